@@ -4,13 +4,16 @@ Audit API endpoints.
 Handles audit log queries.
 """
 from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from typing import List, Dict, Optional
-from datetime import datetime
+from typing import List, Dict, Optional, Tuple
+from datetime import datetime, timezone
 import structlog
 
 from app.db.session import get_db
+from app.utils.audit_chain import AuditChain, get_audit_chain
+from app.utils.audit_log import AuditLogger
 
 logger = structlog.get_logger()
 
@@ -32,30 +35,120 @@ class AuditLogsResponse(BaseModel):
     page: int
 
 
+class ChainHead(BaseModel):
+    """Latest sealed segment; keep its chain_root somewhere outside the database to anchor the trail."""
+    seq: int
+    last_event_id: int
+    chain_root: str
+
+
+class AuditSegmentCheck(BaseModel):
+    """One sealed segment and whether its events and chain link check out."""
+    seq: int
+    first_event_id: int
+    last_event_id: int
+    start_time: datetime
+    end_time: datetime
+    event_count: int
+    merkle_root: str
+    chain_root: str
+    events_in_range: Optional[int] = None
+    stored_nodes_used: Optional[int] = None
+    complete: Optional[bool] = None
+    verified: Optional[bool] = None
+
+
+class EventProof(BaseModel):
+    """Merkle audit path of one event."""
+    event_id: int
+    record: str
+    leaf_index: Optional[int]
+    proof: List[Tuple[str, str]]
+
+
+class AuditVerifyResponse(BaseModel):
+    """Response model for audit verification."""
+    verified: bool
+    events_checked: int
+    unsealed_events: int
+    segments: List[AuditSegmentCheck]
+    mismatched_event_ids: List[int] = []
+    event: Optional[EventProof] = None
+    chain_head: Optional[ChainHead]
+
+
+def _parse_date(value: Optional[str], name: str) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: {value}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)  # Stored timestamps are naive UTC
+    return parsed
+
+
 @router.get("/logs", response_model=AuditLogsResponse)
 async def get_audit_logs(
     start_date: Optional[str] = Query(None, description="Start date (ISO 8601)"),
     end_date: Optional[str] = Query(None, description="End date (ISO 8601)"),
     event_type: Optional[str] = Query(None, description="Filter by event type"),
-    limit: int = Query(100, description="Number of results"),
+    limit: int = Query(100, ge=1, le=1000, description="Number of results"),
+    page: int = Query(1, ge=1, description="Page number (1-based)"),
     db: Session = Depends(get_db)
 ):
     """
-    Retrieve audit log entries.
-    
-    TODO: Implement in Phase 7:
-    - Query database audit logs
-    - Apply filters
-    - Return paginated results
+    Retrieve audit log entries in chronological order.
     """
-    logger.info("Audit logs requested", filters={
-        "start_date": start_date,
-        "end_date": end_date,
-        "event_type": event_type
-    })
-    
-    # Placeholder response
-    raise HTTPException(
-        status_code=501,
-        detail="Audit log retrieval not yet implemented. Coming in Phase 7."
+    start = _parse_date(start_date, "start_date")
+    end = _parse_date(end_date, "end_date")
+    events, total = AuditLogger(db).query(start, end, event_type, limit, page)
+    return AuditLogsResponse(
+        logs=[
+            AuditLogEntry(
+                timestamp=event.timestamp,
+                event_type=event.event_type,
+                correlation_id=event.correlation_id,
+                metadata=event.metadata_ or {}
+            )
+            for event in events
+        ],
+        total=total,
+        page=page
     )
+
+
+@router.get("/verify", response_model=AuditVerifyResponse)
+async def verify_audit_trail(
+    event_id: Optional[int] = Query(None, description="Verify this event with its Merkle proof"),
+    start_date: Optional[str] = Query(None, description="Start of the range to verify (ISO 8601)"),
+    end_date: Optional[str] = Query(None, description="End of the range to verify (ISO 8601)"),
+    db: Session = Depends(get_db),
+    chain: AuditChain = Depends(get_audit_chain)
+):
+    """
+    Check sealed audit events against their segments' Merkle roots and the
+    segment chain: one event (with its audit path), or every event in a
+    time range.
+    """
+    if event_id is not None:
+        result = chain.verify_event(db, event_id)
+        if result is None:
+            raise HTTPException(status_code=404, detail=f"Audit event not found: {event_id}")
+        sealed = result["segment"] is not None
+        return AuditVerifyResponse(
+            verified=result["verified"],
+            events_checked=1 if sealed else 0,
+            unsealed_events=0 if sealed else 1,
+            segments=[AuditSegmentCheck(**result["segment"], verified=result["verified"])] if sealed else [],
+            mismatched_event_ids=[] if result["verified"] or not sealed else [event_id],
+            event=EventProof(**{key: result[key] for key in ("event_id", "record", "leaf_index", "proof")}),
+            chain_head=result["chain_head"],
+        )
+    start = _parse_date(start_date, "start_date")
+    end = _parse_date(end_date, "end_date")
+    if start is None and end is None:
+        raise HTTPException(status_code=400, detail="Give event_id, or start_date and/or end_date")
+    # Hashing a long range is CPU-bound; keep it off the event loop
+    return AuditVerifyResponse(**await run_in_threadpool(chain.verify_range, db, start, end))
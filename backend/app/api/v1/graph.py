@@ -0,0 +1,107 @@
+
+"""
+Citation graph API endpoints.
+Serves work co-citation neighborhoods and binary graph snapshots.
+"""
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import structlog
+
+from app.core.citation_graph import CitationGraph, get_citation_graph
+from app.db.session import get_db
+
+logger = structlog.get_logger()
+
+router = APIRouter()
+
+
+class GraphNode(BaseModel):
+    """A cited work."""
+    work_slug: str
+    citations: int
+
+
+class GraphNeighbor(BaseModel):
+    """A work co-cited with the requested one; weight counts co-cited citation pairs."""
+    work_slug: str
+    weight: int
+    citations: int
+
+
+class GraphNodesResponse(BaseModel):
+    """Response model for a page of cited works."""
+    nodes: List[GraphNode]
+    total: int
+    next_offset: Optional[int]
+
+
+class NeighborhoodResponse(BaseModel):
+    """Response model for a page of a work's neighborhood."""
+    node: GraphNode
+    neighbors: List[GraphNeighbor]
+    total: int
+    next_offset: Optional[int]
+
+
+def _next_offset(offset: int, limit: int, total: int) -> Optional[int]:
+    return offset + limit if offset + limit < total else None
+
+
+@router.get("/nodes", response_model=GraphNodesResponse)
+async def list_nodes(
+    offset: int = Query(0, ge=0, description="Works to skip"),
+    limit: int = Query(100, ge=1, le=1000, description="Works to return"),
+    db: Session = Depends(get_db),
+    graph: CitationGraph = Depends(get_citation_graph)
+):
+    """
+    Cited works, most cited first.
+    """
+    await run_in_threadpool(graph.current, db)  # The first request builds the graph
+    total, nodes = graph.nodes(offset, limit)
+    return GraphNodesResponse(nodes=nodes, total=total, next_offset=_next_offset(offset, limit, total))
+
+
+@router.get("/neighborhood/{work_slug}", response_model=NeighborhoodResponse)
+async def get_neighborhood(
+    work_slug: str,
+    offset: int = Query(0, ge=0, description="Neighbors to skip"),
+    limit: int = Query(50, ge=1, le=1000, description="Neighbors to return"),
+    min_weight: int = Query(1, ge=1, description="Leave out lighter edges"),
+    db: Session = Depends(get_db),
+    graph: CitationGraph = Depends(get_citation_graph)
+):
+    """
+    Works co-cited with work_slug, heaviest edge first.
+    """
+    await run_in_threadpool(graph.current, db)
+    page = graph.neighborhood(work_slug, offset, limit, min_weight)
+    node = graph.node(work_slug)
+    if page is None or node is None:
+        raise HTTPException(status_code=404, detail=f"No citations of work: {work_slug}")
+    total, neighbors = page
+    return NeighborhoodResponse(
+        node=node, neighbors=neighbors, total=total, next_offset=_next_offset(offset, limit, total)
+    )
+
+
+@router.get("/snapshot")
+async def get_snapshot(
+    min_weight: int = Query(1, ge=1, description="Leave out lighter edges"),
+    db: Session = Depends(get_db),
+    graph: CitationGraph = Depends(get_citation_graph)
+):
+    """
+    The whole graph as a streamed binary CSR snapshot
+    (layout: CitationGraph.snapshot_chunks).
+    """
+    await run_in_threadpool(graph.current, db)
+    return StreamingResponse(
+        graph.snapshot_chunks(min_weight),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": 'attachment; filename="citation-graph.bin"'},
+    )
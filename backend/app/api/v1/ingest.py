@@ -5,10 +5,18 @@ Handles repository ingestion, chunking, embedding, and indexing.
 """
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
+from redis.exceptions import RedisError
+from rq import Queue
 from sqlalchemy.orm import Session
+from typing import Dict, List, Optional
+from datetime import datetime
+import uuid
 import structlog
 
+from app.db.models import Work
 from app.db.session import get_db
+from app.workers.ingest_worker import ACTIVE_JOB_STATUSES, enqueue_ingestion, get_job_status
+from app.workers.queue import get_ingestion_queue
 
 logger = structlog.get_logger()
 
@@ -19,7 +27,12 @@ class IngestWorkRequest(BaseModel):
     """Request model for ingesting a new work."""
     repo_url: str
     slug: str
-    force_regenerate: bool = False
+    version: Optional[str] = None  # Defaults to the cloned commit SHA
+    branch: Optional[str] = None  # Defaults to the remote's default branch
+    include: Optional[List[str]] = None  # Globs; defaults to INGEST_INCLUDE_GLOBS
+    exclude: Optional[List[str]] = None  # Globs; defaults to INGEST_EXCLUDE_GLOBS
+    force_regenerate: bool = False  # Rebuild an existing version from scratch
+    incremental: bool = False  # New version of an existing slug, reusing unchanged files
 
 
 class IngestWorkResponse(BaseModel):
@@ -28,23 +41,156 @@ class IngestWorkResponse(BaseModel):
     status: str
 
 
-@router.post("/add-work", response_model=IngestWorkResponse)
-async def ingest_work(request: IngestWorkRequest, db: Session = Depends(get_db)):
+class JobStatusResponse(BaseModel):
+    """Response model for ingestion job status."""
+    job_id: str
+    work_id: int
+    slug: str
+    version: str
+    status: str  # pending, processing, completed, failed
+    queue_status: Optional[str]  # RQ job status, None if expired
+    stage: Optional[str]
+    progress: Dict
+    total_chunks: int
+    started_at: Optional[datetime]
+    completed_at: Optional[datetime]
+    error: Optional[str]
+
+
+def _job_status(work: Work, queue: Queue) -> JobStatusResponse:
+    try:
+        queue_status = get_job_status(queue, work.ingestion_job_id)
+    except RedisError:
+        queue_status = None
+    return JobStatusResponse(
+        job_id=work.ingestion_job_id,
+        work_id=work.id,
+        slug=work.source_slug,
+        version=work.version,
+        status=work.ingestion_status,
+        queue_status=queue_status,
+        stage=work.ingestion_stage,
+        progress=work.ingestion_progress or {},
+        total_chunks=work.total_chunks or 0,
+        started_at=work.ingestion_started_at,
+        completed_at=work.ingestion_completed_at,
+        error=work.ingestion_error
+    )
+
+
+def _enqueue(queue: Queue, job_id: str):
+    try:
+        enqueue_ingestion(queue, job_id)
+    except RedisError as e:
+        logger.error("Failed to enqueue ingestion job", job_id=job_id, error=str(e))
+        raise HTTPException(status_code=503, detail="Job queue unavailable")
+
+
+@router.post("/add-work", response_model=IngestWorkResponse, status_code=202)
+async def ingest_work(
+    request: IngestWorkRequest,
+    db: Session = Depends(get_db),
+    queue: Queue = Depends(get_ingestion_queue)
+):
     """
     Submit a new work for ingestion.
-    
-    TODO: Implement ingestion pipeline in Phase 2:
-    - Clone repository
-    - Extract text
-    - Create chunks
-    - Generate embeddings
-    - Build indexes
-    - Store in database
+
+    Registers the work and enqueues a background job; returns immediately
+    with the job ID to poll at /job/{job_id}.
     """
-    logger.info("Ingestion requested", slug=request.slug, url=request.repo_url)
-    
-    # Placeholder response
-    raise HTTPException(
-        status_code=501,
-        detail="Ingestion pipeline not yet implemented. Coming in Phase 2."
-    )
+    logger.info("Ingestion requested", slug=request.slug, url=request.repo_url, incremental=request.incremental)
+
+    version = request.version or "HEAD"
+    versions = db.query(Work).filter(Work.source_slug == request.slug).order_by(Work.id).all()
+    for existing in versions:
+        if existing.ingestion_status in ("pending", "processing"):
+            raise HTTPException(
+                status_code=409,
+                detail=f"Work {request.slug} is already being ingested (job {existing.ingestion_job_id})"
+            )
+    same_version = next((w for w in versions if w.version == version), None)
+
+    if not versions:
+        work = Work(source_slug=request.slug)
+        db.add(work)
+    elif request.incremental:
+        # A new Work row per version; it becomes current once fully ingested
+        if same_version is not None:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Version {version} of {request.slug} already exists (job {same_version.ingestion_job_id})"
+            )
+        current = next((w for w in versions if w.is_current), None)
+        work = Work(source_slug=request.slug, base_work_id=current.id if current else None)
+        db.add(work)
+    elif request.force_regenerate:
+        work = same_version or next((w for w in versions if w.is_current), versions[-1])
+        work.base_work_id = None
+    else:
+        raise HTTPException(status_code=409, detail=f"Work {request.slug} already exists")
+
+    job_id = uuid.uuid4().hex
+    work.version = version
+    work.canonical_url = request.repo_url
+    work.ingestion_status = "pending"
+    work.ingestion_job_id = job_id
+    work.ingestion_stage = None
+    work.ingestion_progress = {}
+    work.ingestion_error = None
+    work.ingestion_started_at = None
+    work.ingestion_completed_at = None
+    work.total_chunks = 0
+    meta = {"branch": request.branch, "include": request.include, "exclude": request.exclude}
+    if work.id is not None and request.force_regenerate:
+        # The worker drops the old chunks from the indexes before deleting them
+        meta["regenerate"] = True
+    work.metadata_ = meta
+    db.commit()
+
+    _enqueue(queue, job_id)
+    return IngestWorkResponse(job_id=job_id, status="queued")
+
+
+@router.get("/job/{job_id}", response_model=JobStatusResponse)
+async def get_ingestion_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    queue: Queue = Depends(get_ingestion_queue)
+):
+    """Report status and per-stage progress of an ingestion job."""
+    work = db.query(Work).filter(Work.ingestion_job_id == job_id).first()
+    if work is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_status(work, queue)
+
+
+@router.post("/job/{job_id}/resume", response_model=JobStatusResponse, status_code=202)
+async def resume_ingestion_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    queue: Queue = Depends(get_ingestion_queue)
+):
+    """
+    Resume an interrupted or failed ingestion job.
+    Work already persisted by the previous run is skipped.
+    """
+    work = db.query(Work).filter(Work.ingestion_job_id == job_id).first()
+    if work is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if work.ingestion_status == "completed":
+        raise HTTPException(status_code=409, detail="Job already completed")
+    try:
+        queue_status = get_job_status(queue, job_id)
+    except RedisError as e:
+        logger.error("Job queue unavailable", job_id=job_id, error=str(e))
+        raise HTTPException(status_code=503, detail="Job queue unavailable")
+    if queue_status in ACTIVE_JOB_STATUSES:
+        raise HTTPException(status_code=409, detail="Job is still queued or running")
+
+    work.ingestion_status = "pending"
+    work.ingestion_error = None
+    db.commit()
+
+    logger.info("Resuming ingestion job", job_id=job_id, work_id=work.id)
+    _enqueue(queue, job_id)
+    return _job_status(work, queue)
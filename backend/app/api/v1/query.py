@@ -1,20 +1,33 @@
 
 """
 Query API endpoints.
-Handles hybrid retrieval queries.
+Handles hybrid retrieval queries, whole or streamed as server-sent events.
+Both run under the query admission controller; identical concurrent
+queries share one retrieval.
 """
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Iterator, Optional, Tuple
+import re
+import orjson
 import structlog
 
+from app.config import settings
+from app.core.admission import AdmissionController, SingleFlight, get_query_admission, get_query_flights
+from app.core.diversity import diversity_options
+from app.core.retrieval import HybridRetriever, get_retriever
 from app.db.session import get_db
+from app.utils.audit_log import AuditLogger
 
 logger = structlog.get_logger()
 
 router = APIRouter()
 
+MAX_CLAIMS = 3
+PREVIEW_CHARS = 300
+
 
 class QueryRequest(BaseModel):
     """Request model for query."""
@@ -36,22 +49,160 @@ class QueryResponse(BaseModel):
     retrieval_ids: List[str]
 
 
+def _first_sentence(text: str) -> str:
+    match = re.search(r"(.+?[.!?])(\s|$)", " ".join(text.split()))
+    return match.group(1) if match else " ".join(text.split())
+
+
+def generate_claims(results: List[Dict], max_claims: int = MAX_CLAIMS) -> Iterator[Claim]:
+    """
+    Extractive claims: the leading sentence of each top hit, cited to that hit.
+    Stands in for LLM generation, which is not wired up yet.
+    """
+    for result in results[:max_claims]:
+        yield Claim(text=_first_sentence(result["text"]), citation_ids=[result["retrieval_id"]])
+
+
+def compose_answer(results: List[Dict], max_claims: int = MAX_CLAIMS) -> Tuple[str, List[Claim]]:
+    """Answer text and claims for the top hits (see generate_claims)."""
+    claims = list(generate_claims(results, max_claims))
+    return " ".join(claim.text for claim in claims), claims
+
+
+def sse_event(event: str, data) -> bytes:
+    """One server-sent event with a JSON payload."""
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+def _hit_preview(result: Dict, max_chars: int = PREVIEW_CHARS) -> Dict:
+    return {
+        "retrieval_id": result["retrieval_id"],
+        "work_slug": result["work_slug"],
+        "work_title": result["work_title"],
+        "work_url": result["work_url"],
+        "chunk_index": result["chunk_index"],
+        "hybrid_score": result["hybrid_score"],
+        "text": result["text"][:max_chars],
+        "context_window": result.get("context_window", []),
+        "aliases": result.get("aliases", []),
+    }
+
+
+def _check_query(request: QueryRequest):
+    logger.info("Query received", session_id=request.session_id, query=request.user_query)
+    if len(request.user_query.strip()) < 3:
+        raise HTTPException(status_code=400, detail="Query too short (min 3 chars)")
+    try:
+        diversity_options(request.constraints)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def coalescing_key(request: QueryRequest) -> Tuple[str, bytes]:
+    """Requests with equal keys get the same retrieval results: query text up to whitespace, and constraints."""
+    return " ".join(request.user_query.split()), orjson.dumps(request.constraints, option=orjson.OPT_SORT_KEYS)
+
+
+async def _streaming_slot(admission: AdmissionController = Depends(get_query_admission)):
+    """Holds a query admission slot until the streamed response has been sent."""
+    async with admission.slot():
+        yield
+
+
+def _log_query(db: Session, request: QueryRequest, results: List[Dict]):
+    AuditLogger(db).log_event(
+        event_type="retrieval",
+        action="query",
+        resource_type="session",
+        resource_id=request.session_id,
+        metadata={"results": len(results)}
+    )
+
+
 @router.post("/", response_model=QueryResponse)
-async def query(request: QueryRequest, db: Session = Depends(get_db)):
+async def query(
+    request: QueryRequest,
+    retriever: HybridRetriever = Depends(get_retriever),
+    db: Session = Depends(get_db),
+    admission: AdmissionController = Depends(get_query_admission),
+    flights: SingleFlight = Depends(get_query_flights)
+):
     """
     Submit a query for hybrid retrieval.
-    
-    TODO: Implement in Phase 4:
-    - Embed query
-    - Search FAISS (semantic)
-    - Search Whoosh (lexical)
-    - Merge results with hybrid scoring
-    - Return top-K chunks
+
+    Constraints may include work_slug, version and tags, and mmr_lambda and
+    max_per_work to diversify results (see app.core.diversity). Answers 429
+    with Retry-After when the retrieval cannot be admitted within its queue
+    budget.
     """
-    logger.info("Query received", session_id=request.session_id, query=request.user_query)
-    
-    # Placeholder response
-    raise HTTPException(
-        status_code=501,
-        detail="Query pipeline not yet implemented. Coming in Phase 4."
+    _check_query(request)
+
+    async def compute() -> List[Dict]:
+        async with admission.slot():
+            results = await retriever.retrieve(request.user_query, top_k=settings.TOP_K, filters=request.constraints)
+            retriever.load_text(results[:MAX_CLAIMS])  # Only the hits claims are drawn from need text
+            return results
+
+    # Requests joining an identical in-flight query take no admission slot of their own
+    results = await flights.do(coalescing_key(request), compute)
+    answer, claims = compose_answer(results)
+    _log_query(db, request, results)
+    return QueryResponse(
+        answer=answer,
+        claims=claims,
+        retrieval_ids=[result["retrieval_id"] for result in results]
     )
+
+
+@router.post("/stream")
+async def query_stream(
+    request: QueryRequest,
+    retriever: HybridRetriever = Depends(get_retriever),
+    db: Session = Depends(get_db),
+    _slot: None = Depends(_streaming_slot)
+):
+    """
+    Streaming variant of query, as server-sent events (text/event-stream):
+
+    - ``retrieval`` {leg, retrieval_ids, hits}: first from whichever search
+      leg finishes first (leg "semantic" or "lexical"), then the fused
+      top-K (leg "fused");
+    - ``claim``: each claim as it is generated;
+    - ``answer``: the complete QueryResponse;
+    - ``error`` {detail}: the query failed after streaming started.
+
+    A query that fails validation or admission gets a plain HTTP error
+    instead. Streams are not coalesced.
+    """
+    _check_query(request)
+
+    async def events() -> AsyncIterator[bytes]:
+        try:
+            results: List[Dict] = []
+            async for leg, results in retriever.retrieve_progressive(
+                request.user_query, top_k=settings.TOP_K, filters=request.constraints
+            ):
+                retriever.load_text(results, max_chars=PREVIEW_CHARS)
+                yield sse_event("retrieval", {
+                    "leg": leg,
+                    "retrieval_ids": [result["retrieval_id"] for result in results],
+                    "hits": [_hit_preview(result) for result in results],
+                })
+            retriever.load_text(results[:MAX_CLAIMS])
+            claims = []
+            for claim in generate_claims(results):
+                claims.append(claim)
+                yield sse_event("claim", claim.model_dump())
+            _log_query(db, request, results)
+            yield sse_event("answer", QueryResponse(
+                answer=" ".join(claim.text for claim in claims),
+                claims=claims,
+                retrieval_ids=[result["retrieval_id"] for result in results]
+            ).model_dump())
+        except Exception as e:
+            logger.error("Streaming query failed", session_id=request.session_id, error=str(e))
+            yield sse_event("error", {"detail": "Query failed"})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache", "X-Accel-Buffering": "no"
+    })
@@ -9,7 +9,10 @@ from sqlalchemy.orm import Session
 from typing import List, Dict, Optional
 import structlog
 
+from app.core.checkpoint import SessionStateManager
 from app.db.session import get_db
+from app.storage.s3_client import get_s3_client
+from app.utils.audit_log import AuditLogger
 
 logger = structlog.get_logger()
 
@@ -37,22 +40,31 @@ class RehydrateResponse(BaseModel):
 
 
 @router.post("/checkpoint", response_model=CheckpointResponse)
-async def create_checkpoint(request: CheckpointRequest, db: Session = Depends(get_db)):
+async def create_checkpoint(
+    request: CheckpointRequest,
+    db: Session = Depends(get_db),
+    store=Depends(get_s3_client)
+):
     """
-    Create a session checkpoint.
-    
-    TODO: Implement in Phase 6:
-    - Save session state
-    - Link to parent checkpoint
-    - Store in database
+    Create a session checkpoint, linked to the session's previous one.
+    The state is also archived to object storage.
     """
     logger.info("Checkpoint requested", session_id=request.session_id)
-    
-    # Placeholder response
-    raise HTTPException(
-        status_code=501,
-        detail="Checkpoint creation not yet implemented. Coming in Phase 6."
+
+    checkpoint = SessionStateManager(db, store).create_checkpoint(
+        session_id=request.session_id,
+        condensed_summary=request.condensed_summary,
+        accepted_claims=request.accepted_claims,
+        top_citation_ids=request.top_citation_ids
+    )
+    AuditLogger(db).log_event(
+        event_type="checkpoint",
+        action="create_checkpoint",
+        resource_type="session",
+        resource_id=request.session_id,
+        metadata={"checkpoint_id": checkpoint.checkpoint_id, "citations": len(request.top_citation_ids)}
     )
+    return CheckpointResponse(checkpoint_id=checkpoint.checkpoint_id)
 
 
 @router.get("/rehydrate", response_model=RehydrateResponse)
@@ -61,17 +73,12 @@ async def rehydrate_session(
     db: Session = Depends(get_db)
 ):
     """
-    Rehydrate a session from a checkpoint.
-    
-    TODO: Implement in Phase 6:
-    - Load checkpoint data
-    - Retrieve associated chunks
-    - Return condensed context
+    Rehydrate a session from a checkpoint: its condensed summary, the short
+    summaries of its cited chunks and the citations that still resolve.
     """
     logger.info("Rehydration requested", checkpoint_id=checkpoint_id)
-    
-    # Placeholder response
-    raise HTTPException(
-        status_code=501,
-        detail="Session rehydration not yet implemented. Coming in Phase 6."
-    )
+
+    try:
+        return RehydrateResponse(**SessionStateManager(db).rehydrate(checkpoint_id))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
@@ -5,11 +5,12 @@ Handles citation verification.
 """
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from typing import List, Dict
+from typing import List, Dict, Optional
 import structlog
 
-from app.db.session import get_db
+from app.core.admission import AdmissionController, get_verify_admission
+from app.core.verifier import CitationVerifier, get_verifier
+from app.utils.audit_log import AuditLogger
 
 logger = structlog.get_logger()
 
@@ -21,6 +22,8 @@ class VerifyRequest(BaseModel):
     run_id: str
     model_output: str
     retrieval_ids: List[str]
+    query_text: Optional[str] = None
+    expand_aliases: bool = False
 
 
 class VerifyResponse(BaseModel):
@@ -30,21 +33,34 @@ class VerifyResponse(BaseModel):
 
 
 @router.post("/run", response_model=VerifyResponse)
-async def verify(request: VerifyRequest, db: Session = Depends(get_db)):
+async def verify(
+    request: VerifyRequest,
+    verifier: CitationVerifier = Depends(get_verifier),
+    admission: AdmissionController = Depends(get_verify_admission)
+):
     """
     Run citation verification on model output.
-    
-    TODO: Implement in Phase 5:
-    - Extract claims from output
-    - Compare with cited chunks
-    - Calculate similarity scores
-    - Apply thresholds
-    - Return pass/partial/fail decisions
+
+    Each claim (sentence) is checked against the retrieval IDs it cites
+    inline as [slug:version:chunk_id], or against all request retrieval_ids
+    if it cites none. The run fails if any claim fails. With expand_aliases,
+    near-duplicate copies of each best chunk are cited as well. Answers 429
+    with Retry-After when the run cannot be admitted within its queue budget.
     """
     logger.info("Verification requested", run_id=request.run_id)
-    
-    # Placeholder response
-    raise HTTPException(
-        status_code=501,
-        detail="Citation verification not yet implemented. Coming in Phase 5."
+
+    if not request.model_output.strip():
+        raise HTTPException(status_code=400, detail="model_output is empty")
+
+    async with admission.slot():
+        result = await verifier.verify(
+            request.model_output, request.retrieval_ids, request.query_text, expand_aliases=request.expand_aliases
+        )
+    AuditLogger(verifier.db).log_event(
+        event_type="verification",
+        action="verify_run",
+        resource_type="run",
+        resource_id=request.run_id,
+        metadata={"claims": len(result["annotated_claims"]), "decision": result["verifier_decision"]}
     )
+    return VerifyResponse(**result)
@@ -54,6 +54,9 @@ class Settings(BaseSettings):
         description="Comma-separated list of allowed CORS origins"
     )
     LOG_LEVEL: str = Field("INFO", description="Logging level")
+    LOG_ASYNC: bool = Field(False, description="Render and write logs on a background thread")
+    LOG_QUEUE_SIZE: int = Field(10000, description="Max queued log events in async mode (overflow is dropped)")
+    LOG_SAMPLE_RATES: str = Field("", description="Comma-separated event=rate pairs, e.g. 'Query received=0.01'")
     DEBUG: bool = Field(False, description="Debug mode")
     RANDOM_SEED: int = Field(42, description="Random seed for reproducibility")
     ENVIRONMENT: str = Field("development", description="Environment name")
@@ -69,15 +72,90 @@ class Settings(BaseSettings):
         description="Embedding model name"
     )
     EMBEDDING_DIM: int = Field(384, description="Embedding dimension")
+    EMBEDDING_EXECUTION_MODE: str = Field(
+        "local",
+        description="Ingestion embedding mode: local or process_pool"
+    )
+    EMBEDDING_POOL_PROCESSES: int = Field(0, description="Embedding pool processes (0 = one per CPU)")
+    EMBEDDING_POOL_THREADS_PER_PROCESS: int = Field(1, description="Torch threads per pool process")
     
     # Chunking
     CHUNK_SIZE: int = Field(1024, description="Chunk size in tokens")
     CHUNK_OVERLAP: float = Field(0.2, description="Chunk overlap ratio")
     
+    # Ingestion
+    INDEX_DIR: str = Field("/app/data", description="Directory for FAISS and Whoosh indexes")
+    REPO_CACHE_DIR: str = Field("/tmp/greds_repos", description="Working directory for cloned repositories")
+    INGEST_QUEUE_NAME: str = Field("ingestion", description="RQ queue name for ingestion jobs")
+    INGEST_JOB_TIMEOUT: int = Field(14400, description="Ingestion job timeout in seconds")
+    INGEST_EXTRACT_WORKERS: int = Field(4, description="Worker threads for text extraction")
+    INGEST_CHUNK_WORKERS: int = Field(2, description="Worker threads for chunking")
+    INGEST_EMBED_WORKERS: int = Field(1, description="Worker threads for embedding")
+    INGEST_SUMMARIZE_WORKERS: int = Field(4, description="Worker threads for summarization")
+    INGEST_STAGE_QUEUE_SIZE: int = Field(8, description="Max items buffered between stages")
+    INGEST_EMBED_BATCH_SIZE: int = Field(32, description="Chunks per embedding batch")
+    INGEST_PROGRESS_INTERVAL: float = Field(1.0, description="Seconds between progress writes")
+    INGEST_SHALLOW_CLONE: bool = Field(True, description="Clone only the tip of a single branch")
+    INGEST_INCLUDE_GLOBS: str = Field("", description="Comma-separated include globs (empty = all supported files)")
+    INGEST_EXCLUDE_GLOBS: str = Field(
+        "node_modules/*,**/node_modules/*,.github/*",
+        description="Comma-separated exclude globs"
+    )
+    INGEST_MAX_FILE_BYTES: int = Field(50 * 1024 * 1024, description="Skip files larger than this (0 = no cap)")
+    INGEST_PARSE_IN_PROCESS_POOL: bool = Field(True, description="Parse PDF/HTML/Markdown on a process pool")
+    INGEST_PARSE_PROCESSES: int = Field(0, description="Parse pool processes (0 = one per CPU)")
+    DEDUP_ENABLED: bool = Field(False, description="Store near-duplicate chunks as aliases of a canonical chunk")
+    DEDUP_THRESHOLD: float = Field(0.85, description="Estimated Jaccard similarity of word shingles for a duplicate")
+    DEDUP_NUM_PERM: int = Field(128, description="MinHash permutations per chunk signature")
+    DEDUP_SHINGLE_WORDS: int = Field(5, description="Words per shingle")
+
     # Retrieval
     SEMANTIC_WEIGHT: float = Field(0.7, description="Semantic search weight")
     LEXICAL_WEIGHT: float = Field(0.3, description="Lexical search weight")
     TOP_K: int = Field(20, description="Number of top results to return")
+    QUERY_EMBED_MAX_BATCH: int = Field(32, description="Max queries embedded per forward pass")
+    QUERY_EMBED_MAX_WAIT_MS: float = Field(5.0, description="Max ms a query waits to join a batch")
+    SEMANTIC_SHARDS: int = Field(1, description="FAISS index shards (1 = single unsharded index)")
+    SEMANTIC_SHARD_KEY: str = Field("chunk", description="Shard assignment: chunk (chunk_id) or work (work slug hash)")
+    SEMANTIC_SEARCH_PROCESSES: int = Field(0, description="Processes for scatter-gather shard search (0 = in-process)")
+    SEMANTIC_INDEX_CODES: str = Field(
+        "flat", description="flat (exact float32 in RAM), or pq/binary codes in RAM with exact re-ranking from disk"
+    )
+    SEMANTIC_CANDIDATES: int = Field(256, description="Candidates from pq/binary codes re-ranked exactly per search")
+    SEMANTIC_PQ_SUBQUANTIZERS: int = Field(48, description="PQ code bytes per vector (must divide EMBEDDING_DIM)")
+    SEMANTIC_PQ_TRAIN_SIZE: int = Field(10000, description="Vectors collected before PQ codes are trained")
+    INDEX_SNAPSHOTS: bool = Field(
+        False, description="Publish index snapshots to S3 after ingestion; serve queries from the newest one"
+    )
+    INDEX_SNAPSHOT_PREFIX: str = Field("index-snapshots", description="S3 key prefix of index snapshot generations")
+    INDEX_SNAPSHOT_PART_BYTES: int = Field(8 * 1024 * 1024, description="Bytes per ranged GET of a snapshot download")
+    INDEX_SNAPSHOT_DOWNLOAD_THREADS: int = Field(8, description="Concurrent ranged GETs per snapshot download")
+    INDEX_SNAPSHOT_POLL_SECONDS: float = Field(30.0, description="How often replicas check for a newer snapshot")
+    INDEX_SNAPSHOT_KEEP: int = Field(2, description="Downloaded snapshot generations kept on disk (min 2)")
+    SEARCH_INDEX_REFRESH_SECONDS: float = Field(
+        5.0, description="How often the API checks INDEX_DIR for a newer saved semantic index (without snapshots)"
+    )
+    CONTEXT_WINDOW_CHUNKS: int = Field(1, description="Chunks on each side of a hit in its context window")
+    NEIGHBOR_INDEX_REFRESH_SECONDS: float = Field(
+        30.0, description="How often the chunk neighbor index checks for newly ingested chunks"
+    )
+    HYDRATION_CACHE_CHUNKS: int = Field(50000, description="Hit chunks whose metadata is cached in RAM (0 = no cache)")
+    HYDRATION_CACHE_REFRESH_SECONDS: float = Field(
+        5.0, description="How often cached chunk and work metadata is checked against the database"
+    )
+    RETRIEVAL_MODE: str = Field(
+        "flat", description="flat (search every chunk) or hierarchical (route through work and section vectors first)"
+    )
+    HIERARCHY_WORKS: int = Field(8, description="Candidate works per hierarchical query")
+    HIERARCHY_SECTIONS: int = Field(64, description="Candidate sections, within the candidate works, per query")
+    HIERARCHY_SECTION_CHUNKS: int = Field(32, description="Consecutive chunks of one file per section")
+    HIERARCHY_REFRESH_SECONDS: float = Field(
+        30.0, description="How often the work and section vectors check for newly ingested or published works"
+    )
+    MMR_LAMBDA: float = Field(
+        0.7, description="Relevance weight of diversity re-ranking when a query sets max_per_work but not mmr_lambda"
+    )
+    MMR_CANDIDATES: int = Field(100, description="Hits per search leg considered when a query asks for diversity")
     
     # Verification
     VERIFIER_PASS_THRESHOLD: float = Field(
@@ -89,6 +167,37 @@ class Settings(BaseSettings):
         description="Similarity threshold for partial pass"
     )
     
+    # Profiling
+    PROFILING_SAMPLE_RATE: float = Field(0.0, description="Fraction of requests profiled (0 = header-triggered only)")
+    PROFILING_TOKEN: str = Field("", description="Requests sending X-Profile: <token> are profiled (empty = disabled)")
+    PROFILING_INTERVAL_MS: float = Field(1.0, description="Stack sampling interval for request profiles")
+    PROFILING_TRACE_ALLOCATIONS: bool = Field(True, description="Record allocation stats (tracemalloc) in profiles")
+    PROFILING_MAX_CONCURRENT: int = Field(1, description="Max requests profiled at once; extra ones run unprofiled")
+
+    # Load shedding
+    QUERY_COALESCING: bool = Field(True, description="Identical in-flight queries share one retrieval")
+    ADMISSION_QUERY_CONCURRENCY: int = Field(8, description="Retrievals running at once (0 = unlimited)")
+    ADMISSION_QUERY_QUEUE: int = Field(64, description="Retrievals waiting for a slot before new ones get 429")
+    ADMISSION_QUERY_QUEUE_MS: float = Field(1000.0, description="Longest a retrieval waits for a slot before 429")
+    ADMISSION_VERIFY_CONCURRENCY: int = Field(4, description="Verifications running at once (0 = unlimited)")
+    ADMISSION_VERIFY_QUEUE: int = Field(32, description="Verifications waiting for a slot before new ones get 429")
+    ADMISSION_VERIFY_QUEUE_MS: float = Field(2000.0, description="Longest a verification waits for a slot before 429")
+
+    # Audit trail
+    AUDIT_SEGMENT_EVENTS: int = Field(1024, description="Audit events sealed into one Merkle segment")
+    AUDIT_SEGMENT_SECONDS: float = Field(3600.0, description="Seal a partial segment once its oldest event is this old")
+
+    # Citation graph
+    CITATION_GRAPH_REFRESH_SECONDS: float = Field(
+        5.0, description="How often the citation graph reads citations written by other processes"
+    )
+    CITATION_GRAPH_MERGE_EDGES: int = Field(
+        65536, description="Recent edge updates held apart from the compact adjacency arrays before merging"
+    )
+    CITATION_GRAPH_QUERIES: int = Field(
+        100000, description="Most recently cited query texts whose per-work counts are kept to pair new citations"
+    )
+
     class Config:
         """Pydantic configuration."""
         env_file = ".env"
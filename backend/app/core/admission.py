@@ -0,0 +1,238 @@
+
+"""
+Load shedding for the query and verify endpoints.
+
+Bursts of requests (a class firing the same query at once) otherwise pile
+up on the CPU-bound retrieval until every request is slow. Two layers
+keep latency bounded instead:
+
+- SingleFlight merges identical in-flight computations: the first caller
+  runs it, later callers with the same key await the same result.
+- AdmissionController caps how many requests of an endpoint run at once.
+  Extra requests wait in a FIFO queue for at most a queue-time budget;
+  when the queue is full or the budget runs out they are rejected with
+  Overloaded, which the API turns into 429 with a Retry-After estimate.
+"""
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+import asyncio
+import math
+import time
+
+import structlog
+
+from app.config import settings
+from app.utils.metrics import REGISTRY
+
+logger = structlog.get_logger()
+
+ADMISSION_QUEUE_TIME = REGISTRY.histogram(
+    "greds_admission_queue_seconds",
+    "Time admitted requests waited for an admission slot",
+    ["endpoint"]
+)
+ADMISSION_REJECTED = REGISTRY.counter(
+    "greds_admission_rejected_total",
+    "Requests shed with 429, by reason (queue_full or queue_timeout)",
+    ["endpoint", "reason"]
+)
+COALESCED_REQUESTS = REGISTRY.counter(
+    "greds_coalesced_requests_total",
+    "Requests served by joining an identical in-flight computation",
+    ["endpoint"]
+)
+
+
+class Overloaded(Exception):
+    """A request was shed by admission control."""
+
+    def __init__(self, endpoint: str, reason: str, retry_after: int):
+        super().__init__(f"{endpoint} overloaded ({reason})")
+        self.endpoint = endpoint
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Concurrency limit plus a bounded, time-budgeted FIFO queue.
+
+    A finished request hands its slot straight to the oldest waiter, so
+    queued requests are served in arrival order and newcomers cannot
+    overtake them.
+    """
+
+    def __init__(self, endpoint: str, max_concurrency: int, max_queue: int, queue_timeout_ms: float):
+        """
+        Args:
+            endpoint: Name used in logs, metrics and errors
+            max_concurrency: Requests running at once (0 = unlimited)
+            max_queue: Requests waiting for a slot; more are rejected at once
+            queue_timeout_ms: Longest a request waits for a slot before it is rejected
+        """
+        self.endpoint = endpoint
+        self.max_concurrency = max_concurrency
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = max(0.0, queue_timeout_ms) / 1000.0
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._service_seconds = 0.1  # Moving average of slot hold time, for Retry-After
+        self.stats: Dict[str, int] = {"admitted": 0, "queued": 0, "rejected": 0}
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue has likely drained (at least 1)."""
+        drain = (len(self._waiters) + 1) * self._service_seconds / max(1, self.max_concurrency)
+        return max(1, min(60, math.ceil(drain)))
+
+    def _reject(self, reason: str):
+        self.stats["rejected"] += 1
+        ADMISSION_REJECTED.labels(self.endpoint, reason).inc()
+        retry_after = self.retry_after()
+        logger.warning("Request shed", endpoint=self.endpoint, reason=reason, active=self.active,
+                       waiting=len(self._waiters), retry_after=retry_after)
+        raise Overloaded(self.endpoint, reason, retry_after)
+
+    async def acquire(self):
+        """Take a slot, waiting up to the queue budget; raises Overloaded if none frees up."""
+        start = time.perf_counter()
+        if self.max_concurrency <= 0 or (self.active < self.max_concurrency and not self._waiters):
+            self.active += 1
+        else:
+            if len(self._waiters) >= self.max_queue:
+                self._reject("queue_full")
+            self.stats["queued"] += 1
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            try:
+                await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+            except asyncio.TimeoutError:
+                if not future.done():
+                    self._waiters.remove(future)
+                    future.cancel()
+                    self._reject("queue_timeout")
+            except asyncio.CancelledError:
+                # Client went away while queued; pass on a slot already handed to us
+                if future.done() and not future.cancelled():
+                    self.release()
+                else:
+                    self._waiters.remove(future)
+                    future.cancel()
+                raise
+        self.stats["admitted"] += 1
+        ADMISSION_QUEUE_TIME.labels(self.endpoint).observe(time.perf_counter() - start)
+
+    def release(self, held_seconds: Optional[float] = None):
+        """Free a slot, handing it to the oldest waiter if there is one."""
+        if held_seconds is not None:
+            self._service_seconds += 0.2 * (held_seconds - self._service_seconds)
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)  # The slot passes on; active is unchanged
+                return
+        self.active -= 1
+
+    def slot(self) -> "_Slot":
+        """async with controller.slot(): ... runs the block in an admitted slot."""
+        return _Slot(self)
+
+
+class _Slot:
+    __slots__ = ("controller", "_start")
+
+    def __init__(self, controller: AdmissionController):
+        self.controller = controller
+
+    async def __aenter__(self):
+        await self.controller.acquire()
+        self._start = time.perf_counter()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.controller.release(time.perf_counter() - self._start)
+        return False
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with equal keys into one computation.
+
+    Only in-flight calls are shared: once a computation finishes, the next
+    call with its key starts a new one. Every caller gets the same result
+    object (or exception), so callers must not mutate it. A caller that is
+    cancelled leaves the computation running for the others; it is
+    cancelled only when no caller is left waiting for it.
+    """
+
+    def __init__(self, endpoint: str, enabled: bool = True):
+        self.endpoint = endpoint
+        self.enabled = enabled
+        self._calls: Dict[Any, _Call] = {}
+        self.stats: Dict[str, int] = {"calls": 0, "shared": 0}
+
+    async def do(self, key: Any, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Result of compute(), shared with any concurrent call with the same key."""
+        self.stats["calls"] += 1
+        if not self.enabled:
+            return await compute()
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = _Call(asyncio.ensure_future(compute()))
+            call.task.add_done_callback(lambda _, key=key, call=call: self._forget(key, call))
+        else:
+            self.stats["shared"] += 1
+            COALESCED_REQUESTS.labels(self.endpoint).inc()
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+    def _forget(self, key: Any, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+
+_controllers: Dict[str, AdmissionController] = {}
+_query_flights: Optional[SingleFlight] = None
+
+
+def get_query_admission() -> AdmissionController:
+    """FastAPI dependency for the process-wide query admission controller."""
+    if "query" not in _controllers:
+        _controllers["query"] = AdmissionController(
+            "query", settings.ADMISSION_QUERY_CONCURRENCY, settings.ADMISSION_QUERY_QUEUE,
+            settings.ADMISSION_QUERY_QUEUE_MS
+        )
+    return _controllers["query"]
+
+
+def get_verify_admission() -> AdmissionController:
+    """FastAPI dependency for the process-wide verify admission controller."""
+    if "verify" not in _controllers:
+        _controllers["verify"] = AdmissionController(
+            "verify", settings.ADMISSION_VERIFY_CONCURRENCY, settings.ADMISSION_VERIFY_QUEUE,
+            settings.ADMISSION_VERIFY_QUEUE_MS
+        )
+    return _controllers["verify"]
+
+
+def get_query_flights() -> SingleFlight:
+    """FastAPI dependency for the process-wide query coalescer."""
+    global _query_flights
+    if _query_flights is None:
+        _query_flights = SingleFlight("query", enabled=settings.QUERY_COALESCING)
+    return _query_flights
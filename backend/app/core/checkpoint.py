@@ -0,0 +1,123 @@
+
+"""
+Session checkpoints and rehydration.
+
+A checkpoint is an immutable Session row (is_checkpoint=True) holding the
+condensed summary, accepted claims and top citations of a conversation,
+linked to the session's previous checkpoint. Rehydration turns it back into
+a compact context: the summary, the short summaries of the cited chunks and
+the retrieval IDs that still resolve.
+"""
+from datetime import datetime
+from typing import Dict, List, Optional
+import uuid
+
+from sqlalchemy.orm import Session
+import structlog
+
+from app.db.models import Chunk, Session as SessionModel, Summary
+from app.utils.helpers import parse_retrieval_id
+
+logger = structlog.get_logger()
+
+
+class SessionStateManager:
+    """
+    Creates and rehydrates session checkpoints.
+
+    When an object store is given (S3Client or a stand-in), each
+    checkpoint's state is also archived as JSON under
+    ``checkpoints/{session_id}/{checkpoint_id}.json``.
+    """
+
+    def __init__(self, db: Session, store=None):
+        self.db = db
+        self.store = store
+
+    def create_checkpoint(
+        self,
+        session_id: str,
+        condensed_summary: str,
+        accepted_claims: List[Dict],
+        top_citation_ids: List[str],
+        checkpoint_name: Optional[str] = None
+    ) -> SessionModel:
+        """
+        Save a checkpoint, linked to the session's latest checkpoint.
+
+        Returns:
+            The checkpoint row (checkpoint_id is its public ID)
+        """
+        parent = self.db.query(SessionModel.id).filter(
+            SessionModel.session_id == session_id, SessionModel.is_checkpoint.is_(True)
+        ).order_by(SessionModel.id.desc()).first()
+        now = datetime.utcnow()
+        checkpoint_id = str(uuid.uuid4())
+        state = {
+            "session_id": session_id,
+            "checkpoint_id": checkpoint_id,
+            "condensed_summary": condensed_summary,
+            "accepted_claims": accepted_claims,
+            "top_citation_ids": top_citation_ids,
+            "timestamp": now.isoformat(),
+        }
+        checkpoint = SessionModel(
+            session_id=session_id,
+            checkpoint_id=checkpoint_id,
+            condensed_summary=condensed_summary,
+            accepted_claims=accepted_claims,
+            top_citations=top_citation_ids,
+            parent_checkpoint_id=parent.id if parent else None,
+            is_checkpoint=True,
+            checkpoint_name=checkpoint_name or f"Checkpoint {now.isoformat()}",
+            state_json=state
+        )
+        self.db.add(checkpoint)
+        self.db.commit()
+
+        if self.store is not None:
+            self.store.upload_json(state, f"checkpoints/{session_id}/{checkpoint_id}.json")
+        logger.info("Checkpoint created", session_id=session_id, checkpoint_id=checkpoint_id)
+        return checkpoint
+
+    def rehydrate(self, checkpoint_id: str) -> Dict:
+        """
+        Rebuild session context from a checkpoint.
+
+        Returns:
+            {condensed_summary, top_short_summaries, supporting_chunk_ids}
+
+        Raises:
+            ValueError: If the checkpoint does not exist
+        """
+        checkpoint = self.db.query(SessionModel).filter(
+            SessionModel.checkpoint_id == checkpoint_id, SessionModel.is_checkpoint.is_(True)
+        ).first()
+        if checkpoint is None:
+            raise ValueError(f"Checkpoint {checkpoint_id} not found")
+
+        chunk_ids = {}
+        for retrieval_id in checkpoint.top_citations or []:
+            try:
+                chunk_ids[retrieval_id] = parse_retrieval_id(retrieval_id)[2]
+            except ValueError:
+                logger.warning("Invalid retrieval ID in checkpoint", retrieval_id=retrieval_id)
+
+        existing = {
+            row.id for row in self.db.query(Chunk.id).filter(Chunk.id.in_(list(chunk_ids.values())))
+        } if chunk_ids else set()
+        summaries = {
+            row.chunk_id: row.summary_text
+            for row in self.db.query(Summary.chunk_id, Summary.summary_text).filter(
+                Summary.chunk_id.in_(list(existing)), Summary.summary_level == "short"
+            )
+        } if existing else {}
+
+        supporting = [rid for rid, chunk_id in chunk_ids.items() if chunk_id in existing]
+        return {
+            "condensed_summary": checkpoint.condensed_summary or "",
+            "top_short_summaries": [
+                summaries[chunk_ids[rid]] for rid in supporting if chunk_ids[rid] in summaries
+            ],
+            "supporting_chunk_ids": supporting,
+        }
@@ -0,0 +1,115 @@
+
+"""
+Deterministic text chunking.
+Splits text into fixed-size token windows with overlap.
+"""
+from dataclasses import dataclass
+from typing import Dict, List
+
+from app.config import settings
+from app.utils.helpers import compute_sha256
+
+
+@dataclass
+class TextChunk:
+    """A single chunk of text with its position in the source."""
+    text: str
+    chunk_index: int
+    start_char: int
+    end_char: int
+    token_count: int
+    chunk_hash: str
+
+
+class DeterministicChunker:
+    """
+    Chunks text into fixed-size segments with overlap.
+    Reproducible with seed for consistent hashing.
+    """
+
+    STRATEGY = "fixed_tokens_with_overlap"
+
+    def __init__(
+        self,
+        chunk_size: int = settings.CHUNK_SIZE,
+        overlap: float = settings.CHUNK_OVERLAP,
+        seed: int = settings.RANDOM_SEED,
+        encoder=None,
+        tokenizer_name: str = "cl100k_base"
+    ):
+        """
+        Args:
+            chunk_size: Tokens per chunk
+            overlap: Fraction of each chunk repeated in the next one
+            seed: Seed mixed into chunk hashes
+            encoder: Object with encode()/decode(); defaults to tiktoken
+            tokenizer_name: Name recorded in chunking metadata
+        """
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.seed = seed
+        self.tokenizer_name = tokenizer_name
+        self._encoder = encoder
+
+    @property
+    def encoder(self):
+        """Tokenizer, loaded on first use."""
+        if self._encoder is None:
+            import tiktoken
+            self._encoder = tiktoken.get_encoding(self.tokenizer_name)
+        return self._encoder
+
+    def chunk_text(self, text: str) -> List[TextChunk]:
+        """
+        Split text into overlapping chunks of fixed token size.
+
+        Args:
+            text: Text to split
+
+        Returns:
+            Chunks in order, with character offsets into the input
+        """
+        tokens = self.encoder.encode(text)
+        step_size = max(1, int(self.chunk_size * (1 - self.overlap)))
+
+        chunks = []
+        # Character offset of every step boundary, so that start_char is exact
+        # rather than approximated from the decoded chunk length.
+        char_cursor = 0
+        token_cursor = 0
+
+        for i in range(0, len(tokens), step_size):
+            if i > token_cursor:
+                char_cursor += len(self.encoder.decode(tokens[token_cursor:i]))
+                token_cursor = i
+
+            chunk_tokens = tokens[i:i + self.chunk_size]
+            chunk_text = self.encoder.decode(chunk_tokens)
+
+            chunks.append(TextChunk(
+                text=chunk_text,
+                chunk_index=len(chunks),
+                start_char=char_cursor,
+                end_char=char_cursor + len(chunk_text),
+                token_count=len(chunk_tokens),
+                chunk_hash=self.hash_text(chunk_text)
+            ))
+
+            if i + self.chunk_size >= len(tokens):
+                break
+
+        return chunks
+
+    def hash_text(self, text: str) -> str:
+        """Deterministic chunk hash (text + seed)."""
+        return compute_sha256(f"{text}{self.seed}")
+
+    def get_metadata(self) -> Dict:
+        """Return chunking configuration for storage."""
+        return {
+            "chunk_size": self.chunk_size,
+            "overlap": self.overlap,
+            "seed": self.seed,
+            "strategy": self.STRATEGY,
+            "tokenizer": self.tokenizer_name
+        }
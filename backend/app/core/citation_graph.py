@@ -0,0 +1,348 @@
+
+"""
+Citation graph: works as nodes, co-citation weights as edges.
+
+A node is a work (by source_slug, across versions) and counts the
+citations of its chunks. Two works are linked when citations made for the
+same query text point at both. An edge's weight is the number of such
+citation pairs: each new citation of work A for a query adds to edge
+(A, B) the number of citations B already has for that query.
+
+Edges live in CSR arrays (indptr, indices, weights; each edge stored in
+both directions) plus a small dict of recent updates. Once the updates
+reach CITATION_GRAPH_MERGE_EDGES entries they are merged into new arrays
+with one vectorized pass. A neighborhood is then a slice of the arrays
+plus the node's pending updates, sorted by weight, and a snapshot is the
+arrays themselves (see snapshot_chunks for the byte format).
+
+The graph is built from one scan of the citations table on first use and
+kept current incrementally. Citations with IDs above the highest one seen
+are read after each verification in this process, and at most every
+CITATION_GRAPH_REFRESH_SECONDS otherwise, so citations written by other
+processes show up too. Per-query citation counts stay in memory (keyed by
+a 64-bit hash of the query text) so that later citations can be paired
+with earlier ones. They are kept for the CITATION_GRAPH_QUERIES most
+recently cited queries only: a citation for a query dropped from that LRU
+starts a new group, and the edges already counted stay.
+"""
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+import hashlib
+import struct
+import threading
+import time
+import weakref
+
+import numpy as np
+from fastapi import Depends
+from sqlalchemy.orm import Session
+import structlog
+
+from app.config import settings
+from app.db.models import Chunk, Citation, Work
+from app.db.session import get_db
+
+logger = structlog.get_logger()
+
+SNAPSHOT_MAGIC = b"CGR1"
+SNAPSHOT_HEADER = struct.Struct("<4sIQQ")  # magic, nodes, edge entries, slug bytes
+SNAPSHOT_CHUNK_BYTES = 1 << 20
+SCAN_BATCH = 50000
+
+
+def query_key(text: Optional[str]) -> Optional[int]:
+    """64-bit key of a citation's query text (None: not grouped with other citations)."""
+    if not text:
+        return None
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class CitationGraph:
+    """Work co-citation graph (see module docstring)."""
+
+    def __init__(
+        self,
+        merge_edges: int = settings.CITATION_GRAPH_MERGE_EDGES,
+        refresh_seconds: float = settings.CITATION_GRAPH_REFRESH_SECONDS,
+        max_queries: int = settings.CITATION_GRAPH_QUERIES
+    ):
+        self.merge_edges = max(1, merge_edges)
+        self.max_queries = max(1, max_queries)
+        self.refresh_seconds = refresh_seconds
+        self.slugs: List[str] = []
+        self._node_of: Dict[str, int] = {}
+        self.citations = np.zeros(0, dtype=np.int64)
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.zeros(0, dtype=np.int32)
+        self.weights = np.zeros(0, dtype=np.int64)
+        self._pending: Dict[int, Dict[int, int]] = {}
+        self._pending_entries = 0
+        self._queries: "OrderedDict[int, Dict[int, int]]" = OrderedDict()
+        self.max_citation_id = 0
+        self.built = False
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of nodes."""
+        return len(self.slugs)
+
+    @property
+    def edges(self) -> int:
+        """Undirected edges, after pending updates are merged."""
+        with self._lock:
+            self._merge()
+            return len(self.indices) // 2
+
+    @property
+    def nbytes(self) -> int:
+        return self.citations.nbytes + self.indptr.nbytes + self.indices.nbytes + self.weights.nbytes
+
+    def _node(self, slug: str) -> int:
+        node = self._node_of.get(slug)
+        if node is None:
+            node = self._node_of[slug] = len(self.slugs)
+            self.slugs.append(slug)
+            if node >= len(self.citations):
+                grown = np.zeros(max(node + 1, len(self.citations) * 2, 64), dtype=np.int64)
+                grown[:len(self.citations)] = self.citations
+                self.citations = grown
+        return node
+
+    def _add(self, slug: str, key: Optional[int]):
+        """Count one citation of slug's work for the query with key."""
+        node = self._node(slug)
+        self.citations[node] += 1
+        if key is None:
+            return
+        counts = self._queries.get(key)
+        if counts is None:
+            counts = self._queries[key] = {}
+            if len(self._queries) > self.max_queries:
+                self._queries.popitem(last=False)
+        else:
+            self._queries.move_to_end(key)
+        for other, count in counts.items():
+            if other == node:
+                continue
+            for a, b in ((node, other), (other, node)):
+                row = self._pending.setdefault(a, {})
+                if b not in row:
+                    self._pending_entries += 1
+                row[b] = row.get(b, 0) + count
+        counts[node] = counts.get(node, 0) + 1
+        if self._pending_entries >= self.merge_edges:
+            self._merge()
+
+    def _merge(self):
+        """Fold pending updates into new CSR arrays (duplicates summed, rows sorted by neighbor)."""
+        if not self._pending and len(self.indptr) == len(self.slugs) + 1:
+            return
+        size = len(self.slugs)
+        old_rows = np.repeat(np.arange(len(self.indptr) - 1, dtype=np.int64), np.diff(self.indptr))
+        new_rows = np.fromiter(
+            (a for a, row in self._pending.items() for _ in row), dtype=np.int64, count=self._pending_entries
+        )
+        new_cols = np.fromiter(
+            (b for row in self._pending.values() for b in row), dtype=np.int64, count=self._pending_entries
+        )
+        new_weights = np.fromiter(
+            (w for row in self._pending.values() for w in row.values()), dtype=np.int64, count=self._pending_entries
+        )
+        keys = np.concatenate([old_rows * size + self.indices, new_rows * size + new_cols])
+        unique, inverse = np.unique(keys, return_inverse=True)
+        weights = np.zeros(len(unique), dtype=np.int64)
+        np.add.at(weights, inverse, np.concatenate([self.weights, new_weights]))
+        rows = unique // max(size, 1)
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=size))]).astype(np.int64)
+        self.indices = (unique % max(size, 1)).astype(np.int32)
+        self.weights = weights
+        self._pending = {}
+        self._pending_entries = 0
+
+    def _scan(self, db: Session, after: int) -> int:
+        """Add citations with IDs above `after`, in ID order; returns how many."""
+        added = 0
+        while True:
+            rows = db.query(Citation.id, Citation.query_text, Work.source_slug).join(
+                Chunk, Citation.chunk_id == Chunk.id
+            ).join(Work, Chunk.work_id == Work.id).filter(Citation.id > after).order_by(Citation.id) \
+                .limit(SCAN_BATCH).all()
+            for _, text, slug in rows:
+                self._add(slug, query_key(text))
+            added += len(rows)
+            if rows:
+                after = self.max_citation_id = rows[-1][0]
+            if len(rows) < SCAN_BATCH:
+                return added
+
+    def build(self, db: Session) -> "CitationGraph":
+        """Add every citation (one ordered scan) and merge; no-op once built."""
+        start = time.perf_counter()
+        with self._lock:
+            if self.built:
+                return self
+            citations = self._scan(db, self.max_citation_id)
+            self._merge()
+            self._checked_at = time.monotonic()
+            self.built = True
+        logger.info("Citation graph built", citations=citations, works=len(self), edges=len(self.indices) // 2,
+                    seconds=round(time.perf_counter() - start, 3))
+        return self
+
+    def refresh(self, db: Session) -> int:
+        """
+        Add citations written since the last build or refresh.
+
+        Returns:
+            Number of new citations
+        """
+        with self._lock:
+            self._checked_at = time.monotonic()
+            return self._scan(db, self.max_citation_id)
+
+    def observe(self, db: Session):
+        """Pick up citations just committed (after a verification); no-op until the graph is built."""
+        if self.built:
+            self.refresh(db)
+
+    def current(self, db: Session) -> "CitationGraph":
+        """Build on first use, otherwise refresh if due; returns self."""
+        if not self.built:
+            return self.build(db)
+        if time.monotonic() - self._checked_at >= self.refresh_seconds:
+            self.refresh(db)
+        return self
+
+    def node(self, slug: str) -> Optional[Dict]:
+        """{work_slug, citations} of a cited work, else None."""
+        node = self._node_of.get(slug)
+        if node is None:
+            return None
+        return {"work_slug": slug, "citations": int(self.citations[node])}
+
+    def nodes(self, offset: int = 0, limit: int = 50) -> Tuple[int, List[Dict]]:
+        """
+        Cited works, most cited first (ties: first cited first).
+
+        Returns:
+            (total works, [{work_slug, citations}, ...] for the page)
+        """
+        with self._lock:
+            counts = self.citations[:len(self.slugs)]
+            order = np.argsort(-counts, kind="stable")[offset:offset + limit]
+            return len(counts), [{"work_slug": self.slugs[n], "citations": int(counts[n])} for n in order]
+
+    def neighborhood(
+        self,
+        slug: str,
+        offset: int = 0,
+        limit: int = 50,
+        min_weight: int = 1
+    ) -> Optional[Tuple[int, List[Dict]]]:
+        """
+        Works co-cited with slug's work, heaviest edge first (ties: first cited first).
+
+        Args:
+            slug: Work slug
+            offset: Neighbors to skip
+            limit: Neighbors to return
+            min_weight: Leave out lighter edges
+
+        Returns:
+            (total neighbors, [{work_slug, weight, citations}, ...] for the page),
+            or None for a work with no citations
+        """
+        with self._lock:
+            node = self._node_of.get(slug)
+            if node is None:
+                return None
+            if node < len(self.indptr) - 1:
+                start, end = self.indptr[node], self.indptr[node + 1]
+                cols, weights = self.indices[start:end], self.weights[start:end]
+            else:
+                cols, weights = self.indices[:0], self.weights[:0]
+            pending = self._pending.get(node)
+            if pending:
+                # Rows are sorted by neighbor, so pending updates are placed by binary search
+                others = np.fromiter(pending.keys(), dtype=np.int32, count=len(pending))
+                added = np.fromiter(pending.values(), dtype=np.int64, count=len(pending))
+                at = np.searchsorted(cols, others)
+                found = at < len(cols)
+                found[found] = cols[at[found]] == others[found]
+                weights = weights.copy()
+                weights[at[found]] += added[found]
+                cols = np.concatenate([cols, others[~found]])
+                weights = np.concatenate([weights, added[~found]])
+            if min_weight > 1:
+                keep = weights >= min_weight
+                cols, weights = cols[keep], weights[keep]
+            order = np.lexsort((cols, -weights))[offset:offset + limit]
+            return len(cols), [
+                {"work_slug": self.slugs[n], "weight": int(w), "citations": int(self.citations[n])}
+                for n, w in zip(cols[order], weights[order])
+            ]
+
+    def snapshot_chunks(self, min_weight: int = 1) -> Iterator[bytes]:
+        """
+        The whole graph as little-endian binary, in chunks of about 1 MiB.
+
+        Layout: header (magic "CGR1", uint32 nodes, uint64 edge entries,
+        uint64 slug bytes), then node slugs as UTF-8 separated by "\\n",
+        then uint32 citations per node, int64 indptr (nodes + 1), uint32
+        neighbor indices and uint32 weights (entries each; weights capped
+        at 2^32 - 1). Node i's neighbors are indices[indptr[i]:indptr[i + 1]],
+        each edge appearing once from either end.
+        """
+        with self._lock:
+            self._merge()
+            slugs, citations = list(self.slugs), self.citations[:len(self.slugs)].copy()
+            indptr, indices, weights = self.indptr, self.indices, self.weights
+        if min_weight > 1:
+            keep = weights >= min_weight
+            rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))[keep]
+            indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=len(slugs)))]).astype(np.int64)
+            indices, weights = indices[keep], weights[keep]
+        names = "\n".join(slugs).encode("utf-8")
+        yield SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(slugs), len(indices), len(names))
+        arrays = (
+            np.minimum(citations, 2 ** 32 - 1).astype("<u4"),
+            indptr.astype("<i8"),
+            indices.astype("<u4"),
+            np.minimum(weights, 2 ** 32 - 1).astype("<u4"),
+        )
+        for block in [names] + [array.tobytes() for array in arrays]:
+            for start in range(0, len(block), SNAPSHOT_CHUNK_BYTES):
+                yield block[start:start + SNAPSHOT_CHUNK_BYTES]
+
+
+def read_snapshot(data: bytes) -> Dict:
+    """Parse snapshot_chunks output: {slugs, citations, indptr, indices, weights}."""
+    magic, nodes, entries, name_bytes = SNAPSHOT_HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError("Not a citation graph snapshot")
+    offset = SNAPSHOT_HEADER.size
+    names = data[offset:offset + name_bytes].decode("utf-8")
+    offset += name_bytes
+    arrays = {}
+    for name, dtype, count in (("citations", "<u4", nodes), ("indptr", "<i8", nodes + 1),
+                               ("indices", "<u4", entries), ("weights", "<u4", entries)):
+        arrays[name] = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        offset += arrays[name].nbytes
+    return {"slugs": names.split("\n") if nodes else [], **arrays}
+
+
+_graphs: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_graph_lock = threading.Lock()
+
+
+def get_citation_graph(db: Session = Depends(get_db)) -> CitationGraph:
+    """Process-wide citation graph for the session's database; built by its first reader (current())."""
+    bind = db.get_bind()
+    graph = _graphs.get(bind)
+    if graph is None:
+        with _graph_lock:
+            graph = _graphs.get(bind)
+            if graph is None:
+                graph = _graphs[bind] = CitationGraph()
+    return graph
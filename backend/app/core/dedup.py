@@ -0,0 +1,173 @@
+
+"""
+Near-duplicate chunk detection (MinHash + LSH).
+
+Each chunk gets a MinHash signature over its word shingles (runs of
+DEDUP_SHINGLE_WORDS lowercased words); the fraction of equal signature
+slots estimates the Jaccard similarity of two chunks' shingle sets. An
+LSH table over bands of the signature finds candidates without comparing
+against every chunk, and candidates are confirmed with the full signature
+against DEDUP_THRESHOLD.
+
+During ingestion a chunk that matches an existing canonical chunk is
+stored as an alias (Chunk.canonical_chunk_id) with no vector, lexical
+index entry or summaries of its own; retrieval maps hits on the canonical
+chunk back to whichever copies are visible.
+"""
+from typing import Dict, List, Optional, Tuple
+import re
+import threading
+import zlib
+
+import numpy as np
+from sqlalchemy.orm import Session
+import structlog
+
+from app.config import settings
+from app.db.models import Chunk
+
+logger = structlog.get_logger()
+
+_WORD = re.compile(r"\w+")
+_MIX = np.uint64(0x9E3779B97F4A7C15)  # Odd multiplier for combining word hashes into shingle hashes
+
+
+class MinHasher:
+    """MinHash signatures of word shingles, using multiply-shift hash functions."""
+
+    def __init__(
+        self,
+        num_perm: int = settings.DEDUP_NUM_PERM,
+        shingle_words: int = settings.DEDUP_SHINGLE_WORDS,
+        seed: int = settings.RANDOM_SEED
+    ):
+        self.num_perm = num_perm
+        self.shingle_words = shingle_words
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(0, 2 ** 64, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 64, size=num_perm, dtype=np.uint64)
+
+    def shingle_hashes(self, text: str) -> np.ndarray:
+        """64-bit hashes of the text's distinct word shingles."""
+        words = np.fromiter(
+            (zlib.crc32(word.encode("utf-8")) for word in _WORD.findall(text.lower())), dtype=np.uint64
+        )
+        if len(words) == 0:
+            return words
+        width = min(self.shingle_words, len(words))
+        count = len(words) - width + 1
+        hashes = words[:count].copy()
+        with np.errstate(over="ignore"):
+            for offset in range(1, width):
+                hashes = hashes * _MIX + words[offset:offset + count]
+        return np.unique(hashes)
+
+    def signature(self, text: str) -> np.ndarray:
+        """uint32 signature of num_perm slots (all 0xFFFFFFFF for text without words)."""
+        hashes = self.shingle_hashes(text)
+        if len(hashes) == 0:
+            return np.full(self.num_perm, np.iinfo(np.uint32).max, dtype=np.uint32)
+        with np.errstate(over="ignore"):
+            permuted = (hashes[:, None] * self._a[None, :] + self._b[None, :]) >> np.uint64(32)
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.count_nonzero(a == b)) / len(a)
+
+
+def lsh_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    (bands, rows) whose LSH threshold (1/bands)^(1/rows) is the highest not
+    above threshold, so pairs at the threshold are very likely candidates.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if (1.0 / bands) ** (1.0 / rows) <= threshold:
+            best = (bands, rows)
+    return best
+
+
+class NearDuplicateIndex:
+    """
+    Signatures of canonical chunks with an LSH table for candidate lookup.
+    Thread-safe: the embed stage looks up while the index stage adds.
+    """
+
+    def __init__(
+        self,
+        threshold: float = settings.DEDUP_THRESHOLD,
+        hasher: Optional[MinHasher] = None
+    ):
+        self.threshold = threshold
+        self.hasher = hasher if hasher is not None else MinHasher()
+        self.bands, self.rows = lsh_bands(self.hasher.num_perm, threshold)
+        self._tables: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        self._signatures: Dict[int, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def _keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[b * self.rows:(b + 1) * self.rows].tobytes() for b in range(self.bands)]
+
+    def add(self, chunk_id: int, signature: np.ndarray):
+        """Register a canonical chunk."""
+        with self._lock:
+            self._signatures[chunk_id] = signature
+            for table, key in zip(self._tables, self._keys(signature)):
+                table.setdefault(key, []).append(chunk_id)
+
+    def remove(self, chunk_ids):
+        """Forget canonical chunks (e.g. those of a regenerated work)."""
+        with self._lock:
+            for chunk_id in chunk_ids:
+                signature = self._signatures.pop(chunk_id, None)
+                if signature is None:
+                    continue
+                for table, key in zip(self._tables, self._keys(signature)):
+                    table[key].remove(chunk_id)
+                    if not table[key]:
+                        del table[key]
+
+    def find(self, signature: np.ndarray) -> Optional[Tuple[int, float]]:
+        """
+        Most similar canonical chunk at or above the threshold.
+
+        Returns:
+            (chunk_id, estimated similarity), or None
+        """
+        with self._lock:
+            candidates = set()
+            for table, key in zip(self._tables, self._keys(signature)):
+                candidates.update(table.get(key, ()))
+            best = None
+            for chunk_id in sorted(candidates):
+                score = similarity(signature, self._signatures[chunk_id])
+                if score >= self.threshold and (best is None or score > best[1]):
+                    best = (chunk_id, score)
+            return best
+
+    def load(self, db: Session, batch_size: int = 10000) -> int:
+        """Add every canonical chunk with a stored signature; returns how many."""
+        count, last_id = 0, 0
+        while True:
+            rows = db.query(Chunk.id, Chunk.minhash).filter(
+                Chunk.id > last_id, Chunk.canonical_chunk_id.is_(None), Chunk.minhash.isnot(None)
+            ).order_by(Chunk.id).limit(batch_size).all()
+            if not rows:
+                break
+            for chunk_id, blob in rows:
+                self.add(chunk_id, np.frombuffer(blob, dtype=np.uint32))
+            count += len(rows)
+            last_id = rows[-1][0]
+        logger.info("Near-duplicate index loaded", chunks=count, bands=self.bands, rows=self.rows)
+        return count
+
+
+def create_dedup_index() -> Optional[NearDuplicateIndex]:
+    """Near-duplicate index per settings, or None when DEDUP_ENABLED is off."""
+    return NearDuplicateIndex() if settings.DEDUP_ENABLED else None
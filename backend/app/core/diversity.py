@@ -0,0 +1,106 @@
+
+"""
+Diversity re-ranking: maximal marginal relevance (MMR) over fused hits.
+
+Overlapping chunks and successive versions of a work often fill the top
+results with near-copies. MMR picks results one at a time, each time
+taking the candidate with the best
+
+    lambda * relevance - (1 - lambda) * (highest cosine similarity to a result already picked)
+
+where relevance is the fused hybrid score. lambda = 1 keeps the fused
+order; lower values trade relevance for variety. A per-work cap also
+stops any one work from taking more than its share of the results.
+
+Candidates are compared by their vectors in the semantic index, read by
+position, so nothing is re-embedded. Each pick costs one matrix-vector
+product over the candidates, so selecting k of n costs O(k * n * dim).
+
+Requested per query through constraints:
+
+- ``mmr_lambda``: lambda in [0, 1];
+- ``max_per_work``: most results from one work (MMR_LAMBDA applies if
+  mmr_lambda is not given).
+
+Diversity needs vectors by position, so it works with the flat and
+two-stage indexers but not with SEMANTIC_SHARDS.
+"""
+from typing import Dict, NamedTuple, Optional
+
+import numpy as np
+
+from app.config import settings
+
+
+class Diversity(NamedTuple):
+    """How a query's results are diversified."""
+    mmr_lambda: float
+    max_per_work: Optional[int]
+
+
+def diversity_options(constraints: Optional[Dict]) -> Optional[Diversity]:
+    """
+    Diversity requested by query constraints, if any.
+
+    Raises:
+        ValueError: mmr_lambda outside [0, 1], or max_per_work below 1
+    """
+    if not constraints or ("mmr_lambda" not in constraints and "max_per_work" not in constraints):
+        return None
+    mmr_lambda = constraints.get("mmr_lambda")
+    max_per_work = constraints.get("max_per_work")
+    if mmr_lambda is None:
+        mmr_lambda = settings.MMR_LAMBDA
+    if isinstance(mmr_lambda, bool) or not isinstance(mmr_lambda, (int, float)) or not 0 <= mmr_lambda <= 1:
+        raise ValueError("mmr_lambda must be a number between 0 and 1")
+    if max_per_work is not None and (isinstance(max_per_work, bool) or not isinstance(max_per_work, int)
+                                     or max_per_work < 1):
+        raise ValueError("max_per_work must be a positive integer")
+    return Diversity(float(mmr_lambda), max_per_work)
+
+
+def mmr(
+    relevance: np.ndarray,
+    vectors: np.ndarray,
+    k: int,
+    mmr_lambda: float,
+    groups: Optional[np.ndarray] = None,
+    max_per_group: Optional[int] = None
+) -> np.ndarray:
+    """
+    Pick up to k candidates by maximal marginal relevance.
+
+    Args:
+        relevance: Score per candidate, in ranked order (ties go to the earlier candidate)
+        vectors: Unit vector per candidate (rows); zero rows are similar to nothing
+        k: Candidates to pick
+        mmr_lambda: Weight of relevance against redundancy
+        groups: Group code per candidate (e.g. its work), for max_per_group
+        max_per_group: Most picks from one group
+
+    Returns:
+        Indices of the picked candidates, in pick order (fewer than k when
+        the caps leave no candidate)
+    """
+    n = len(relevance)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    gain = mmr_lambda * np.asarray(relevance, dtype=np.float32)
+    redundancy = np.zeros(n, dtype=np.float32)  # Highest similarity to a pick (negative similarity is no bonus)
+    open_ = np.ones(n, dtype=bool)
+    if groups is not None and max_per_group is not None:
+        picked_in = np.zeros(int(groups.max()) + 1 if n else 0, dtype=np.int64)
+    picks = []
+    for _ in range(min(k, n)):
+        scores = np.where(open_, gain - (1 - mmr_lambda) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        if not open_[best]:
+            break
+        picks.append(best)
+        open_[best] = False
+        np.maximum(redundancy, vectors @ vectors[best], out=redundancy)
+        if groups is not None and max_per_group is not None:
+            group = groups[best]
+            picked_in[group] += 1
+            if picked_in[group] >= max_per_group:
+                open_[groups == group] = False
+    return np.asarray(picks, dtype=np.int64)
@@ -0,0 +1,158 @@
+
+"""
+Query embedding service for the API process.
+
+Concurrent requests each need one short query embedded. Encoding them one
+at a time wastes most of every forward pass, so QueryEmbeddingService
+collects concurrent calls for up to QUERY_EMBED_MAX_WAIT_MS (or until
+QUERY_EMBED_MAX_BATCH texts are waiting), runs a single embed_batch on a
+background thread and resolves each caller's future with its own row.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import asyncio
+
+import numpy as np
+import structlog
+
+from app.config import settings
+from app.core.embeddings import EmbeddingGenerator
+
+logger = structlog.get_logger()
+
+
+class QueryEmbeddingService:
+    """
+    Dynamic micro-batcher in front of an embedder.
+
+    A batch is dispatched when it is full or when its oldest request has
+    waited max_wait_ms. While a forward pass is running, new requests keep
+    queueing; if any are waiting when it finishes, the next batch goes out
+    immediately, so batches grow with load instead of adding latency.
+
+    Bound to the event loop it is first used on.
+    """
+
+    def __init__(
+        self,
+        embedder=None,
+        max_batch: int = settings.QUERY_EMBED_MAX_BATCH,
+        max_wait_ms: float = settings.QUERY_EMBED_MAX_WAIT_MS
+    ):
+        """
+        Args:
+            embedder: Object with embed_batch(texts, batch_size); defaults to EmbeddingGenerator
+            max_batch: Most texts per forward pass (1 disables batching)
+            max_wait_ms: Longest a request waits for others to join its batch
+        """
+        self.embedder = embedder if embedder is not None else EmbeddingGenerator()
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="query-embed")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats: Dict[str, int] = {"requests": 0, "batches": 0, "max_batch_seen": 0}
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._full = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Embed one text, sharing a forward pass with concurrent callers."""
+        self._ensure_started()
+        future = self._loop.create_future()
+        self._queue.put_nowait((text, future))
+        if self._queue.qsize() >= self.max_batch - 1:  # The batcher already holds the first
+            self._full.set()
+        return await future
+
+    async def _next_batch(self, backlogged: bool) -> List[Tuple[str, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        if not backlogged and self.max_wait > 0 and self._queue.qsize() < self.max_batch - 1:
+            self._full.clear()
+            try:
+                await asyncio.wait_for(self._full.wait(), self.max_wait)
+            except asyncio.TimeoutError:
+                pass
+        while len(batch) < self.max_batch and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        backlogged = False
+        while True:
+            batch = await self._next_batch(backlogged)
+            batch = [(text, future) for text, future in batch if not future.done()]
+            if batch:
+                await self._dispatch(batch)
+            backlogged = not self._queue.empty()
+
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future]]):
+        texts = [text for text, _ in batch]
+        self.stats["requests"] += len(batch)
+        self.stats["batches"] += 1
+        self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(batch))
+        try:
+            vectors = await self._loop.run_in_executor(
+                self._executor, lambda: self.embedder.embed_batch(texts, batch_size=len(texts))
+            )
+        except Exception as e:
+            logger.error("Query embedding batch failed", batch_size=len(batch), error=str(e))
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        if len(vectors) != len(batch):
+            error = RuntimeError(f"Embedder returned {len(vectors)} vectors for {len(batch)} texts")
+            logger.error("Query embedding batch failed", batch_size=len(batch), error=str(error))
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for row, (_, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(vectors[row])
+
+    async def aclose(self):
+        """Stop the batching task and fail any requests still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.cancel()
+        self._executor.shutdown(wait=False)
+
+
+_query_embedder: Optional[QueryEmbeddingService] = None
+
+
+def get_query_embedder() -> QueryEmbeddingService:
+    """
+    FastAPI dependency for the process-wide query embedding service.
+    Tests override this with a service around an offline embedder.
+    """
+    global _query_embedder
+    if _query_embedder is None:
+        _query_embedder = QueryEmbeddingService()
+    return _query_embedder
+
+
+async def close_query_embedder():
+    """Shut down the process-wide service (application shutdown)."""
+    global _query_embedder
+    if _query_embedder is not None:
+        await _query_embedder.aclose()
+        _query_embedder = None
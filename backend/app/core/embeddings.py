@@ -0,0 +1,244 @@
+
+"""
+Embedding generation using sentence-transformers.
+
+Two execution modes are available (``settings.EMBEDDING_EXECUTION_MODE``):
+
+- ``local``: encode in the calling process (EmbeddingGenerator)
+- ``process_pool``: shard batches across worker processes that write vectors
+  straight into a shared-memory buffer (ParallelEmbeddingPool)
+"""
+from concurrent.futures import ProcessPoolExecutor, wait
+from functools import partial
+from multiprocessing import get_context, shared_memory
+from typing import Callable, Dict, List, Optional, Sequence
+import hashlib
+import os
+import threading
+
+import numpy as np
+import structlog
+
+from app.config import settings
+
+logger = structlog.get_logger()
+
+
+class EmbeddingGenerator:
+    """
+    Generates vector embeddings using sentence-transformers.
+    Model: all-MiniLM-L6-v2 (384 dimensions)
+
+    The model is loaded on first use so that importing this module (and
+    constructing pipelines around it) stays cheap.
+    """
+
+    def __init__(self, model_name: str = settings.EMBEDDING_MODEL):
+        self.model_name = model_name
+        self.vector_dim = settings.EMBEDDING_DIM
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        """Sentence-transformer model, loaded once per process."""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name)
+                    self.vector_dim = self._model.get_sentence_embedding_dimension()
+                    logger.info("Loaded embedding model", model=self.model_name, dim=self.vector_dim)
+        return self._model
+
+    def embed_text(self, text: str) -> np.ndarray:
+        """Generate embedding for single text."""
+        return self.model.encode(text, convert_to_numpy=True)
+
+    def embed_batch(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """Generate embeddings for multiple texts efficiently."""
+        return self.model.encode(
+            texts,
+            batch_size=batch_size,
+            show_progress_bar=False,
+            convert_to_numpy=True
+        )
+
+    def hash_embedding(self, embedding: np.ndarray) -> str:
+        """Create deterministic hash of embedding vector."""
+        # Round to 6 decimals for consistency
+        rounded = np.round(np.asarray(embedding, dtype=np.float32), decimals=6)
+        return hashlib.sha256(rounded.tobytes()).hexdigest()
+
+    def get_metadata(self) -> Dict:
+        """Return model configuration."""
+        return {
+            "model_name": self.model_name,
+            "vector_dim": self.vector_dim,
+        }
+
+
+# Per-process embedder inside ParallelEmbeddingPool workers
+_worker_embedder = None
+
+
+def _pool_worker_init(embedder_factory: Callable, threads: int):
+    """Load the model once per worker process and pin its intra-op threads."""
+    global _worker_embedder
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_embedder = embedder_factory()
+
+
+def _pool_worker_encode(
+    shm_name: str,
+    shape: tuple,
+    positions: Sequence[int],
+    texts: List[str],
+    batch_size: int
+) -> int:
+    """
+    Encode one shard and write it into the shared output buffer.
+
+    Only the row count travels back to the parent; the vectors never get pickled.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+        out[np.asarray(positions)] = _worker_embedder.embed_batch(texts, batch_size=batch_size)
+        del out
+    finally:
+        shm.close()
+    return len(texts)
+
+
+class ParallelEmbeddingPool:
+    """
+    Embeds large batches on a process pool sized to the host.
+
+    Texts are sorted by length and cut into shards of ``batch_size``, so every
+    forward pass pads to similar lengths. Each worker writes its rows into a
+    shared float32 array at the texts' original positions, so the result is
+    already in input order when all shards finish.
+
+    Exposes the same interface as EmbeddingGenerator.
+    """
+
+    def __init__(
+        self,
+        model_name: str = settings.EMBEDDING_MODEL,
+        processes: int = settings.EMBEDDING_POOL_PROCESSES,
+        threads_per_process: int = settings.EMBEDDING_POOL_THREADS_PER_PROCESS,
+        batch_size: int = settings.INGEST_EMBED_BATCH_SIZE,
+        vector_dim: int = settings.EMBEDDING_DIM,
+        embedder_factory: Optional[Callable] = None,
+        start_method: str = "spawn"
+    ):
+        """
+        Args:
+            model_name: Model loaded by each worker
+            processes: Worker processes (0 = one per CPU)
+            threads_per_process: Torch intra-op threads per worker
+            batch_size: Texts per shard (one forward pass)
+            vector_dim: Embedding dimension
+            embedder_factory: Picklable callable returning an embedder in the
+                worker; defaults to EmbeddingGenerator(model_name)
+            start_method: multiprocessing start method ("spawn" avoids
+                forking a process with live torch threads)
+        """
+        self.model_name = model_name
+        self.processes = processes or os.cpu_count() or 1
+        self.threads_per_process = threads_per_process
+        self.batch_size = batch_size
+        self.vector_dim = vector_dim
+        self._factory = embedder_factory or partial(EmbeddingGenerator, model_name)
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=get_context(start_method),
+            initializer=_pool_worker_init,
+            initargs=(self._factory, threads_per_process)
+        )
+        logger.info(
+            "Started embedding pool",
+            model=model_name,
+            processes=self.processes,
+            threads_per_process=threads_per_process
+        )
+
+    def embed_text(self, text: str) -> np.ndarray:
+        """Generate embedding for single text."""
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        Embed texts across the pool.
+
+        Args:
+            texts: Texts to embed
+            batch_size: Texts per shard (defaults to the pool's batch_size)
+
+        Returns:
+            float32 array of shape (len(texts), vector_dim), in input order
+        """
+        batch_size = batch_size or self.batch_size
+        shape = (len(texts), self.vector_dim)
+        if not texts:
+            return np.zeros(shape, dtype=np.float32)
+
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        shm = shared_memory.SharedMemory(create=True, size=shape[0] * shape[1] * 4)
+        try:
+            futures = []
+            for start in range(0, len(order), batch_size):
+                positions = order[start:start + batch_size]
+                futures.append(self._executor.submit(
+                    _pool_worker_encode,
+                    shm.name,
+                    shape,
+                    positions,
+                    [texts[i] for i in positions],
+                    batch_size
+                ))
+            done, _ = wait(futures)
+            for future in done:
+                future.result()  # Re-raise worker errors
+            return np.array(np.ndarray(shape, dtype=np.float32, buffer=shm.buf))
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def hash_embedding(self, embedding: np.ndarray) -> str:
+        """Create deterministic hash of embedding vector."""
+        rounded = np.round(np.asarray(embedding, dtype=np.float32), decimals=6)
+        return hashlib.sha256(rounded.tobytes()).hexdigest()
+
+    def get_metadata(self) -> Dict:
+        """Return model and pool configuration."""
+        return {
+            "model_name": self.model_name,
+            "vector_dim": self.vector_dim,
+            "processes": self.processes,
+        }
+
+    def close(self):
+        """Shut down worker processes."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def create_embedder():
+    """Embedder for ingestion, according to settings.EMBEDDING_EXECUTION_MODE."""
+    mode = settings.EMBEDDING_EXECUTION_MODE
+    if mode == "process_pool":
+        return ParallelEmbeddingPool()
+    if mode == "local":
+        return EmbeddingGenerator()
+    raise ValueError(f"Unknown embedding execution mode: {mode}")
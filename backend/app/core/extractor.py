@@ -0,0 +1,297 @@
+
+"""
+Repository cloning and text extraction.
+Supports PDF, Markdown, HTML and plain-text files.
+
+Clones are shallow and single-branch by default. Parsing the CPU-heavy
+formats (PDF, HTML, Markdown) runs on a process pool so extraction threads
+are not serialized on the GIL.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatchcase
+from html.parser import HTMLParser
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set
+import os
+import shutil
+import threading
+
+import structlog
+import yaml
+
+from app.config import settings
+
+logger = structlog.get_logger()
+
+# File suffix -> Work.file_format
+SUPPORTED_FORMATS = {
+    ".pdf": "pdf",
+    ".md": "md",
+    ".markdown": "md",
+    ".html": "html",
+    ".htm": "html",
+    ".txt": "txt",
+    ".rst": "txt",
+}
+
+# Formats parsed on the process pool; plain text is read in the calling thread
+POOL_FORMATS = {"pdf", "html", "md"}
+
+
+def parse_globs(value: str) -> List[str]:
+    """Split a comma-separated glob list from settings."""
+    return [pattern.strip() for pattern in value.split(",") if pattern.strip()]
+
+
+def matches_any(path: str, patterns: Sequence[str]) -> bool:
+    """
+    Whether a repo-relative POSIX path matches any fnmatch-style pattern.
+    "*" also matches "/"; a leading "**/" also matches files at the root.
+    """
+    for pattern in patterns:
+        if fnmatchcase(path, pattern):
+            return True
+        if pattern.startswith("**/") and fnmatchcase(path, pattern[3:]):
+            return True
+    return False
+
+
+class _TextStripper(HTMLParser):
+    """Collects text content from HTML, dropping tags, scripts and styles."""
+
+    _SKIP = {"script", "style"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP:
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+    def get_text(self) -> str:
+        return "".join(self.parts)
+
+
+def html_to_text(html: str) -> str:
+    """Strip markup from an HTML string."""
+    stripper = _TextStripper()
+    stripper.feed(html)
+    stripper.close()
+    return stripper.get_text()
+
+
+def extract_text(file_path: Path) -> str:
+    """
+    Extract plain text from a supported file.
+
+    Raises:
+        ValueError: If the file format is not supported
+    """
+    fmt = SUPPORTED_FORMATS.get(file_path.suffix.lower())
+    if fmt == "pdf":
+        import PyPDF2
+        with open(file_path, 'rb') as f:
+            reader = PyPDF2.PdfReader(f)
+            return "\n\n".join((page.extract_text() or "") for page in reader.pages)
+    if fmt == "md":
+        import markdown
+        return html_to_text(markdown.markdown(file_path.read_text(encoding='utf-8', errors='replace')))
+    if fmt == "html":
+        return html_to_text(file_path.read_text(encoding='utf-8', errors='replace'))
+    if fmt == "txt":
+        return file_path.read_text(encoding='utf-8', errors='replace')
+    raise ValueError(f"Unsupported file format: {file_path.suffix}")
+
+
+class RepositoryExtractor:
+    """
+    Clones repositories and extracts text from various file formats.
+
+    Safe to share between extraction threads; the parse pool is started on
+    first use and shut down by close().
+    """
+
+    def __init__(
+        self,
+        temp_dir: Optional[str] = None,
+        shallow: bool = settings.INGEST_SHALLOW_CLONE,
+        include: Optional[Sequence[str]] = None,
+        exclude: Optional[Sequence[str]] = None,
+        max_file_bytes: int = settings.INGEST_MAX_FILE_BYTES,
+        use_process_pool: bool = settings.INGEST_PARSE_IN_PROCESS_POOL,
+        parse_processes: int = settings.INGEST_PARSE_PROCESSES
+    ):
+        """
+        Args:
+            temp_dir: Working directory for clones
+            shallow: Clone only the tip of a single branch
+            include: Default include globs (all supported files if empty)
+            exclude: Default exclude globs
+            max_file_bytes: Skip files larger than this (0 = no cap)
+            use_process_pool: Parse PDF/HTML/Markdown on a process pool
+            parse_processes: Pool size (0 = one per CPU)
+        """
+        self.temp_dir = Path(temp_dir or settings.REPO_CACHE_DIR)
+        self.temp_dir.mkdir(parents=True, exist_ok=True)
+        self.shallow = shallow
+        self.include = list(include if include is not None else parse_globs(settings.INGEST_INCLUDE_GLOBS))
+        self.exclude = list(exclude if exclude is not None else parse_globs(settings.INGEST_EXCLUDE_GLOBS))
+        self.max_file_bytes = max_file_bytes
+        self.use_process_pool = use_process_pool
+        self.parse_processes = (parse_processes or os.cpu_count() or 1) if use_process_pool else 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def clone_repo(self, repo_url: str, dest_name: str, branch: Optional[str] = None) -> Path:
+        """
+        Clone repository into the working directory.
+
+        Args:
+            repo_url: Git URL (or local path)
+            dest_name: Directory name under the working directory
+            branch: Branch to check out (remote default if None)
+
+        Returns:
+            Path to the working tree
+        """
+        import git
+
+        clone_path = self.temp_dir / dest_name
+        if clone_path.exists():
+            shutil.rmtree(clone_path)
+
+        logger.info("Cloning repository", url=repo_url, branch=branch, shallow=self.shallow)
+        kwargs = {"branch": branch} if branch else {}
+        if self.shallow:
+            kwargs.update(depth=1, single_branch=True)
+            if Path(repo_url).exists():
+                # git ignores --depth for plain local paths
+                repo_url = Path(repo_url).resolve().as_uri()
+        git.Repo.clone_from(repo_url, clone_path, **kwargs)
+        return clone_path
+
+    def head_commit(self, repo_path: Path) -> str:
+        """Hex SHA of the checked-out commit."""
+        import git
+        return git.Repo(repo_path).head.commit.hexsha
+
+    def checkout(self, repo_path: Path, commit: str):
+        """
+        Check out a specific commit in a cloned repository.
+        Shallow clones fetch the commit first if it is not the branch tip.
+        """
+        import git
+        repo = git.Repo(repo_path)
+        self._ensure_commit(repo, commit)
+        repo.git.checkout(commit)
+
+    def changed_files(self, repo_path: Path, base_commit: str) -> Set[str]:
+        """
+        Paths added, modified or deleted between base_commit and HEAD.
+        Renames count as a delete plus an add.
+
+        Raises:
+            git.GitCommandError: If base_commit cannot be fetched
+        """
+        import git
+        repo = git.Repo(repo_path)
+        self._ensure_commit(repo, base_commit)
+        output = repo.git.diff("--name-only", "--no-renames", base_commit, "HEAD")
+        return {line for line in output.splitlines() if line}
+
+    def _ensure_commit(self, repo, commit: str):
+        """Fetch a commit missing from a shallow clone."""
+        import git
+        try:
+            repo.commit(commit).tree
+        except (ValueError, git.BadName):
+            repo.git.fetch("--depth", "1", "origin", commit)
+
+    def list_files(
+        self,
+        repo_path: Path,
+        include: Optional[Sequence[str]] = None,
+        exclude: Optional[Sequence[str]] = None
+    ) -> List[str]:
+        """
+        Supported files in the repository, as sorted POSIX paths relative to the root.
+
+        Args:
+            repo_path: Working tree
+            include: Include globs (overrides the extractor default)
+            exclude: Exclude globs, applied after include (overrides the default)
+        """
+        include = self.include if include is None else include
+        exclude = self.exclude if exclude is None else exclude
+        files = []
+        oversized = 0
+        for root, dirs, names in os.walk(repo_path):
+            dirs[:] = [d for d in dirs if d != ".git"]
+            for name in names:
+                if Path(name).suffix.lower() not in SUPPORTED_FORMATS:
+                    continue
+                full_path = Path(root) / name
+                rel_path = full_path.relative_to(repo_path).as_posix()
+                if include and not matches_any(rel_path, include):
+                    continue
+                if exclude and matches_any(rel_path, exclude):
+                    continue
+                if self.max_file_bytes and full_path.stat().st_size > self.max_file_bytes:
+                    oversized += 1
+                    continue
+                files.append(rel_path)
+        if oversized:
+            logger.info("Skipped oversized files", count=oversized, max_bytes=self.max_file_bytes)
+        return sorted(files)
+
+    def extract(self, file_path: Path) -> str:
+        """
+        Extract text from one file, on the parse pool for CPU-heavy formats.
+        Blocks the calling thread until the text is ready.
+        """
+        fmt = SUPPORTED_FORMATS.get(file_path.suffix.lower())
+        if not self.use_process_pool or fmt not in POOL_FORMATS:
+            return extract_text(file_path)
+        return self._parse_pool().submit(extract_text, file_path).result()
+
+    def _parse_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.parse_processes,
+                        mp_context=get_context("spawn")
+                    )
+                    logger.info("Started parse pool", processes=self.parse_processes)
+        return self._pool
+
+    def close(self):
+        """Shut down the parse pool."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def load_metadata(self, repo_path: Path) -> Dict:
+        """Load metadata.yaml if it exists."""
+        metadata_path = repo_path / "metadata.yaml"
+        if metadata_path.exists():
+            with open(metadata_path, 'r') as f:
+                return yaml.safe_load(f) or {}
+        return {}
+
+    def cleanup(self, repo_path: Path):
+        """Remove cloned repository."""
+        if repo_path.exists():
+            shutil.rmtree(repo_path)
+            logger.info("Cleaned up repository", path=str(repo_path))
@@ -0,0 +1,307 @@
+
+"""
+Hierarchical (coarse-to-fine) retrieval: route a query to candidate works
+and sections before searching chunks.
+
+Every current work gets a vector, and so does each of its sections: a run
+of up to HIERARCHY_SECTION_CHUNKS consecutive chunks of one file. A
+section's vector is the normalized mean of its chunks' vectors, read back
+from the semantic index, and a work's is the mean over all its chunks,
+so building them runs no model. A query scores the work
+vectors, keeps the best HIERARCHY_WORKS, scores those works' sections and
+keeps the best HIERARCHY_SECTIONS. The semantic leg then scores only the
+chunks of those sections. The lexical leg still searches every chunk:
+restricting Whoosh to a set of works made BM25 queries slower, not faster,
+and it finds exact terms that routing by vector could miss.
+
+The vectors are rebuilt when the semantic index changes (a new index
+object, or vectors added to it) or a work changes (is_current moving to a
+new version), checked at most every HIERARCHY_REFRESH_SECONDS. Works
+whose chunks are unchanged keep their vectors. Requests arriving during
+a rebuild route with the previous snapshot.
+
+Routing needs vectors by position, so it works with the flat and
+two-stage indexers but not with SEMANTIC_SHARDS.
+"""
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import threading
+import time
+import weakref
+
+import numpy as np
+from fastapi import Depends
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+import structlog
+
+from app.config import settings
+from app.core.indexer import normalize_rows
+from app.db.models import Chunk, Work
+from app.db.session import get_db
+
+logger = structlog.get_logger()
+
+
+class Candidates(NamedTuple):
+    """Where a routed query searches."""
+    work_slugs: List[str]  # Best first
+    positions: np.ndarray  # Semantic index positions of the chosen sections' chunks
+
+
+class _WorkSections(NamedTuple):
+    """One work's vectors; reused across rebuilds while its chunks are unchanged."""
+    key: Tuple[int, int]  # (canonical chunks, highest chunk ID)
+    slug: str
+    tags: Tuple[str, ...]
+    vector: np.ndarray
+    section_vectors: np.ndarray
+    section_offsets: np.ndarray  # Section s holds positions[section_offsets[s]:section_offsets[s + 1]]
+    positions: np.ndarray
+
+
+class _Snapshot(NamedTuple):
+    indexer: object
+    next_id: int
+    works_updated_at: object
+    slugs: List[str]
+    tags: List[Tuple[str, ...]]
+    work_vectors: np.ndarray
+    work_sections: np.ndarray  # Work w owns sections work_sections[w]:work_sections[w + 1]
+    section_vectors: np.ndarray
+    section_offsets: np.ndarray
+    positions: np.ndarray
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return (vectors / np.where(norms > 0, norms, 1.0)).astype(np.float32)
+
+
+def _top(scores: np.ndarray, n: int) -> np.ndarray:
+    """Indices of the n highest scores, best first (ties by index)."""
+    if n < len(scores):
+        keep = np.argpartition(-scores, n - 1)[:n]
+    else:
+        keep = np.arange(len(scores))
+    return keep[np.lexsort((keep, -scores[keep]))]
+
+
+class SectionIndex:
+    """Work and section vectors for routing queries (see module docstring)."""
+
+    def __init__(
+        self,
+        works: int = settings.HIERARCHY_WORKS,
+        sections: int = settings.HIERARCHY_SECTIONS,
+        section_chunks: int = settings.HIERARCHY_SECTION_CHUNKS,
+        refresh_seconds: float = settings.HIERARCHY_REFRESH_SECONDS
+    ):
+        """
+        Args:
+            works: Candidate works per query
+            sections: Candidate sections per query, among the candidate works' sections
+            section_chunks: Longest run of consecutive chunks in one section
+            refresh_seconds: Longest the vectors go unchecked against the index and works
+        """
+        self.works = works
+        self.sections = sections
+        self.section_chunks = max(1, section_chunks)
+        self.refresh_seconds = refresh_seconds
+        self._snapshot: Optional[_Snapshot] = None
+        self._groups: Dict[int, _WorkSections] = {}
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of sections."""
+        return 0 if self._snapshot is None else len(self._snapshot.section_vectors)
+
+    @staticmethod
+    def supports(indexer) -> bool:
+        return hasattr(indexer, "rows") and hasattr(indexer, "position_chunk_ids")
+
+    def _work_sections(
+        self,
+        indexer,
+        key: Tuple[int, int],
+        slug: str,
+        tags,
+        rows: List,
+        position_of: Dict[int, int]
+    ) -> _WorkSections:
+        """Sections of one work from its (chunk_id, source_path) rows in chunk_index order."""
+        positions, starts, path, run = [], [], None, 0
+        for chunk_id, source_path in rows:
+            position = position_of.get(chunk_id)
+            if position is None:
+                continue  # Not indexed yet
+            if not positions or source_path != path or run == self.section_chunks:
+                starts.append(len(positions))
+                path, run = source_path, 0
+            positions.append(position)
+            run += 1
+        positions = np.array(positions, dtype=np.int64)
+        vectors = indexer.rows(positions).astype(np.float32, copy=False)
+        sums = np.add.reduceat(vectors, starts, axis=0)
+        return _WorkSections(
+            key=key, slug=slug, tags=tuple(tags or ()),
+            vector=_unit(vectors.sum(axis=0)), section_vectors=_unit(sums),
+            section_offsets=np.append(np.array(starts, dtype=np.int64), len(positions)), positions=positions,
+        )
+
+    def build(self, db: Session, indexer) -> "SectionIndex":
+        """Compute work and section vectors for every current work's indexed chunks."""
+        start = time.perf_counter()
+        with self._lock:
+            self._build(db, indexer)
+            snapshot = self._snapshot
+        logger.info("Section index built", works=len(snapshot.slugs), sections=len(self),
+                    chunks=len(snapshot.positions), seconds=round(time.perf_counter() - start, 3))
+        return self
+
+    def _build(self, db: Session, indexer):
+        self._checked_at = time.monotonic()
+        next_id = indexer.next_id
+        works_updated_at = db.query(func.max(Work.updated_at)).scalar()
+        if self._snapshot is None or self._snapshot.indexer is not indexer:
+            self._groups = {}  # Positions belong to one index object
+        chunk_ids = indexer.position_chunk_ids()
+        position_of = dict(zip(chunk_ids.tolist(), range(len(chunk_ids))))
+
+        works = db.query(Work.id, Work.source_slug, Work.tags).filter(Work.is_current.is_(True)).all()
+        keys = {
+            work_id: (count, highest) for work_id, count, highest in
+            db.query(Chunk.work_id, func.count(Chunk.id), func.max(Chunk.id)).join(Work)
+            .filter(Work.is_current.is_(True), Chunk.canonical_chunk_id.is_(None)).group_by(Chunk.work_id)
+        }
+        groups: Dict[int, _WorkSections] = {}
+        for work_id, slug, tags in works:
+            if work_id not in keys:
+                continue
+            cached = self._groups.get(work_id)
+            # Reused only once every chunk was indexed: ingestion indexes after writing chunks
+            if cached is not None and cached.key == keys[work_id] and len(cached.positions) == keys[work_id][0]:
+                groups[work_id] = cached
+                continue
+            # Ordered by (work_id, chunk_index): served by idx_chunk_work_index; aliases are not indexed
+            rows = db.query(Chunk.id, Chunk.source_path).filter(
+                Chunk.work_id == work_id, Chunk.canonical_chunk_id.is_(None)
+            ).order_by(Chunk.chunk_index).all()
+            if any(chunk_id in position_of for chunk_id, _ in rows):
+                groups[work_id] = self._work_sections(indexer, keys[work_id], slug, tags, rows, position_of)
+        self._groups = groups
+        self._snapshot = self._assemble(indexer, next_id, works_updated_at, list(groups.values()))
+
+    def _assemble(self, indexer, next_id: int, works_updated_at, groups: List[_WorkSections]) -> _Snapshot:
+        dim = indexer.vector_dim
+        counts = [len(group.section_vectors) for group in groups]
+        section_offsets, base = [np.zeros(1, dtype=np.int64)], 0
+        for group in groups:
+            section_offsets.append(group.section_offsets[1:] + base)
+            base += len(group.positions)
+        return _Snapshot(
+            indexer=indexer, next_id=next_id, works_updated_at=works_updated_at,
+            slugs=[group.slug for group in groups], tags=[group.tags for group in groups],
+            work_vectors=np.stack([group.vector for group in groups]) if groups else np.zeros((0, dim), np.float32),
+            work_sections=np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+            section_vectors=np.concatenate([group.section_vectors for group in groups])
+            if groups else np.zeros((0, dim), np.float32),
+            section_offsets=np.concatenate(section_offsets),
+            positions=np.concatenate([group.positions for group in groups]) if groups else np.zeros(0, np.int64),
+        )
+
+    def _current(self, db: Session, indexer) -> _Snapshot:
+        """The snapshot to route with, rebuilding it first if the index or works changed."""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.indexer is indexer and \
+                time.monotonic() - self._checked_at < self.refresh_seconds:
+            return snapshot
+        # Only one request rebuilds; the others keep routing with the previous snapshot
+        if not self._lock.acquire(blocking=snapshot is None or snapshot.indexer is not indexer):
+            return snapshot
+        try:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.indexer is not indexer or \
+                    time.monotonic() - self._checked_at >= self.refresh_seconds:
+                self._checked_at = time.monotonic()
+                works_updated_at = db.query(func.max(Work.updated_at)).scalar()
+                if snapshot is None or snapshot.indexer is not indexer or snapshot.next_id != indexer.next_id or \
+                        snapshot.works_updated_at != works_updated_at:
+                    start = time.perf_counter()
+                    self._build(db, indexer)
+                    logger.info("Section index refreshed", works=len(self._snapshot.slugs), sections=len(self),
+                                seconds=round(time.perf_counter() - start, 3))
+            return self._snapshot
+        finally:
+            self._lock.release()
+
+    def route(
+        self,
+        db: Session,
+        indexer,
+        query_embedding: np.ndarray,
+        filters: Optional[Dict] = None,
+        works: Optional[int] = None,
+        sections: Optional[int] = None
+    ) -> Optional[Candidates]:
+        """
+        Candidate works and section chunks for a query.
+
+        Args:
+            db: Database session
+            indexer: The semantic index the positions refer to
+            query_embedding: Query vector
+            filters: Query constraints; work_slug and tags narrow the candidate works
+            works: Candidate works (default: self.works)
+            sections: Candidate sections (default: self.sections)
+
+        Returns:
+            Candidates, or None to search every chunk (the index cannot be
+            routed, or nothing matched)
+        """
+        if not self.supports(indexer):
+            return None
+        snapshot = self._current(db, indexer)
+        if not snapshot.slugs:
+            return None
+        query = normalize_rows(query_embedding)[0]
+        work_scores = snapshot.work_vectors @ query
+        if filters and ("work_slug" in filters or filters.get("tags")):
+            slug, wanted = filters.get("work_slug"), set(filters.get("tags") or ())
+            allowed = np.array([
+                (slug is None or work_slug == slug) and (not wanted or bool(wanted & set(tags)))
+                for work_slug, tags in zip(snapshot.slugs, snapshot.tags)
+            ])
+            if not allowed.any():
+                return None
+            work_scores = np.where(allowed, work_scores, -np.inf)
+            works = min(works or self.works, int(allowed.sum()))
+        chosen = _top(work_scores, works or self.works)
+
+        owned = np.concatenate([np.arange(snapshot.work_sections[w], snapshot.work_sections[w + 1]) for w in chosen])
+        best = owned[_top(snapshot.section_vectors[owned] @ query, sections or self.sections)]
+        offsets = snapshot.section_offsets
+        positions = np.concatenate([snapshot.positions[offsets[s]:offsets[s + 1]] for s in best])
+        return Candidates([snapshot.slugs[w] for w in chosen], positions)
+
+
+_section_indexes: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_section_lock = threading.Lock()
+
+
+def get_section_index(db: Session = Depends(get_db)) -> Optional[SectionIndex]:
+    """
+    Process-wide section index for the session's database with
+    RETRIEVAL_MODE=hierarchical, otherwise None. Vectors are computed on the
+    first routed query.
+    """
+    if settings.RETRIEVAL_MODE != "hierarchical":
+        return None
+    bind = db.get_bind()
+    index = _section_indexes.get(bind)
+    if index is None:
+        with _section_lock:
+            index = _section_indexes.get(bind)
+            if index is None:
+                index = _section_indexes[bind] = SectionIndex()
+    return index
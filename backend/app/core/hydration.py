@@ -0,0 +1,241 @@
+
+"""
+Result hydration: ranked chunk IDs to retrieval results.
+
+A hit needs its work's slug, version, title and URL, its position and its
+near-duplicate copies, but not its text: text columns are large and most
+responses show the text of only a few hits. ChunkHydrator resolves all
+hits with one query over just the columns it needs and keeps them in an
+LRU, so hot chunks need no query at all. Text is read afterwards, for the
+results that show it, in one more query (load_text). Summaries are never
+read during hydration.
+
+Works change (is_current moves to a newly ingested version), an
+incremental re-ingest moves unchanged chunks over to the new version's
+work, and later ingestion can add aliases to a chunk's copies. As with
+the neighbor index, the cache checks for all three when a lookup brings
+in a work it has not seen, and at most every
+HYDRATION_CACHE_REFRESH_SECONDS otherwise: copies that touch a changed
+work are dropped and read again on their next hit.
+"""
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+import threading
+import time
+import weakref
+
+from fastapi import Depends
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db.models import Chunk, Work
+from app.db.session import get_db
+from app.utils.helpers import generate_retrieval_id
+
+
+class ChunkRef(NamedTuple):
+    """One copy of a hit: a chunk row without its text."""
+    chunk_id: int
+    work_id: int
+    chunk_index: int
+    retrieval_id: str
+
+
+class WorkRef(NamedTuple):
+    """The work columns results and filters need."""
+    id: int
+    source_slug: str
+    version: str
+    title: Optional[str]
+    canonical_url: str
+    tags: Optional[List[str]]
+    is_current: bool
+
+
+WORK_COLUMNS = (Work.id, Work.source_slug, Work.version, Work.title, Work.canonical_url, Work.tags, Work.is_current)
+
+
+class ChunkHydrator:
+    """
+    Copies and works of hit chunk IDs, with an LRU of hot chunks (see module docstring).
+
+    A hit's copies are the chunk itself and its near-duplicate aliases
+    (see app.core.dedup), canonical copy first, then by chunk ID.
+    """
+
+    def __init__(
+        self,
+        max_chunks: int = settings.HYDRATION_CACHE_CHUNKS,
+        refresh_seconds: float = settings.HYDRATION_CACHE_REFRESH_SECONDS
+    ):
+        """
+        Args:
+            max_chunks: Hit chunk IDs whose copies are cached (0 disables caching)
+            refresh_seconds: Longest a cached work or set of copies goes unchecked
+        """
+        self.max_chunks = max(0, max_chunks)
+        self.refresh_seconds = refresh_seconds
+        self._copies: "OrderedDict[int, Tuple[ChunkRef, ...]]" = OrderedDict()
+        self._works: Dict[int, WorkRef] = {}
+        self.max_chunk_id = 0
+        self._works_updated_at = None
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "queries": 0}
+
+    def __len__(self) -> int:
+        return len(self._copies)
+
+    def _refresh(self, db: Session):
+        """Drop copies that gained aliases or touch a changed work, and the cached works."""
+        self._checked_at = time.monotonic()
+        newest, works_updated_at = db.query(
+            select(func.max(Chunk.id)).scalar_subquery(), select(func.max(Work.updated_at)).scalar_subquery()
+        ).one()
+        self.stats["queries"] += 1
+        newest = newest or 0
+        if newest > self.max_chunk_id and self._copies:
+            grown = db.query(Chunk.canonical_chunk_id).filter(
+                Chunk.id > self.max_chunk_id, Chunk.canonical_chunk_id.isnot(None)
+            ).distinct()
+            self.stats["queries"] += 1
+            for (canonical_id,) in grown:
+                self._copies.pop(canonical_id, None)
+        self.max_chunk_id = max(self.max_chunk_id, newest)
+        if works_updated_at != self._works_updated_at:
+            if self._copies:
+                self._drop_changed_works(db)
+            self._works.clear()
+            self._works_updated_at = works_updated_at
+
+    def _drop_changed_works(self, db: Session):
+        """
+        Drop copies that belong to a work updated since the last check.
+
+        Publishing a version updates both works, the new one and the one it
+        supersedes, and moves carried-over chunks from the latter to the
+        former; cached copies still name the old work (and its retrieval IDs).
+        """
+        if self._works_updated_at is None:
+            self._copies.clear()
+            return
+        changed = {work_id for (work_id,) in db.query(Work.id).filter(Work.updated_at >= self._works_updated_at)}
+        self.stats["queries"] += 1
+        stale = [
+            chunk_id for chunk_id, group in self._copies.items() if any(ref.work_id in changed for ref in group)
+        ]
+        for chunk_id in stale:
+            del self._copies[chunk_id]
+
+    def refresh(self, db: Session):
+        """Check the database for new aliases and changed works now."""
+        with self._lock:
+            self._refresh(db)
+
+    def _load_copies(self, db: Session, chunk_ids: List[int]) -> Dict[int, Tuple[ChunkRef, ...]]:
+        """Copies of chunk_ids and their works, in one query."""
+        rows = db.query(
+            Chunk.id, Chunk.work_id, Chunk.chunk_index, Chunk.canonical_chunk_id, *WORK_COLUMNS[1:]
+        ).join(Work).filter(
+            or_(Chunk.id.in_(chunk_ids), Chunk.canonical_chunk_id.in_(chunk_ids))
+        ).order_by(Chunk.id).all()
+        self.stats["queries"] += 1
+        copies: Dict[int, List[ChunkRef]] = {}
+        new_work = False
+        for chunk_id, work_id, chunk_index, canonical_id, *work in rows:
+            if work_id not in self._works:
+                new_work = True
+                self._works[work_id] = WorkRef(work_id, *work)
+            ref = ChunkRef(chunk_id, work_id, chunk_index, generate_retrieval_id(work[0], work[1], chunk_id))
+            group = copies.setdefault(canonical_id or chunk_id, [])
+            if canonical_id is None:
+                group.insert(0, ref)  # The canonical copy comes first
+            else:
+                group.append(ref)
+        if new_work and self.max_chunks:
+            # A work not seen before (such as a new version) may have changed others' is_current
+            self._refresh(db)
+        return {chunk_id: tuple(group) for chunk_id, group in copies.items()}
+
+    def _load_works(self, db: Session, work_ids: Iterable[int]):
+        rows = db.query(*WORK_COLUMNS).filter(Work.id.in_(list(work_ids))).all()
+        self.stats["queries"] += 1
+        for row in rows:
+            self._works[row[0]] = WorkRef(*row)
+
+    def copies(
+        self,
+        db: Session,
+        chunk_ids: Iterable[int]
+    ) -> Tuple[Dict[int, Tuple[ChunkRef, ...]], Dict[int, WorkRef]]:
+        """
+        Copies of each hit chunk ID, and the works they belong to.
+
+        Returns:
+            ({chunk_id: copies}, {work_id: WorkRef}); chunk IDs with no row
+            (or that are themselves aliases) are left out
+        """
+        chunk_ids = list(dict.fromkeys(chunk_ids))
+        with self._lock:
+            if self.max_chunks and time.monotonic() - self._checked_at >= self.refresh_seconds:
+                self._refresh(db)
+            found = {}
+            for chunk_id in chunk_ids:
+                group = self._copies.get(chunk_id)
+                if group is not None:
+                    self._copies.move_to_end(chunk_id)
+                    found[chunk_id] = group
+            missing = [chunk_id for chunk_id in chunk_ids if chunk_id not in found]
+            self.stats["hits"] += len(found)
+            self.stats["misses"] += len(missing)
+            if missing:
+                loaded = self._load_copies(db, missing)
+                found.update(loaded)
+                if self.max_chunks:
+                    self._copies.update(loaded)
+                    while len(self._copies) > self.max_chunks:
+                        self._copies.popitem(last=False)
+            work_ids = {ref.work_id for group in found.values() for ref in group}
+            if work_ids - self._works.keys():
+                self._load_works(db, work_ids - self._works.keys())
+            works = {work_id: self._works[work_id] for work_id in work_ids if work_id in self._works}
+            if not self.max_chunks:
+                self._works.clear()
+        return found, works
+
+    def load_text(self, db: Session, results: List[Dict], max_chars: Optional[int] = None) -> List[Dict]:
+        """
+        Set "text" on results (dicts with chunk_id), in one query.
+
+        Args:
+            db: Database session
+            results: Results to fill in, in place
+            max_chars: Read only the first max_chars characters (previews)
+
+        Returns:
+            results
+        """
+        if not results:
+            return results
+        text = Chunk.text if max_chars is None else func.substr(Chunk.text, 1, max_chars)
+        texts = dict(db.query(Chunk.id, text).filter(Chunk.id.in_({r["chunk_id"] for r in results})).all())
+        for result in results:
+            result["text"] = texts.get(result["chunk_id"], "")
+        return results
+
+
+_hydrators: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_hydrator_lock = threading.Lock()
+
+
+def get_chunk_hydrator(db: Session = Depends(get_db)) -> ChunkHydrator:
+    """Process-wide hydrator (and its cache) for the session's database."""
+    bind = db.get_bind()
+    hydrator = _hydrators.get(bind)
+    if hydrator is None:
+        with _hydrator_lock:
+            hydrator = _hydrators.get(bind)
+            if hydrator is None:
+                hydrator = _hydrators[bind] = ChunkHydrator()
+    return hydrator
@@ -0,0 +1,855 @@
+
+"""
+Semantic (FAISS) and lexical (Whoosh BM25) index management.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import heapq
+import os
+import pickle
+import uuid
+import zlib
+
+import faiss
+import numpy as np
+import structlog
+from whoosh import index
+from whoosh.fields import Schema, TEXT, ID, NUMERIC
+from whoosh.qparser import QueryParser
+from whoosh.query import And, Term
+from whoosh.scoring import BM25F
+
+from app.config import settings
+
+logger = structlog.get_logger()
+
+LEGACY_VECTOR_FILE = "index_vectors.f32"  # Vector file of indexes saved before files were named per generation
+_COPY_ROWS = 65536
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize vectors so inner product equals cosine similarity."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _lookup_positions(sorted_ids: np.ndarray, order: np.ndarray, chunk_ids: List[int]) -> np.ndarray:
+    """Positions of chunk_ids, given an index's chunk IDs sorted and the sorting order; -1 where absent."""
+    wanted = np.asarray(chunk_ids, dtype=np.int64)
+    if not len(sorted_ids):
+        return np.full(len(wanted), -1, dtype=np.int64)
+    at = np.minimum(np.searchsorted(sorted_ids, wanted), len(sorted_ids) - 1)
+    return np.where(sorted_ids[at] == wanted, order[at], -1)
+
+
+class FAISSIndexer:
+    """
+    Manages FAISS index for semantic similarity search.
+    Uses IndexFlatIP (inner product) for cosine similarity after L2 normalization.
+    """
+
+    def __init__(
+        self,
+        vector_dim: int = settings.EMBEDDING_DIM,
+        index_path: Optional[str] = None
+    ):
+        self.vector_dim = vector_dim
+        self.index_path = Path(index_path or os.path.join(settings.INDEX_DIR, "faiss"))
+        self.index_path.mkdir(parents=True, exist_ok=True)
+
+        self.index = faiss.IndexFlatIP(vector_dim)
+        self.id_mapping: Dict[int, int] = {}  # faiss_index_id -> chunk_id
+        self.next_id = 0
+        self._lookup: Optional[Tuple[int, np.ndarray, np.ndarray]] = None  # (next_id, sorted chunk IDs, order)
+
+    def chunk_ids(self) -> set:
+        """Set of chunk IDs present in the index."""
+        return set(self.id_mapping.values())
+
+    def add_batch(self, chunk_ids: List[int], embeddings: np.ndarray, work_slug: Optional[str] = None) -> List[int]:
+        """
+        Add multiple embeddings efficiently.
+
+        Args:
+            chunk_ids: Chunk IDs, aligned with embeddings
+            embeddings: Vectors to add
+            work_slug: Owning work (only used by ShardedFAISSIndexer)
+
+        Returns:
+            List of FAISS index IDs, aligned with chunk_ids
+        """
+        normalized = normalize_rows(embeddings)
+
+        start_id = self.next_id
+        self.index.add(normalized)
+
+        faiss_ids = list(range(start_id, start_id + len(chunk_ids)))
+        for faiss_id, chunk_id in zip(faiss_ids, chunk_ids):
+            self.id_mapping[faiss_id] = chunk_id
+
+        self.next_id += len(chunk_ids)
+        return faiss_ids
+
+    def search(self, query_embedding: np.ndarray, k: int = 20, within: Optional[np.ndarray] = None) -> List[Dict]:
+        """
+        Find k nearest neighbors.
+
+        Args:
+            query_embedding: Query vector
+            k: Results to return
+            within: Only score these positions (FAISS index IDs), as in hierarchical retrieval
+
+        Returns:
+            List of {chunk_id, score}
+        """
+        if self.next_id == 0 or (within is not None and len(within) == 0):
+            return []
+
+        params = None
+        if within is not None:
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(np.asarray(within, dtype=np.int64)))
+            k = min(k, len(within))
+        distances, indices = self.index.search(normalize_rows(query_embedding), k, params=params)
+
+        results = []
+        for dist, idx in zip(distances[0], indices[0]):
+            if idx != -1:  # FAISS returns -1 for empty slots
+                results.append({
+                    "chunk_id": self.id_mapping[int(idx)],
+                    "score": float(dist)
+                })
+        return results
+
+    def save(self, name: str = "index"):
+        """Persist index and mappings to disk (atomically replaces previous files)."""
+        index_file = self.index_path / f"{name}.faiss"
+        mapping_file = self.index_path / f"{name}_mapping.pkl"
+
+        faiss.write_index(self.index, str(index_file) + ".tmp")
+        with open(str(mapping_file) + ".tmp", 'wb') as f:
+            pickle.dump({
+                'id_mapping': self.id_mapping,
+                'next_id': self.next_id
+            }, f)
+        os.replace(str(index_file) + ".tmp", index_file)
+        os.replace(str(mapping_file) + ".tmp", mapping_file)
+
+        logger.info("Saved FAISS index", path=str(index_file), vectors=self.next_id)
+
+    def load(self, name: str = "index") -> bool:
+        """Load index from disk. Returns False if no saved index exists."""
+        index_file = self.index_path / f"{name}.faiss"
+        mapping_file = self.index_path / f"{name}_mapping.pkl"
+
+        if not index_file.exists() or not mapping_file.exists():
+            logger.info("FAISS index not found", path=str(index_file))
+            return False
+
+        self.index = faiss.read_index(str(index_file))
+        with open(mapping_file, 'rb') as f:
+            data = pickle.load(f)
+            self.id_mapping = data['id_mapping']
+            self.next_id = data['next_id']
+        self._lookup = None
+
+        logger.info("Loaded FAISS index", path=str(index_file), vectors=self.next_id)
+        return True
+
+    def position_chunk_ids(self) -> np.ndarray:
+        """Chunk ID at every position (FAISS index ID)."""
+        return np.fromiter((self.id_mapping[i] for i in range(self.next_id)), dtype=np.int64, count=self.next_id)
+
+    def rows(self, positions: np.ndarray) -> np.ndarray:
+        """Normalized vectors at the given positions."""
+        return self.index.reconstruct_batch(np.asarray(positions, dtype=np.int64))
+
+    def positions(self, chunk_ids: List[int]) -> np.ndarray:
+        """Positions of chunk_ids (-1 for chunks not in the index), by binary search over sorted chunk IDs."""
+        lookup = self._lookup
+        if lookup is None or lookup[0] != self.next_id:
+            ids = self.position_chunk_ids()
+            order = np.argsort(ids, kind="stable")
+            lookup = self._lookup = (self.next_id, ids[order], order)
+        return _lookup_positions(lookup[1], lookup[2], chunk_ids)
+
+    def vectors(self) -> Tuple[List[int], np.ndarray]:
+        """All (chunk_ids, normalized vectors) in insertion order."""
+        ids = [self.id_mapping[i] for i in range(self.next_id)]
+        if not ids:
+            return [], np.zeros((0, self.vector_dim), dtype=np.float32)
+        return ids, self.index.reconstruct_n(0, self.next_id)
+
+    def remove(self, chunk_ids) -> int:
+        """Drop the vectors of chunk_ids, rebuilding from the rest. Returns vectors removed."""
+        ids, vectors = self.vectors()
+        drop = set(chunk_ids)
+        rows = [row for row, chunk_id in enumerate(ids) if chunk_id not in drop]
+        if len(rows) == len(ids):
+            return 0
+        self.reset()
+        if rows:
+            self.add_batch([ids[row] for row in rows], vectors[rows])
+        return len(ids) - len(rows)
+
+    def reset(self):
+        """Drop all vectors."""
+        self.index = faiss.IndexFlatIP(self.vector_dim)
+        self.id_mapping = {}
+        self.next_id = 0
+        self._lookup = None
+
+
+# Shard worker state (one process owns a fixed set of shards)
+_worker_shards: Dict[int, FAISSIndexer] = {}
+
+
+def _shard_worker_init(vector_dim: int, shard_paths: Dict[int, str]):
+    """Load this worker's shards; faiss runs single-threaded per worker."""
+    faiss.omp_set_num_threads(1)
+    for shard, path in shard_paths.items():
+        _shard_worker_load(vector_dim, shard, path)
+
+
+def _shard_worker_load(vector_dim: int, shard: int, path: str) -> int:
+    indexer = FAISSIndexer(vector_dim=vector_dim, index_path=path)
+    indexer.load()
+    _worker_shards[shard] = indexer
+    return indexer.next_id
+
+
+def _shard_worker_search(query: np.ndarray, k: int) -> List[Tuple[float, int]]:
+    hits = []
+    for indexer in _worker_shards.values():
+        hits.extend((r["score"], r["chunk_id"]) for r in indexer.search(query, k))
+    return hits
+
+
+class ShardedFAISSIndexer:
+    """
+    Semantic index split into N FAISSIndexer shards.
+
+    Vectors are assigned to shards by chunk_id (``SEMANTIC_SHARD_KEY=chunk``)
+    or by work slug (``work``, keeping every version of a work in one
+    shard). Each shard is saved under ``index_path/shard-NNN`` and can be
+    rebuilt on its own.
+
+    With ``search_processes`` > 0, search() scatters the query to worker
+    processes that each own a subset of the shards (loaded from disk) and
+    merges their top-k lists; the parent then keeps no vectors in memory and
+    is read-only until the pool is stopped. Otherwise shards are searched
+    in-process, which is what ingestion uses.
+
+    FAISS ids are global: ``local_id * num_shards + shard``.
+    """
+
+    def __init__(
+        self,
+        vector_dim: int = settings.EMBEDDING_DIM,
+        index_path: Optional[str] = None,
+        num_shards: int = settings.SEMANTIC_SHARDS,
+        shard_key: str = settings.SEMANTIC_SHARD_KEY,
+        search_processes: int = 0
+    ):
+        """
+        Args:
+            vector_dim: Embedding dimension
+            index_path: Directory holding the shard directories
+            num_shards: Number of shards
+            shard_key: "chunk" (chunk_id modulo shards) or "work" (hash of work slug)
+            search_processes: Worker processes for scatter-gather search (0 = in-process)
+        """
+        if shard_key not in ("chunk", "work"):
+            raise ValueError(f"Unknown shard key: {shard_key}")
+        self.vector_dim = vector_dim
+        self.index_path = Path(index_path or os.path.join(settings.INDEX_DIR, "faiss"))
+        self.num_shards = num_shards
+        self.shard_key = shard_key
+        self.search_processes = min(search_processes, num_shards)
+        self.shards = [
+            FAISSIndexer(vector_dim, str(self.index_path / f"shard-{i:03d}")) for i in range(num_shards)
+        ]
+        self._executors: List[ProcessPoolExecutor] = []
+        self._owner: Dict[int, int] = {}  # shard -> executor position
+        self._sizes = [0] * num_shards  # Vector counts while shards live in workers
+
+    @property
+    def next_id(self) -> int:
+        """Total number of vectors across shards."""
+        if self._executors:
+            return sum(self._sizes)
+        return sum(shard.next_id for shard in self.shards)
+
+    def shard_for(self, chunk_id: int, work_slug: Optional[str] = None) -> int:
+        """Shard that owns a chunk."""
+        if self.shard_key == "work":
+            if work_slug is None:
+                raise ValueError("work_slug is required when sharding by work")
+            return zlib.crc32(work_slug.encode("utf-8")) % self.num_shards
+        return chunk_id % self.num_shards
+
+    def chunk_ids(self) -> set:
+        """Set of chunk IDs present in the index."""
+        self._require_local()
+        ids = set()
+        for shard in self.shards:
+            ids.update(shard.id_mapping.values())
+        return ids
+
+    def add_batch(self, chunk_ids: List[int], embeddings: np.ndarray, work_slug: Optional[str] = None) -> List[int]:
+        """
+        Add embeddings, routing each to its shard.
+
+        Returns:
+            Global FAISS ids, aligned with chunk_ids
+        """
+        self._require_local()
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        groups: Dict[int, List[int]] = {}
+        for row, chunk_id in enumerate(chunk_ids):
+            groups.setdefault(self.shard_for(chunk_id, work_slug), []).append(row)
+
+        faiss_ids = [0] * len(chunk_ids)
+        for shard, rows in groups.items():
+            local_ids = self.shards[shard].add_batch([chunk_ids[r] for r in rows], embeddings[rows])
+            for row, local_id in zip(rows, local_ids):
+                faiss_ids[row] = local_id * self.num_shards + shard
+        return faiss_ids
+
+    def search(self, query_embedding: np.ndarray, k: int = 20) -> List[Dict]:
+        """
+        Top-k over all shards (scatter-gather), ties broken by chunk_id.
+
+        Returns:
+            List of {chunk_id, score}
+        """
+        query = normalize_rows(query_embedding)
+        if self._executors:
+            futures = [executor.submit(_shard_worker_search, query, k) for executor in self._executors]
+            hits = [hit for future in futures for hit in future.result()]
+        else:
+            hits = [
+                (r["score"], r["chunk_id"]) for shard in self.shards for r in shard.search(query, k)
+            ]
+        best = heapq.nsmallest(k, hits, key=lambda hit: (-hit[0], hit[1]))
+        return [{"chunk_id": chunk_id, "score": score} for score, chunk_id in best]
+
+    def rebuild_shard(self, shard: int, chunk_ids: List[int], embeddings: np.ndarray, name: str = "index"):
+        """
+        Replace one shard's contents and persist it; other shards are untouched.
+        Running search workers reload the shard.
+        """
+        self._require_local()
+        indexer = self.shards[shard]
+        indexer.reset()
+        if len(chunk_ids):
+            indexer.add_batch(list(chunk_ids), embeddings)
+        indexer.save(name)
+        logger.info("Rebuilt FAISS shard", shard=shard, vectors=indexer.next_id)
+
+    def compact_shard(self, shard: int, keep_chunk_ids: set, name: str = "index") -> int:
+        """
+        Rebuild a shard from its own vectors, dropping chunks not in keep_chunk_ids
+        (e.g. chunks left on superseded versions). Returns vectors removed.
+        """
+        ids, vectors = self.shards[shard].vectors()
+        rows = [row for row, chunk_id in enumerate(ids) if chunk_id in keep_chunk_ids]
+        self.rebuild_shard(shard, [ids[row] for row in rows], vectors[rows], name)
+        return len(ids) - len(rows)
+
+    def remove(self, chunk_ids) -> int:
+        """Drop the vectors of chunk_ids from every shard. Returns vectors removed."""
+        self._require_local()
+        drop = set(chunk_ids)
+        return sum(shard.remove(drop) for shard in self.shards)
+
+    def save(self, name: str = "index"):
+        """Persist every shard."""
+        self._require_local()
+        for shard in self.shards:
+            shard.save(name)
+
+    def load(self, name: str = "index") -> bool:
+        """Load all shards from disk. Returns False if any shard is missing."""
+        return all([shard.load(name) for shard in self.shards])
+
+    def start_search_pool(self):
+        """
+        Move the shards into search worker processes (from their saved files)
+        and free them in this process.
+        """
+        if self.search_processes <= 0 or self._executors:
+            return
+        context = get_context("spawn")
+        assignments = [
+            {shard: str(self.shards[shard].index_path)
+             for shard in range(self.num_shards) if shard % self.search_processes == worker}
+            for worker in range(self.search_processes)
+        ]
+        for worker, shard_paths in enumerate(assignments):
+            self._executors.append(ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=context,
+                initializer=_shard_worker_init,
+                initargs=(self.vector_dim, shard_paths)
+            ))
+            for shard in shard_paths:
+                self._owner[shard] = worker
+        for shard in range(self.num_shards):
+            self._sizes[shard] = self.shards[shard].next_id
+            self.shards[shard].reset()
+        logger.info("Started FAISS search pool", shards=self.num_shards, processes=self.search_processes)
+
+    def reload_shard(self, shard: int, name: str = "index"):
+        """Reload one shard from disk (in its search worker, if the pool is running)."""
+        if self._executors:
+            executor = self._executors[self._owner[shard]]
+            path = str(self.shards[shard].index_path)
+            self._sizes[shard] = executor.submit(_shard_worker_load, self.vector_dim, shard, path).result()
+        else:
+            self.shards[shard].load(name)
+
+    def stop_search_pool(self, reload: bool = True):
+        """Shut down search workers and (unless reload is False) load the shards back in-process."""
+        if not self._executors:
+            return
+        for executor in self._executors:
+            executor.shutdown(wait=True)
+        self._executors = []
+        self._owner = {}
+        if reload:
+            self.load()
+
+    def _require_local(self):
+        if self._executors:
+            raise RuntimeError("Shards are held by the search pool; stop it before modifying the index")
+
+
+class TwoStageFAISSIndexer:
+    """
+    Semantic index searched in two stages.
+
+    Compressed codes held in RAM find ``candidates`` hits, which are then
+    re-scored exactly against full-precision vectors kept in a file on disk
+    and memory-mapped, so a search only reads the pages of its candidates.
+    Codes are either:
+
+    - ``pq``: product quantization (``subquantizers`` bytes per vector),
+      trained once ``train_size`` vectors have been added. Until then the
+      first stage scans the disk vectors exactly.
+    - ``binary``: sign bits of a random projection (SimHash, vector_dim
+      bits per vector) compared by Hamming distance; needs no training.
+    - ``exact``: no codes; every search scans the mapped vectors. Used to
+      serve snapshots of flat and sharded indexes (see app.core.snapshots).
+
+    Final scores are exact cosine similarities, as with FAISSIndexer, so
+    thresholds tuned on exact search still apply.
+
+    Other processes map the same vector file (the API reloads what the
+    ingestion worker saves), so rows a save has recorded are never changed
+    in place. Vector files are named per generation and only appended to;
+    the mapping file names the generation it was saved with, and a load
+    maps exactly that file and row count. Removing vectors, a reset, or
+    appending to a file whose tail this instance does not own (rows added
+    by another writer or left by a crash) starts a new generation instead.
+    The generation a save replaces is deleted by the save after that, once
+    readers have had a refresh interval to move on.
+    """
+
+    def __init__(
+        self,
+        vector_dim: int = settings.EMBEDDING_DIM,
+        index_path: Optional[str] = None,
+        codes: str = settings.SEMANTIC_INDEX_CODES,
+        candidates: int = settings.SEMANTIC_CANDIDATES,
+        subquantizers: int = settings.SEMANTIC_PQ_SUBQUANTIZERS,
+        train_size: int = settings.SEMANTIC_PQ_TRAIN_SIZE,
+        seed: int = settings.RANDOM_SEED
+    ):
+        """
+        Args:
+            vector_dim: Embedding dimension
+            index_path: Directory for the codes, chunk IDs and vector file
+            codes: "pq", "binary" or "exact"
+            candidates: First-stage hits re-ranked exactly per search
+            subquantizers: PQ code bytes per vector (must divide vector_dim)
+            train_size: Vectors to collect before training PQ
+            seed: Seed of the binary random projection
+        """
+        if codes not in ("pq", "binary", "exact"):
+            raise ValueError(f"Unknown semantic index codes: {codes}")
+        if codes == "pq" and vector_dim % subquantizers:
+            raise ValueError(f"vector_dim {vector_dim} is not divisible by {subquantizers} subquantizers")
+        self.vector_dim = vector_dim
+        self.index_path = Path(index_path or os.path.join(settings.INDEX_DIR, "faiss"))
+        self.index_path.mkdir(parents=True, exist_ok=True)
+        self.codes = codes
+        self.candidates = candidates
+        self.subquantizers = subquantizers
+        self.train_size = max(train_size, 256)  # 8-bit PQ needs at least 2^8 training vectors
+        self.bits = (vector_dim + 7) // 8 * 8
+        self._projection = np.random.default_rng(seed).standard_normal((vector_dim, self.bits)).astype(np.float32)
+        self._vector_file = self._new_vector_file()
+        self._saved_vector_file: Optional[Path] = None  # Named by the last save or load
+        self.index = faiss.IndexBinaryFlat(self.bits) if codes == "binary" else None
+        self._chunk_ids = np.zeros(0, dtype=np.int64)  # Position -> chunk_id
+        self.next_id = 0
+        self._mapped = None
+        self._lookup: Optional[Tuple[int, np.ndarray, np.ndarray]] = None  # (next_id, sorted chunk IDs, order)
+
+    def reset(self):
+        """Drop all vectors (continuing in a new, empty vector file)."""
+        self.index = faiss.IndexBinaryFlat(self.bits) if self.codes == "binary" else None
+        self._chunk_ids = np.zeros(0, dtype=np.int64)
+        self.next_id = 0
+        self._mapped = None
+        self._lookup = None
+        self._discard_unsaved()
+        self._vector_file = self._new_vector_file()
+
+    def _new_vector_file(self) -> Path:
+        return self.index_path / f"index_vectors-{uuid.uuid4().hex[:16]}.f32"
+
+    def _discard_unsaved(self):
+        """Delete the current vector file if no save names it (only this instance ever used it)."""
+        if self._vector_file != self._saved_vector_file:
+            self._vector_file.unlink(missing_ok=True)
+
+    def _fork_vector_file(self):
+        """Continue in a new vector file holding a copy of the first next_id rows."""
+        vectors = self._disk_vectors()
+        path = self._new_vector_file()
+        with open(path, "wb") as f:
+            for start in range(0, self.next_id, _COPY_ROWS):
+                f.write(np.ascontiguousarray(vectors[start:start + _COPY_ROWS]).tobytes())
+        self._discard_unsaved()
+        self._vector_file = path
+        self._mapped = None
+        logger.info("Started new vector file", path=str(path), vectors=self.next_id)
+
+    @property
+    def trained(self) -> bool:
+        return self.index is not None
+
+    @property
+    def nbytes(self) -> int:
+        """RAM held for search: codes, PQ codebooks and the chunk ID array."""
+        size = self._chunk_ids[:self.next_id].nbytes
+        if isinstance(self.index, faiss.IndexPQ):
+            size += self.index.sa_code_size() * self.index.ntotal + self.index.pq.centroids.size() * 4
+        elif self.index is not None:
+            size += self.index.code_size * self.index.ntotal
+        return size
+
+    def chunk_ids(self) -> set:
+        """Set of chunk IDs present in the index."""
+        return set(self._chunk_ids[:self.next_id].tolist())
+
+    def _binary_codes(self, vectors: np.ndarray) -> np.ndarray:
+        return np.packbits(vectors @ self._projection > 0, axis=1)
+
+    def _encode(self, vectors: np.ndarray):
+        if self.codes == "binary":
+            self.index.add(self._binary_codes(vectors))
+        else:
+            self.index.add(vectors)
+
+    def _disk_vectors(self) -> np.ndarray:
+        """Memory map of the first next_id disk vectors."""
+        if self.next_id == 0:
+            return np.zeros((0, self.vector_dim), dtype=np.float32)
+        if self._mapped is None or len(self._mapped) != self.next_id:
+            self._mapped = np.memmap(
+                self._vector_file, dtype=np.float32, mode="r", shape=(self.next_id, self.vector_dim)
+            )
+        return self._mapped
+
+    def _train(self):
+        vectors = self._disk_vectors()
+        index = faiss.IndexPQ(self.vector_dim, self.subquantizers, 8, faiss.METRIC_INNER_PRODUCT)
+        index.train(np.ascontiguousarray(vectors[:self.train_size]))
+        for start in range(0, self.next_id, 65536):
+            index.add(np.ascontiguousarray(vectors[start:start + 65536]))
+        self.index = index
+        logger.info("Trained PQ codes", vectors=self.next_id, subquantizers=self.subquantizers)
+
+    def add_batch(self, chunk_ids: List[int], embeddings: np.ndarray, work_slug: Optional[str] = None) -> List[int]:
+        """
+        Append vectors to the disk file and their codes to the in-RAM index.
+
+        Returns:
+            List of FAISS index IDs (positions), aligned with chunk_ids
+        """
+        normalized = normalize_rows(embeddings)
+        start_id = self.next_id
+        # Row i lives at byte i * dim * 4; only ever append right after this instance's own rows
+        size = self._vector_file.stat().st_size if self._vector_file.exists() else 0
+        if size != start_id * self.vector_dim * 4:
+            self._fork_vector_file()
+        with open(self._vector_file, "ab") as f:
+            f.write(normalized.tobytes())
+        if start_id + len(chunk_ids) > len(self._chunk_ids):
+            grown = np.zeros(max(start_id + len(chunk_ids), 2 * len(self._chunk_ids)), dtype=np.int64)
+            grown[:start_id] = self._chunk_ids[:start_id]
+            self._chunk_ids = grown
+        self._chunk_ids[start_id:start_id + len(chunk_ids)] = chunk_ids
+        self.next_id += len(chunk_ids)
+
+        if self.trained:
+            self._encode(normalized)
+        elif self.codes == "pq" and self.next_id >= self.train_size:
+            self._train()
+        return list(range(start_id, start_id + len(chunk_ids)))
+
+    def _first_stage(self, query: np.ndarray, depth: int) -> Optional[np.ndarray]:
+        """Candidate positions from the codes, or None for all of them (no codes, or depth covers the index)."""
+        if not self.trained or depth >= self.next_id:
+            return None
+        codes = self._binary_codes(query) if self.codes == "binary" else query
+        _, positions = self.index.search(codes, depth)
+        return positions[0][positions[0] >= 0]
+
+    def search(
+        self,
+        query_embedding: np.ndarray,
+        k: int = 20,
+        candidates: Optional[int] = None,
+        within: Optional[np.ndarray] = None
+    ) -> List[Dict]:
+        """
+        Top-k by exact cosine similarity among the first stage's candidates,
+        ties broken by chunk_id.
+
+        Args:
+            query_embedding: Query vector
+            k: Results to return
+            candidates: First-stage depth (default: self.candidates, at least k)
+            within: Score exactly these positions instead of running the first stage
+
+        Returns:
+            List of {chunk_id, score}
+        """
+        if self.next_id == 0:
+            return []
+        query = normalize_rows(query_embedding)
+        if within is not None:
+            positions = np.asarray(within, dtype=np.int64)
+        else:
+            positions = self._first_stage(query, max(k, candidates or self.candidates))
+        if positions is None:
+            scores = self._disk_vectors() @ query[0]
+            positions = np.arange(self.next_id)
+            if k < self.next_id:
+                positions = np.argpartition(-scores, k - 1)[:k]
+                scores = scores[positions]
+        else:
+            positions = np.sort(positions)  # Sequential reads
+            scores = self._disk_vectors()[positions] @ query[0]
+        chunk_ids = self._chunk_ids[positions]
+        best = np.lexsort((chunk_ids, -scores))[:k]
+        return [{"chunk_id": int(chunk_ids[i]), "score": float(scores[i])} for i in best]
+
+    def position_chunk_ids(self) -> np.ndarray:
+        """Chunk ID at every position."""
+        return self._chunk_ids[:self.next_id].copy()
+
+    def rows(self, positions: np.ndarray) -> np.ndarray:
+        """Normalized vectors at the given positions (read from the mapped file)."""
+        return np.asarray(self._disk_vectors()[np.asarray(positions, dtype=np.int64)])
+
+    def positions(self, chunk_ids: List[int]) -> np.ndarray:
+        """Positions of chunk_ids (-1 for chunks not in the index), by binary search over sorted chunk IDs."""
+        lookup = self._lookup
+        if lookup is None or lookup[0] != self.next_id:
+            ids = self.position_chunk_ids()
+            order = np.argsort(ids, kind="stable")
+            lookup = self._lookup = (self.next_id, ids[order], order)
+        return _lookup_positions(lookup[1], lookup[2], chunk_ids)
+
+    def vectors(self) -> Tuple[List[int], np.ndarray]:
+        """All (chunk_ids, normalized vectors) in insertion order."""
+        return self._chunk_ids[:self.next_id].tolist(), np.array(self._disk_vectors())
+
+    def remove(self, chunk_ids) -> int:
+        """
+        Drop the vectors of chunk_ids, writing the rest to a new vector file
+        and rebuilding the codes (PQ codes are retrained). Returns vectors removed.
+        """
+        ids, vectors = self.vectors()
+        drop = set(chunk_ids)
+        rows = [row for row, chunk_id in enumerate(ids) if chunk_id not in drop]
+        if len(rows) == len(ids):
+            return 0
+        self.reset()
+        if rows:
+            self.add_batch([ids[row] for row in rows], vectors[rows])
+        return len(ids) - len(rows)
+
+    def saved_files(self, name: str = "index") -> List[Tuple[Path, int]]:
+        """(path, bytes) of the files making up the last save; the vector file's size is its saved rows."""
+        files = [(self._vector_file, self.next_id * self.vector_dim * 4)]
+        for suffix in (".faiss", "_mapping.pkl"):
+            path = self.index_path / f"{name}_{self.codes}{suffix}"
+            if path.exists():
+                files.append((path, path.stat().st_size))
+        return files
+
+    def save(self, name: str = "index"):
+        """
+        Persist codes and chunk IDs (atomically replaces previous files). Disk
+        vectors are written as they are added; the mapping names their file
+        and the saved count marks how many of them belong to this snapshot.
+        """
+        codes_file = self.index_path / f"{name}_{self.codes}.faiss"
+        mapping_file = self.index_path / f"{name}_{self.codes}_mapping.pkl"
+        previous = {}
+        if mapping_file.exists():
+            with open(mapping_file, "rb") as f:
+                previous = pickle.load(f)
+        replaced = previous.get("vector_file", LEGACY_VECTOR_FILE) if previous else None
+        retired, drop = previous.get("retired"), None
+        if replaced is not None and replaced != self._vector_file.name:
+            # Readers may still map the file being replaced: keep it until the next switch
+            drop, retired = retired, replaced
+        with open(self._vector_file, "ab") as f:
+            os.fsync(f.fileno())
+        if self.trained:
+            write = faiss.write_index_binary if self.codes == "binary" else faiss.write_index
+            write(self.index, str(codes_file) + ".tmp")
+            os.replace(str(codes_file) + ".tmp", codes_file)
+        with open(str(mapping_file) + ".tmp", "wb") as f:
+            pickle.dump({
+                "chunk_ids": self._chunk_ids[:self.next_id],
+                "next_id": self.next_id,
+                "trained": self.trained,
+                "vector_file": self._vector_file.name,
+                "retired": retired,
+            }, f)
+        os.replace(str(mapping_file) + ".tmp", mapping_file)
+        self._saved_vector_file = self._vector_file
+        if drop and drop != self._vector_file.name:
+            (self.index_path / drop).unlink(missing_ok=True)
+        logger.info("Saved two-stage index", path=str(self.index_path), codes=self.codes, vectors=self.next_id)
+
+    def load(self, name: str = "index") -> bool:
+        """
+        Load codes and chunk IDs, and map the vector file they were saved
+        with. Returns False if no saved index exists.
+        """
+        codes_file = self.index_path / f"{name}_{self.codes}.faiss"
+        mapping_file = self.index_path / f"{name}_{self.codes}_mapping.pkl"
+        if not mapping_file.exists():
+            logger.info("Two-stage index not found", path=str(mapping_file))
+            return False
+        with open(mapping_file, "rb") as f:
+            data = pickle.load(f)
+        self._chunk_ids = np.asarray(data["chunk_ids"], dtype=np.int64)
+        self.next_id = data["next_id"]
+        self._lookup = None
+        if data["trained"]:
+            read = faiss.read_index_binary if self.codes == "binary" else faiss.read_index
+            self.index = read(str(codes_file))
+        else:
+            self.index = None
+        self._discard_unsaved()
+        self._vector_file = self._saved_vector_file = self.index_path / data.get("vector_file", LEGACY_VECTOR_FILE)
+        self._mapped = None
+        # Map now, while the file is current (a later save may retire it); rows past next_id are ignored
+        self._disk_vectors()
+        logger.info("Loaded two-stage index", path=str(self.index_path), codes=self.codes, vectors=self.next_id)
+        return True
+
+
+def create_semantic_indexer(vector_dim: int = settings.EMBEDDING_DIM, search_processes: int = 0):
+    """
+    FAISSIndexer; ShardedFAISSIndexer when SEMANTIC_SHARDS > 1; or
+    TwoStageFAISSIndexer when SEMANTIC_INDEX_CODES is "pq" or "binary".
+    """
+    if settings.SEMANTIC_INDEX_CODES != "flat":
+        if settings.SEMANTIC_SHARDS > 1:
+            raise ValueError("SEMANTIC_INDEX_CODES requires SEMANTIC_SHARDS=1")
+        return TwoStageFAISSIndexer(vector_dim=vector_dim)
+    if settings.SEMANTIC_SHARDS > 1:
+        return ShardedFAISSIndexer(vector_dim=vector_dim, search_processes=search_processes)
+    return FAISSIndexer(vector_dim=vector_dim)
+
+
+class WhooshIndexer:
+    """
+    Manages Whoosh index for BM25 lexical search.
+    """
+
+    def __init__(self, index_path: Optional[str] = None):
+        self.index_path = Path(index_path or os.path.join(settings.INDEX_DIR, "whoosh"))
+        self.index_path.mkdir(parents=True, exist_ok=True)
+
+        self.schema = Schema(
+            chunk_id=ID(stored=True, unique=True),
+            text=TEXT(stored=False),  # Don't store text, retrieve from DB
+            work_slug=ID(stored=True),
+            version=ID(stored=True),
+            chunk_index=NUMERIC(stored=True)
+        )
+
+        if not index.exists_in(str(self.index_path)):
+            self.ix = index.create_in(str(self.index_path), self.schema)
+            logger.info("Created Whoosh index", path=str(self.index_path))
+        else:
+            self.ix = index.open_dir(str(self.index_path))
+
+    def add_batch(self, documents: List[Dict]):
+        """
+        Add or replace multiple documents in one commit.
+        documents: [{chunk_id, text, work_slug, version, chunk_index}, ...]
+        """
+        writer = self.ix.writer()
+        for doc in documents:
+            writer.update_document(
+                chunk_id=str(doc['chunk_id']),
+                text=doc['text'],
+                work_slug=doc['work_slug'],
+                version=doc['version'],
+                chunk_index=doc['chunk_index']
+            )
+        writer.commit()
+
+    def remove(self, chunk_ids):
+        """Delete the documents of chunk_ids in one commit."""
+        writer = self.ix.writer()
+        for chunk_id in chunk_ids:
+            writer.delete_by_term("chunk_id", str(chunk_id))
+        writer.commit()
+
+    def search(self, query_text: str, k: int = 20, filters: Optional[Dict] = None) -> List[Dict]:
+        """
+        Search using BM25 ranking.
+        filters: {work_slug: str, version: str}
+        """
+        with self.ix.searcher(weighting=BM25F()) as searcher:
+            query = QueryParser("text", self.ix.schema).parse(query_text)
+
+            if filters:
+                filter_queries = [
+                    Term(field, filters[field])
+                    for field in ("work_slug", "version")
+                    if field in filters
+                ]
+                if filter_queries:
+                    query = And([query] + filter_queries)
+
+            results = searcher.search(query, limit=k)
+            return [
+                {
+                    "chunk_id": int(hit['chunk_id']),
+                    "score": hit.score,
+                    "work_slug": hit['work_slug'],
+                    "version": hit['version'],
+                    "chunk_index": hit['chunk_index']
+                }
+                for hit in results
+            ]
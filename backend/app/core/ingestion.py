@@ -0,0 +1,916 @@
+
+"""
+Staged ingestion pipeline.
+
+A work is ingested in five stages:
+
+    extract -> chunk -> embed -> index -> summarize
+
+Each stage runs on its own pool of worker threads. Stages are connected by
+bounded queues, so a slow stage (usually embedding) blocks its producers
+instead of letting extracted text pile up in memory. Per-stage counters are
+written to ``Work.ingestion_progress`` while the job runs.
+
+Every stage is idempotent with respect to what is already in the database,
+which is what makes interrupted jobs resumable: re-running the pipeline for
+the same work skips files and chunks that were fully processed and only
+re-does the remainder.
+"""
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from queue import Empty, Full, Queue
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+import threading
+
+import numpy as np
+import structlog
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.chunker import DeterministicChunker
+from app.core.dedup import NearDuplicateIndex, create_dedup_index, similarity
+from app.core.embeddings import EmbeddingGenerator, create_embedder
+from app.core.extractor import RepositoryExtractor, SUPPORTED_FORMATS
+from app.core.indexer import FAISSIndexer, WhooshIndexer, create_semantic_indexer
+from app.core.summarizer import SUMMARY_LEVELS, ExtractiveSummarizer
+from app.db.models import Chunk, Embedding, Summary, Work
+
+logger = structlog.get_logger()
+
+STAGES: Tuple[str, ...] = ("extract", "chunk", "embed", "index", "summarize")
+
+_END = object()  # End-of-stream marker passed between stages
+_POLL_SECONDS = 0.1
+
+
+class PipelineAborted(Exception):
+    """Raised inside stage workers when the pipeline is shutting down."""
+
+
+@dataclass
+class StageSpec:
+    """A named stage: handler(item) yields zero or more items for the next stage."""
+    name: str
+    handler: Callable[[object], Iterable]
+    workers: int = 1
+
+
+class ProgressTracker:
+    """Thread-safe per-stage counters."""
+
+    def __init__(self, stages: Sequence[str] = STAGES):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Counter] = {name: Counter() for name in stages}
+        self._values: Dict[str, object] = {}
+
+    def add(self, stage: str, key: str, amount: int = 1):
+        with self._lock:
+            self._counters[stage][key] += amount
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._values[key] = value
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            data = {key: value for key, value in self._values.items()}
+            data["stages"] = {name: dict(c) for name, c in self._counters.items()}
+        return data
+
+
+class StagedPipeline:
+    """
+    Runs stage handlers on thread pools connected by bounded queues.
+
+    Puts into a full queue block, which propagates backpressure from the
+    slowest stage back to the source. The first handler exception aborts
+    every stage and is re-raised from run().
+    """
+
+    def __init__(self, stages: Sequence[StageSpec], queue_size: int = settings.INGEST_STAGE_QUEUE_SIZE):
+        self.stages = list(stages)
+        self.queues: List[Queue] = [Queue(maxsize=queue_size) for _ in self.stages]
+        self._abort = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._error_lock = threading.Lock()
+        self._alive: Dict[str, int] = {}
+        self._alive_lock = threading.Lock()
+
+    def stop(self):
+        """Ask every stage to stop at the next queue operation."""
+        self._abort.set()
+
+    def active_stage(self) -> Optional[str]:
+        """Earliest stage that still has running workers."""
+        with self._alive_lock:
+            for spec in self.stages:
+                if self._alive.get(spec.name):
+                    return spec.name
+        return None
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Items waiting in front of each stage."""
+        return {spec.name: q.qsize() for spec, q in zip(self.stages, self.queues)}
+
+    def run(
+        self,
+        source: Iterable,
+        on_tick: Optional[Callable[[], None]] = None,
+        tick_seconds: float = settings.INGEST_PROGRESS_INTERVAL
+    ):
+        """
+        Feed source items through all stages and wait for completion.
+
+        Args:
+            source: Items for the first stage
+            on_tick: Called periodically from the calling thread while running
+            tick_seconds: Interval between on_tick calls
+        """
+        threads = []
+        for position, spec in enumerate(self.stages):
+            inbox = self.queues[position]
+            outbox = self.queues[position + 1] if position + 1 < len(self.stages) else None
+            self._alive[spec.name] = spec.workers
+            for n in range(spec.workers):
+                thread = threading.Thread(
+                    target=self._work,
+                    args=(spec, inbox, outbox),
+                    name=f"ingest-{spec.name}-{n}",
+                    daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        feeder = threading.Thread(target=self._feed, args=(source,), name="ingest-source", daemon=True)
+        feeder.start()
+        threads.append(feeder)
+
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=tick_seconds)
+                    if thread.is_alive():
+                        break
+                if on_tick is not None:
+                    on_tick()
+        except BaseException:
+            self.stop()
+            raise
+
+        if self._error is not None:
+            raise self._error
+
+    def _feed(self, source: Iterable):
+        try:
+            for item in source:
+                self._put(self.queues[0], item)
+            self._put(self.queues[0], _END)
+        except PipelineAborted:
+            pass
+        except BaseException as e:
+            self._fail(e, "source")
+
+    def _work(self, spec: StageSpec, inbox: Queue, outbox: Optional[Queue]):
+        try:
+            while True:
+                item = self._get(inbox)
+                if item is _END:
+                    # Leave the marker for sibling workers of this stage
+                    self._put(inbox, _END)
+                    break
+                for result in spec.handler(item):
+                    if outbox is not None:
+                        self._put(outbox, result)
+        except PipelineAborted:
+            pass
+        except BaseException as e:
+            self._fail(e, spec.name)
+        finally:
+            with self._alive_lock:
+                self._alive[spec.name] -= 1
+                last = self._alive[spec.name] == 0
+            if last and outbox is not None and not self._abort.is_set():
+                try:
+                    self._put(outbox, _END)
+                except PipelineAborted:
+                    pass
+
+    def _fail(self, error: BaseException, stage: str):
+        with self._error_lock:
+            if self._error is None:
+                self._error = error
+                logger.error("Ingestion stage failed", stage=stage, error=str(error))
+        self._abort.set()
+
+    def _put(self, q: Queue, item):
+        while True:
+            if self._abort.is_set():
+                raise PipelineAborted()
+            try:
+                q.put(item, timeout=_POLL_SECONDS)
+                return
+            except Full:
+                continue
+
+    def _get(self, q: Queue):
+        while True:
+            if self._abort.is_set():
+                raise PipelineAborted()
+            try:
+                return q.get(timeout=_POLL_SECONDS)
+            except Empty:
+                continue
+
+
+@dataclass
+class SourceFile:
+    """A repository file waiting for extraction."""
+    path: str
+
+
+@dataclass
+class Document:
+    """Extracted text of one repository file."""
+    path: str
+    text: str
+
+
+@dataclass
+class PendingChunk:
+    """A chunk on its way through the pipeline; chunk_id is set once persisted."""
+    text: str
+    source_path: str
+    chunk_index: int
+    token_count: int
+    start_char: int
+    end_char: int
+    chunk_hash: str
+    chunk_id: Optional[int] = None
+    minhash: Optional[np.ndarray] = field(default=None, repr=False)
+    canonical_chunk_id: Optional[int] = None  # Set when stored as a near-duplicate alias
+
+
+@dataclass
+class ChunkBatch:
+    """
+    Unit of work for the embed, index and summarize stages.
+
+    needs_index is False for batches that were indexed by an earlier run and
+    only still need summaries. vectors has one row per chunk that was not
+    already an alias when the batch was embedded, in batch order.
+    """
+    chunks: List[PendingChunk]
+    needs_index: bool = True
+    vectors: Optional[np.ndarray] = field(default=None, repr=False)
+
+
+class IngestionPipeline:
+    """
+    Orchestrates ingestion of one Work from its repository.
+
+    Index and summarize stages open their own sessions from session_factory,
+    so the factory must hand out sessions that are safe to use from worker
+    threads (one session per thread).
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        chunker: Optional[DeterministicChunker] = None,
+        embedder: Optional[EmbeddingGenerator] = None,
+        faiss_indexer: Optional[FAISSIndexer] = None,
+        whoosh_indexer: Optional[WhooshIndexer] = None,
+        extractor: Optional[RepositoryExtractor] = None,
+        summarizer: Optional[ExtractiveSummarizer] = None,
+        dedup: Optional[NearDuplicateIndex] = None,
+        workers: Optional[Dict[str, int]] = None,
+        queue_size: int = settings.INGEST_STAGE_QUEUE_SIZE,
+        batch_size: int = settings.INGEST_EMBED_BATCH_SIZE,
+        progress_interval: float = settings.INGEST_PROGRESS_INTERVAL
+    ):
+        self.session_factory = session_factory
+        self.chunker = chunker if chunker is not None else DeterministicChunker()
+        self.embedder = embedder if embedder is not None else create_embedder()
+        self.faiss_indexer = faiss_indexer if faiss_indexer is not None else create_semantic_indexer()
+        self.whoosh_indexer = whoosh_indexer if whoosh_indexer is not None else WhooshIndexer()
+        self.extractor = extractor if extractor is not None else RepositoryExtractor()
+        self.summarizer = summarizer if summarizer is not None else ExtractiveSummarizer()
+        self.dedup = dedup if dedup is not None else create_dedup_index()
+        self.workers = {
+            "extract": settings.INGEST_EXTRACT_WORKERS,
+            "chunk": settings.INGEST_CHUNK_WORKERS,
+            "embed": settings.INGEST_EMBED_WORKERS,
+            # Single writer keeps FAISS ids and chunk rows consistent
+            "index": 1,
+            "summarize": settings.INGEST_SUMMARIZE_WORKERS,
+        }
+        self.workers.update(workers or {})
+        self.workers["index"] = 1
+        # A process-pool embedder parallelizes inside embed_batch; keep enough
+        # batches in flight to occupy every worker process.
+        pool_processes = getattr(self.embedder, "processes", 0)
+        self.workers["embed"] = max(self.workers["embed"], pool_processes)
+        # Likewise, each extract thread blocks on one parse-pool process
+        parse_processes = getattr(self.extractor, "parse_processes", 0)
+        self.workers["extract"] = max(self.workers["extract"], parse_processes)
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.progress_interval = progress_interval
+
+    def run(self, work_id: int) -> Work:
+        """
+        Ingest (or resume ingesting) a work.
+
+        Returns:
+            The completed Work, detached from any session
+        """
+        db = self.session_factory()
+        repo_path = None
+        try:
+            work = db.get(Work, work_id)
+            if work is None:
+                raise ValueError(f"Work {work_id} not found")
+
+            if self.faiss_indexer.next_id == 0:
+                self.faiss_indexer.load()
+            if self.dedup is not None and len(self.dedup) == 0:
+                self.dedup.load(db)
+            if (work.metadata_ or {}).get("regenerate"):
+                self._purge(db, work)
+
+            run = _WorkRun(self, work)
+            work.ingestion_status = "processing"
+            work.ingestion_stage = "extract"
+            work.ingestion_error = None
+            work.ingestion_started_at = work.ingestion_started_at or datetime.utcnow()
+            db.commit()
+
+            logger.info("Starting ingestion", work_id=work.id, slug=work.source_slug)
+            repo_path = run.prepare_repository(db, work)
+            source = run.plan(db, work)
+
+            pipeline = StagedPipeline(
+                [StageSpec(name, getattr(run, f"stage_{name}"), self.workers[name]) for name in STAGES],
+                queue_size=self.queue_size
+            )
+            run.pipeline = pipeline
+            pipeline.run(source, on_tick=lambda: run.flush_progress(db, work), tick_seconds=self.progress_interval)
+
+            self.faiss_indexer.save()
+            run.publish(db, work)
+
+            logger.info("Ingestion complete", work_id=work.id, chunks=work.total_chunks)
+            db.refresh(work)
+            db.expunge(work)
+            return work
+        except BaseException as e:
+            db.rollback()
+            work = db.get(Work, work_id)
+            if work is not None:
+                work.ingestion_status = "failed"
+                work.ingestion_error = str(e) or type(e).__name__
+                db.commit()
+            # Keep vectors for chunks that were committed, so a resume has less to redo
+            if self.faiss_indexer.next_id:
+                self.faiss_indexer.save()
+            logger.error("Ingestion failed", work_id=work_id, error=str(e))
+            raise
+        finally:
+            if repo_path is not None:
+                self.extractor.cleanup(repo_path)
+            db.close()
+
+    def close(self):
+        """Shut down the embedder's and extractor's process pools, if any."""
+        if hasattr(self.embedder, "close"):
+            self.embedder.close()
+        self.extractor.close()
+
+    def _purge(self, db: Session, work: Work):
+        """
+        Drop a regenerated work's old chunks from the indexes, then from the
+        database. Chunk rows go last so their IDs are not reused while stale
+        vectors or documents still reference them; an interrupted purge is
+        simply repeated.
+        """
+        chunk_ids = [chunk_id for (chunk_id,) in db.query(Chunk.id).filter(Chunk.work_id == work.id)]
+        if chunk_ids:
+            removed = self.faiss_indexer.remove(chunk_ids)
+            self.faiss_indexer.save()
+            self.whoosh_indexer.remove(chunk_ids)
+            if self.dedup is not None:
+                self.dedup.remove(chunk_ids)
+            logger.info("Purged regenerated work", work_id=work.id, chunks=len(chunk_ids), vectors=removed)
+        work.chunks.clear()
+        meta = dict(work.metadata_)
+        del meta["regenerate"]
+        work.metadata_ = meta
+        db.commit()
+
+
+class _WorkRun:
+    """State shared by the stage handlers while one work is ingested."""
+
+    def __init__(self, pipeline: IngestionPipeline, work: Work):
+        self.owner = pipeline
+        self.work_id = work.id
+        self.slug = work.source_slug
+        self.version = work.version
+        self.repo_path: Optional[Path] = None
+        self.pipeline: Optional[StagedPipeline] = None
+        self.progress = ProgressTracker()
+
+        self._lock = threading.Lock()
+        self._next_index = 0
+        # path -> {start_char: chunk_index}; start offsets are unique within a
+        # file even when chunk text repeats, so they identify persisted chunks
+        self._persisted: Dict[str, Dict[int, int]] = {}
+        self._pending_files: Dict[str, int] = {}  # path -> chunks not yet indexed
+        self._completed_files: Set[str] = set()
+        # Incremental mode: unchanged files whose chunks move over from the base version
+        self.base_work_id: Optional[int] = None
+        self.carried_files: List[str] = []
+        self.carried_chunks = 0
+
+    # -- setup ---------------------------------------------------------
+
+    def prepare_repository(self, db: Session, work: Work) -> Path:
+        """Clone the repository and pin the work to the checked-out commit."""
+        meta = dict(work.metadata_ or {})
+        extractor = self.owner.extractor
+        repo_path = extractor.clone_repo(work.canonical_url, f"{work.source_slug}-{work.id}", meta.get("branch"))
+
+        if meta.get("commit"):
+            # Resumed job: ingest exactly the commit the first run started on
+            extractor.checkout(repo_path, meta["commit"])
+        else:
+            meta["commit"] = extractor.head_commit(repo_path)
+        if not work.version or work.version == "HEAD":
+            version = meta["commit"][:12]
+            existing = db.query(Work.id).filter(
+                Work.source_slug == work.source_slug, Work.version == version, Work.id != work.id
+            ).first()
+            if existing is not None:
+                raise ValueError(f"Version {version} of {work.source_slug} is already ingested (work {existing.id})")
+            work.version = version
+            self.version = work.version
+
+        repo_meta = extractor.load_metadata(repo_path)
+        meta.update({key: value for key, value in repo_meta.items() if key not in ("title", "authors", "tags")})
+        work.title = work.title or repo_meta.get("title")
+        work.authors = work.authors or repo_meta.get("authors")
+        work.tags = work.tags or repo_meta.get("tags")
+        work.metadata_ = meta
+        db.commit()
+
+        self.repo_path = repo_path
+        return repo_path
+
+    def plan(self, db: Session, work: Work) -> List:
+        """
+        Build the source items, skipping whatever an earlier run finished.
+
+        Returns:
+            Resume batches first (persisted chunks missing vectors or
+            summaries), then the files that still need extraction
+        """
+        meta = work.metadata_ or {}
+        files = self.owner.extractor.list_files(self.repo_path, meta.get("include"), meta.get("exclude"))
+        formats = Counter(SUPPORTED_FORMATS[Path(path).suffix.lower()] for path in files)
+        work.file_format = formats.most_common(1)[0][0] if formats else None
+
+        files = self._carry_over(db, work, files)
+
+        previous = (work.ingestion_progress or {}).get("completed_files", [])
+        self._completed_files = set(previous) & set(files)
+
+        rows = db.query(
+            Chunk.id, Chunk.source_path, Chunk.chunk_index, Chunk.start_char, Chunk.canonical_chunk_id
+        ).filter(Chunk.work_id == work.id).all()
+        for chunk_id, path, chunk_index, start_char, _ in rows:
+            self._persisted.setdefault(path, {})[start_char] = chunk_index
+            self._next_index = max(self._next_index, chunk_index + 1)
+        self._reserve_partial_ranges(set(self._persisted) - self._completed_files)
+
+        indexed = self.owner.faiss_indexer.chunk_ids()
+        # Aliases of near-duplicates have no vectors or summaries of their own
+        persisted_ids = [row[0] for row in rows if row[4] is None]
+        missing_vectors = [chunk_id for chunk_id in persisted_ids if chunk_id not in indexed]
+        summarized = {
+            chunk_id for (chunk_id,) in db.query(Summary.chunk_id)
+            .join(Chunk, Chunk.id == Summary.chunk_id)
+            .filter(Chunk.work_id == work.id)
+            .group_by(Summary.chunk_id)
+            .having(func.count(func.distinct(Summary.summary_level)) >= len(SUMMARY_LEVELS))
+        }
+        missing_summaries = [
+            chunk_id for chunk_id in persisted_ids
+            if chunk_id in indexed and chunk_id not in summarized
+        ]
+
+        source: List = []
+        source.extend(self._resume_batches(db, missing_vectors, needs_index=True))
+        source.extend(self._resume_batches(db, missing_summaries, needs_index=False))
+        remaining = [path for path in files if path not in self._completed_files]
+        source.extend(SourceFile(path) for path in remaining)
+
+        self.progress.set("files_total", len(files) + len(self.carried_files))
+        self.progress.set("files_skipped", len(files) - len(remaining))
+        self.progress.set("files_carried_over", len(self.carried_files))
+        self.progress.set("chunks_carried_over", self.carried_chunks)
+        self.progress.set("resumed_chunks", len(missing_vectors) + len(missing_summaries))
+        logger.info(
+            "Ingestion plan",
+            work_id=work.id,
+            files=len(files),
+            files_remaining=len(remaining),
+            chunks_missing_vectors=len(missing_vectors),
+            chunks_missing_summaries=len(missing_summaries)
+        )
+        db.commit()
+        return source
+
+    def _reserve_partial_ranges(self, paths: Set[str]):
+        """
+        Keep the whole index range of partially ingested files reserved.
+
+        Persisted chunks only show where such a file's range starts; its
+        unpersisted tail must not be handed to a fresh file, whichever
+        reaches the chunk stage first, so the files are re-chunked here.
+        """
+        for path in sorted(paths):
+            try:
+                chunks = self.owner.chunker.chunk_text(self.owner.extractor.extract(self.repo_path / path))
+            except Exception:
+                continue  # Fails again (and is reported) in stage_extract
+            persisted = self._persisted[path]
+            for chunk in chunks:
+                if chunk.start_char in persisted:
+                    base = persisted[chunk.start_char] - chunk.chunk_index
+                    self._next_index = max(self._next_index, base + len(chunks))
+                    break
+
+    def _carry_over(self, db: Session, work: Work, files: List[str]) -> List[str]:
+        """
+        Incremental mode: split off files that are unchanged since the base version.
+
+        Their chunks (with embeddings, summaries and index entries) are moved
+        to this work by publish(); only the returned files are processed.
+        Falls back to a full ingest if the base cannot be diffed or was
+        chunked or embedded with different settings.
+        """
+        base = db.get(Work, work.base_work_id) if work.base_work_id else None
+        if base is None:
+            return files
+        base_commit = (base.metadata_ or {}).get("commit")
+        sample = db.query(Chunk).filter(Chunk.work_id == base.id).first()
+        embedding = db.query(Embedding).filter(Embedding.chunk_id == sample.id).first() if sample else None
+        reason = None
+        if base.ingestion_status != "completed" or not base_commit or sample is None:
+            reason = "base version is not a completed ingestion"
+        elif (sample.chunking_strategy, sample.chunking_params) != (
+            self.owner.chunker.STRATEGY, self.owner.chunker.get_metadata()
+        ):
+            reason = "chunking settings changed"
+        elif embedding is None or embedding.model_name != self.owner.embedder.model_name:
+            reason = "embedding model changed"
+        if reason is None:
+            try:
+                changed = self.owner.extractor.changed_files(self.repo_path, base_commit)
+            except Exception as e:
+                reason = f"cannot diff against {base_commit[:12]}: {e}"
+        if reason is not None:
+            logger.warning("Incremental ingestion unavailable, ingesting all files", work_id=work.id, reason=reason)
+            work.base_work_id = None
+            return files
+
+        base_files = {
+            path: count for path, count in
+            db.query(Chunk.source_path, func.count(Chunk.id))
+            .filter(Chunk.work_id == base.id)
+            .group_by(Chunk.source_path)
+        }
+        self.base_work_id = base.id
+        self.carried_files = [path for path in files if path in base_files and path not in changed]
+        self.carried_chunks = sum(base_files[path] for path in self.carried_files)
+        # New chunks take indexes after the base's so carried ranges stay untouched
+        base_max = db.query(func.max(Chunk.chunk_index)).filter(Chunk.work_id == base.id).scalar()
+        self._next_index = max(self._next_index, (base_max or 0) + 1)
+
+        carried = set(self.carried_files)
+        logger.info(
+            "Incremental ingestion",
+            work_id=work.id,
+            base_work_id=base.id,
+            changed=len(changed),
+            carried_files=len(carried),
+            carried_chunks=self.carried_chunks
+        )
+        return [path for path in files if path not in carried]
+
+    def publish(self, db: Session, work: Work):
+        """
+        Make this version the searchable one for its slug.
+
+        Carried-over chunks move from the base version and the current flag
+        flips in the same transaction, so readers see either the old version
+        or the complete new one.
+        """
+        for start in range(0, len(self.carried_files), 500):
+            db.query(Chunk).filter(
+                Chunk.work_id == self.base_work_id,
+                Chunk.source_path.in_(self.carried_files[start:start + 500])
+            ).update({Chunk.work_id: work.id}, synchronize_session=False)
+        previous = db.query(Work).filter(
+            Work.source_slug == work.source_slug, Work.id != work.id, Work.is_current.is_(True)
+        ).all()
+        for old in previous:
+            old.is_current = False
+            old.total_chunks = db.query(Chunk).filter(Chunk.work_id == old.id).count()
+            old.metadata_ = {**(old.metadata_ or {}), "superseded_by": work.id}
+
+        work.is_current = True
+        work.total_chunks = db.query(Chunk).filter(Chunk.work_id == work.id).count()
+        work.ingestion_status = "completed"
+        work.ingestion_stage = None
+        work.ingestion_completed_at = datetime.utcnow()
+        self.carried_chunks = 0  # Now counted in total_chunks
+        self.flush_progress(db, work)  # Commits
+
+    def _resume_batches(self, db: Session, chunk_ids: List[int], needs_index: bool) -> Iterator[ChunkBatch]:
+        size = self.owner.batch_size
+        for start in range(0, len(chunk_ids), size):
+            rows = db.query(Chunk).filter(Chunk.id.in_(chunk_ids[start:start + size])).order_by(Chunk.id).all()
+            yield ChunkBatch(
+                chunks=[
+                    PendingChunk(
+                        text=row.text,
+                        source_path=row.source_path,
+                        chunk_index=row.chunk_index,
+                        token_count=row.token_count,
+                        start_char=row.start_char,
+                        end_char=row.end_char,
+                        chunk_hash=row.chunk_hash,
+                        chunk_id=row.id
+                    )
+                    for row in rows
+                ],
+                needs_index=needs_index
+            )
+
+    # -- progress ------------------------------------------------------
+
+    def flush_progress(self, db: Session, work: Work):
+        """Write counters to the Work row (called from the coordinating thread)."""
+        snapshot = self.progress.snapshot()
+        with self._lock:
+            snapshot["completed_files"] = sorted(self._completed_files)
+        if self.pipeline is not None:
+            snapshot["queue_depths"] = self.pipeline.queue_depths()
+            if work.ingestion_status == "processing":
+                work.ingestion_stage = self.pipeline.active_stage() or work.ingestion_stage
+        snapshot["updated_at"] = datetime.utcnow().isoformat()
+        work.ingestion_progress = snapshot
+        if work.ingestion_status == "processing":
+            work.total_chunks = self.carried_chunks + snapshot["stages"]["index"].get("chunks", 0) + sum(
+                len(offsets) for offsets in self._persisted.values()
+            )
+        db.commit()
+
+    def _file_indexed(self, path: str, count: int):
+        with self._lock:
+            left = self._pending_files.get(path, 0) - count
+            self._pending_files[path] = left
+            if left <= 0:
+                self._pending_files.pop(path, None)
+                self._completed_files.add(path)
+
+    # -- stages --------------------------------------------------------
+
+    def stage_extract(self, item) -> Iterator:
+        if not isinstance(item, SourceFile):
+            yield item
+            return
+        try:
+            text = self.owner.extractor.extract(self.repo_path / item.path)
+        except Exception as e:
+            # One unreadable file should not fail the whole work
+            logger.warning("Extraction failed", path=item.path, error=str(e))
+            self.progress.add("extract", "errors")
+            return
+        self.progress.add("extract", "files")
+        yield Document(item.path, text)
+
+    def stage_chunk(self, item) -> Iterator:
+        if not isinstance(item, Document):
+            yield item
+            return
+        chunks = self.owner.chunker.chunk_text(item.text)
+        persisted = self._persisted.get(item.path, {})
+
+        # Reuse the index range of a partially ingested file, otherwise
+        # reserve a fresh contiguous range so a file's chunks stay adjacent.
+        base = None
+        for chunk in chunks:
+            if chunk.start_char in persisted:
+                base = persisted[chunk.start_char] - chunk.chunk_index
+                break
+        with self._lock:
+            if base is None:
+                base = self._next_index
+                self._next_index += len(chunks)
+            todo = [chunk for chunk in chunks if chunk.start_char not in persisted]
+            self._pending_files[item.path] = len(todo)
+
+        self.progress.add("chunk", "files")
+        self.progress.add("chunk", "chunks", len(todo))
+        if not todo:
+            self._file_indexed(item.path, 0)
+            return
+
+        hasher = self.owner.dedup.hasher if self.owner.dedup is not None else None
+        pending = [
+            PendingChunk(
+                text=chunk.text,
+                source_path=item.path,
+                chunk_index=base + chunk.chunk_index,
+                token_count=chunk.token_count,
+                start_char=chunk.start_char,
+                end_char=chunk.end_char,
+                chunk_hash=chunk.chunk_hash,
+                minhash=hasher.signature(chunk.text) if hasher is not None else None
+            )
+            for chunk in todo
+        ]
+        size = self.owner.batch_size
+        for start in range(0, len(pending), size):
+            yield ChunkBatch(chunks=pending[start:start + size])
+
+    def stage_embed(self, batch: ChunkBatch) -> Iterator:
+        if batch.needs_index and batch.vectors is None:
+            dedup = self.owner.dedup
+            if dedup is not None:
+                # Near-duplicates of chunks indexed so far need no vector
+                for chunk in batch.chunks:
+                    if chunk.chunk_id is None and chunk.minhash is not None:
+                        match = dedup.find(chunk.minhash)
+                        if match is not None:
+                            chunk.canonical_chunk_id = match[0]
+            texts = [chunk.text for chunk in batch.chunks if chunk.canonical_chunk_id is None]
+            batch.vectors = np.asarray(
+                self.owner.embedder.embed_batch(texts, batch_size=self.owner.batch_size),
+                dtype=np.float32
+            ) if texts else np.zeros((0, 0), dtype=np.float32)
+            self.progress.add("embed", "chunks", len(texts))
+            if len(texts) < len(batch.chunks):
+                self.progress.add("embed", "skipped_duplicates", len(batch.chunks) - len(texts))
+        yield batch
+
+    def stage_index(self, batch: ChunkBatch) -> Iterator:
+        if not batch.needs_index:
+            yield batch
+            return
+        owner = self.owner
+        embedded = [chunk for chunk in batch.chunks if chunk.canonical_chunk_id is None]
+        vector_of = {id(chunk): vector for chunk, vector in zip(embedded, batch.vectors)}
+        in_batch = self._find_duplicates(batch)
+        db = owner.session_factory()
+        try:
+            new_rows = []
+            for chunk in batch.chunks:
+                if chunk.chunk_id is None:
+                    row = Chunk(
+                        work_id=self.work_id,
+                        chunk_index=chunk.chunk_index,
+                        text=chunk.text,
+                        token_count=chunk.token_count,
+                        start_char=chunk.start_char,
+                        end_char=chunk.end_char,
+                        source_path=chunk.source_path,
+                        chunk_hash=chunk.chunk_hash,
+                        chunking_strategy=owner.chunker.STRATEGY,
+                        chunking_params=owner.chunker.get_metadata(),
+                        canonical_chunk_id=chunk.canonical_chunk_id,
+                        minhash=chunk.minhash.tobytes() if chunk.minhash is not None else None
+                    )
+                    db.add(row)
+                    new_rows.append((chunk, row))
+            db.flush()
+            for chunk, row in new_rows:
+                chunk.chunk_id = row.id
+            for alias, row in new_rows:
+                if id(alias) in in_batch:
+                    alias.canonical_chunk_id = row.canonical_chunk_id = in_batch[id(alias)].chunk_id
+
+            indexed = [chunk for chunk in batch.chunks if chunk.canonical_chunk_id is None]
+            vectors = (
+                np.stack([vector_of[id(chunk)] for chunk in indexed]) if indexed
+                else np.zeros((0, owner.faiss_indexer.vector_dim), dtype=np.float32)
+            )
+            chunk_ids = [chunk.chunk_id for chunk in indexed]
+            faiss_ids = owner.faiss_indexer.add_batch(chunk_ids, vectors, work_slug=self.slug) if indexed else []
+            existing = {
+                e.chunk_id: e for e in db.query(Embedding).filter(Embedding.chunk_id.in_(chunk_ids))
+            }
+            for chunk, vector, faiss_id in zip(indexed, vectors, faiss_ids):
+                record = existing.get(chunk.chunk_id) or Embedding(chunk_id=chunk.chunk_id)
+                record.model_name = owner.embedder.model_name
+                record.vector_dim = int(vector.shape[0])
+                record.embedding_hash = owner.embedder.hash_embedding(vector)
+                record.faiss_index_id = faiss_id
+                db.add(record)
+
+            owner.whoosh_indexer.add_batch([
+                {
+                    "chunk_id": chunk.chunk_id,
+                    "text": chunk.text,
+                    "work_slug": self.slug,
+                    "version": self.version,
+                    "chunk_index": chunk.chunk_index
+                }
+                for chunk in indexed
+            ])
+            db.commit()
+        except BaseException:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        if owner.dedup is not None:
+            for chunk, _ in new_rows:
+                if chunk.canonical_chunk_id is None and chunk.minhash is not None:
+                    owner.dedup.add(chunk.chunk_id, chunk.minhash)
+        aliased = sum(1 for chunk, _ in new_rows if chunk.canonical_chunk_id is not None)
+        if aliased:
+            self.progress.add("index", "aliased", aliased)
+        self.progress.add("index", "chunks", len(new_rows))
+        self.progress.add("index", "reindexed", len(batch.chunks) - len(new_rows))
+        per_file = Counter(chunk.source_path for chunk, _ in new_rows)
+        for path, count in per_file.items():
+            self._file_indexed(path, count)
+
+        batch.vectors = None  # Not needed downstream; release memory early
+        yield batch
+
+    def _find_duplicates(self, batch: ChunkBatch) -> Dict[int, PendingChunk]:
+        """
+        Last near-duplicate check before new chunks are written (single index
+        worker, so decisions follow arrival order). Matches against indexed
+        chunks set canonical_chunk_id directly; matches against an earlier
+        new chunk of the same batch are returned as {id(alias): canonical}.
+        """
+        dedup = self.owner.dedup
+        in_batch: Dict[int, PendingChunk] = {}
+        if dedup is None:
+            return in_batch
+        fresh: List[PendingChunk] = []
+        for chunk in batch.chunks:
+            if chunk.chunk_id is not None or chunk.minhash is None or chunk.canonical_chunk_id is not None:
+                continue
+            match = dedup.find(chunk.minhash)
+            if match is not None:
+                chunk.canonical_chunk_id = match[0]
+                continue
+            twin = next((c for c in fresh if similarity(c.minhash, chunk.minhash) >= dedup.threshold), None)
+            if twin is not None:
+                in_batch[id(chunk)] = twin
+            else:
+                fresh.append(chunk)
+        return in_batch
+
+    def stage_summarize(self, batch: ChunkBatch) -> Iterator:
+        owner = self.owner
+        chunks = [chunk for chunk in batch.chunks if chunk.canonical_chunk_id is None]
+        db = owner.session_factory()
+        try:
+            chunk_ids = [chunk.chunk_id for chunk in chunks]
+            have = {
+                (chunk_id, level) for chunk_id, level in
+                db.query(Summary.chunk_id, Summary.summary_level).filter(Summary.chunk_id.in_(chunk_ids))
+            }
+            for chunk in chunks:
+                levels = owner.summarizer.summarize(chunk.text)
+                for level in SUMMARY_LEVELS:
+                    if (chunk.chunk_id, level) in have:
+                        continue
+                    db.add(Summary(
+                        chunk_id=chunk.chunk_id,
+                        summary_level=level,
+                        summary_text=levels[level],
+                        char_count=len(levels[level]),
+                        llm_model=owner.summarizer.model_name,
+                        prompt_hash=owner.summarizer.prompt_hash(level),
+                        temperature=owner.summarizer.temperature
+                    ))
+            db.commit()
+        except BaseException:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        self.progress.add("summarize", "chunks", len(chunks))
+        return iter(())
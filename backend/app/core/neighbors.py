@@ -0,0 +1,192 @@
+
+"""
+Chunk neighbor index for citation context windows.
+
+Two int32 arrays indexed by chunk_id hold the previous and next chunk of
+the same file (same work and source_path, consecutive chunk_index), or -1.
+A ±k window is then a walk along the arrays with no database access, and
+window text, when needed, is one batched read for all windows.
+
+The index is built from one ordered scan of the chunks table on first use
+and kept current incrementally: chunks with IDs above the highest one seen
+cause their works to be relinked. That check runs when a lookup misses and
+at most every NEIGHBOR_INDEX_REFRESH_SECONDS otherwise, so chunks written
+by the ingestion worker process are picked up without a restart.
+"""
+from typing import Dict, Iterable, List, Optional
+import threading
+import time
+import weakref
+
+import numpy as np
+from fastapi import Depends
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+import structlog
+
+from app.config import settings
+from app.db.models import Chunk
+from app.db.session import get_db
+
+logger = structlog.get_logger()
+
+NONE = -1
+
+
+class NeighborIndex:
+    """prev/next chunk IDs by chunk_id (see module docstring)."""
+
+    def __init__(self, refresh_seconds: float = settings.NEIGHBOR_INDEX_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.prev = np.full(0, NONE, dtype=np.int32)
+        self.next = np.full(0, NONE, dtype=np.int32)
+        self.known = np.zeros(0, dtype=bool)
+        self.max_chunk_id = 0
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return int(self.known.sum())
+
+    @property
+    def nbytes(self) -> int:
+        return self.prev.nbytes + self.next.nbytes + self.known.nbytes
+
+    def _grow(self, max_id: int):
+        if max_id < len(self.prev):
+            return
+        size = max(max_id + 1, int(len(self.prev) * 1.5))
+        for name, fill, dtype in (("prev", NONE, np.int32), ("next", NONE, np.int32), ("known", False, bool)):
+            grown = np.full(size, fill, dtype=dtype)
+            old = getattr(self, name)
+            grown[:len(old)] = old
+            setattr(self, name, grown)
+
+    def _link(self, rows: List):
+        """Link rows of (id, work_id, source_path) ordered by work and chunk_index."""
+        if not rows:
+            return
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        works = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+        paths = np.array([row[2] for row in rows], dtype=object)
+        self._grow(int(ids.max()))
+        # Row i follows row i-1 when both belong to the same file
+        follows = np.zeros(len(rows), dtype=bool)
+        follows[1:] = (works[1:] == works[:-1]) & (paths[1:] == paths[:-1])
+        self.prev[ids] = NONE
+        self.next[ids] = NONE
+        self.prev[ids[follows]] = ids[np.flatnonzero(follows) - 1]
+        self.next[ids[np.flatnonzero(follows) - 1]] = ids[follows]
+        self.known[ids] = True
+        self.max_chunk_id = max(self.max_chunk_id, int(ids.max()))
+
+    @staticmethod
+    def _scan(db: Session, work_ids: Optional[Iterable[int]] = None) -> List:
+        query = db.query(Chunk.id, Chunk.work_id, Chunk.source_path)
+        if work_ids is not None:
+            query = query.filter(Chunk.work_id.in_(list(work_ids)))
+        # Ordered by (work_id, chunk_index): served by idx_chunk_work_index
+        return query.order_by(Chunk.work_id, Chunk.chunk_index).all()
+
+    def build(self, db: Session) -> "NeighborIndex":
+        """Link every chunk (one ordered scan)."""
+        start = time.perf_counter()
+        with self._lock:
+            rows = self._scan(db)
+            self._link(rows)
+            self._checked_at = time.monotonic()
+        logger.info("Neighbor index built", chunks=len(rows), seconds=round(time.perf_counter() - start, 3))
+        return self
+
+    def refresh(self, db: Session) -> int:
+        """
+        Relink works that gained chunks since the last build or refresh.
+
+        Returns:
+            Number of new chunks
+        """
+        with self._lock:
+            self._checked_at = time.monotonic()
+            newest = db.query(func.max(Chunk.id)).scalar() or 0
+            if newest <= self.max_chunk_id:
+                return 0
+            work_ids = [
+                work_id for (work_id,) in
+                db.query(Chunk.work_id).filter(Chunk.id > self.max_chunk_id).distinct()
+            ]
+            before = self.max_chunk_id
+            self._link(self._scan(db, work_ids))
+            added = int(self.known[before + 1:].sum())
+        logger.info("Neighbor index refreshed", new_chunks=added, works=len(work_ids))
+        return added
+
+    def _ensure(self, db: Session, chunk_ids: Iterable[int]):
+        stale = time.monotonic() - self._checked_at >= self.refresh_seconds
+        if stale or any(cid >= len(self.known) or not self.known[cid] for cid in chunk_ids):
+            self.refresh(db)
+
+    def window(self, chunk_id: int, k: int = settings.CONTEXT_WINDOW_CHUNKS) -> List[int]:
+        """Chunk IDs from k before to k after chunk_id, in document order (fewer at file edges)."""
+        if chunk_id >= len(self.known) or not self.known[chunk_id]:
+            return [chunk_id]
+        before, cursor = [], chunk_id
+        for _ in range(k):
+            cursor = int(self.prev[cursor])
+            if cursor == NONE:
+                break
+            before.append(cursor)
+        after, cursor = [], chunk_id
+        for _ in range(k):
+            cursor = int(self.next[cursor])
+            if cursor == NONE:
+                break
+            after.append(cursor)
+        return before[::-1] + [chunk_id] + after
+
+    def windows(
+        self, db: Session, chunk_ids: Iterable[int], k: int = settings.CONTEXT_WINDOW_CHUNKS
+    ) -> Dict[int, List[int]]:
+        """Windows of several chunks; refreshes first if any is unknown or the index is due a check."""
+        chunk_ids = list(chunk_ids)
+        self._ensure(db, chunk_ids)
+        return {chunk_id: self.window(chunk_id, k) for chunk_id in chunk_ids}
+
+    @staticmethod
+    def load_windows(db: Session, windows: Dict[int, List[int]], with_text: bool = True) -> Dict[int, List[Dict]]:
+        """
+        Rows of every window in one query.
+
+        Args:
+            db: Database session
+            windows: {chunk_id: window chunk IDs}, as returned by windows()
+            with_text: Also load chunk text (otherwise only IDs and positions)
+
+        Returns:
+            {chunk_id: [{chunk_id, chunk_index, source_path[, text]}, ...]} in window order
+        """
+        wanted = {cid for window in windows.values() for cid in window}
+        if not wanted:
+            return {}
+        columns = [Chunk.id, Chunk.chunk_index, Chunk.source_path] + ([Chunk.text] if with_text else [])
+        rows = {row[0]: row for row in db.query(*columns).filter(Chunk.id.in_(wanted))}
+        keys = ("chunk_id", "chunk_index", "source_path", "text")
+        return {
+            center: [dict(zip(keys, rows[cid])) for cid in window if cid in rows]
+            for center, window in windows.items()
+        }
+
+
+_neighbor_indexes: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_neighbor_lock = threading.Lock()
+
+
+def get_neighbor_index(db: Session = Depends(get_db)) -> NeighborIndex:
+    """Process-wide neighbor index for the session's database, built on first use."""
+    bind = db.get_bind()
+    index = _neighbor_indexes.get(bind)
+    if index is None:
+        with _neighbor_lock:
+            index = _neighbor_indexes.get(bind)
+            if index is None:
+                index = _neighbor_indexes[bind] = NeighborIndex().build(db)
+    return index
@@ -0,0 +1,425 @@
+
+"""
+Hybrid retrieval: FAISS (semantic) + Whoosh BM25 (lexical).
+Scores are min-max normalized per leg and fused as
+SEMANTIC_WEIGHT * semantic + LEXICAL_WEIGHT * lexical.
+With RETRIEVAL_MODE=hierarchical the semantic leg searches only the
+sections the query is routed to (see app.core.hierarchy). Queries whose
+constraints ask for diversity are re-ranked by MMR after fusion (see
+app.core.diversity).
+"""
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import threading
+import time
+
+import numpy as np
+from fastapi import Depends
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+import structlog
+
+from app.config import settings
+from app.core.diversity import Diversity, diversity_options, mmr
+from app.core.embedding_service import QueryEmbeddingService, get_query_embedder
+from app.core.hierarchy import SectionIndex, get_section_index
+from app.core.hydration import ChunkHydrator, WorkRef, get_chunk_hydrator
+from app.core.indexer import FAISSIndexer, ShardedFAISSIndexer, WhooshIndexer, create_semantic_indexer
+from app.core.neighbors import NeighborIndex, get_neighbor_index
+from app.core.snapshots import IndexSnapshots, SnapshotWatcher
+from app.db.session import get_db
+from app.utils.metrics import stage_timer
+
+logger = structlog.get_logger()
+
+
+def normalize_scores(scores: List[float]) -> List[float]:
+    """
+    Min-max normalization to [0, 1].
+    All-equal scores normalize to 1.0.
+    """
+    if not scores:
+        return []
+    low, high = min(scores), max(scores)
+    if high == low:
+        return [1.0] * len(scores)
+    return [(s - low) / (high - low) for s in scores]
+
+
+class HybridRetriever:
+    """
+    Combines semantic (FAISS) and lexical (Whoosh BM25) search.
+
+    The two legs run concurrently; the query embedding goes through the
+    shared QueryEmbeddingService so concurrent requests batch together.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        embedder: QueryEmbeddingService,
+        faiss_indexer: FAISSIndexer,
+        whoosh_indexer: WhooshIndexer,
+        semantic_weight: float = settings.SEMANTIC_WEIGHT,
+        lexical_weight: float = settings.LEXICAL_WEIGHT,
+        neighbors: Optional[NeighborIndex] = None,
+        hydrator: Optional[ChunkHydrator] = None,
+        hierarchy: Optional[SectionIndex] = None,
+        mmr_candidates: int = settings.MMR_CANDIDATES
+    ):
+        self.db = db
+        self.embedder = embedder
+        self.faiss_indexer = faiss_indexer
+        self.whoosh_indexer = whoosh_indexer
+        self.semantic_weight = semantic_weight
+        self.lexical_weight = lexical_weight
+        self.neighbors = neighbors
+        self.hydrator = hydrator if hydrator is not None else ChunkHydrator(max_chunks=0)
+        self.hierarchy = hierarchy
+        self.mmr_candidates = mmr_candidates
+
+    async def semantic_search(self, query: str, k: int, filters: Optional[Dict] = None) -> List[Dict]:
+        """
+        Embed the query and search FAISS; with a section index, only the
+        chunks of the sections the query is routed to.
+        """
+        with stage_timer("embed"):
+            embedding = await self.embedder.embed(query)
+        candidates = None
+        if self.hierarchy is not None:
+            with stage_timer("routing"):
+                candidates = await run_in_threadpool(
+                    self.hierarchy.route, self.db, self.faiss_indexer, embedding, filters
+                )
+        with stage_timer("semantic_search"):
+            if candidates is None:
+                return await run_in_threadpool(self.faiss_indexer.search, embedding, k)
+            return await run_in_threadpool(self.faiss_indexer.search, embedding, k, within=candidates.positions)
+
+    async def lexical_search(self, query: str, k: int, filters: Optional[Dict] = None) -> List[Dict]:
+        """
+        BM25 search, restricted to a work_slug filter if given.
+
+        Version is checked during hydration instead: chunks carried over by
+        incremental ingestion keep the version they were first indexed under.
+        """
+        whoosh_filters = {"work_slug": filters["work_slug"]} if filters and "work_slug" in filters else {}
+        with stage_timer("lexical_search"):
+            return await run_in_threadpool(self.whoosh_indexer.search, query, k, whoosh_filters)
+
+    def fuse(self, semantic_results: List[Dict], lexical_results: List[Dict]) -> List[Dict]:
+        """
+        Merge both legs into one list ranked by hybrid score.
+        Ties break on chunk_id so ranking is deterministic.
+        """
+        semantic_scores = normalize_scores([r["score"] for r in semantic_results])
+        lexical_scores = normalize_scores([r["score"] for r in lexical_results])
+
+        fused: Dict[int, Dict] = {}
+        for result, score in zip(semantic_results, semantic_scores):
+            fused[result["chunk_id"]] = {
+                "chunk_id": result["chunk_id"], "semantic_score": score, "lexical_score": 0.0
+            }
+        for result, score in zip(lexical_results, lexical_scores):
+            entry = fused.setdefault(result["chunk_id"], {
+                "chunk_id": result["chunk_id"], "semantic_score": 0.0, "lexical_score": 0.0
+            })
+            entry["lexical_score"] = score
+
+        for entry in fused.values():
+            entry["hybrid_score"] = (
+                self.semantic_weight * entry["semantic_score"]
+                + self.lexical_weight * entry["lexical_score"]
+            )
+        return sorted(fused.values(), key=lambda e: (-e["hybrid_score"], e["chunk_id"]))
+
+    def hydrate(self, ranked: List[Dict], top_k: int, filters: Optional[Dict] = None) -> List[Dict]:
+        """
+        Resolve ranked hits to results, apply filters and keep top_k.
+        Only the current version of each work is visible. A hit on a chunk
+        with near-duplicate aliases (see app.core.dedup) is reported once,
+        as the first visible copy, with the other copies' retrieval IDs in
+        "aliases". With a neighbor index, each result also lists its
+        context_window chunk IDs.
+
+        With diversity constraints, every visible hit is resolved and
+        diversify picks top_k of them.
+
+        Results carry no text; load_text adds it to those that need it.
+        """
+        if not ranked:
+            return []
+        diversity = diversity_options(filters)
+        copies, works = self.hydrator.copies(self.db, [entry["chunk_id"] for entry in ranked])
+
+        results, indexed_ids = [], []
+        for entry in ranked:
+            # Missing: deleted chunk, or one left behind on a superseded version
+            visible = [
+                ref for ref in copies.get(entry["chunk_id"], ())
+                if ref.work_id in works and _matches(works[ref.work_id], filters)
+            ]
+            if not visible:
+                continue
+            chunk, work = visible[0], works[visible[0].work_id]
+            results.append({
+                "retrieval_id": chunk.retrieval_id,
+                "chunk_id": chunk.chunk_id,
+                "work_slug": work.source_slug,
+                "version": work.version,
+                "chunk_index": chunk.chunk_index,
+                "semantic_score": entry["semantic_score"],
+                "lexical_score": entry["lexical_score"],
+                "hybrid_score": entry["hybrid_score"],
+                "work_title": work.title,
+                "work_url": work.canonical_url,
+                "aliases": [alias.retrieval_id for alias in visible[1:]],
+            })
+            indexed_ids.append(entry["chunk_id"])  # The reported copy may be an alias with no vector
+            if len(results) == top_k and diversity is None:
+                break
+        if diversity is not None:
+            results = self.diversify(results, indexed_ids, top_k, diversity)
+        if self.neighbors is not None and results:
+            windows = self.neighbors.windows(self.db, [result["chunk_id"] for result in results])
+            for result in results:
+                result["context_window"] = windows[result["chunk_id"]]
+        return results
+
+    def diversify(self, results: List[Dict], chunk_ids: List[int], top_k: int, diversity: Diversity) -> List[Dict]:
+        """
+        Pick top_k of the ranked results by MMR, comparing them by the
+        vectors of chunk_ids (their indexed chunks) in the semantic index.
+        Without vectors by position (SEMANTIC_SHARDS), only the per-work
+        cap applies.
+        """
+        with stage_timer("diversity"):
+            vectors = np.zeros((len(results), self.faiss_indexer.vector_dim), dtype=np.float32)
+            if hasattr(self.faiss_indexer, "positions"):
+                positions = self.faiss_indexer.positions(chunk_ids)
+                found = positions >= 0
+                if found.any():
+                    vectors[found] = self.faiss_indexer.rows(positions[found])
+            _, works = np.unique([result["work_slug"] for result in results], return_inverse=True)
+            picks = mmr(
+                np.array([result["hybrid_score"] for result in results], dtype=np.float32),
+                vectors, top_k, diversity.mmr_lambda, works, diversity.max_per_work
+            )
+            return [results[i] for i in picks]
+
+    def load_text(self, results: List[Dict], max_chars: Optional[int] = None) -> List[Dict]:
+        """Add "text" (at most max_chars of it) to results, in one query."""
+        with stage_timer("hydration"):
+            return self.hydrator.load_text(self.db, results, max_chars)
+
+    def candidates(self, top_k: int, filters: Optional[Dict] = None) -> int:
+        """Hits each search leg returns: 2 x top_k, or at least mmr_candidates for a diversified query."""
+        if diversity_options(filters) is None:
+            return top_k * 2
+        return max(top_k * 2, self.mmr_candidates)
+
+    async def retrieve(self, query: str, top_k: int = settings.TOP_K, filters: Optional[Dict] = None) -> List[Dict]:
+        """
+        Hybrid retrieval combining semantic and lexical search.
+
+        Args:
+            query: Search query string
+            top_k: Number of results to return
+            filters: Optional constraints {work_slug, version, tags, mmr_lambda, max_per_work}
+
+        Returns:
+            Ranked results with retrieval IDs and scores
+        """
+        k = self.candidates(top_k, filters)
+        semantic_results, lexical_results = await asyncio.gather(
+            self.semantic_search(query, k, filters),
+            self.lexical_search(query, k, filters)
+        )
+        return self._fuse_and_hydrate(semantic_results, lexical_results, top_k, filters)
+
+    async def retrieve_progressive(
+        self,
+        query: str,
+        top_k: int = settings.TOP_K,
+        filters: Optional[Dict] = None
+    ) -> AsyncIterator[Tuple[str, List[Dict]]]:
+        """
+        Hybrid retrieval that also reports the first leg to finish.
+
+        Yields ("semantic" or "lexical", results of that leg alone), then
+        ("fused", the same results retrieve() returns). Results have the
+        shape retrieve() returns; early results rank by the one leg's score.
+        """
+        k = self.candidates(top_k, filters)
+        semantic = asyncio.ensure_future(self.semantic_search(query, k, filters))
+        lexical = asyncio.ensure_future(self.lexical_search(query, k, filters))
+        try:
+            done, _ = await asyncio.wait({semantic, lexical}, return_when=asyncio.FIRST_COMPLETED)
+            first = lexical if lexical in done else semantic  # Lexical wins ties: it needs no embedding
+            leg_results = first.result()
+            with stage_timer("hydration"):
+                if first is semantic:
+                    early = self.hydrate(self.fuse(leg_results, []), top_k, filters)
+                else:
+                    early = self.hydrate(self.fuse([], leg_results), top_k, filters)
+            yield ("semantic" if first is semantic else "lexical"), early
+            semantic_results, lexical_results = await semantic, await lexical
+            yield "fused", self._fuse_and_hydrate(semantic_results, lexical_results, top_k, filters)
+        finally:
+            for task in (semantic, lexical):
+                task.cancel()
+
+    def _fuse_and_hydrate(
+        self,
+        semantic_results: List[Dict],
+        lexical_results: List[Dict],
+        top_k: int,
+        filters: Optional[Dict]
+    ) -> List[Dict]:
+        with stage_timer("fusion"):
+            ranked = self.fuse(semantic_results, lexical_results)
+        with stage_timer("hydration"):
+            results = self.hydrate(ranked, top_k, filters)
+        logger.info(
+            "Retrieval complete",
+            semantic=len(semantic_results),
+            lexical=len(lexical_results),
+            results_count=len(results)
+        )
+        return results
+
+
+def _matches(work: WorkRef, filters: Optional[Dict]) -> bool:
+    if not work.is_current:
+        return False
+    if not filters:
+        return True
+    if "work_slug" in filters and work.source_slug != filters["work_slug"]:
+        return False
+    if "version" in filters and work.version != filters["version"]:
+        return False
+    if filters.get("tags") and not set(work.tags or []) & set(filters["tags"]):
+        return False
+    return True
+
+
+_indexes: Optional[Tuple[FAISSIndexer, WhooshIndexer]] = None
+_indexes_lock = threading.Lock()
+_indexes_stamp: Optional[Tuple[int, ...]] = None  # Saved index the local semantic index was loaded from
+_indexes_checked_at = 0.0
+_snapshot_generation: Optional[int] = None
+_snapshot_watcher: Optional[SnapshotWatcher] = None
+
+
+def _saved_index_stamp(faiss_indexer) -> Tuple[int, ...]:
+    """Modification times of the saved index's mapping files, which every save replaces last."""
+    path = Path(faiss_indexer.index_path)
+    files = list(path.glob("*_mapping.pkl")) + list(path.glob("shard-*/*_mapping.pkl"))
+    return tuple(sorted(file.stat().st_mtime_ns for file in files))
+
+
+def _load_semantic_indexer() -> Tuple[FAISSIndexer, Tuple[int, ...]]:
+    """The semantic index saved in INDEX_DIR, and the stamp of the save it was loaded from."""
+    faiss_indexer = create_semantic_indexer(search_processes=settings.SEMANTIC_SEARCH_PROCESSES)
+    # Stamped before loading, so a save racing the load triggers another reload
+    stamp = _saved_index_stamp(faiss_indexer)
+    faiss_indexer.load()
+    if isinstance(faiss_indexer, ShardedFAISSIndexer):
+        faiss_indexer.start_search_pool()  # No-op unless SEMANTIC_SEARCH_PROCESSES > 0
+    return faiss_indexer, stamp
+
+
+def _refresh_semantic_index():
+    """Reload the local semantic index if the ingestion worker saved a newer one (call under _indexes_lock)."""
+    global _indexes, _indexes_stamp, _indexes_checked_at
+    _indexes_checked_at = time.monotonic()
+    faiss_indexer, whoosh_indexer = _indexes
+    stamp = _saved_index_stamp(faiss_indexer)
+    if stamp == _indexes_stamp:
+        return
+    if isinstance(faiss_indexer, ShardedFAISSIndexer) and faiss_indexer.search_processes > 0:
+        # Shards live in the search workers, which reload them in turn
+        for shard in range(faiss_indexer.num_shards):
+            faiss_indexer.reload_shard(shard)
+    else:
+        # A new object, so requests already searching keep a consistent index
+        faiss_indexer, stamp = _load_semantic_indexer()
+        _indexes = (faiss_indexer, whoosh_indexer)
+    _indexes_stamp = stamp
+    logger.info("Reloaded semantic index", vectors=_indexes[0].next_id)
+
+
+def get_search_indexes() -> Tuple[FAISSIndexer, WhooshIndexer]:
+    """
+    Process-wide FAISS and Whoosh indexes, loaded on first use: from the
+    newest published snapshot with INDEX_SNAPSHOTS (see app.core.snapshots),
+    otherwise (or while none is published) from INDEX_DIR.
+
+    A semantic index loaded from INDEX_DIR is reloaded once the ingestion
+    worker saves a newer one, checked at most every
+    SEARCH_INDEX_REFRESH_SECONDS. Whoosh searchers see new commits as is.
+    """
+    global _indexes, _snapshot_generation, _indexes_stamp, _indexes_checked_at
+    if _indexes is None:
+        with _indexes_lock:
+            latest = IndexSnapshots().load_latest() if _indexes is None and settings.INDEX_SNAPSHOTS else None
+            if latest is not None:
+                _snapshot_generation, _indexes = latest
+            elif _indexes is None:
+                faiss_indexer, _indexes_stamp = _load_semantic_indexer()
+                _indexes = (faiss_indexer, WhooshIndexer())
+                _indexes_checked_at = time.monotonic()
+    elif _snapshot_generation is None and \
+            time.monotonic() - _indexes_checked_at >= settings.SEARCH_INDEX_REFRESH_SECONDS:
+        with _indexes_lock:
+            if _indexes is not None and _snapshot_generation is None and \
+                    time.monotonic() - _indexes_checked_at >= settings.SEARCH_INDEX_REFRESH_SECONDS:
+                _refresh_semantic_index()
+    return _indexes
+
+
+def start_snapshot_watcher():
+    """
+    Load the newest snapshot and follow newly published generations
+    (INDEX_SNAPSHOTS). A new generation replaces the index pair in one
+    assignment, so each request searches one generation throughout.
+    """
+    global _snapshot_watcher
+    if not settings.INDEX_SNAPSHOTS or _snapshot_watcher is not None:
+        return
+    get_search_indexes()
+
+    def switch(generation: int, indexes: Tuple):
+        global _indexes, _snapshot_generation
+        with _indexes_lock:
+            _indexes, _snapshot_generation = indexes, generation
+
+    _snapshot_watcher = SnapshotWatcher(IndexSnapshots(), switch, current=_snapshot_generation)
+    _snapshot_watcher.start()
+
+
+def close_search_indexes():
+    """Stop the snapshot watcher and shard search workers, if any (application shutdown)."""
+    global _indexes, _snapshot_watcher
+    if _snapshot_watcher is not None:
+        _snapshot_watcher.stop()
+        _snapshot_watcher = None
+    if _indexes is not None and isinstance(_indexes[0], ShardedFAISSIndexer):
+        _indexes[0].stop_search_pool(reload=False)
+    _indexes = None
+
+
+def get_retriever(
+    db: Session = Depends(get_db),
+    embedder: QueryEmbeddingService = Depends(get_query_embedder),
+    indexes: Tuple[FAISSIndexer, WhooshIndexer] = Depends(get_search_indexes),
+    neighbors: NeighborIndex = Depends(get_neighbor_index),
+    hydrator: ChunkHydrator = Depends(get_chunk_hydrator),
+    hierarchy: Optional[SectionIndex] = Depends(get_section_index)
+) -> HybridRetriever:
+    """FastAPI dependency building a retriever over the shared indexes."""
+    faiss_indexer, whoosh_indexer = indexes
+    return HybridRetriever(
+        db, embedder, faiss_indexer, whoosh_indexer, neighbors=neighbors, hydrator=hydrator, hierarchy=hierarchy
+    )
@@ -0,0 +1,351 @@
+
+"""
+Versioned index snapshots in object storage.
+
+After an ingestion job the worker publishes the semantic index, the
+lexical index and the chunk ID map as one generation:
+
+    {INDEX_SNAPSHOT_PREFIX}/{generation:08d}/claims/{writer}  one per publisher that tried the number
+    {INDEX_SNAPSHOT_PREFIX}/{generation:08d}/bundle.bin       index files back to back
+    {INDEX_SNAPSHOT_PREFIX}/{generation:08d}/manifest.json    offset, size and SHA-256 per file
+    {INDEX_SNAPSHOT_PREFIX}/LATEST.json                       {"generation": n}
+
+Publishers (several workers may finish jobs at once) claim a generation
+number before uploading to it: each writes a claim named by its own random
+writer token and keeps the number only if no other claim is listed beside
+it (see _claim_generation), so two publishers never write the same
+generation. LATEST.json is written last, so a generation is only visible
+once complete, and only if it is still newer than the LATEST.json re-read
+just before; a publisher overtaken by a later generation leaves it alone.
+
+A replica downloads a generation with parallel ranged GETs, writing each
+part straight into its file under INDEX_DIR/snapshots/{generation}.partial,
+verifies the checksums and renames the directory into place. It then
+serves from the files as they are: semantic vectors are memory-mapped by
+TwoStageFAISSIndexer (flat and sharded indexes are published in its
+"exact" layout) and Whoosh maps its segment files itself, so nothing is
+deserialized beyond the ID map and compressed codes. SnapshotWatcher
+polls for newer generations while the replica serves.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+
+import structlog
+
+from app.config import settings
+from app.core.indexer import ShardedFAISSIndexer, TwoStageFAISSIndexer, WhooshIndexer
+from app.storage.s3_client import get_s3_client
+
+logger = structlog.get_logger()
+
+_HASH_BLOCK = 1 << 20
+_CLAIM_ATTEMPTS = 100
+
+
+def _sha256(path: Path, size: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        remaining = size
+        while remaining > 0:
+            block = f.read(min(_HASH_BLOCK, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+
+class IndexSnapshots:
+    """Publish, download and open index snapshot generations (see module docstring)."""
+
+    def __init__(
+        self,
+        s3=None,
+        local_dir: Optional[str] = None,
+        prefix: str = settings.INDEX_SNAPSHOT_PREFIX,
+        part_bytes: int = settings.INDEX_SNAPSHOT_PART_BYTES,
+        download_threads: int = settings.INDEX_SNAPSHOT_DOWNLOAD_THREADS,
+        keep: int = settings.INDEX_SNAPSHOT_KEEP
+    ):
+        """
+        Args:
+            s3: S3Client or LocalS3Client (default: the process-wide S3 client)
+            local_dir: Where downloaded generations live (default: INDEX_DIR/snapshots)
+            prefix: Object key prefix
+            part_bytes: Size of each ranged GET
+            download_threads: Concurrent ranged GETs
+            keep: Downloaded generations kept on disk (at least 2, so the one being replaced stays readable)
+        """
+        self.s3 = s3 if s3 is not None else get_s3_client()
+        self.local_dir = Path(local_dir or os.path.join(settings.INDEX_DIR, "snapshots"))
+        self.local_dir.mkdir(parents=True, exist_ok=True)
+        self.prefix = prefix.rstrip("/")
+        self.part_bytes = part_bytes
+        self.download_threads = download_threads
+        self.keep = max(keep, 2)
+
+    def _key(self, generation: int, name: str) -> str:
+        return f"{self.prefix}/{generation:08d}/{name}"
+
+    def latest_generation(self) -> Optional[int]:
+        """Newest published generation, or None if nothing has been published."""
+        data = self.s3.download_file(f"{self.prefix}/LATEST.json")
+        return json.loads(data)["generation"] if data else None
+
+    # -- publishing ------------------------------------------------------
+
+    def _claim_generation(self, writer: str) -> int:
+        """
+        Claim the lowest free generation number above LATEST for writer.
+
+        A number is kept only if writer's claim is the only one listed under
+        it. Of two publishers racing for a number, the one that listed first
+        saw no other claim, so the other (which wrote its claim before
+        listing) sees the first one's and moves on; at worst both move on.
+        """
+        generation = (self.latest_generation() or 0) + 1
+        for _ in range(_CLAIM_ATTEMPTS):
+            claims = f"{self.prefix}/{generation:08d}/claims/"
+            if not self.s3.list_objects(claims):
+                if not self.s3.upload_json({"writer": writer, "claimed_at": datetime.utcnow().isoformat()},
+                                           claims + writer):
+                    raise RuntimeError(f"Failed to claim index snapshot generation {generation}")
+                if self.s3.list_objects(claims) == [claims + writer]:
+                    return generation
+            generation += 1
+        raise RuntimeError(f"No free index snapshot generation after {_CLAIM_ATTEMPTS} attempts")
+
+    @staticmethod
+    def _semantic_files(faiss_indexer, scratch: Path) -> Tuple[List[Tuple[Path, int]], Dict]:
+        """Files of the saved semantic index in TwoStageFAISSIndexer layout, and its manifest entry."""
+        if isinstance(faiss_indexer, TwoStageFAISSIndexer):
+            indexer = faiss_indexer
+        else:
+            indexer = TwoStageFAISSIndexer(faiss_indexer.vector_dim, index_path=str(scratch), codes="exact")
+            shards = faiss_indexer.shards if isinstance(faiss_indexer, ShardedFAISSIndexer) else [faiss_indexer]
+            for shard in shards:
+                ids, vectors = shard.vectors()
+                if ids:
+                    indexer.add_batch(ids, vectors)
+            indexer.save()
+        return indexer.saved_files(), {
+            "codes": indexer.codes,
+            "vector_dim": indexer.vector_dim,
+            "subquantizers": indexer.subquantizers,
+            "vectors": indexer.next_id,
+        }
+
+    @staticmethod
+    def _lexical_files(whoosh_indexer: WhooshIndexer) -> List[Tuple[Path, int]]:
+        return [
+            (path, path.stat().st_size) for path in sorted(whoosh_indexer.index_path.iterdir())
+            if path.is_file() and not path.name.endswith((".lock", "WRITELOCK"))
+        ]
+
+    def publish(self, faiss_indexer, whoosh_indexer: WhooshIndexer) -> Dict:
+        """
+        Upload the saved semantic and lexical indexes as the next generation.
+
+        Returns:
+            The generation's manifest
+        """
+        writer = uuid.uuid4().hex
+        generation = self._claim_generation(writer)
+        with tempfile.TemporaryDirectory(dir=self.local_dir) as tmp:
+            tmp = Path(tmp)
+            semantic, semantic_meta = self._semantic_files(faiss_indexer, tmp / "semantic")
+            sources = [(f"semantic/{path.name}", path, size) for path, size in semantic]
+            sources += [(f"lexical/{path.name}", path, size) for path, size in self._lexical_files(whoosh_indexer)]
+
+            files, offset = [], 0
+            bundle = tmp / "bundle.bin"
+            with open(bundle, "wb") as out:
+                for name, path, size in sources:
+                    digest = hashlib.sha256()
+                    with open(path, "rb") as f:
+                        remaining = size
+                        while remaining > 0:
+                            block = f.read(min(_HASH_BLOCK, remaining))
+                            if not block:
+                                raise RuntimeError(f"Index file shrank while publishing: {path}")
+                            digest.update(block)
+                            out.write(block)
+                            remaining -= len(block)
+                    files.append({"name": name, "offset": offset, "bytes": size, "sha256": digest.hexdigest()})
+                    offset += size
+
+            manifest = {
+                "generation": generation,
+                "writer": writer,
+                "created_at": datetime.utcnow().isoformat(),
+                "bundle_key": self._key(generation, "bundle.bin"),
+                "bundle_bytes": offset,
+                "semantic": semantic_meta,
+                "files": files,
+            }
+            with open(bundle, "rb") as f:
+                uploaded = self.s3.upload_file(f, manifest["bundle_key"], metadata={"generation": str(generation)})
+            if not (uploaded and self.s3.upload_json(manifest, self._key(generation, "manifest.json"))):
+                raise RuntimeError(f"Failed to publish index snapshot generation {generation}")
+            latest = self.latest_generation()
+            if latest is not None and latest > generation:
+                logger.warning("Newer index snapshot already published, LATEST left in place",
+                               generation=generation, latest=latest)
+            elif not self.s3.upload_json({"generation": generation}, f"{self.prefix}/LATEST.json"):
+                raise RuntimeError(f"Failed to publish index snapshot generation {generation}")
+        logger.info("Published index snapshot", generation=generation, bytes=offset, files=len(files),
+                    vectors=semantic_meta["vectors"])
+        return manifest
+
+    # -- replicas ----------------------------------------------------------
+
+    def local_path(self, generation: int) -> Path:
+        return self.local_dir / f"{generation:08d}"
+
+    def fetch(self, generation: int) -> Path:
+        """
+        Download and verify a generation unless it is already on disk.
+
+        Returns:
+            Directory holding the generation's files and manifest.json
+        """
+        target = self.local_path(generation)
+        if (target / "manifest.json").exists():
+            return target
+        data = self.s3.download_file(self._key(generation, "manifest.json"))
+        if data is None:
+            raise FileNotFoundError(f"Index snapshot generation {generation} has no manifest")
+        manifest = json.loads(data)
+
+        staging = target.with_name(target.name + ".partial")
+        shutil.rmtree(staging, ignore_errors=True)
+        for entry in manifest["files"]:
+            path = staging / entry["name"]
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "wb") as f:
+                f.truncate(entry["bytes"])
+
+        def download(span: Tuple[int, int]):
+            start, end = span
+            data = self.s3.download_range(manifest["bundle_key"], start, end)
+            if data is None or len(data) != end - start:
+                raise IOError(f"Ranged GET {start}-{end} of {manifest['bundle_key']} failed")
+            for entry in manifest["files"]:
+                lo = max(start, entry["offset"])
+                hi = min(end, entry["offset"] + entry["bytes"])
+                if lo < hi:
+                    fd = os.open(staging / entry["name"], os.O_WRONLY)
+                    try:
+                        os.pwrite(fd, data[lo - start:hi - start], lo - entry["offset"])
+                    finally:
+                        os.close(fd)
+
+        def verify(entry: Dict):
+            if _sha256(staging / entry["name"], entry["bytes"]) != entry["sha256"]:
+                raise IOError(f"Checksum mismatch for {entry['name']} in generation {generation}")
+
+        total = manifest["bundle_bytes"]
+        spans = [(start, min(start + self.part_bytes, total)) for start in range(0, total, self.part_bytes)]
+        with ThreadPoolExecutor(self.download_threads) as pool:
+            list(pool.map(download, spans))
+            list(pool.map(verify, manifest["files"]))
+        (staging / "manifest.json").write_text(json.dumps(manifest))
+        os.replace(staging, target)
+        logger.info("Fetched index snapshot", generation=generation, bytes=total, parts=len(spans))
+        return target
+
+    @staticmethod
+    def open(path: Path) -> Tuple[TwoStageFAISSIndexer, WhooshIndexer]:
+        """Search indexes over a fetched generation's files (memory-mapped, read-only use)."""
+        meta = json.loads((path / "manifest.json").read_text())["semantic"]
+        semantic = TwoStageFAISSIndexer(
+            vector_dim=meta["vector_dim"], index_path=str(path / "semantic"),
+            codes=meta["codes"], subquantizers=meta["subquantizers"]
+        )
+        if not semantic.load():
+            raise FileNotFoundError(f"No semantic index in {path}")
+        return semantic, WhooshIndexer(index_path=str(path / "lexical"))
+
+    def prune(self):
+        """Delete all but the newest `keep` downloaded generations, and abandoned partial downloads."""
+        generations = sorted(p for p in self.local_dir.iterdir() if p.is_dir() and p.name.isdigit())
+        for path in generations[:-self.keep]:
+            shutil.rmtree(path, ignore_errors=True)
+        for path in self.local_dir.glob("*.partial"):
+            shutil.rmtree(path, ignore_errors=True)
+
+    def load_latest(self) -> Optional[Tuple[int, Tuple[TwoStageFAISSIndexer, WhooshIndexer]]]:
+        """(generation, indexes) for the newest generation, or None if nothing is published."""
+        generation = self.latest_generation()
+        if generation is None:
+            return None
+        indexes = self.open(self.fetch(generation))
+        self.prune()
+        return generation, indexes
+
+
+class SnapshotWatcher:
+    """
+    Background thread that loads newer generations as they are published and
+    hands them to on_generation(generation, indexes).
+    """
+
+    def __init__(
+        self,
+        snapshots: IndexSnapshots,
+        on_generation: Callable[[int, Tuple], None],
+        current: Optional[int] = None,
+        poll_seconds: float = settings.INDEX_SNAPSHOT_POLL_SECONDS
+    ):
+        self.snapshots = snapshots
+        self.on_generation = on_generation
+        self.current = current
+        self.poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def check(self) -> bool:
+        """Load the newest generation if it is newer than the current one; True if switched."""
+        generation = self.snapshots.latest_generation()
+        if generation is None or (self.current is not None and generation <= self.current):
+            return False
+        indexes = self.snapshots.open(self.snapshots.fetch(generation))
+        self.on_generation(generation, indexes)
+        self.current = generation
+        self.snapshots.prune()
+        logger.info("Switched to index snapshot", generation=generation)
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error("Index snapshot refresh failed", error=str(e))
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="index-snapshot-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def publish_index_snapshot(faiss_indexer, whoosh_indexer: WhooshIndexer) -> Optional[Dict]:
+    """Publish the indexes when INDEX_SNAPSHOTS is on (ingestion worker, after a job)."""
+    if not settings.INDEX_SNAPSHOTS:
+        return None
+    return IndexSnapshots().publish(faiss_indexer, whoosh_indexer)
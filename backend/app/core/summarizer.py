@@ -0,0 +1,52 @@
+
+"""
+Three-level chunk summarization.
+"""
+from typing import Dict, Tuple
+import re
+
+from app.utils.helpers import compute_sha256
+
+SUMMARY_LEVELS: Tuple[str, ...] = ("short", "medium", "long")
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+
+
+class ExtractiveSummarizer:
+    """
+    Deterministic extractive summarizer.
+
+    Takes leading sentences of the chunk up to a per-level character budget.
+    Used by the ingestion pipeline until the LLM summarization service
+    (Phase 3) is wired in; both produce the same Summary rows.
+    """
+
+    model_name = "extractive"
+    temperature = 0.0
+    budgets: Dict[str, int] = {"short": 200, "medium": 800, "long": 2000}
+
+    def summarize(self, text: str) -> Dict[str, str]:
+        """
+        Summarize text at every level.
+
+        Returns:
+            Dict mapping level -> summary text
+        """
+        sentences = [s for s in _SENTENCE_SPLIT.split(" ".join(text.split())) if s]
+        return {level: self._take(sentences, self.budgets[level]) for level in SUMMARY_LEVELS}
+
+    def prompt_hash(self, level: str) -> str:
+        """Hash identifying the summarization recipe for a level."""
+        return compute_sha256(f"{self.model_name}:{level}:{self.budgets[level]}")
+
+    @staticmethod
+    def _take(sentences, budget: int) -> str:
+        out, used = [], 0
+        for sentence in sentences:
+            if used + len(sentence) > budget:
+                break
+            out.append(sentence)
+            used += len(sentence) + 1
+        if not out and sentences:
+            return sentences[0][:budget]
+        return " ".join(out)
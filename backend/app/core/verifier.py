@@ -0,0 +1,282 @@
+
+"""
+Citation verification.
+
+Model output is split into sentence-level claims. Each claim is compared
+(cosine similarity of embeddings) against the chunks it cites, either
+inline as ``[slug:version:chunk_id]`` or, when it cites nothing inline,
+against every retrieval ID supplied with the run. The best-matching chunk
+decides the claim: pass >= VERIFIER_PASS_THRESHOLD, partial >=
+VERIFIER_PARTIAL_THRESHOLD, fail otherwise. Each stored citation records
+the ±CONTEXT_WINDOW_CHUNKS window around its chunk; once committed, the
+citations are added to the citation graph (app.core.citation_graph).
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+import asyncio
+import re
+
+import numpy as np
+from fastapi import Depends
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+import structlog
+
+from app.config import settings
+from app.core.citation_graph import CitationGraph, get_citation_graph
+from app.core.embedding_service import QueryEmbeddingService, get_query_embedder
+from app.core.neighbors import NeighborIndex, get_neighbor_index
+from app.core.retrieval import get_search_indexes
+from app.db.models import Chunk, Citation, Work
+from app.db.session import get_db
+from app.utils.helpers import generate_retrieval_id, parse_retrieval_id
+from app.utils.metrics import stage_timer
+
+logger = structlog.get_logger()
+
+CITATION_PATTERN = re.compile(r"\[([A-Za-z0-9_\-]+:[A-Za-z0-9_.\-]+:\d+)\]")
+LEADING_CITATIONS = re.compile(r"(?:\s*\[[A-Za-z0-9_\-]+:[A-Za-z0-9_.\-]+:\d+\])+")
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+PASS = "pass"
+PARTIAL = "partial"
+FAIL = "fail"
+
+
+def extract_claims(text: str) -> List[Dict]:
+    """
+    Split text into claims (sentences longer than 10 characters).
+
+    Returns:
+        List of {text, citation_ids}, with citation markers removed from text
+    """
+    sentences = SENTENCE_BOUNDARY.split(text.strip())
+    for i in range(1, len(sentences)):
+        # Markers placed after the full stop ("... grid. [a:b:1]") belong to the previous sentence
+        leading = LEADING_CITATIONS.match(sentences[i])
+        if leading:
+            sentences[i - 1] += " " + leading.group(0).strip()
+            sentences[i] = sentences[i][leading.end():]
+
+    claims = []
+    for sentence in sentences:
+        citation_ids = CITATION_PATTERN.findall(sentence)
+        clean = re.sub(r"\s+", " ", CITATION_PATTERN.sub("", sentence)).strip()
+        clean = re.sub(r"\s+([.!?,;:])", r"\1", clean)
+        if len(clean) > 10:
+            claims.append({"text": clean, "citation_ids": citation_ids})
+    return claims
+
+
+def worst_decision(decisions: List[str]) -> str:
+    """FAIL if any claim failed, PARTIAL if any was partial, else PASS."""
+    if not decisions or FAIL in decisions:
+        return FAIL
+    if PARTIAL in decisions:
+        return PARTIAL
+    return PASS
+
+
+class CitationVerifier:
+    """
+    Verifies claims against cited chunks.
+
+    Claims are embedded through the shared QueryEmbeddingService, so one
+    verification run is a single batched forward pass. Cited chunks use
+    the vectors stored in the semantic index at ingestion; only chunks
+    without one (near-duplicate aliases, or a sharded index) are embedded
+    along with the claims.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        embedder: QueryEmbeddingService,
+        pass_threshold: float = settings.VERIFIER_PASS_THRESHOLD,
+        partial_threshold: float = settings.VERIFIER_PARTIAL_THRESHOLD,
+        neighbors: Optional[NeighborIndex] = None,
+        graph: Optional[CitationGraph] = None,
+        semantic_index=None
+    ):
+        self.db = db
+        self.embedder = embedder
+        self.neighbors = neighbors
+        self.graph = graph
+        self.semantic_index = semantic_index
+        self.pass_threshold = pass_threshold
+        self.partial_threshold = partial_threshold
+
+    def decide(self, similarity: float) -> str:
+        """Map a similarity score to pass/partial/fail."""
+        if similarity >= self.pass_threshold:
+            return PASS
+        if similarity >= self.partial_threshold:
+            return PARTIAL
+        return FAIL
+
+    def load_chunks(self, retrieval_ids: List[str]) -> Dict[str, Chunk]:
+        """
+        Chunks for well-formed retrieval IDs (one query). Unknown IDs, and
+        IDs whose slug or version is not the chunk's work, are omitted.
+        """
+        by_chunk_id: Dict[int, List[Tuple[str, str, str]]] = {}
+        for retrieval_id in retrieval_ids:
+            try:
+                slug, version, chunk_id = parse_retrieval_id(retrieval_id)
+            except ValueError:
+                continue
+            by_chunk_id.setdefault(chunk_id, []).append((retrieval_id, slug, version))
+        if not by_chunk_id:
+            return {}
+        rows = self.db.query(Chunk, Work).join(Work).filter(Chunk.id.in_(list(by_chunk_id))).all()
+        return {
+            rid: chunk for chunk, work in rows for rid, slug, version in by_chunk_id[chunk.id]
+            if (slug, version) == (work.source_slug, work.version)
+        }
+
+    def stored_vectors(self, chunk_ids: List[int]) -> Dict[int, np.ndarray]:
+        """Normalized vectors of chunk_ids held by the semantic index; chunks it lacks are omitted."""
+        index = self.semantic_index
+        if index is None or not hasattr(index, "positions") or not chunk_ids:
+            return {}
+        positions = index.positions(chunk_ids)
+        found = positions >= 0
+        if not found.any():
+            return {}
+        rows = np.asarray(index.rows(positions[found]), dtype=np.float32)
+        return dict(zip(np.asarray(chunk_ids)[found].tolist(), rows))
+
+    def load_aliases(self, chunks: Iterable[Chunk]) -> Dict[int, List[Tuple[str, Chunk]]]:
+        """
+        Other copies of each chunk's near-duplicate group on current works
+        (one query), as {chunk_id: [(retrieval_id, chunk), ...]} in ID order.
+        """
+        chunks = list(chunks)
+        canonical_ids = {chunk.canonical_chunk_id or chunk.id for chunk in chunks}
+        if not canonical_ids:
+            return {}
+        rows = self.db.query(Chunk, Work).join(Work).filter(
+            or_(Chunk.id.in_(canonical_ids), Chunk.canonical_chunk_id.in_(canonical_ids)),
+            Work.is_current.is_(True)
+        ).order_by(Chunk.id).all()
+        groups: Dict[int, List[Tuple[str, Chunk]]] = {}
+        for chunk, work in rows:
+            groups.setdefault(chunk.canonical_chunk_id or chunk.id, []).append(
+                (generate_retrieval_id(work.source_slug, work.version, chunk.id), chunk)
+            )
+        return {
+            chunk.id: [
+                (rid, copy) for rid, copy in groups.get(chunk.canonical_chunk_id or chunk.id, []) if copy.id != chunk.id
+            ]
+            for chunk in chunks
+        }
+
+    async def _embed(self, texts: List[str]) -> np.ndarray:
+        with stage_timer("embed"):
+            vectors = await asyncio.gather(*(self.embedder.embed(text) for text in texts))
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    @stage_timer("verification")
+    async def verify(
+        self,
+        model_output: str,
+        retrieval_ids: List[str],
+        query_text: Optional[str] = None,
+        expand_aliases: bool = False
+    ) -> Dict:
+        """
+        Verify every claim in model_output.
+
+        Args:
+            model_output: Generated text, optionally with inline [retrieval_id] citations
+            retrieval_ids: Retrieval IDs available to the model for this run
+            query_text: Original query, stored with each citation
+            expand_aliases: Also record a citation for every near-duplicate
+                copy of each claim's best chunk (see app.core.dedup)
+
+        Returns:
+            {verifier_decision, annotated_claims}
+        """
+        claims = extract_claims(model_output)
+        if not claims:
+            return {"verifier_decision": FAIL, "annotated_claims": []}
+        cited = {rid for claim in claims for rid in claim["citation_ids"]}
+        chunks = self.load_chunks(list(dict.fromkeys(list(retrieval_ids) + sorted(cited))))
+
+        chunk_keys = list(chunks)
+        stored = self.stored_vectors(list({chunk.id for chunk in chunks.values()}))
+        unstored = [k for k in chunk_keys if chunks[k].id not in stored]
+        vectors = await self._embed([claim["text"] for claim in claims] + [chunks[k].text for k in unstored])
+        claim_vectors = vectors[:len(claims)]
+        embedded = dict(zip(unstored, vectors[len(claims):]))
+        chunk_vectors = np.asarray(
+            [embedded[k] if k in embedded else stored[chunks[k].id] for k in chunk_keys], dtype=np.float32
+        ).reshape(len(chunk_keys), vectors.shape[1])
+        chunk_rows = {rid: row for row, rid in enumerate(chunk_keys)}
+
+        aliases = self.load_aliases(chunks.values()) if expand_aliases else {}
+        window_ids = {c.id for c in chunks.values()} | {c.id for group in aliases.values() for _, c in group}
+        windows = self.neighbors.windows(self.db, window_ids) if self.neighbors else {}
+
+        annotated = []
+        for claim, claim_vector in zip(claims, claim_vectors):
+            candidates = claim["citation_ids"] or list(retrieval_ids)
+            best_id, similarity = self._best_match(claim_vector, candidates, chunk_rows, chunk_vectors)
+            decision = self.decide(similarity)
+            annotated.append({
+                "text": claim["text"],
+                "citation_ids": claim["citation_ids"],
+                "best_citation_id": best_id,
+                "similarity": similarity,
+                "decision": decision,
+            })
+            if best_id is None:
+                continue
+            cited_chunks = [(best_id, chunks[best_id])]
+            if expand_aliases:
+                cited_chunks += aliases.get(chunks[best_id].id, [])
+                annotated[-1]["alias_citation_ids"] = [rid for rid, _ in cited_chunks[1:]]
+            for retrieval_id, chunk in cited_chunks:
+                self.db.add(Citation(
+                    chunk_id=chunk.id,
+                    retrieval_id=retrieval_id,
+                    query_text=query_text,
+                    claim_text=claim["text"],
+                    similarity_score=similarity,
+                    verifier_decision=decision,
+                    context_window=windows.get(chunk.id, [])
+                ))
+        self.db.commit()
+        if self.graph is not None:
+            self.graph.observe(self.db)
+
+        verifier_decision = worst_decision([claim["decision"] for claim in annotated])
+        logger.info("Verification complete", claims=len(annotated), decision=verifier_decision)
+        return {"verifier_decision": verifier_decision, "annotated_claims": annotated}
+
+    @staticmethod
+    def _best_match(
+        claim_vector: np.ndarray,
+        candidates: List[str],
+        chunk_rows: Dict[str, int],
+        chunk_vectors: np.ndarray
+    ) -> Tuple[Optional[str], float]:
+        rows = [(rid, chunk_rows[rid]) for rid in candidates if rid in chunk_rows]
+        if not rows:
+            return None, 0.0
+        scores = chunk_vectors[[row for _, row in rows]] @ claim_vector
+        best = int(np.argmax(scores))
+        return rows[best][0], float(scores[best])
+
+
+def get_verifier(
+    db: Session = Depends(get_db),
+    embedder: QueryEmbeddingService = Depends(get_query_embedder),
+    neighbors: NeighborIndex = Depends(get_neighbor_index),
+    graph: CitationGraph = Depends(get_citation_graph),
+    indexes: Tuple = Depends(get_search_indexes)
+) -> CitationVerifier:
+    """FastAPI dependency building a verifier on the shared query embedder and semantic index."""
+    return CitationVerifier(db, embedder, neighbors=neighbors, graph=graph, semantic_index=indexes[0])
@@ -3,7 +3,7 @@
 SQLAlchemy ORM models for the GREDs database schema.
 Defines all database tables and relationships.
 """
-from sqlalchemy import Column, Integer, String, Text, Float, DateTime, Boolean, JSON, ForeignKey, Index
+from sqlalchemy import Column, Integer, String, Text, Float, DateTime, Boolean, JSON, ForeignKey, Index, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -18,8 +18,10 @@ class Work(Base):
     __tablename__ = "works"
     
     id = Column(Integer, primary_key=True, index=True)
-    source_slug = Column(String(255), unique=True, nullable=False, index=True)
+    source_slug = Column(String(255), nullable=False, index=True)
     version = Column(String(50), nullable=False)
+    is_current = Column(Boolean, default=False, nullable=False)  # Searchable version of its slug
+    base_work_id = Column(Integer, ForeignKey("works.id"), nullable=True)  # Version diffed against (incremental)
     canonical_url = Column(String(512), nullable=False)
     title = Column(String(512))
     authors = Column(JSON)  # List of author names
@@ -30,8 +32,12 @@ class Work(Base):
     ingestion_status = Column(String(20), default="pending")  # pending, processing, completed, failed
     ingestion_started_at = Column(DateTime, nullable=True)
     ingestion_completed_at = Column(DateTime, nullable=True)
+    ingestion_job_id = Column(String(64), nullable=True, index=True)  # Public job ID for status/resume
+    ingestion_stage = Column(String(20), nullable=True)  # extract, chunk, embed, index, summarize
+    ingestion_progress = Column(JSON)  # Per-stage counters and queue depths
+    ingestion_error = Column(Text, nullable=True)
     total_chunks = Column(Integer, default=0)
-    metadata = Column(JSON)  # Additional metadata
+    metadata_ = Column("metadata", JSON)  # Additional metadata ("metadata" is reserved by declarative)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
@@ -40,12 +46,13 @@ class Work(Base):
     
     # Indexes
     __table_args__ = (
-        Index('idx_work_slug_version', 'source_slug', 'version'),
+        Index('idx_work_slug_version', 'source_slug', 'version', unique=True),
         Index('idx_work_status', 'ingestion_status'),
+        Index('idx_work_slug_current', 'source_slug', 'is_current'),
     )
 
     def __repr__(self):
-        return f"<Work(id={self.id}, slug={self.source_slug}, status={self.ingestion_status})>"
+        return f"<Work(id={self.id}, slug={self.source_slug}, version={self.version}, status={self.ingestion_status})>"
 
 
 class Chunk(Base):
@@ -61,9 +68,13 @@ class Chunk(Base):
     token_count = Column(Integer)
     start_char = Column(Integer)
     end_char = Column(Integer)
-    chunk_hash = Column(String(64), unique=True, index=True)  # SHA256 of text
+    source_path = Column(String(1024), nullable=True)  # File within the repository
+    chunk_hash = Column(String(64), index=True)  # SHA256 of text (identical text may recur across files)
     chunking_strategy = Column(String(50))  # "fixed_tokens_with_overlap"
     chunking_params = Column(JSON)  # {chunk_size: 1024, overlap: 0.2, seed: 42}
+    # Set on near-duplicate aliases
+    canonical_chunk_id = Column(Integer, ForeignKey("chunks.id"), nullable=True, index=True)
+    minhash = Column(LargeBinary, nullable=True)  # MinHash signature (uint32 array) when dedup is enabled
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
     # Relationships
@@ -138,7 +149,8 @@ class Session(Base):
     __tablename__ = "sessions"
     
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(String(64), unique=True, nullable=False, index=True)
+    session_id = Column(String(64), nullable=False, index=True)  # Shared by a session's checkpoints
+    checkpoint_id = Column(String(36), unique=True, nullable=True, index=True)  # Public checkpoint ID (UUID)
     user_id = Column(String(255), nullable=True)  # Optional user identifier
     condensed_summary = Column(Text, nullable=True)  # Aggregated context
     accepted_claims = Column(JSON)  # List of verified claims
@@ -170,7 +182,7 @@ class Citation(Base):
     claim_text = Column(Text, nullable=True)
     similarity_score = Column(Float)
     verifier_decision = Column(String(20))  # pass, partial, fail
-    context_window = Column(JSON)  # Adjacent chunk IDs
+    context_window = Column(JSON)  # Chunk IDs of the ±k window around chunk_id, in order
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
     # Relationships
@@ -199,7 +211,7 @@ class AuditLog(Base):
     action = Column(String(255))
     resource_type = Column(String(100))
     resource_id = Column(String(255))
-    metadata = Column(JSON)
+    metadata_ = Column("metadata", JSON)
     status = Column(String(20))  # success, failure
     error_message = Column(Text, nullable=True)
     duration_ms = Column(Integer)
@@ -213,3 +225,31 @@ class AuditLog(Base):
 
     def __repr__(self):
         return f"<AuditLog(id={self.id}, type={self.event_type}, status={self.status})>"
+
+
+class AuditSegment(Base):
+    """
+    A sealed run of consecutive audit events: Merkle root over the events,
+    chained to the previous segment (see app.utils.audit_chain).
+    """
+    __tablename__ = "audit_segments"
+
+    id = Column(Integer, primary_key=True, index=True)
+    seq = Column(Integer, nullable=False, unique=True)  # 0, 1, 2, ... in event order
+    first_event_id = Column(Integer, nullable=False)
+    last_event_id = Column(Integer, nullable=False, index=True)
+    start_time = Column(DateTime, nullable=False)  # Earliest event timestamp
+    end_time = Column(DateTime, nullable=False)  # Latest event timestamp
+    event_count = Column(Integer, nullable=False)
+    merkle_root = Column(String(64), nullable=False)  # Hex SHA256
+    chain_root = Column(String(64), nullable=False)  # Hex SHA256 over the previous chain_root and merkle_root
+    tree = Column(LargeBinary, nullable=False)  # Every tree node, leaves first, 32 bytes each
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Indexes
+    __table_args__ = (
+        Index('idx_audit_segment_time', 'start_time', 'end_time'),
+    )
+
+    def __repr__(self):
+        return f"<AuditSegment(seq={self.seq}, events={self.first_event_id}-{self.last_event_id})>"
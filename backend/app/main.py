@@ -3,27 +3,24 @@
 FastAPI application entry point.
 Defines the main application, middleware, and routes.
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from contextlib import asynccontextmanager
 import structlog
 import sys
 
 from app.config import settings
+from app.core.admission import Overloaded
+from app.core.embedding_service import close_query_embedder
+from app.core.retrieval import close_search_indexes, start_snapshot_watcher
+from app.utils.log_pipeline import configure_logging, shutdown_logging
+from app.utils.metrics import REGISTRY
+from app.utils.profiling import ProfilingMiddleware
+from app.utils.request_context import RequestContextMiddleware
 
-# Configure structured logging
-structlog.configure(
-    processors=[
-        structlog.stdlib.filter_by_level,
-        structlog.stdlib.add_logger_name,
-        structlog.stdlib.add_log_level,
-        structlog.processors.TimeStamper(fmt="iso"),
-        structlog.processors.JSONRenderer()
-    ],
-    wrapper_class=structlog.stdlib.BoundLogger,
-    logger_factory=structlog.stdlib.LoggerFactory(),
-    cache_logger_on_first_use=True,
-)
+configure_logging()
 
 logger = structlog.get_logger()
 
@@ -43,7 +40,9 @@ async def lifespan(app: FastAPI):
     )
     
     # TODO: Initialize database connection pool
-    # TODO: Initialize FAISS and Whoosh indexes
+    if settings.INDEX_SNAPSHOTS:
+        # Warm start from the newest published index snapshot, then follow new generations
+        await run_in_threadpool(start_snapshot_watcher)
     # TODO: Initialize Redis connection
     # TODO: Verify S3 connectivity
     
@@ -51,8 +50,10 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Application shutdown")
+    await close_query_embedder()
+    close_search_indexes()
+    shutdown_logging()
     # TODO: Close database connections
-    # TODO: Save indexes
     # TODO: Close Redis connection
 
 
@@ -73,7 +74,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Correlation-ID"],
 )
+# Profiling sits inside the request context, whose correlation ID keys the profile
+app.add_middleware(ProfilingMiddleware)
+# Outermost, so request durations include CORS handling
+app.add_middleware(RequestContextMiddleware)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """Shed requests: 429 with a hint of when the queue will have drained."""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
 
 
 @app.get("/health")
@@ -94,6 +110,12 @@ async def health_check():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics: per-stage and per-route latency histograms."""
+    return Response(REGISTRY.render(), media_type=REGISTRY.CONTENT_TYPE)
+
+
 @app.get("/")
 async def root():
     """Root endpoint with API information."""
@@ -105,13 +127,14 @@ async def root():
     }
 
 
-# TODO: Include API routers when implemented
-# from app.api.v1 import ingest, query, session, verify, audit
-# app.include_router(ingest.router, prefix="/api/v1/ingest", tags=["Ingestion"])
-# app.include_router(query.router, prefix="/api/v1/query", tags=["Query"])
-# app.include_router(session.router, prefix="/api/v1/session", tags=["Session"])
-# app.include_router(verify.router, prefix="/api/v1/verify", tags=["Verification"])
-# app.include_router(audit.router, prefix="/api/v1/audit", tags=["Audit"])
+# API routers
+from app.api.v1 import ingest, query, session, verify, audit, graph  # noqa: E402
+app.include_router(ingest.router, prefix="/api/v1/ingest", tags=["Ingestion"])
+app.include_router(query.router, prefix="/api/v1/query", tags=["Query"])
+app.include_router(session.router, prefix="/api/v1/session", tags=["Session"])
+app.include_router(verify.router, prefix="/api/v1/verify", tags=["Verification"])
+app.include_router(audit.router, prefix="/api/v1/audit", tags=["Audit"])
+app.include_router(graph.router, prefix="/api/v1/graph", tags=["Citation Graph"])
 
 
 if __name__ == "__main__":
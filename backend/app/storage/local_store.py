@@ -0,0 +1,92 @@
+
+"""
+Filesystem-backed stand-in for S3Client.
+
+Same interface as S3Client, storing objects as files under a root
+directory. Used by tests and offline benchmarks in place of MinIO/S3.
+"""
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional
+import json
+import os
+import threading
+
+import structlog
+
+from app.utils.metrics import stage_timer
+
+logger = structlog.get_logger()
+
+
+class LocalS3Client:
+    """Object store on the local filesystem with the S3Client API."""
+
+    def __init__(self, root: str, bucket: str = "local"):
+        self.root = Path(root) / bucket
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.bucket = bucket
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Key escapes the bucket: {key}")
+        return path
+
+    def _write(self, key: str, data: bytes):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    @stage_timer("s3_io")
+    def upload_file(self, file_obj: BinaryIO, key: str, metadata: Optional[Dict] = None) -> bool:
+        """Store a file object under key."""
+        self._write(key, file_obj.read())
+        return True
+
+    @stage_timer("s3_io")
+    def download_file(self, key: str) -> Optional[bytes]:
+        """Object contents, or None if the key does not exist."""
+        path = self._path(key)
+        if not path.exists():
+            logger.warning("Local object not found", key=key)
+            return None
+        return path.read_bytes()
+
+    @stage_timer("s3_io")
+    def download_range(self, key: str, start: int, end: int) -> Optional[bytes]:
+        """Bytes [start, end) of the object, or None if the key does not exist."""
+        path = self._path(key)
+        if not path.exists():
+            logger.warning("Local object not found", key=key)
+            return None
+        with open(path, "rb") as f:
+            f.seek(start)
+            return f.read(end - start)
+
+    @stage_timer("s3_io")
+    def upload_json(self, data: Dict, key: str) -> bool:
+        """Store data as JSON under key."""
+        self._write(key, json.dumps(data, indent=2).encode("utf-8"))
+        return True
+
+    @stage_timer("s3_io")
+    def append_jsonl(self, data: Dict, key: str) -> bool:
+        """Append one JSON line to the object at key."""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(path, "ab") as f:
+            f.write((json.dumps(data) + "\n").encode("utf-8"))
+        return True
+
+    @stage_timer("s3_io")
+    def list_objects(self, prefix: str = "") -> list:
+        """Keys starting with prefix, sorted."""
+        keys = [
+            path.relative_to(self.root).as_posix()
+            for path in self.root.rglob("*")
+            if path.is_file() and not path.name.endswith(".tmp")
+        ]
+        return sorted(key for key in keys if key.startswith(prefix))
@@ -11,6 +11,7 @@ import structlog
 import json
 
 from app.config import settings
+from app.utils.metrics import stage_timer
 
 logger = structlog.get_logger()
 
@@ -50,6 +51,7 @@ class S3Client:
             else:
                 logger.error("S3 bucket check failed", error=str(e))
     
+    @stage_timer("s3_io")
     def upload_file(
         self,
         file_obj: BinaryIO,
@@ -79,6 +81,7 @@ class S3Client:
             logger.error("Failed to upload file to S3", key=key, error=str(e))
             return False
     
+    @stage_timer("s3_io")
     def download_file(self, key: str) -> Optional[bytes]:
         """
         Download file from S3.
@@ -99,6 +102,27 @@ class S3Client:
                 logger.error("Failed to download file from S3", key=key, error=str(e))
             return None
     
+    @stage_timer("s3_io")
+    def download_range(self, key: str, start: int, end: int) -> Optional[bytes]:
+        """
+        Download part of an object (ranged GET).
+
+        Args:
+            key: S3 object key (path)
+            start: First byte offset
+            end: Offset one past the last byte
+
+        Returns:
+            Bytes [start, end), or None if failed
+        """
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=key, Range=f"bytes={start}-{end - 1}")
+            return response['Body'].read()
+        except ClientError as e:
+            logger.error("Failed ranged download from S3", key=key, start=start, end=end, error=str(e))
+            return None
+
+    @stage_timer("s3_io")
     def upload_json(self, data: Dict, key: str) -> bool:
         """
         Upload JSON data to S3.
@@ -123,6 +147,7 @@ class S3Client:
             logger.error("Failed to upload JSON to S3", key=key, error=str(e))
             return False
     
+    @stage_timer("s3_io")
     def append_jsonl(self, data: Dict, key: str) -> bool:
         """
         Append JSONL entry to file (for audit logs).
@@ -157,6 +182,7 @@ class S3Client:
             logger.error("Failed to append JSONL", key=key, error=str(e))
             return False
     
+    @stage_timer("s3_io")
     def list_objects(self, prefix: str = "") -> list:
         """
         List objects in bucket with given prefix.
@@ -177,5 +203,16 @@ class S3Client:
             return []
 
 
-# Global S3 client instance
-s3_client = S3Client()
+_s3_client: Optional[S3Client] = None
+
+
+def get_s3_client() -> S3Client:
+    """
+    Process-wide S3 client, created on first use (so importing this module
+    needs no S3 connection). FastAPI dependency; tests and benchmarks
+    override it with LocalS3Client.
+    """
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = S3Client()
+    return _s3_client
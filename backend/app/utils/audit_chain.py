@@ -0,0 +1,497 @@
+
+"""
+Tamper-evident audit trail: Merkle segments chained by their roots.
+
+Consecutive audit events (by ID) are sealed into segments of up to
+AUDIT_SEGMENT_EVENTS events. A segment stores the Merkle root over its
+events and a chain root, the hash of the previous segment's chain root and
+its own Merkle root, so changing any sealed event (or a segment) breaks
+every later chain root. Anchoring the latest chain root outside the
+database (it is returned by every verification) makes that detectable
+even for whoever controls the database.
+
+Hashes are SHA256 with domain-separation prefixes:
+
+- leaf: H(0x00 || record), where record is the event's canonical JSON
+  (see event_record);
+- node: H(0x01 || left || right); a level's last node without a sibling is
+  promoted unchanged to the next level;
+- chain: H(0x02 || previous chain root || merkle root || event count as
+  8 big-endian bytes), with 32 zero bytes before the first segment.
+
+Every tree node is stored with the segment, so one event is proved with
+its O(log n) sibling hashes (audit path) and a time range with its own
+events plus the sibling hashes at the range's edges, without reading or
+re-hashing the rest of the segment.
+"""
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import hashlib
+import threading
+import time
+import weakref
+
+from fastapi import Depends
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import orjson
+import structlog
+
+from app.config import settings
+from app.db.models import AuditLog, AuditSegment
+from app.db.session import get_db
+
+logger = structlog.get_logger()
+
+LEAF, NODE, CHAIN = b"\x00", b"\x01", b"\x02"
+GENESIS = bytes(32)
+HASH_BYTES = 32
+
+EVENT_FIELDS = (
+    "id", "timestamp", "event_type", "correlation_id", "user_id", "action", "resource_type", "resource_id",
+    "metadata", "status", "error_message", "duration_ms",
+)
+EVENT_COLUMNS = (
+    AuditLog.id, AuditLog.timestamp, AuditLog.event_type, AuditLog.correlation_id, AuditLog.user_id, AuditLog.action,
+    AuditLog.resource_type, AuditLog.resource_id, AuditLog.metadata_, AuditLog.status, AuditLog.error_message,
+    AuditLog.duration_ms,
+)
+SEGMENT_HEADER = (
+    AuditSegment.id, AuditSegment.seq, AuditSegment.first_event_id, AuditSegment.last_event_id,
+    AuditSegment.start_time, AuditSegment.end_time, AuditSegment.event_count, AuditSegment.merkle_root,
+    AuditSegment.chain_root,
+)
+MAX_NODE_COLUMNS = 64  # Above this many stored nodes, read the whole tree instead
+
+
+def event_record(row: Sequence) -> bytes:
+    """Canonical JSON of an event (a row of EVENT_COLUMNS): sorted keys, ISO timestamp."""
+    record = dict(zip(EVENT_FIELDS, row))
+    record["timestamp"] = record["timestamp"].isoformat()
+    return orjson.dumps(record, option=orjson.OPT_SORT_KEYS)
+
+
+def leaf_hash(record: bytes) -> bytes:
+    return hashlib.sha256(LEAF + record).digest()
+
+
+def node_hash(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(NODE + left + right).digest()
+
+
+def chain_hash(previous: bytes, merkle_root: bytes, event_count: int) -> bytes:
+    return hashlib.sha256(CHAIN + previous + merkle_root + event_count.to_bytes(8, "big")).digest()
+
+
+def level_sizes(leaves: int) -> List[int]:
+    """Node count of each tree level, leaves first, root last."""
+    sizes = [leaves]
+    while sizes[-1] > 1:
+        sizes.append((sizes[-1] + 1) // 2)
+    return sizes
+
+
+def build_tree(leaves: List[bytes]) -> List[List[bytes]]:
+    """Every level of the Merkle tree over leaf hashes, leaves first."""
+    levels = [leaves]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+
+def audit_path(leaves: int, index: int) -> List[Tuple[int, int, str]]:
+    """
+    Sibling nodes proving leaf index: (level, position, side) from the leaf
+    up, where side is "L" when the sibling is on the left.
+    """
+    path = []
+    for level, size in enumerate(level_sizes(leaves)[:-1]):
+        sibling = index ^ 1
+        if sibling < size:
+            path.append((level, sibling, "L" if sibling < index else "R"))
+        index //= 2
+    return path
+
+
+def root_from_path(leaf: bytes, proof: List[Tuple[str, bytes]]) -> bytes:
+    """Merkle root implied by a leaf hash and its audit path [(side, sibling), ...]."""
+    node = leaf
+    for side, sibling in proof:
+        node = node_hash(sibling, node) if side == "L" else node_hash(node, sibling)
+    return node
+
+
+def subset_root(
+    known: Dict[int, bytes],
+    leaves: int,
+    stored: Callable[[List[Tuple[int, int]]], Dict[Tuple[int, int], bytes]]
+) -> Tuple[bytes, int]:
+    """
+    Merkle root from some leaves' hashes plus the stored nodes next to them.
+
+    Args:
+        known: {leaf index: leaf hash} being checked
+        leaves: Leaves in the tree
+        stored: Returns stored node hashes for [(level, position), ...]
+
+    Returns:
+        (root, number of stored nodes used)
+    """
+    sizes = level_sizes(leaves)
+    # Which positions are derived from the known leaves, level by level, and which siblings must come from storage
+    derived = [set(known)]
+    needed = []
+    for level, size in enumerate(sizes[:-1]):
+        for position in derived[level]:
+            sibling = position ^ 1
+            if sibling < size and sibling not in derived[level]:
+                needed.append((level, sibling))
+        derived.append({position // 2 for position in derived[level]})
+    nodes = stored(needed) if needed else {}
+
+    current = dict(known)
+    for level, size in enumerate(sizes[:-1]):
+        parents = {}
+        for position in derived[level + 1]:
+            left, right = 2 * position, 2 * position + 1
+            left_hash = current[left] if left in current else nodes[(level, left)]
+            if right >= size:
+                parents[position] = left_hash
+            else:
+                parents[position] = node_hash(left_hash, current[right] if right in current else nodes[(level, right)])
+        current = parents
+    return current[0], len(needed)
+
+
+def _offset(sizes: List[int], level: int, position: int) -> int:
+    return (sum(sizes[:level]) + position) * HASH_BYTES
+
+
+def _stored_nodes(db: Session, segment_id: int, leaves: int):
+    """Node reader for subset_root: a few substr columns, or the whole tree when many are needed."""
+    sizes = level_sizes(leaves)
+
+    def read(positions: List[Tuple[int, int]]) -> Dict[Tuple[int, int], bytes]:
+        offsets = [_offset(sizes, level, position) for level, position in positions]
+        if len(positions) > MAX_NODE_COLUMNS:
+            tree = db.query(AuditSegment.tree).filter(AuditSegment.id == segment_id).scalar()
+            return {key: tree[offset:offset + HASH_BYTES] for key, offset in zip(positions, offsets)}
+        row = db.query(*(
+            func.substr(AuditSegment.tree, offset + 1, HASH_BYTES) for offset in offsets
+        )).filter(AuditSegment.id == segment_id).one()
+        return {key: bytes(node) for key, node in zip(positions, row)}
+
+    return read
+
+
+class AuditChain:
+    """
+    Seals audit events into chained Merkle segments and verifies them.
+
+    AuditLogger reports every event it commits (observe); once
+    segment_events events are waiting, or the oldest waiting event is
+    segment_seconds old, the next event seals them. Events younger than
+    grace_seconds are left for a later segment, so an insert that
+    committed late never lands behind an already sealed ID range.
+    Several processes may seal the same database: a segment sequence
+    number can be taken once, and the loser of a race simply retries later.
+    """
+
+    def __init__(
+        self,
+        segment_events: int = settings.AUDIT_SEGMENT_EVENTS,
+        segment_seconds: float = settings.AUDIT_SEGMENT_SECONDS,
+        grace_seconds: float = 5.0
+    ):
+        """
+        Args:
+            segment_events: Events per full segment
+            segment_seconds: Age at which the oldest waiting event is sealed in a partial segment
+            grace_seconds: Events younger than this are not sealed yet
+        """
+        self.segment_events = max(1, segment_events)
+        self.segment_seconds = segment_seconds
+        self.grace = timedelta(seconds=grace_seconds)
+        self._sealed_through: Optional[int] = None  # Last sealed event ID, as last seen
+        self._oldest_waiting: Optional[datetime] = None
+        self._next_attempt = 0.0
+        self._lock = threading.Lock()
+
+    def _load_state(self, db: Session):
+        last = db.query(func.max(AuditSegment.last_event_id)).scalar() or 0
+        self._sealed_through = last
+        self._oldest_waiting = db.query(func.min(AuditLog.timestamp)).filter(AuditLog.id > last).scalar()
+
+    def observe(self, db: Session, event_id: int, timestamp: datetime):
+        """Note a committed event and seal a segment if one is due. Never raises."""
+        try:
+            with self._lock:
+                if self._sealed_through is None:
+                    self._load_state(db)
+                if self._oldest_waiting is None:
+                    self._oldest_waiting = timestamp
+                due = (
+                    event_id - self._sealed_through >= self.segment_events
+                    or timestamp - self._oldest_waiting >= timedelta(seconds=self.segment_seconds)
+                )
+                if not due or time.monotonic() < self._next_attempt:
+                    return
+            self.seal(db, max_segments=1)
+        except Exception as e:
+            db.rollback()
+            logger.warning("Audit segment sealing failed", error=str(e))
+
+    def seal(self, db: Session, max_segments: Optional[int] = None, now: Optional[datetime] = None) -> int:
+        """
+        Seal every segment that is due (full, or old enough).
+
+        Args:
+            db: Database session
+            max_segments: Stop after sealing this many
+            now: Current time (naive UTC), for tests and backfills
+
+        Returns:
+            Number of segments sealed
+        """
+        now = now or datetime.utcnow()
+        sealed = 0
+        with self._lock:
+            while max_segments is None or sealed < max_segments:
+                last = db.query(AuditSegment.seq, AuditSegment.last_event_id, AuditSegment.chain_root).order_by(
+                    AuditSegment.seq.desc()
+                ).first()
+                seq, after, previous = (last[0] + 1, last[1], bytes.fromhex(last[2])) if last else (0, 0, GENESIS)
+                rows = db.query(*EVENT_COLUMNS).filter(AuditLog.id > after).order_by(AuditLog.id).limit(
+                    self.segment_events
+                ).all()
+                cutoff = now - self.grace
+                ready = 0
+                while ready < len(rows) and rows[ready][1] <= cutoff:
+                    ready += 1
+                self._sealed_through = after
+                self._oldest_waiting = rows[0][1] if rows else None
+                if ready == 0 or (ready < self.segment_events and rows[0][1] > now - timedelta(
+                    seconds=self.segment_seconds
+                )):
+                    break
+                rows = rows[:ready]
+                levels = build_tree([leaf_hash(event_record(row)) for row in rows])
+                merkle_root = levels[-1][0]
+                timestamps = [row[1] for row in rows]
+                db.add(AuditSegment(
+                    seq=seq,
+                    first_event_id=rows[0][0],
+                    last_event_id=rows[-1][0],
+                    start_time=min(timestamps),
+                    end_time=max(timestamps),
+                    event_count=len(rows),
+                    merkle_root=merkle_root.hex(),
+                    chain_root=chain_hash(previous, merkle_root, len(rows)).hex(),
+                    tree=b"".join(node for level in levels for node in level),
+                ))
+                try:
+                    db.commit()
+                except IntegrityError:
+                    db.rollback()  # Another process sealed this segment first
+                    break
+                sealed += 1
+                self._sealed_through = rows[-1][0]
+                self._oldest_waiting = None
+            self._next_attempt = time.monotonic() + (0.0 if sealed else 1.0)
+        if sealed:
+            logger.info("Sealed audit segments", segments=sealed, through_event_id=self._sealed_through)
+        return sealed
+
+    def chain_head(self, db: Session) -> Optional[Dict]:
+        """Sequence number, last event ID and chain root of the latest segment."""
+        row = db.query(AuditSegment.seq, AuditSegment.last_event_id, AuditSegment.chain_root).order_by(
+            AuditSegment.seq.desc()
+        ).first()
+        return {"seq": row[0], "last_event_id": row[1], "chain_root": row[2]} if row else None
+
+    def _previous_chain_root(self, db: Session, seq: int) -> bytes:
+        if seq == 0:
+            return GENESIS
+        previous = db.query(AuditSegment.chain_root).filter(AuditSegment.seq == seq - 1).scalar()
+        return bytes.fromhex(previous) if previous else GENESIS
+
+    @staticmethod
+    def _header(segment) -> Dict:
+        return {
+            "seq": segment.seq,
+            "first_event_id": segment.first_event_id,
+            "last_event_id": segment.last_event_id,
+            "start_time": segment.start_time,
+            "end_time": segment.end_time,
+            "event_count": segment.event_count,
+            "merkle_root": segment.merkle_root,
+            "chain_root": segment.chain_root,
+        }
+
+    def verify_event(self, db: Session, event_id: int) -> Optional[Dict]:
+        """
+        Check one event against its segment's Merkle root and chain link.
+
+        Returns:
+            None if there is no such event; otherwise the verdict, the
+            event's canonical record, its leaf index and audit path
+            [(side, sibling hex), ...], and the segment header. Unsealed
+            events come back with segment None and verified False.
+        """
+        row = db.query(*EVENT_COLUMNS).filter(AuditLog.id == event_id).first()
+        if row is None:
+            return None
+        record = event_record(row)
+        result = {"event_id": event_id, "record": record.decode(), "verified": False, "segment": None,
+                  "leaf_index": None, "proof": [], "chain_head": self.chain_head(db)}
+        segment = db.query(*SEGMENT_HEADER).filter(
+            AuditSegment.first_event_id <= event_id, AuditSegment.last_event_id >= event_id
+        ).first()
+        if segment is None:
+            return result
+        index = db.query(func.count(AuditLog.id)).filter(
+            AuditLog.id >= segment.first_event_id, AuditLog.id < event_id
+        ).scalar()
+        path = audit_path(segment.event_count, index) if index < segment.event_count else []
+        positions = [(level, position) for level, position, _ in path]
+        nodes = _stored_nodes(db, segment.id, segment.event_count)(positions) if positions else {}
+        proof = [(side, nodes[(level, position)]) for level, position, side in path]
+        merkle_root = bytes.fromhex(segment.merkle_root)
+        in_tree = index < segment.event_count and root_from_path(leaf_hash(record), proof) == merkle_root
+        linked = chain_hash(
+            self._previous_chain_root(db, segment.seq), merkle_root, segment.event_count
+        ) == bytes.fromhex(segment.chain_root)
+        result.update(
+            verified=in_tree and linked,
+            segment=self._header(segment),
+            leaf_index=index,
+            proof=[(side, node.hex()) for side, node in proof],
+        )
+        return result
+
+    def verify_range(self, db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict:
+        """
+        Check every sealed event timestamped in [start, end].
+
+        Each overlapping segment is checked on its own: its events in the
+        range are hashed and combined with the stored nodes at the range's
+        edges into the Merkle root, the segment's event IDs are counted
+        (catching deleted or inserted rows), and its chain root is checked
+        against its predecessor's.
+
+        Returns:
+            The verdict, events checked, events in range not sealed yet,
+            per-segment results, and the IDs of events whose hashes no
+            longer match their stored leaves
+        """
+        query = db.query(*SEGMENT_HEADER)
+        if start is not None:
+            query = query.filter(AuditSegment.end_time >= start)
+        if end is not None:
+            query = query.filter(AuditSegment.start_time <= end)
+        segments = query.order_by(AuditSegment.seq).all()
+
+        checked, mismatched, results = 0, [], []
+        previous = None
+        for segment in segments:
+            indexed, segment_rows = self._events_in_range(db, segment, start, end)
+            if not indexed:
+                continue
+            leaves = {index: leaf_hash(event_record(row)) for index, row in indexed}
+            complete = segment_rows == segment.event_count
+            merkle_root = bytes.fromhex(segment.merkle_root)
+            stored_nodes = 0
+            if not complete:
+                in_tree = False
+            elif len(leaves) == segment.event_count:
+                in_tree = build_tree([leaves[i] for i in range(segment.event_count)])[-1][0] == merkle_root
+            else:
+                root, stored_nodes = subset_root(leaves, segment.event_count,
+                                                 _stored_nodes(db, segment.id, segment.event_count))
+                in_tree = root == merkle_root
+            if not in_tree and complete:
+                mismatched.extend(self._mismatched(db, segment, indexed, leaves))
+            prior = (bytes.fromhex(previous.chain_root) if previous is not None and previous.seq == segment.seq - 1
+                     else self._previous_chain_root(db, segment.seq))
+            linked = chain_hash(prior, merkle_root, segment.event_count) == bytes.fromhex(segment.chain_root)
+            previous = segment
+            checked += len(indexed)
+            results.append({
+                **self._header(segment),
+                "events_in_range": len(indexed),
+                "stored_nodes_used": stored_nodes,
+                "complete": complete,
+                "verified": in_tree and linked,
+            })
+
+        sealed_through = segments[-1].last_event_id if segments else 0
+        head = self.chain_head(db)
+        unsealed = db.query(func.count(AuditLog.id)).filter(
+            AuditLog.id > (head["last_event_id"] if head else 0)
+        )
+        if start is not None:
+            unsealed = unsealed.filter(AuditLog.timestamp >= start)
+        if end is not None:
+            unsealed = unsealed.filter(AuditLog.timestamp <= end)
+        logger.info("Verified audit range", segments=len(results), events=checked, through_event_id=sealed_through)
+        return {
+            "verified": all(result["verified"] for result in results),
+            "events_checked": checked,
+            "unsealed_events": unsealed.scalar(),
+            "segments": results,
+            "mismatched_event_ids": mismatched,
+            "chain_head": head,
+        }
+
+    @staticmethod
+    def _events_in_range(db: Session, segment, start: Optional[datetime], end: Optional[datetime]):
+        """
+        ([(leaf index, row), ...] for the segment's events in [start, end],
+        number of event rows now in the segment's ID range).
+        """
+        in_segment = AuditLog.id.between(segment.first_event_id, segment.last_event_id)
+        if (start is None or start <= segment.start_time) and (end is None or segment.end_time <= end):
+            rows = db.query(*EVENT_COLUMNS).filter(in_segment).order_by(AuditLog.id).all()
+            return list(enumerate(rows)), len(rows)
+        # Leaf indexes count every event in the segment, so number them before filtering by time
+        numbered = select(
+            *EVENT_COLUMNS,
+            (func.row_number().over(order_by=AuditLog.id) - 1).label("leaf_index"),
+            func.count().over().label("segment_rows"),
+        ).where(in_segment).subquery()
+        query = select(numbered)
+        if start is not None:
+            query = query.where(numbered.c.timestamp >= start)
+        if end is not None:
+            query = query.where(numbered.c.timestamp <= end)
+        rows = db.execute(query.order_by(numbered.c.id)).all()
+        return [(row[-2], tuple(row[:-2])) for row in rows], rows[0][-1] if rows else 0
+
+    def _mismatched(self, db: Session, segment, indexed, leaves: Dict[int, bytes]) -> List[int]:
+        """Events whose leaf hash differs from the stored one (the tree itself is trusted here)."""
+        tree = db.query(AuditSegment.tree).filter(AuditSegment.id == segment.id).scalar()
+        return [
+            row[0] for index, row in indexed
+            if tree[index * HASH_BYTES:(index + 1) * HASH_BYTES] != leaves[index]
+        ]
+
+
+_chains: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_chain_lock = threading.Lock()
+
+
+def get_audit_chain(db: Session = Depends(get_db)) -> AuditChain:
+    """Process-wide audit chain for the session's database."""
+    bind = db.get_bind()
+    chain = _chains.get(bind)
+    if chain is None:
+        with _chain_lock:
+            chain = _chains.get(bind)
+            if chain is None:
+                chain = _chains[bind] = AuditChain()
+    return chain
@@ -0,0 +1,117 @@
+
+"""
+Audit trail: one AuditLog row per audited action.
+"""
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import uuid
+
+from sqlalchemy.orm import Session
+import structlog
+
+from app.db.models import AuditLog
+from app.utils.audit_chain import get_audit_chain
+from app.utils.request_context import current_request
+
+logger = structlog.get_logger()
+
+
+class AuditLogger:
+    """
+    Writes and queries audit events.
+
+    Events are committed immediately, in the caller's session, so they are
+    recorded even if the request fails later on. Inside an HTTP request the
+    correlation ID and duration (time since the request arrived) default to
+    the request's, as tracked by RequestContextMiddleware, and events of a
+    profiled request carry the profile's object key in their metadata.
+    Committed events are sealed into chained Merkle segments in the
+    background of later writes (see app.utils.audit_chain).
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def log_event(
+        self,
+        event_type: str,
+        action: str,
+        resource_type: Optional[str] = None,
+        resource_id: Optional[str] = None,
+        metadata: Optional[Dict] = None,
+        correlation_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        status: str = "success",
+        error_message: Optional[str] = None,
+        duration_ms: Optional[int] = None
+    ) -> AuditLog:
+        """
+        Record an audit event.
+
+        Args:
+            event_type: retrieval, ingestion, verification, checkpoint, ...
+            action: Specific action taken
+            resource_type: Type of resource affected
+            resource_id: ID of the resource
+            metadata: Additional event data
+            correlation_id: Correlation ID (default: the current request's, else generated)
+            user_id: User identifier, if known
+            status: success or failure
+            error_message: Error details when status is failure
+            duration_ms: Execution time in milliseconds (default: time since the
+                current request arrived)
+
+        Returns:
+            The stored AuditLog row
+        """
+        request = current_request()
+        if request is not None:
+            correlation_id = correlation_id or request.correlation_id
+            duration_ms = request.elapsed_ms() if duration_ms is None else duration_ms
+            if request.profile_key:
+                metadata = {**(metadata or {}), "profile_key": request.profile_key}
+        timestamp = datetime.utcnow()
+        event = AuditLog(
+            timestamp=timestamp,
+            event_type=event_type,
+            correlation_id=correlation_id or str(uuid.uuid4()),
+            user_id=user_id,
+            action=action,
+            resource_type=resource_type,
+            resource_id=resource_id,
+            metadata_=metadata or {},
+            status=status,
+            error_message=error_message,
+            duration_ms=duration_ms
+        )
+        self.db.add(event)
+        self.db.flush()
+        event_id = event.id
+        self.db.commit()
+        get_audit_chain(self.db).observe(self.db, event_id, timestamp)
+        return event
+
+    def query(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        event_type: Optional[str] = None,
+        limit: int = 100,
+        page: int = 1
+    ) -> Tuple[List[AuditLog], int]:
+        """
+        Events in chronological order, filtered and paginated.
+
+        Returns:
+            (events on the requested page, total matching events)
+        """
+        query = self.db.query(AuditLog)
+        if start is not None:
+            query = query.filter(AuditLog.timestamp >= start)
+        if end is not None:
+            query = query.filter(AuditLog.timestamp <= end)
+        if event_type:
+            query = query.filter(AuditLog.event_type == event_type)
+        total = query.count()
+        events = query.order_by(AuditLog.timestamp, AuditLog.id).offset((page - 1) * limit).limit(limit).all()
+        return events, total
@@ -0,0 +1,225 @@
+
+"""
+Structured logging setup.
+
+Two modes, chosen by LOG_ASYNC:
+
+- synchronous (default): structlog renders JSON and hands it to stdlib
+  logging, all on the caller's thread;
+- asynchronous: the caller only filters, samples, stamps and enqueues the
+  event dict. A background thread renders it with orjson and writes in
+  batches. The queue is bounded (LOG_QUEUE_SIZE); when it is full new
+  events are dropped and counted rather than blocking the event loop.
+
+In both modes LOG_SAMPLE_RATES keeps only a fraction of selected event
+types, e.g. ``Query received=0.01,Retrieval complete=0.1``; warnings and
+errors are never sampled out. Outcomes are counted in
+greds_log_events_total{outcome=written|dropped|sampled_out|failed}.
+"""
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import logging
+import queue
+import random
+import sys
+import threading
+import time
+
+import orjson
+import structlog
+
+from app.config import settings
+from app.utils.metrics import REGISTRY
+
+LOG_EVENTS = REGISTRY.counter("greds_log_events_total", "Log events by outcome", ["outcome"])
+_written = LOG_EVENTS.labels("written")
+_dropped = LOG_EVENTS.labels("dropped")
+_sampled_out = LOG_EVENTS.labels("sampled_out")
+_failed = LOG_EVENTS.labels("failed")
+
+_NEVER_SAMPLED = {"warning", "error", "critical", "exception"}
+
+# Client libraries that log every request at INFO
+_QUIET_LOGGERS = ("httpx", "httpcore", "botocore", "urllib3")
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """'event=rate,...' -> {event: rate}; rates are clamped to [0, 1]."""
+    rates = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        event, _, rate = part.rpartition("=")
+        if not event:
+            raise ValueError(f"Invalid log sample rate {part!r} (expected event=rate)")
+        rates[event.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class EventSampler:
+    """structlog processor keeping a per-event-type fraction of events."""
+
+    def __init__(self, rates: Dict[str, float]):
+        self.rates = rates
+        self._random = random.random
+
+    def __call__(self, logger, method_name: str, event_dict: Dict) -> Dict:
+        rate = self.rates.get(event_dict.get("event"))
+        if rate is not None and method_name not in _NEVER_SAMPLED and self._random() >= rate:
+            _sampled_out.inc()
+            raise structlog.DropEvent
+        if rate is not None:
+            event_dict["sample_rate"] = rate
+        return event_dict
+
+
+def _stamp(logger, method_name: str, event_dict: Dict) -> Dict:
+    # Epoch float on the hot path; formatted as ISO 8601 by the writer thread
+    event_dict["timestamp"] = time.time()
+    event_dict["level"] = method_name
+    return event_dict
+
+
+def _to_logger(logger, method_name: str, event_dict: Dict):
+    return (event_dict,), {}
+
+
+class BackgroundLogWriter:
+    """
+    Renders and writes queued event dicts on a daemon thread.
+
+    enqueue() never blocks: if the queue is full the event is dropped and
+    counted. Events are written in batches with one flush per batch, to a
+    binary stream or to the binary buffer of a text stream.
+    """
+
+    def __init__(self, stream=None, queue_size: int = settings.LOG_QUEUE_SIZE, batch_size: int = 256):
+        self.stream = stream if stream is not None else sys.stdout
+        self.batch_size = batch_size
+        self.queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, event_dict: Dict):
+        try:
+            self.queue.put_nowait(event_dict)
+        except queue.Full:
+            _dropped.inc()
+
+    @staticmethod
+    def render(event_dict: Dict) -> bytes:
+        stamp = event_dict.get("timestamp")
+        if isinstance(stamp, float):
+            event_dict["timestamp"] = datetime.fromtimestamp(stamp, timezone.utc).isoformat().replace("+00:00", "Z")
+        return orjson.dumps(event_dict, default=repr, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS)
+
+    def _run(self):
+        while True:
+            batch: List = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            lines = []
+            for event_dict in batch:
+                if event_dict is None:
+                    continue
+                try:
+                    lines.append(self.render(event_dict))
+                except Exception:
+                    _failed.inc()
+            if lines:
+                self._write(b"".join(lines), len(lines))
+            if stop:
+                return
+
+    def _write(self, data: bytes, count: int):
+        try:
+            # Text streams (sys.stdout) are written through their binary buffer
+            getattr(self.stream, "buffer", self.stream).write(data)
+            self.stream.flush()
+            _written.inc(count)
+        except Exception:
+            _failed.inc(count)
+
+    def close(self, timeout: float = 5.0):
+        """Write out everything queued so far, then stop the thread."""
+        if self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join(timeout)
+
+
+class _QueueLogger:
+    """structlog logger whose every method enqueues the processed event dict."""
+
+    def __init__(self, writer: BackgroundLogWriter):
+        self.writer = writer
+
+    def msg(self, event_dict: Dict):
+        self.writer.enqueue(event_dict)
+
+    debug = info = warning = warn = error = critical = exception = fatal = log = msg
+
+
+_writer: Optional[BackgroundLogWriter] = None
+
+
+def configure_logging(
+    async_mode: bool = settings.LOG_ASYNC,
+    level: str = settings.LOG_LEVEL,
+    sample_rates: Optional[Dict[str, float]] = None,
+    stream=None,
+    queue_size: int = settings.LOG_QUEUE_SIZE
+) -> Optional[BackgroundLogWriter]:
+    """
+    Configure structlog (see module docstring).
+
+    Returns:
+        The background writer in async mode, else None
+    """
+    global _writer
+    shutdown_logging()
+    rates = parse_sample_rates(settings.LOG_SAMPLE_RATES) if sample_rates is None else sample_rates
+    sampler = [EventSampler(rates)] if rates else []
+    numeric_level = logging.getLevelName(level.upper())
+
+    if not async_mode:
+        handler = logging.StreamHandler(stream if stream is not None else sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        root = logging.getLogger()
+        root.handlers = [handler]
+        root.setLevel(numeric_level)
+        for name in _QUIET_LOGGERS:
+            logging.getLogger(name).setLevel(max(numeric_level, logging.WARNING))
+        structlog.configure(
+            processors=[
+                structlog.stdlib.filter_by_level,
+                *sampler,
+                structlog.stdlib.add_logger_name,
+                structlog.stdlib.add_log_level,
+                structlog.processors.TimeStamper(fmt="iso"),
+                structlog.processors.JSONRenderer()
+            ],
+            wrapper_class=structlog.stdlib.BoundLogger,
+            logger_factory=structlog.stdlib.LoggerFactory(),
+            cache_logger_on_first_use=True,
+        )
+        return None
+
+    _writer = BackgroundLogWriter(stream=stream, queue_size=queue_size)
+    writer_logger = _QueueLogger(_writer)
+    structlog.configure(
+        processors=[*sampler, _stamp, _to_logger],
+        wrapper_class=structlog.make_filtering_bound_logger(numeric_level),
+        logger_factory=lambda *args: writer_logger,
+        cache_logger_on_first_use=True,
+    )
+    return _writer
+
+
+def shutdown_logging():
+    """Flush and stop the background writer, if any."""
+    global _writer
+    if _writer is not None:
+        _writer.close()
+        _writer = None
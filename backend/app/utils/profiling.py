@@ -0,0 +1,258 @@
+
+"""
+Opt-in per-request profiling.
+
+A request is profiled when it sends ``X-Profile: <PROFILING_TOKEN>`` or is
+picked by PROFILING_SAMPLE_RATE. While it runs, a sampler thread looks at
+the event loop every PROFILING_INTERVAL_MS:
+
+- if the request's task is the one running, the loop thread's stack is
+  recorded as a "running" (CPU) sample;
+- otherwise the task is suspended, and its await chain is recorded as a
+  "waiting" sample (thread pool work, I/O, batching queues).
+
+Together the two give a wall-clock profile of that one request, unaffected
+by other requests sharing the loop. While any profile is active the
+interpreter's thread switch interval is lowered to the sampling interval,
+so the sampler is not starved by CPU-bound code holding the GIL. With
+PROFILING_TRACE_ALLOCATIONS,
+tracemalloc runs for the request's duration and the profile lists the top
+allocation sites (tracemalloc is process-wide, so concurrent requests can
+contribute).
+
+The profile is uploaded after the response is sent, on a worker thread,
+to ``profiles/{YYYY-MM-DD}/{correlation_id}.json`` in the object store;
+the same key is returned in X-Profile-Key and stored in the metadata of
+the request's audit events. Requests that are not profiled pay for one
+header scan and one random() call.
+"""
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+import asyncio
+import random
+import sys
+import threading
+import time
+import tracemalloc
+
+import structlog
+
+from app.config import settings
+from app.storage.s3_client import get_s3_client
+from app.utils.request_context import current_request
+
+logger = structlog.get_logger()
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_KEY_HEADER = b"x-profile-key"
+MAX_STACK_DEPTH = 64
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}:{frame.f_lineno}"
+
+
+def _thread_stack(frame) -> List[str]:
+    stack = []
+    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _await_chain(task: asyncio.Task) -> List[str]:
+    # Walk the coroutine chain (cr_await) from the task's outermost coroutine
+    # down to whatever it is suspended on
+    stack, coro = [], task.get_coro()
+    while coro is not None and len(stack) < MAX_STACK_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        stack.append(_frame_label(frame))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return stack
+
+
+class RequestProfiler:
+    """Samples one request's task and optionally traces allocations."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, task: asyncio.Task,
+                 interval_ms: float = None, trace_allocations: bool = None):
+        self.loop = loop
+        self.task = task
+        self.thread_id = threading.get_ident()
+        self.interval = (interval_ms if interval_ms is not None else settings.PROFILING_INTERVAL_MS) / 1000.0
+        self.trace_allocations = (
+            settings.PROFILING_TRACE_ALLOCATIONS if trace_allocations is None else trace_allocations
+        )
+        self.running: Counter = Counter()
+        self.waiting: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="request-profiler", daemon=True)
+        self._started_tracemalloc = False
+        self._snapshot = None
+        self.started_at = None
+        self.duration = 0.0
+
+    def start(self):
+        self.started_at = datetime.utcnow()
+        if self.trace_allocations:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(1)
+                self._started_tracemalloc = True
+            tracemalloc.reset_peak()
+            self._snapshot = tracemalloc.take_snapshot()
+        self._start = time.perf_counter()
+        self._thread.start()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            if asyncio.current_task(self.loop) is self.task:
+                frame = sys._current_frames().get(self.thread_id)
+                if frame is not None:
+                    self.running[";".join(_thread_stack(frame))] += 1
+            else:
+                self.waiting[";".join(_await_chain(self.task))] += 1
+
+    def stop(self) -> Dict:
+        """Stop sampling; returns the profile (stacks in collapsed/folded format)."""
+        self.duration = time.perf_counter() - self._start
+        self._stop.set()
+        self._thread.join()
+        profile = {
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": self.duration * 1000,
+            "interval_ms": self.interval * 1000,
+            "samples": {"running": sum(self.running.values()), "waiting": sum(self.waiting.values())},
+            "top_functions": self._top_functions(),
+            "stacks": {"running": dict(self.running.most_common()), "waiting": dict(self.waiting.most_common())},
+        }
+        if self.trace_allocations:
+            profile["allocations"] = self._allocations()
+        return profile
+
+    def _top_functions(self, limit: int = 20) -> List[Dict]:
+        # Self samples: the innermost frame of each running stack
+        leaves: Counter = Counter()
+        for stack, count in self.running.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [
+            {"frame": frame, "samples": count, "fraction": count / total}
+            for frame, count in leaves.most_common(limit)
+        ]
+
+    def _allocations(self, limit: int = 20) -> Dict:
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        diff = snapshot.compare_to(self._snapshot, "lineno")
+        return {
+            "peak_traced_bytes": peak,
+            "net_bytes": sum(stat.size_diff for stat in diff),
+            "top": [
+                {"location": str(stat.traceback[0]), "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+                for stat in diff[:limit]
+            ],
+        }
+
+
+def profile_key(correlation_id: str, when: Optional[datetime] = None) -> str:
+    """Object key of a request's profile."""
+    return f"profiles/{(when or datetime.utcnow()):%Y-%m-%d}/{correlation_id}.json"
+
+
+class ProfilingMiddleware:
+    """
+    Profiles selected requests (see module docstring). Must run inside
+    RequestContextMiddleware, whose correlation ID keys the profile.
+    """
+
+    def __init__(self, app, store_factory=None):
+        self.app = app
+        self.store_factory = store_factory
+        self._active = 0
+        self._switch_interval = sys.getswitchinterval()
+        self._uploads = set()
+
+    def _wanted(self, scope) -> Optional[str]:
+        token = settings.PROFILING_TOKEN
+        if token:
+            for name, value in scope.get("headers", ()):
+                if name == PROFILE_HEADER:
+                    if value.decode("latin-1") == token:
+                        return "header"
+                    break
+        rate = settings.PROFILING_SAMPLE_RATE
+        if rate > 0 and random.random() < rate:
+            return "sampled"
+        return None
+
+    def _store(self, scope):
+        if self.store_factory is not None:
+            return self.store_factory()
+        # Honour the app's dependency overrides (tests, offline benchmarks)
+        overrides = getattr(scope.get("app"), "dependency_overrides", {})
+        return overrides.get(get_s3_client, get_s3_client)()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (settings.PROFILING_TOKEN or settings.PROFILING_SAMPLE_RATE):
+            await self.app(scope, receive, send)
+            return
+        trigger = self._wanted(scope)
+        request = current_request()
+        if trigger is None or request is None or self._active >= settings.PROFILING_MAX_CONCURRENT:
+            await self.app(scope, receive, send)
+            return
+
+        key = profile_key(request.correlation_id)
+        request.profile_key = key
+        status = 500
+
+        async def send_with_key(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + [
+                    (PROFILE_KEY_HEADER, key.encode("latin-1"))
+                ]}
+            await send(message)
+
+        profiler = RequestProfiler(asyncio.get_running_loop(), asyncio.current_task())
+        if self._active == 0:
+            self._switch_interval = sys.getswitchinterval()
+            sys.setswitchinterval(min(self._switch_interval, profiler.interval))
+        self._active += 1
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_key)
+        finally:
+            profile = profiler.stop()
+            self._active -= 1
+            if self._active == 0:
+                sys.setswitchinterval(self._switch_interval)
+            profile.update({
+                "correlation_id": request.correlation_id,
+                "trigger": trigger,
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status,
+            })
+            self._upload(scope, key, profile)
+
+    def _upload(self, scope, key: str, profile: Dict):
+        async def upload():
+            try:
+                store = self._store(scope)
+                await asyncio.get_running_loop().run_in_executor(None, store.upload_json, profile, key)
+                logger.info("Request profile uploaded", key=key, duration_ms=round(profile["duration_ms"], 1))
+            except Exception as e:
+                logger.error("Request profile upload failed", key=key, error=str(e))
+
+        task = asyncio.get_running_loop().create_task(upload())
+        self._uploads.add(task)  # Keep a reference until done
+        task.add_done_callback(self._uploads.discard)
@@ -0,0 +1,92 @@
+
+"""
+Per-request context: correlation ID and start time.
+
+RequestContextMiddleware opens a context for every HTTP request, takes the
+correlation ID from the X-Correlation-ID header (or generates one), echoes
+it on the response and records the request in
+greds_http_request_duration_seconds. Code running inside the request reads
+the context through current_request(); AuditLogger uses it to fill in
+correlation_id and duration_ms.
+"""
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+import time
+import uuid
+
+from app.utils.metrics import REQUEST_DURATION
+
+CORRELATION_HEADER = "x-correlation-id"
+
+
+@dataclass
+class RequestContext:
+    correlation_id: str
+    start: float = field(default_factory=time.perf_counter)
+    profile_key: Optional[str] = None  # Set when the request is being profiled
+
+    def elapsed_ms(self) -> int:
+        return int((time.perf_counter() - self.start) * 1000)
+
+
+_current: ContextVar[Optional[RequestContext]] = ContextVar("request_context", default=None)
+
+
+def current_request() -> Optional[RequestContext]:
+    """Context of the HTTP request being handled, or None outside a request."""
+    return _current.get()
+
+
+class RequestContextMiddleware:
+    """Pure ASGI middleware (no per-request task or body buffering)."""
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Dict[object, str] = {}
+
+    def _route(self, scope) -> str:
+        # Label by route template, not raw path, to keep label cardinality bounded
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if endpoint not in self._routes:
+            app = scope.get("app")
+            for route in getattr(app, "routes", []):
+                if getattr(route, "endpoint", None) is endpoint:
+                    self._routes[endpoint] = route.path
+                    break
+            else:
+                self._routes[endpoint] = getattr(endpoint, "__name__", "unknown")
+        return self._routes[endpoint]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        correlation_id = None
+        for name, value in scope.get("headers", []):
+            if name == CORRELATION_HEADER.encode("latin-1"):
+                correlation_id = value.decode("latin-1")[:64]
+                break
+        context = RequestContext(correlation_id or uuid.uuid4().hex)
+        token = _current.set(context)
+        status = 500
+
+        async def send_with_header(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((CORRELATION_HEADER.encode("latin-1"), context.correlation_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_header)
+        finally:
+            REQUEST_DURATION.labels(scope["method"], self._route(scope), str(status)).observe(
+                time.perf_counter() - context.start
+            )
+            _current.reset(token)
@@ -0,0 +1,127 @@
+
+"""
+RQ jobs for work ingestion.
+
+Run a worker with:
+    python -m app.workers.ingest_worker
+
+The FAISS and Whoosh indexes are files shared by every job, so run a single
+worker process per index directory. With INDEX_SNAPSHOTS, each completed job
+publishes the indexes as a new snapshot generation for query replicas.
+"""
+from typing import Callable, Dict, List, Optional
+
+import structlog
+from rq import Queue, Worker
+from rq.exceptions import NoSuchJobError
+from rq.job import Job
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.ingestion import IngestionPipeline
+from app.core.snapshots import publish_index_snapshot
+from app.db.models import Work
+from app.db.session import SessionLocal
+from app.workers.queue import get_ingestion_queue
+
+logger = structlog.get_logger()
+
+# RQ statuses meaning the job is still owned by a worker or waiting for one
+ACTIVE_JOB_STATUSES = {"queued", "started", "deferred", "scheduled"}
+
+
+def build_pipeline(session_factory: Callable[[], Session]) -> IngestionPipeline:
+    """Create the ingestion pipeline used by worker jobs."""
+    return IngestionPipeline(session_factory)
+
+
+def enqueue_ingestion(queue: Queue, job_id: str) -> Job:
+    """
+    Enqueue (or re-enqueue, for resume) the ingestion job for a work.
+    The public job ID doubles as the RQ job ID.
+    """
+    return queue.enqueue(
+        run_ingestion_job,
+        job_id,
+        job_id=job_id,
+        job_timeout=settings.INGEST_JOB_TIMEOUT,
+        result_ttl=86400,
+        failure_ttl=7 * 86400,
+        description=f"ingest {job_id}"
+    )
+
+
+def get_job_status(queue: Queue, job_id: str) -> Optional[str]:
+    """RQ status of a job, or None if Redis no longer knows it."""
+    try:
+        status = Job.fetch(job_id, connection=queue.connection).get_status()
+    except NoSuchJobError:
+        return None
+    return getattr(status, "value", status)
+
+
+def run_ingestion_job(job_id: str) -> Dict:
+    """
+    RQ entry point: ingest the work registered under job_id.
+
+    Safe to run repeatedly for the same job; later runs resume where the
+    previous one stopped.
+    """
+    db = SessionLocal()
+    try:
+        work = db.query(Work).filter(Work.ingestion_job_id == job_id).first()
+        if work is None:
+            raise ValueError(f"No work registered for job {job_id}")
+        work_id = work.id
+    finally:
+        db.close()
+
+    # RQ runs each job in a forked work horse, so the pipeline's process
+    # pools cannot outlive the job; shut them down before it exits
+    pipeline = build_pipeline(SessionLocal)
+    try:
+        work = pipeline.run(work_id)
+        try:
+            publish_index_snapshot(pipeline.faiss_indexer, pipeline.whoosh_indexer)
+        except Exception as e:
+            # The work is ingested; replicas stay on the previous generation until the next publish
+            logger.error("Index snapshot publish failed", work_id=work.id, error=str(e))
+    finally:
+        pipeline.close()
+    return {"work_id": work.id, "version": work.version, "total_chunks": work.total_chunks}
+
+
+def find_interrupted_jobs(db: Session, queue: Queue) -> List[str]:
+    """Job IDs of unfinished works that no worker currently owns."""
+    works = db.query(Work).filter(
+        Work.ingestion_status.in_(["pending", "processing"]),
+        Work.ingestion_job_id.isnot(None)
+    ).all()
+    return [
+        work.ingestion_job_id for work in works
+        if get_job_status(queue, work.ingestion_job_id) not in ACTIVE_JOB_STATUSES
+    ]
+
+
+def resume_interrupted_jobs(db: Session, queue: Queue) -> List[str]:
+    """Re-enqueue jobs left behind by a crashed or killed worker."""
+    job_ids = find_interrupted_jobs(db, queue)
+    for job_id in job_ids:
+        enqueue_ingestion(queue, job_id)
+        logger.info("Resumed interrupted ingestion job", job_id=job_id)
+    return job_ids
+
+
+def main():
+    """Resume interrupted jobs, then process the ingestion queue."""
+    queue = get_ingestion_queue()
+    db = SessionLocal()
+    try:
+        resume_interrupted_jobs(db, queue)
+    finally:
+        db.close()
+    Worker([queue], connection=queue.connection).work()
+
+
+if __name__ == "__main__":
+    main()
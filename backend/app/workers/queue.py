@@ -0,0 +1,26 @@
+
+"""
+Redis connection and RQ queue factories.
+"""
+from redis import Redis
+from rq import Queue
+
+from app.config import settings
+
+_redis = None
+
+
+def get_redis() -> Redis:
+    """Process-wide Redis connection (created on first use)."""
+    global _redis
+    if _redis is None:
+        _redis = Redis.from_url(settings.REDIS_URL)
+    return _redis
+
+
+def get_ingestion_queue() -> Queue:
+    """
+    FastAPI dependency for the ingestion job queue.
+    Tests override this to point at a fake Redis.
+    """
+    return Queue(settings.INGEST_QUEUE_NAME, connection=get_redis())
@@ -0,0 +1,8 @@
+
+"""
+Offline performance benchmarks. Run modules from backend/ with ``python -m benchmarks.<name>``.
+"""
+import os
+
+# Benchmarks never call Abacus.AI; let Settings load without a real key
+os.environ.setdefault("ABACUSAI_API_KEY", "benchmark")
@@ -0,0 +1,144 @@
+
+"""
+Context-window expansion for retrieval hits (app.core.neighbors).
+
+A SQLite database is filled with works split into files of consecutive
+chunks. For batches of 20 hits the benchmark expands each hit to its ±k
+window three ways:
+
+- per_hit_queries: one range query per hit on (work_id, chunk_index),
+  loading full chunk rows (what building windows without the index takes);
+- neighbor_ids: window IDs from the in-memory neighbor index (no database);
+- neighbor_batched_text: the same plus one batched read of window text.
+
+It also reports the index's build time and memory, and the cost of an
+incremental refresh after a new work is ingested.
+
+Usage (from backend/):
+    python -m benchmarks.bench_context_windows
+    python -m benchmarks.bench_context_windows --works 200 --hits 20 --output windows.json
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.core.neighbors import NeighborIndex
+from app.db.models import Base, Chunk, Work
+from benchmarks.common import Timer, latency_summary, synthetic_chunks, write_report
+
+
+def populate(session_factory, works: int, files: int, chunks_per_file: int, texts, version: str = "v1") -> int:
+    """Insert works of files of chunks; returns the number of chunks."""
+    db = session_factory()
+    total = 0
+    for w in range(works):
+        work = Work(source_slug=f"work-{w}", version=version, canonical_url=f"https://example.org/{w}", is_current=True)
+        db.add(work)
+        db.flush()
+        rows = [
+            {"work_id": work.id, "chunk_index": f * chunks_per_file + c, "source_path": f"file-{f}.md",
+             "text": texts[(total + f * chunks_per_file + c) % len(texts)]}
+            for f in range(files) for c in range(chunks_per_file)
+        ]
+        db.execute(insert(Chunk), rows)
+        total += len(rows)
+    db.commit()
+    db.close()
+    return total
+
+
+def per_hit_queries(db, hits, k: int):
+    windows = {}
+    for chunk in hits:
+        windows[chunk.id] = db.query(Chunk).filter(
+            Chunk.work_id == chunk.work_id,
+            Chunk.source_path == chunk.source_path,
+            Chunk.chunk_index.between(chunk.chunk_index - k, chunk.chunk_index + k)
+        ).order_by(Chunk.chunk_index).all()
+    return windows
+
+
+def measure(session_factory, index: NeighborIndex, hit_sets, k: int, repeat: int):
+    samples = {"per_hit_queries": [], "neighbor_ids": [], "neighbor_batched_text": []}
+    db = session_factory()
+    for _ in range(repeat):
+        for hits in hit_sets:
+            db.expire_all()
+            start = time.perf_counter()
+            naive = per_hit_queries(db, hits, k)
+            samples["per_hit_queries"].append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            windows = index.windows(db, [chunk.id for chunk in hits], k)
+            samples["neighbor_ids"].append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            loaded = index.load_windows(db, index.windows(db, [chunk.id for chunk in hits], k))
+            samples["neighbor_batched_text"].append((time.perf_counter() - start) * 1000)
+
+            for chunk in hits:  # Same windows either way
+                assert [row.id for row in naive[chunk.id]] == windows[chunk.id]
+                assert [row["chunk_id"] for row in loaded[chunk.id]] == windows[chunk.id]
+    db.close()
+    return {name: latency_summary(values) for name, values in samples.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--works", type=int, default=100)
+    parser.add_argument("--files-per-work", type=int, default=20)
+    parser.add_argument("--chunks-per-file", type=int, default=50)
+    parser.add_argument("--hits", type=int, default=20)
+    parser.add_argument("--windows", default="1,3", help="Comma-separated k values (chunks each side)")
+    parser.add_argument("--batches", type=int, default=50, help="Distinct hit batches")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    texts = synthetic_chunks(500, min_words=150, max_words=250)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'chunks.db')}")
+        Base.metadata.create_all(engine)
+        session_factory = sessionmaker(bind=engine)
+        with Timer() as fill:
+            chunks = populate(session_factory, args.works, args.files_per_work, args.chunks_per_file, texts)
+
+        db = session_factory()
+        with Timer() as build:
+            index = NeighborIndex(refresh_seconds=3600).build(db)
+        rng = random.Random(0)
+        ids = [chunk_id for (chunk_id,) in db.query(Chunk.id)]
+        hit_sets = []
+        for _ in range(args.batches):
+            sample = rng.sample(ids, args.hits)
+            hit_sets.append(db.query(Chunk).filter(Chunk.id.in_(sample)).all())
+        db.close()
+
+        expansion = {f"k={k}": measure(session_factory, index, hit_sets, int(k), args.repeat)
+                     for k in args.windows.split(",")}
+
+        populate(session_factory, 1, args.files_per_work, args.chunks_per_file, texts, version="v2")
+        db = session_factory()
+        with Timer() as refresh:
+            added = index.refresh(db)
+        db.close()
+        engine.dispose()
+
+    write_report({
+        "benchmark": "context_windows",
+        "chunks": chunks,
+        "hits_per_batch": args.hits,
+        "populate_seconds": fill.elapsed,
+        "index": {"build_seconds": build.elapsed, "bytes": index.nbytes, "bytes_per_chunk": index.nbytes / chunks},
+        "refresh_after_new_work": {"chunks": added, "seconds": refresh.elapsed},
+        "expansion_ms_per_batch": expansion,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+
+"""
+Near-duplicate chunk detection at ingest (app.core.dedup).
+
+Builds a repository of unique documents plus vendored copies of some of
+them: exact copies, copies with a few words edited, and copies with a
+license header prepended (which shifts every chunk boundary). The
+repository is ingested twice into fresh databases and indexes, with
+deduplication off and on, and the report compares:
+
+- chunk rows, vectors in FAISS and on-disk size of the FAISS and Whoosh
+  indexes;
+- ingestion time;
+- the per-chunk cost of a MinHash signature and an LSH lookup;
+- how many vendored chunks were aliased, and how many chunks of unique
+  documents were (wrongly) aliased.
+
+Usage (from backend/):
+    python -m benchmarks.bench_dedup
+    python -m benchmarks.bench_dedup --files 2000 --vendored 0.3 --output dedup.json
+"""
+from pathlib import Path
+import argparse
+import random
+import tempfile
+import time
+
+import git
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.core.dedup import NearDuplicateIndex
+from app.core.extractor import RepositoryExtractor
+from app.core.indexer import FAISSIndexer, WhooshIndexer
+from app.core.ingestion import IngestionPipeline
+from app.db.models import Base, Chunk, Work
+from benchmarks.common import SyntheticEmbedder, Timer, latency_summary, make_chunker, synthetic_chunks, write_report
+
+HEADER = "Copyright the original authors. Licensed under the Apache License, Version 2.0. Vendored copy.\n\n"
+
+
+def vendored_variant(text: str, kind: str, rng: random.Random) -> str:
+    if kind == "exact":
+        return text
+    if kind == "header":
+        return HEADER + text
+    words = text.split(" ")
+    for position in rng.sample(range(len(words)), min(3, len(words))):
+        words[position] = "edited"
+    return " ".join(words)
+
+
+def build_repo(path: Path, files: int, vendored: float, seed: int) -> git.Repo:
+    """Unique documents under docs/, vendored copies of a fraction of them under vendor/."""
+    repo = git.Repo.init(path)
+    rng = random.Random(seed)
+    texts = synthetic_chunks(files, seed=seed, min_words=300, max_words=900)
+    names = []
+    for i, text in enumerate(texts):
+        names.append(f"docs/doc{i:05d}.txt")
+        (path / names[-1]).parent.mkdir(parents=True, exist_ok=True)
+        (path / names[-1]).write_text(text)
+    for n, i in enumerate(rng.sample(range(files), int(files * vendored))):
+        kind = ("exact", "edited", "header")[n % 3]
+        names.append(f"vendor/{kind}/doc{i:05d}.txt")
+        (path / names[-1]).parent.mkdir(parents=True, exist_ok=True)
+        (path / names[-1]).write_text(vendored_variant(texts[i], kind, rng))
+    for start in range(0, len(names), 2000):
+        repo.index.add(names[start:start + 2000])
+    actor = git.Actor("Bench", "bench@example.com")
+    repo.index.commit("initial", author=actor, committer=actor)
+    return repo
+
+
+def directory_bytes(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def ingest(tmp: Path, url: str, dedup: bool, chunk_size: int) -> dict:
+    name = "dedup" if dedup else "baseline"
+    engine = create_engine(
+        f"sqlite:///{tmp / (name + '.db')}", connect_args={"check_same_thread": False, "timeout": 60}
+    )
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    faiss_indexer = FAISSIndexer(vector_dim=128, index_path=str(tmp / name / "faiss"))
+    pipeline = IngestionPipeline(
+        session_factory,
+        chunker=make_chunker(chunk_size=chunk_size, overlap=settings.CHUNK_OVERLAP),
+        embedder=SyntheticEmbedder(vector_dim=128, layers=1),
+        faiss_indexer=faiss_indexer,
+        whoosh_indexer=WhooshIndexer(index_path=str(tmp / name / "whoosh")),
+        extractor=RepositoryExtractor(temp_dir=str(tmp / name / "clones"), use_process_pool=False),
+        dedup=NearDuplicateIndex() if dedup else None,
+        progress_interval=5.0
+    )
+    db = session_factory()
+    work = Work(source_slug="bench", version="HEAD", canonical_url=url, ingestion_status="pending")
+    db.add(work)
+    db.commit()
+    work_id = work.id
+    db.close()
+
+    with Timer() as t:
+        pipeline.run(work_id)
+
+    db = session_factory()
+    rows = db.query(Chunk.source_path, Chunk.canonical_chunk_id).all()
+    db.close()
+    engine.dispose()
+    aliased = [path for path, canonical in rows if canonical is not None]
+    vendored = {}
+    for path, canonical in rows:
+        if path.startswith("vendor/"):
+            counts = vendored.setdefault(path.split("/")[1], {"chunks": 0, "aliased": 0})
+            counts["chunks"] += 1
+            counts["aliased"] += canonical is not None
+    return {
+        "seconds": t.elapsed,
+        "chunks": len(rows),
+        "vectors": faiss_indexer.index.ntotal,
+        "faiss_bytes": directory_bytes(tmp / name / "faiss"),
+        "whoosh_bytes": directory_bytes(tmp / name / "whoosh"),
+        "vendored_chunks_by_kind": vendored,
+        "aliased_unique_chunks": sum(1 for path in aliased if path.startswith("docs/")),
+    }
+
+
+def detection_cost(texts, repeat: int = 3) -> dict:
+    """Per-chunk signature and lookup latency against an index of the same chunks."""
+    index = NearDuplicateIndex()
+    signatures = [index.hasher.signature(text) for text in texts]
+    for chunk_id, signature in enumerate(signatures):
+        index.add(chunk_id, signature)
+    sign_ms, find_ms = [], []
+    for _ in range(repeat):
+        for text in texts:
+            start = time.perf_counter()
+            signature = index.hasher.signature(text)
+            sign_ms.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            index.find(signature)
+            find_ms.append((time.perf_counter() - start) * 1000)
+    return {
+        "indexed_chunks": len(index),
+        "bands": index.bands,
+        "rows_per_band": index.rows,
+        "signature_ms": latency_summary(sign_ms),
+        "lookup_ms": latency_summary(find_ms),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=1000, help="Unique documents")
+    parser.add_argument("--vendored", type=float, default=0.3, help="Fraction of documents also vendored")
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=settings.RANDOM_SEED)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        build_repo(tmp / "origin", args.files, args.vendored, args.seed)
+        baseline = ingest(tmp, str(tmp / "origin"), dedup=False, chunk_size=args.chunk_size)
+        deduped = ingest(tmp, str(tmp / "origin"), dedup=True, chunk_size=args.chunk_size)
+
+    cost = detection_cost(synthetic_chunks(2000, seed=args.seed + 1, min_words=150, max_words=250))
+    index_bytes = {name: run["faiss_bytes"] + run["whoosh_bytes"] for name, run in
+                   (("baseline", baseline), ("dedup", deduped))}
+    write_report({
+        "benchmark": "dedup",
+        "unique_files": args.files,
+        "vendored_fraction": args.vendored,
+        "threshold": settings.DEDUP_THRESHOLD,
+        "baseline": baseline,
+        "dedup": deduped,
+        "vector_reduction": 1 - deduped["vectors"] / baseline["vectors"],
+        "index_bytes_reduction": 1 - index_bytes["dedup"] / index_bytes["baseline"],
+        "detection_cost": cost,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
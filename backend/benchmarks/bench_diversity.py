@@ -0,0 +1,147 @@
+
+"""
+Latency added by diversity (MMR) re-ranking (app.core.diversity).
+
+Fills an exact FAISS index with --index-vectors vectors, plus --copies
+perturbed near-copies of the first --pool of them (as overlapping chunks
+and successive versions produce). Candidates for each query are drawn
+in groups: an original and up to --copies of its near-copies, each group
+belonging to one of --works works, with decreasing fused scores. For
+each --candidates count, times HybridRetriever.diversify picking --k
+results: looking up the candidates' positions, reading their vectors
+from the index and running MMR with a per-work cap. Also reports how
+many of the picked results are near-copies of a higher-ranked pick,
+against the plain top-k.
+
+Hydrating the extra candidates and searching for MMR_CANDIDATES hits per
+leg add their own cost (see bench_hydration for hydration by hit count).
+
+Reference run (defaults: 100k 384-d vectors, groups of up to 4
+near-copies at cosine similarity about 0.96, k=20, lambda 0.7, at most
+3 per work):
+
+    candidates   p50      p99      near-copies in plain top 20 / after MMR
+    100          0.4 ms   0.8 ms   3.3 / 0
+    250          0.8 ms   1.9 ms   1.6 / 0
+    500          1.3 ms   2.5 ms   0.7 / 0
+    1000         2.8 ms   4.4 ms   0.4 / 0
+
+Usage (from backend/):
+    python -m benchmarks.bench_diversity
+    python -m benchmarks.bench_diversity --candidates 100,250,500,1000 --output diversity.json
+    python -m benchmarks.bench_diversity --index-vectors 20000 --dim 128
+"""
+from typing import Dict, List
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.core.diversity import Diversity
+from app.core.indexer import FAISSIndexer, normalize_rows
+from app.core.retrieval import HybridRetriever
+from benchmarks.common import latency_summary, write_report
+
+
+def make_candidates(rng, pool: int, filler: int, count: int, copies: int, works: int):
+    """
+    Ranked candidate results in near-copy groups; the j-th copy of pool
+    vector p has chunk ID filler + (j - 1) * pool + p.
+
+    Returns:
+        (results, group per candidate)
+    """
+    chunk_ids, groups = [], []
+    while len(chunk_ids) < count:
+        original = int(rng.integers(pool))
+        for j in range(min(int(rng.integers(1, copies + 2)), count - len(chunk_ids))):
+            chunk_ids.append(original if j == 0 else filler + (j - 1) * pool + original)
+            groups.append(original)
+    order = rng.permutation(count)  # Copies are spread through the ranking, not adjacent
+    chunk_ids, groups = np.asarray(chunk_ids)[order], np.asarray(groups)[order]
+    scores = np.sort(rng.random(count))[::-1]
+    work_of = {group: int(rng.integers(works)) for group in set(groups.tolist())}
+    results = [{"chunk_id": int(chunk_id), "work_slug": f"work-{work_of[group]}", "hybrid_score": float(score)}
+               for chunk_id, group, score in zip(chunk_ids, groups, scores)]
+    return results, groups
+
+
+def near_copies(picked: List[Dict], group_of: Dict[int, int]) -> int:
+    seen, repeats = set(), 0
+    for result in picked:
+        group = group_of[id(result)]
+        repeats += group in seen
+        seen.add(group)
+    return repeats
+
+
+def run(retriever: HybridRetriever, count: int, args, seed: int) -> Dict:
+    rng = np.random.default_rng(seed)
+    diversity = Diversity(args.mmr_lambda, args.max_per_work)
+    latencies, repeats_before, repeats_after = [], [], []
+    for _ in range(args.queries):
+        results, groups = make_candidates(rng, args.pool, args.index_vectors, count, args.copies, args.works)
+        group_of = {id(result): group for result, group in zip(results, groups.tolist())}
+        chunk_ids = [result["chunk_id"] for result in results]
+        start = time.perf_counter()
+        picked = retriever.diversify(results, chunk_ids, args.k, diversity)
+        latencies.append((time.perf_counter() - start) * 1000)
+        repeats_before.append(near_copies(results[:args.k], group_of))
+        repeats_after.append(near_copies(picked, group_of))
+    return {
+        "candidates": count,
+        "latency": latency_summary(latencies),
+        "near_copies_in_plain_top_k": float(np.mean(repeats_before)),
+        "near_copies_in_mmr_top_k": float(np.mean(repeats_after)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index-vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--candidates", default="100,250,500,1000", help="Comma-separated candidate counts")
+    parser.add_argument("--k", type=int, default=20, help="Results picked (TOP_K)")
+    parser.add_argument("--copies", type=int, default=3, help="Most near-copies of one chunk among the candidates")
+    parser.add_argument("--pool", type=int, default=10000, help="Vectors candidates are drawn from")
+    parser.add_argument("--noise", type=float, default=0.3, help="Distance of a near-copy from its original")
+    parser.add_argument("--works", type=int, default=30)
+    parser.add_argument("--mmr-lambda", type=float, default=0.7)
+    parser.add_argument("--max-per-work", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+    if args.pool > args.index_vectors:
+        parser.error("--pool cannot exceed --index-vectors")
+
+    rng = np.random.default_rng(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        indexer = FAISSIndexer(vector_dim=args.dim, index_path=os.path.join(tmp, "faiss"))
+        originals = normalize_rows(rng.standard_normal((args.index_vectors, args.dim)))
+        indexer.add_batch(list(range(args.index_vectors)), originals)
+        # Near-copies of the first --pool vectors, each a separate indexed chunk close to its original
+        for j in range(args.copies):
+            first = args.index_vectors + j * args.pool
+            noise = rng.standard_normal((args.pool, args.dim)) / np.sqrt(args.dim)
+            indexer.add_batch(list(range(first, first + args.pool)), originals[:args.pool] + args.noise * noise)
+        del originals
+        retriever = HybridRetriever(None, None, indexer, None)
+        indexer.positions([0])  # Builds the chunk ID lookup, as the first diversified query would
+        rows = [run(retriever, int(count), args, args.seed + 1) for count in args.candidates.split(",")]
+
+    write_report({
+        "benchmark": "diversity",
+        "index_vectors": indexer.next_id,
+        "dim": args.dim,
+        "k": args.k,
+        "mmr_lambda": args.mmr_lambda,
+        "max_per_work": args.max_per_work,
+        "results": rows,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
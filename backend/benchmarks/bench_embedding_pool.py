@@ -0,0 +1,96 @@
+
+"""
+Embedding throughput: single process vs. ParallelEmbeddingPool at 1..N processes.
+
+Usage (from backend/):
+    python -m benchmarks.bench_embedding_pool --chunks 2000
+    python -m benchmarks.bench_embedding_pool --model sentence-transformers
+
+The default ``synthetic`` model is an offline, CPU-bound stand-in; use
+``sentence-transformers`` on a host with the real model available.
+"""
+from functools import partial
+import argparse
+import os
+
+from app.config import settings
+from app.core.embeddings import EmbeddingGenerator, ParallelEmbeddingPool
+from benchmarks.common import SyntheticEmbedder, Timer, padding_efficiency, synthetic_chunks, write_report
+
+# PROJECT_PLAN.md ingestion target
+CHUNKS_PER_MINUTE_FLOOR = 50
+
+
+def _factory(model: str):
+    if model == "synthetic":
+        return SyntheticEmbedder
+    return partial(EmbeddingGenerator, settings.EMBEDDING_MODEL)
+
+
+def _process_counts(spec: str):
+    if spec:
+        return [int(p) for p in spec.split(",")]
+    counts, p = [], 1
+    cpus = os.cpu_count() or 1
+    while p < cpus:
+        counts.append(p)
+        p *= 2
+    return counts + [cpus]
+
+
+def run(chunks: int, batch_size: int, model: str, processes, seed: int) -> dict:
+    texts = synthetic_chunks(chunks, seed=seed)
+    factory = _factory(model)
+    results = []
+
+    local = factory()
+    local.embed_batch(texts[:batch_size], batch_size=batch_size)  # warm up
+    with Timer() as t:
+        local.embed_batch(texts, batch_size=batch_size)
+    results.append({"mode": "local", "processes": 1, "seconds": t.elapsed,
+                    "chunks_per_minute": chunks / t.elapsed * 60})
+
+    for count in processes:
+        with ParallelEmbeddingPool(processes=count, batch_size=batch_size, embedder_factory=factory) as pool:
+            pool.embed_batch(texts[:batch_size * count])  # start workers and load models
+            with Timer() as t:
+                pool.embed_batch(texts)
+        results.append({"mode": "process_pool", "processes": count, "seconds": t.elapsed,
+                        "chunks_per_minute": chunks / t.elapsed * 60})
+
+    base = results[0]["chunks_per_minute"]
+    for row in results:
+        row["speedup_vs_local"] = row["chunks_per_minute"] / base
+        row["meets_floor"] = row["chunks_per_minute"] >= CHUNKS_PER_MINUTE_FLOOR
+
+    return {
+        "benchmark": "embedding_pool",
+        "model": model,
+        "chunks": chunks,
+        "batch_size": batch_size,
+        "cpu_count": os.cpu_count(),
+        "floor_chunks_per_minute": CHUNKS_PER_MINUTE_FLOOR,
+        "padding_efficiency": {
+            "input_order": padding_efficiency(texts, batch_size, sort_by_length=False),
+            "length_sorted": padding_efficiency(texts, batch_size, sort_by_length=True),
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=settings.INGEST_EMBED_BATCH_SIZE)
+    parser.add_argument("--model", choices=["synthetic", "sentence-transformers"], default="synthetic")
+    parser.add_argument("--processes", default="", help="Comma-separated process counts (default: 1,2,4..CPUs)")
+    parser.add_argument("--seed", type=int, default=settings.RANDOM_SEED)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = run(args.chunks, args.batch_size, args.model, _process_counts(args.processes), args.seed)
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
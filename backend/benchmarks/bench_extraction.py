@@ -0,0 +1,147 @@
+
+"""
+Repository extraction throughput on a local fixture repository.
+
+Builds a git repository with a history of commits and a mix of PDF, HTML,
+Markdown and text files, then measures:
+
+- full vs. shallow single-branch clone time
+- serial extraction vs. extraction threads vs. threads + parse process pool
+- time to the first chunk when extraction streams into chunking
+
+Usage (from backend/):
+    python -m benchmarks.bench_extraction --files 400 --commits 20
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import git
+
+from app.config import settings
+from app.core.extractor import RepositoryExtractor, extract_text
+from app.core.ingestion import StageSpec, StagedPipeline
+from benchmarks.common import Timer, make_chunker, minimal_pdf, synthetic_chunks, write_report
+
+
+def build_fixture_repo(path: Path, files: int, commits: int, seed: int) -> git.Repo:
+    """Mixed-format repository whose files are rewritten over several commits."""
+    rng = random.Random(seed)
+    repo = git.Repo.init(path)
+    actor = git.Actor("Bench", "bench@example.com")
+    paragraphs = synthetic_chunks(files * 4, seed=seed, min_words=150, max_words=600)
+    for commit in range(commits):
+        names = []
+        for i in range(files):
+            if commit and rng.random() > 0.2:
+                continue  # Later commits touch a fraction of the files
+            body = " ".join(paragraphs[(i * 4 + commit + k) % len(paragraphs)] for k in range(3))
+            kind = ("pdf", "html", "md", "txt")[i % 4]
+            name = f"section{i % 10}/doc{i}.{kind}"
+            target = path / name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if kind == "pdf":
+                words = body.split()
+                target.write_bytes(minimal_pdf([" ".join(words[p:p + 80]) for p in range(0, len(words), 80)]))
+            elif kind == "html":
+                target.write_text(f"<html><body><h1>Doc {i}</h1><p>{body}</p><script>x()</script></body></html>")
+            elif kind == "md":
+                target.write_text(f"# Doc {i}\n\n*{body}*\n")
+            else:
+                target.write_text(body)
+            names.append(name)
+        repo.index.add(names)
+        repo.index.commit(f"revision {commit}", author=actor, committer=actor)
+    return repo
+
+
+def extraction_rates(repo_path: Path, files, seconds: float) -> dict:
+    size = sum((repo_path / f).stat().st_size for f in files)
+    return {
+        "seconds": seconds,
+        "files_per_second": len(files) / seconds,
+        "mb_per_second": size / seconds / 1e6,
+    }
+
+
+def run(files: int, commits: int, threads: int, processes: int, seed: int) -> dict:
+    report = {"benchmark": "extraction", "files": files, "commits": commits,
+              "extract_threads": threads, "parse_processes": processes, "cpu_count": os.cpu_count()}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        build_fixture_repo(tmp / "origin", files, commits, seed)
+
+        clones = {}
+        for mode, shallow in (("full", False), ("shallow", True)):
+            extractor = RepositoryExtractor(temp_dir=str(tmp / "clones"), shallow=shallow, use_process_pool=False)
+            with Timer() as t:
+                # file:// so the full clone copies objects instead of hardlinking them
+                path = extractor.clone_repo((tmp / "origin").as_uri(), mode)
+            counts = dict(line.split(": ") for line in git.Repo(path).git.count_objects("-v").splitlines())
+            clones[mode] = {"seconds": t.elapsed, "objects": int(counts["count"]) + int(counts["in-pack"]),
+                            "pack_kib": int(counts["size-pack"])}
+        report["clone"] = clones
+
+        repo_path = tmp / "clones" / "shallow"
+        extractor = RepositoryExtractor(temp_dir=str(tmp / "clones"), parse_processes=processes)
+        listed = extractor.list_files(repo_path)
+
+        with Timer() as t:
+            for name in listed:
+                extract_text(repo_path / name)
+        results = {"serial": extraction_rates(repo_path, listed, t.elapsed)}
+
+        with ThreadPoolExecutor(threads) as pool, Timer() as t:
+            list(pool.map(lambda name: extract_text(repo_path / name), listed))
+        results["threads"] = extraction_rates(repo_path, listed, t.elapsed)
+
+        extractor.extract(repo_path / next(f for f in listed if f.endswith(".pdf")))  # Start the pool
+        with ThreadPoolExecutor(max(threads, extractor.parse_processes)) as pool, Timer() as t:
+            list(pool.map(lambda name: extractor.extract(repo_path / name), listed))
+        results["threads_process_pool"] = extraction_rates(repo_path, listed, t.elapsed)
+        report["extraction"] = results
+
+        # Streaming into chunking: chunks flow as soon as each file is parsed
+        chunker = make_chunker(chunk_size=settings.CHUNK_SIZE, overlap=settings.CHUNK_OVERLAP)
+        first_chunk = []
+        start = time.perf_counter()
+
+        def chunk(text):
+            chunker.chunk_text(text)
+            if not first_chunk:
+                first_chunk.append(time.perf_counter() - start)
+            return ()
+
+        pipeline = StagedPipeline([
+            StageSpec("extract", lambda name: [extractor.extract(repo_path / name)],
+                      max(threads, extractor.parse_processes)),
+            StageSpec("chunk", chunk, settings.INGEST_CHUNK_WORKERS),
+        ])
+        pipeline.run(iter(listed), tick_seconds=0.05)
+        report["streaming"] = {
+            "first_chunk_seconds": first_chunk[0],
+            "total_seconds": time.perf_counter() - start,
+        }
+        extractor.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=400)
+    parser.add_argument("--commits", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=settings.INGEST_EXTRACT_WORKERS)
+    parser.add_argument("--processes", type=int, default=settings.INGEST_PARSE_PROCESSES,
+                        help="Parse pool processes (0 = one per CPU)")
+    parser.add_argument("--seed", type=int, default=settings.RANDOM_SEED)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+    write_report(run(args.files, args.commits, args.threads, args.processes, args.seed), args.output)
+
+
+if __name__ == "__main__":
+    main()
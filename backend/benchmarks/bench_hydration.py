@@ -0,0 +1,215 @@
+
+"""
+Result hydration: ranked chunk IDs to retrieval results (app.core.hydration).
+
+A SQLite database is filled with works of chunks carrying text, MinHash
+signatures and work metadata, as ingestion leaves them. Batches of ranked
+hits are drawn with a skewed (Zipf) popularity, so some chunks are hot,
+and each batch is hydrated three ways:
+
+- orm_full_rows: Chunk and Work ORM rows for every hit, text and all (how
+  hydration worked before ChunkHydrator);
+- lean_uncached: one column-only query, no text, no cache;
+- lean_cached: the same with the hot-chunk LRU, warmed up on other batches
+  drawn from the same popularity (so the hit rate is a realistic one).
+
+For the lean paths it also reports what reading text back costs: the top
+three results in full (what claims quote) and every result as a preview.
+
+Reference run (100k chunks, about half the hits served from the cache),
+p50 per query:
+
+    hits   orm_full_rows   lean_uncached   lean_cached   text of top 3
+    20     2.5 ms          1.4 ms          1.2 ms        0.5 ms
+    50     4.7 ms          2.2 ms          1.5 ms        0.5 ms
+    100    7.9 ms          3.4 ms          2.4 ms        0.7 ms
+    200    15.7 ms         6.0 ms          3.9 ms        0.8 ms
+
+Usage (from backend/):
+    python -m benchmarks.bench_hydration
+    python -m benchmarks.bench_hydration --works 100 --hits 20,50,100,200 --output hydration.json
+"""
+from typing import Dict, List
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import create_engine, insert, or_
+from sqlalchemy.orm import sessionmaker
+
+from app.core.hydration import ChunkHydrator
+from app.core.retrieval import HybridRetriever, _matches
+from app.db.models import Base, Chunk, Work
+from app.utils.helpers import generate_retrieval_id
+from benchmarks.common import Timer, latency_summary, synthetic_chunks, write_report
+
+PREVIEW_CHARS = 300
+CLAIM_HITS = 3
+
+
+def populate(session_factory, works: int, chunks_per_work: int, texts: List[str], seed: int) -> int:
+    """Insert works and their chunks; returns the number of chunks."""
+    rng = np.random.default_rng(seed)
+    db = session_factory()
+    total = 0
+    for w in range(works):
+        work = Work(
+            source_slug=f"work-{w}", version="v1", canonical_url=f"https://example.org/{w}", is_current=True,
+            title=f"Work {w}", authors=[f"Author {a}" for a in range(3)], tags=["cosmology"],
+            total_chunks=chunks_per_work, metadata_={"repository": f"https://example.org/{w}.git", "files": 20},
+        )
+        db.add(work)
+        db.flush()
+        rows = [
+            {"work_id": work.id, "chunk_index": c, "source_path": f"file-{c // 50}.md",
+             "text": texts[(total + c) % len(texts)], "token_count": 256, "chunking_strategy": "fixed_tokens",
+             "chunking_params": {"chunk_size": 256, "overlap": 0.2},
+             "minhash": rng.integers(0, 2 ** 32, 128, dtype=np.uint32).tobytes()}
+            for c in range(chunks_per_work)
+        ]
+        db.execute(insert(Chunk), rows)
+        total += len(rows)
+    db.commit()
+    db.close()
+    return total
+
+
+def orm_hydrate(db, ranked: List[Dict], top_k: int) -> List[Dict]:
+    """Hydration as it was: full Chunk and Work rows for every hit."""
+    chunk_ids = [entry["chunk_id"] for entry in ranked]
+    rows = db.query(Chunk, Work).join(Work).filter(
+        or_(Chunk.id.in_(chunk_ids), Chunk.canonical_chunk_id.in_(chunk_ids)),
+        Work.is_current.is_(True)
+    ).order_by(Chunk.id).all()
+    copies = {}
+    for chunk, work in rows:
+        canonical_id = chunk.canonical_chunk_id or chunk.id
+        group = copies.setdefault(canonical_id, [])
+        if chunk.id == canonical_id:
+            group.insert(0, (chunk, work))
+        else:
+            group.append((chunk, work))
+    results = []
+    for entry in ranked:
+        visible = [(chunk, work) for chunk, work in copies.get(entry["chunk_id"], ()) if _matches(work, None)]
+        if not visible:
+            continue
+        chunk, work = visible[0]
+        results.append({
+            "retrieval_id": generate_retrieval_id(work.source_slug, work.version, chunk.id),
+            "chunk_id": chunk.id,
+            "work_slug": work.source_slug,
+            "version": work.version,
+            "chunk_index": chunk.chunk_index,
+            "text": chunk.text,
+            "work_title": work.title,
+            "work_url": work.canonical_url,
+            "aliases": [generate_retrieval_id(w.source_slug, w.version, c.id) for c, w in visible[1:]],
+        })
+        if len(results) == top_k:
+            break
+    return results
+
+
+def workload(ids: List[int], hits: int, batches: int, zipf: float, seed: int) -> List[List[Dict]]:
+    """Ranked hit batches whose chunks follow a Zipf popularity."""
+    rng = np.random.default_rng(seed)
+    popularity = 1.0 / np.arange(1, len(ids) + 1) ** zipf
+    popularity /= popularity.sum()
+    order = np.array(ids)
+    random.Random(seed).shuffle(order)
+    ranked = []
+    for _ in range(batches):
+        sample = rng.choice(order, hits, replace=False, p=popularity)
+        ranked.append([{"chunk_id": int(chunk_id), "semantic_score": 0.5, "lexical_score": 0.5, "hybrid_score": 0.5}
+                       for chunk_id in sample])
+    return ranked
+
+
+def timed(samples: List[float], fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    samples.append((time.perf_counter() - start) * 1000)
+    return result
+
+
+def measure(session_factory, warm_sets, ranked_sets, cache_chunks: int, repeat: int) -> Dict:
+    names = ["orm_full_rows", "lean_uncached", "lean_cached", "text_top3", "text_preview_all"]
+    samples = {name: [] for name in names}
+    db = session_factory()
+    uncached = HybridRetriever(db, None, None, None, hydrator=ChunkHydrator(max_chunks=0))
+    cached = HybridRetriever(db, None, None, None, hydrator=ChunkHydrator(max_chunks=cache_chunks,
+                                                                          refresh_seconds=3600))
+    for ranked in warm_sets:
+        cached.hydrate(ranked, len(ranked))
+    cached.hydrator.stats.update(hits=0, misses=0, queries=0)
+    for _ in range(repeat):
+        for ranked in ranked_sets:
+            db.expire_all()
+            top_k = len(ranked)
+            full = timed(samples["orm_full_rows"], orm_hydrate, db, ranked, top_k)
+            db.expunge_all()
+            lean = timed(samples["lean_uncached"], uncached.hydrate, ranked, top_k)
+            hot = timed(samples["lean_cached"], cached.hydrate, ranked, top_k)
+            timed(samples["text_top3"], cached.load_text, hot[:CLAIM_HITS])
+            previews = [dict(result) for result in hot]
+            timed(samples["text_preview_all"], cached.load_text, previews, PREVIEW_CHARS)
+
+            assert [r["retrieval_id"] for r in full] == [r["retrieval_id"] for r in lean] == \
+                [r["retrieval_id"] for r in hot]
+            assert [r["text"] for r in full[:CLAIM_HITS]] == [r["text"] for r in hot[:CLAIM_HITS]]
+    db.close()
+    stats = cached.hydrator.stats
+    return {
+        "ms_per_batch": {name: latency_summary(values) for name, values in samples.items()},
+        "cache_hit_rate": stats["hits"] / max(1, stats["hits"] + stats["misses"]),
+        "cached_queries_per_batch": stats["queries"] / (repeat * len(ranked_sets)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--works", type=int, default=100)
+    parser.add_argument("--chunks-per-work", type=int, default=1000)
+    parser.add_argument("--hits", default="20,50,100,200", help="Comma-separated hits per batch")
+    parser.add_argument("--batches", type=int, default=100, help="Distinct hit batches per size")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the batches (later passes hit the cache)")
+    parser.add_argument("--zipf", type=float, default=1.0, help="Popularity skew of hit chunks")
+    parser.add_argument("--cache-chunks", type=int, default=10000, help="Hydration LRU size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    texts = synthetic_chunks(500, min_words=150, max_words=250)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'chunks.db')}")
+        Base.metadata.create_all(engine)
+        session_factory = sessionmaker(bind=engine)
+        with Timer() as fill:
+            chunks = populate(session_factory, args.works, args.chunks_per_work, texts, args.seed)
+        db = session_factory()
+        ids = [chunk_id for (chunk_id,) in db.query(Chunk.id)]
+        db.close()
+
+        results = {}
+        for hits in args.hits.split(","):
+            warm_sets = workload(ids, int(hits), args.batches, args.zipf, args.seed + 1)
+            ranked_sets = workload(ids, int(hits), args.batches, args.zipf, args.seed)
+            results[f"hits={hits}"] = measure(session_factory, warm_sets, ranked_sets, args.cache_chunks, args.repeat)
+        engine.dispose()
+
+    write_report({
+        "benchmark": "hydration",
+        "chunks": chunks,
+        "populate_seconds": fill.elapsed,
+        "zipf": args.zipf,
+        "cache_chunks": args.cache_chunks,
+        "results": results,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
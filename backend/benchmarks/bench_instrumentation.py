@@ -0,0 +1,161 @@
+
+"""
+Cost of the request instrumentation (app.utils.metrics, RequestContextMiddleware).
+
+Measures, per operation:
+- Histogram.observe on a bound child
+- `with stage_timer(...)` around an empty block, and a @stage_timer call
+- the same timer with several threads recording into one stage
+- RequestContextMiddleware around a trivial ASGI app, versus the bare app
+- rendering /metrics with every stage populated
+
+Each number is the instrumented loop minus an empty loop of the same shape,
+best of --repeat runs.
+
+Usage (from backend/):
+    python -m benchmarks.bench_instrumentation
+    python -m benchmarks.bench_instrumentation --iterations 1000000 --output instr.json
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import asyncio
+import time
+
+from app.utils.metrics import REGISTRY, STAGE_DURATION, stage_timer
+from app.utils.request_context import RequestContextMiddleware
+from benchmarks.common import write_report
+
+STAGES = ("embed", "semantic_search", "lexical_search", "fusion", "hydration", "verification", "s3_io")
+
+
+def best_ns_per_op(loop, iterations: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        loop(iterations)
+        best = min(best, (time.perf_counter_ns() - start) / iterations)
+    return best
+
+
+def empty_loop(n):
+    for _ in range(n):
+        pass
+
+
+class _Empty:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def empty_with_loop(n):
+    for _ in range(n):
+        with _Empty():
+            pass
+
+
+def observe_loop(n):
+    child = STAGE_DURATION.labels("bench_observe")
+    for _ in range(n):
+        child.observe(0.001)
+
+
+def timer_loop(n):
+    for _ in range(n):
+        with stage_timer("bench_timer"):
+            pass
+
+
+def plain(x):
+    return x
+
+
+@stage_timer("bench_decorated")
+def decorated(x):
+    return x
+
+
+def plain_call_loop(n):
+    for i in range(n):
+        plain(i)
+
+
+def decorated_call_loop(n):
+    for i in range(n):
+        decorated(i)
+
+
+def threaded_ns_per_op(threads: int, iterations: int) -> float:
+    per_thread = iterations // threads
+    with ThreadPoolExecutor(threads) as pool:
+        start = time.perf_counter_ns()
+        list(pool.map(lambda _: timer_loop(per_thread), range(threads)))
+        return (time.perf_counter_ns() - start) / (per_thread * threads)
+
+
+async def _bare_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def asgi_ns_per_request(app, requests: int) -> float:
+    scope = {"type": "http", "method": "GET", "path": "/bench",
+             "headers": [(b"x-correlation-id", b"bench")]}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter_ns()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter_ns() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=500_000)
+    parser.add_argument("--requests", type=int, default=50_000, help="ASGI requests per middleware measurement")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    n, repeat = args.iterations, args.repeat
+    loop_ns = best_ns_per_op(empty_loop, n, repeat)
+    with_ns = best_ns_per_op(empty_with_loop, n, repeat)
+    call_ns = best_ns_per_op(plain_call_loop, n, repeat)
+
+    bare = min(asyncio.run(asgi_ns_per_request(_bare_app, args.requests)) for _ in range(repeat))
+    wrapped_app = RequestContextMiddleware(_bare_app)
+    wrapped = min(asyncio.run(asgi_ns_per_request(wrapped_app, args.requests)) for _ in range(repeat))
+
+    for stage in STAGES:
+        for _ in range(100):
+            with stage_timer(stage):
+                pass
+    start = time.perf_counter()
+    text = REGISTRY.render()
+    render_ms = (time.perf_counter() - start) * 1000
+
+    report = {
+        "benchmark": "instrumentation",
+        "iterations": n,
+        "overhead_ns": {
+            "histogram_observe": best_ns_per_op(observe_loop, n, repeat) - loop_ns,
+            "stage_timer_block": best_ns_per_op(timer_loop, n, repeat) - with_ns,
+            "stage_timer_decorator": best_ns_per_op(decorated_call_loop, n, repeat) - call_ns,
+            f"stage_timer_block_{args.threads}_threads": threaded_ns_per_op(args.threads, n) - with_ns,
+            "request_middleware": wrapped - bare,
+        },
+        "metrics_render": {"ms": render_ms, "bytes": len(text)},
+    }
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
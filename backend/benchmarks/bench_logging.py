@@ -0,0 +1,116 @@
+
+"""
+Event-loop cost of logging (app.utils.log_pipeline).
+
+An asyncio loop runs an open-loop request stream (default 1,000 requests/s)
+in which each request makes the same log calls as POST /api/v1/query
+("Query received" with the full query text, "Retrieval complete"), with a
+yield to the loop in between. Logs go to a real file. For each mode:
+
+- sync: structlog JSONRenderer over stdlib logging (the previous setup);
+- async: enqueue only, orjson rendering and batched writes on a thread;
+- async_sampled: async plus LOG_SAMPLE_RATES-style sampling of both events;
+
+the report gives the loop time spent inside log calls per request, the
+lag between each request's scheduled and actual start, and the pipeline's
+written/dropped/sampled_out counters.
+
+Usage (from backend/):
+    python -m benchmarks.bench_logging
+    python -m benchmarks.bench_logging --qps 2000 --seconds 10 --output logging.json
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import structlog
+
+from app.utils.log_pipeline import LOG_EVENTS, configure_logging, shutdown_logging
+from benchmarks.common import latency_summary, synthetic_chunks, write_report
+
+MODES = {
+    "sync": {"async_mode": False, "sample_rates": {}},
+    "async": {"async_mode": True, "sample_rates": {}},
+    "async_sampled": {"async_mode": True, "sample_rates": {"Query received": 0.01, "Retrieval complete": 0.1}},
+}
+
+
+async def handle(logger, query: str, log_ns: list):
+    start = time.perf_counter_ns()
+    logger.info("Query received", session_id="bench-session", query=query)
+    log_ns.append(time.perf_counter_ns() - start)
+    await asyncio.sleep(0)  # Retrieval would await here
+    start = time.perf_counter_ns()
+    logger.info("Retrieval complete", semantic=50, lexical=50, results_count=20)
+    log_ns[-1] += time.perf_counter_ns() - start
+
+
+async def drive(logger, queries, qps: float, seconds: float):
+    loop = asyncio.get_running_loop()
+    log_ns, lag_ms, tasks = [], [], []
+    interval = 1.0 / qps
+    begin = loop.time()
+    for i in range(int(qps * seconds)):
+        scheduled = begin + i * interval
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        lag_ms.append((loop.time() - scheduled) * 1000)
+        tasks.append(loop.create_task(handle(logger, queries[i % len(queries)], log_ns)))
+        if len(tasks) >= 256:
+            await asyncio.gather(*tasks)
+            tasks.clear()
+    await asyncio.gather(*tasks)
+    return log_ns, lag_ms
+
+
+def counters() -> dict:
+    return {outcome: LOG_EVENTS.labels(outcome).value for outcome in ("written", "dropped", "sampled_out", "failed")}
+
+
+def run_mode(mode: str, args, queries, path: str) -> dict:
+    with open(path, "wb" if MODES[mode]["async_mode"] else "w") as stream:
+        configure_logging(level="INFO", stream=stream, **MODES[mode])
+        logger = structlog.get_logger()  # Fresh logger: cached ones keep the previous configuration
+        before = counters()
+        log_ns, lag_ms = asyncio.run(drive(logger, queries, args.qps, args.seconds))
+        shutdown_logging()
+        after = counters()
+    per_request_us = [ns / 1000 for ns in log_ns]
+    if MODES[mode]["async_mode"]:
+        events = {k: after[k] - before[k] for k in after}
+    else:
+        events = {"written": 2 * len(log_ns)}
+    return {
+        "log_calls_us_per_request": {k.replace("_ms", "_us"): v for k, v in latency_summary(per_request_us).items()},
+        "loop_busy_logging_pct": sum(log_ns) / 1e9 / args.seconds * 100,
+        "start_lag_ms": latency_summary(lag_ms),
+        "log_bytes": os.path.getsize(path),
+        "events": events,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--qps", type=float, default=1000.0)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    # Query texts of realistic length (the endpoint logs them in full)
+    queries = synthetic_chunks(200, min_words=10, max_words=60)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in MODES:
+            results[mode] = run_mode(mode, args, queries, os.path.join(tmp, f"{mode}.log"))
+    sync_us = results["sync"]["log_calls_us_per_request"]["mean_us"]
+    for mode in ("async", "async_sampled"):
+        results[mode]["saved_us_per_request"] = sync_us - results[mode]["log_calls_us_per_request"]["mean_us"]
+    configure_logging()
+    write_report({"benchmark": "logging", "qps": args.qps, "seconds": args.seconds, **results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
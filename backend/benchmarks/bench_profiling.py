@@ -0,0 +1,147 @@
+
+"""
+Cost of the per-request profiling hook (app.utils.profiling).
+
+Requests go straight to ASGI apps (no HTTP client) so the middleware cost
+is not buried in transport noise:
+- bare app, versus RequestContextMiddleware + ProfilingMiddleware with
+  profiling off, with a token configured but no header, and with a 1%
+  sampling rate (the unsampled path);
+- a workload request (CPU work on the loop plus a thread pool wait)
+  unprofiled versus profiled, with and without allocation tracing, and
+  what its profile shows.
+
+Usage (from backend/):
+    python -m benchmarks.bench_profiling
+    python -m benchmarks.bench_profiling --requests 100000 --output profiling.json
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.storage.local_store import LocalS3Client
+from app.utils.profiling import ProfilingMiddleware
+from app.utils.request_context import RequestContextMiddleware
+from benchmarks.common import latency_summary, write_report
+
+
+async def bare_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def _cpu_work(rows: int) -> float:
+    a = np.random.default_rng(0).standard_normal((rows, 64))
+    return float(sum(float(row @ row) for row in a))
+
+
+async def workload_app(scope, receive, send):
+    _cpu_work(20000)  # On the loop: shows up as running samples
+    await asyncio.to_thread(time.sleep, 0.01)  # Off the loop: waiting samples
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def _scope(headers):
+    return {"type": "http", "method": "GET", "path": "/bench", "headers": headers}
+
+
+async def _receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def _send(message):
+    pass
+
+
+async def ns_per_request(app, requests: int, headers=()) -> float:
+    start = time.perf_counter_ns()
+    for _ in range(requests):
+        await app(_scope(list(headers)), _receive, _send)
+    return (time.perf_counter_ns() - start) / requests
+
+
+async def workload_latencies(app, requests: int, headers=()) -> list:
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await app(_scope(list(headers)), _receive, _send)
+        samples.append((time.perf_counter() - start) * 1000)
+    await asyncio.sleep(0.2)  # Let uploads finish
+    return samples
+
+
+def configure(token: str = "", rate: float = 0.0, allocations: bool = True):
+    settings.PROFILING_TOKEN = token
+    settings.PROFILING_SAMPLE_RATE = rate
+    settings.PROFILING_TRACE_ALLOCATIONS = allocations
+
+
+async def run(args, store) -> dict:
+    wrapped = RequestContextMiddleware(ProfilingMiddleware(bare_app, store_factory=lambda: store))
+    overhead = {}
+    baseline = min([await ns_per_request(bare_app, args.requests) for _ in range(args.repeat)])
+    context_only = min([
+        await ns_per_request(RequestContextMiddleware(bare_app), args.requests) for _ in range(args.repeat)
+    ])
+    modes = (("off", "", 0.0), ("token_no_header", "secret", 0.0), ("sampling_1pct_unsampled", "", 0.01))
+    for name, token, rate in modes:
+        configure(token, rate)
+        if rate:
+            # Measure only the unsampled path: sampling is decided by random(), so pin it above the rate
+            import app.utils.profiling as profiling
+            real_random = profiling.random.random
+            profiling.random.random = lambda: 1.0
+        cost = min([await ns_per_request(wrapped, args.requests) for _ in range(args.repeat)])
+        if rate:
+            profiling.random.random = real_random
+        overhead[name] = cost - context_only
+    overhead["request_context_middleware"] = context_only - baseline
+
+    workload = RequestContextMiddleware(ProfilingMiddleware(workload_app, store_factory=lambda: store))
+    header = [(b"x-profile", b"secret")]
+    configure("secret", 0.0)
+    await workload_latencies(workload, 3)
+    unprofiled = await workload_latencies(workload, args.workload_requests)
+    profiled = await workload_latencies(workload, args.workload_requests, header)
+    configure("secret", 0.0, allocations=False)
+    profiled_no_alloc = await workload_latencies(workload, args.workload_requests, header)
+    configure()
+
+    sample_key = sorted(store.list_objects("profiles/"))[-1]
+    profile = json.loads(store.download_file(sample_key))
+    return {
+        "off_path_overhead_ns": overhead,
+        "workload_ms": {
+            "unprofiled": latency_summary(unprofiled),
+            "profiled": latency_summary(profiled),
+            "profiled_without_allocations": latency_summary(profiled_no_alloc),
+        },
+        "sample_profile": {
+            "samples": profile["samples"],
+            "top_functions": profile["top_functions"][:5],
+            "top_waiting": list(profile["stacks"]["waiting"].items())[:2],
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50_000, help="Requests per off-path measurement")
+    parser.add_argument("--workload-requests", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = asyncio.run(run(args, LocalS3Client(tmp)))
+    write_report({"benchmark": "profiling", "requests": args.requests, **results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
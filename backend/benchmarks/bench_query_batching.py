@@ -0,0 +1,93 @@
+
+"""
+Query embedding under closed-loop load: micro-batched vs. one pass per request.
+
+Each of N clients embeds a query, waits for the result and immediately sends
+the next one. Reports throughput and latency percentiles per client count.
+
+Usage (from backend/):
+    python -m benchmarks.bench_query_batching
+    python -m benchmarks.bench_query_batching --clients 1,50,200 --duration 5
+    python -m benchmarks.bench_query_batching --model sentence-transformers
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from app.config import settings
+from app.core.embedding_service import QueryEmbeddingService
+from app.core.embeddings import EmbeddingGenerator
+from benchmarks.common import SyntheticEmbedder, latency_summary, synthetic_chunks, write_report
+
+
+async def closed_loop(service: QueryEmbeddingService, clients: int, duration: float, queries, seed: int) -> dict:
+    latencies = []
+    deadline = time.perf_counter() + duration
+
+    async def client(index: int):
+        rng = random.Random(seed + index)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await service.embed(rng.choice(queries))
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    elapsed = time.perf_counter() - start
+    return {"throughput_qps": len(latencies) / elapsed, **latency_summary(latencies)}
+
+
+async def sweep(embedder, client_counts, duration: float, max_batch: int, max_wait_ms: float, seed: int) -> list:
+    queries = synthetic_chunks(500, seed=seed, min_words=3, max_words=16)
+    rows = []
+    for mode, batch, wait_ms in (("unbatched", 1, 0.0), ("batched", max_batch, max_wait_ms)):
+        for clients in client_counts:
+            service = QueryEmbeddingService(embedder, max_batch=batch, max_wait_ms=wait_ms)
+            await service.embed(queries[0])  # Warm up
+            row = await closed_loop(service, clients, duration, queries, seed)
+            row.update({
+                "mode": mode,
+                "clients": clients,
+                "batches": service.stats["batches"],
+                "mean_batch": service.stats["requests"] / max(service.stats["batches"], 1),
+            })
+            await service.aclose()
+            rows.append(row)
+            print(f"{mode:>9} clients={clients:<4} qps={row['throughput_qps']:8.1f} "
+                  f"p50={row['p50_ms']:7.2f}ms p99={row['p99_ms']:7.2f}ms batch={row['mean_batch']:.1f}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", default="1,10,50,100,200", help="Comma-separated concurrent client counts")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds per measurement")
+    parser.add_argument("--max-batch", type=int, default=settings.QUERY_EMBED_MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=settings.QUERY_EMBED_MAX_WAIT_MS)
+    parser.add_argument("--model", choices=["synthetic", "sentence-transformers"], default="synthetic")
+    parser.add_argument("--pass-overhead-ms", type=float, default=1.0,
+                        help="Fixed per-forward-pass cost of the synthetic model")
+    parser.add_argument("--seed", type=int, default=settings.RANDOM_SEED)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    if args.model == "synthetic":
+        embedder = SyntheticEmbedder(pass_overhead_ms=args.pass_overhead_ms)
+    else:
+        embedder = EmbeddingGenerator()
+    client_counts = [int(c) for c in args.clients.split(",")]
+
+    rows = asyncio.run(sweep(embedder, client_counts, args.duration, args.max_batch, args.max_wait_ms, args.seed))
+    write_report({
+        "benchmark": "query_embedding_batching",
+        "model": args.model,
+        "max_batch": args.max_batch,
+        "max_wait_ms": args.max_wait_ms,
+        "duration_seconds": args.duration,
+        "results": rows,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+
+"""
+Sharded semantic index: build time and query latency vs. shard count.
+
+For each shard count, streams synthetic vectors into a ShardedFAISSIndexer
+(sharded by chunk_id), saves it, then measures:
+
+- build and save time
+- query latency with shards searched in-process
+- query latency with scatter-gather over search worker processes
+- time to rebuild a single shard (compaction dropping 10% of its vectors)
+
+Vectors are generated in blocks so the corpus never exists twice in memory;
+5M x 384-d float32 vectors still need ~7.7 GB for the index itself.
+
+Usage (from backend/):
+    python -m benchmarks.bench_sharded_index --vectors 5000000 --shards 1,2,4,8
+"""
+from pathlib import Path
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.core.indexer import ShardedFAISSIndexer
+from benchmarks.common import Timer, latency_summary, write_report
+
+BLOCK = 100_000
+
+
+def vector_blocks(count: int, dim: int, seed: int):
+    """Clustered random vectors, deterministic for a seed, in blocks of BLOCK rows."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((256, dim)).astype(np.float32)
+    for start in range(0, count, BLOCK):
+        size = min(BLOCK, count - start)
+        block = centers[rng.integers(0, len(centers), size)]
+        block += 0.5 * rng.standard_normal((size, dim)).astype(np.float32)
+        yield start, block
+
+
+def measure_queries(indexer: ShardedFAISSIndexer, queries: np.ndarray, k: int) -> dict:
+    indexer.search(queries[0], k)  # Warm up
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        indexer.search(query, k)
+        samples.append((time.perf_counter() - start) * 1000)
+    return latency_summary(samples)
+
+
+def run(vectors: int, dim: int, shard_counts, processes: int, queries: int, k: int, seed: int) -> dict:
+    query_vectors = np.random.default_rng(seed + 1).standard_normal((queries, dim)).astype(np.float32)
+    results = []
+    for num_shards in shard_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            indexer = ShardedFAISSIndexer(vector_dim=dim, index_path=str(Path(tmp) / "faiss"),
+                                          num_shards=num_shards, shard_key="chunk",
+                                          search_processes=min(processes, num_shards))
+            with Timer() as build:
+                for start, block in vector_blocks(vectors, dim, seed):
+                    indexer.add_batch(list(range(start + 1, start + 1 + len(block))), block)
+            with Timer() as save:
+                indexer.save()
+
+            entry = {
+                "shards": num_shards,
+                "build_seconds": build.elapsed,
+                "save_seconds": save.elapsed,
+                "query_in_process": measure_queries(indexer, query_vectors, k),
+            }
+
+            shard_ids = list(indexer.shards[0].id_mapping.values())
+            keep = set(shard_ids) - set(shard_ids[::10])
+            with Timer() as rebuild:
+                removed = indexer.compact_shard(0, keep)
+            entry["rebuild_one_shard"] = {"seconds": rebuild.elapsed, "vectors_removed": removed,
+                                          "vectors_kept": len(keep)}
+
+            if num_shards > 1 and processes > 0:
+                with Timer() as startup:
+                    indexer.start_search_pool()
+                    indexer.search(query_vectors[0], k)  # Workers load their shards
+                entry["pool_startup_seconds"] = startup.elapsed
+                entry["search_processes"] = indexer.search_processes
+                entry["query_process_pool"] = measure_queries(indexer, query_vectors, k)
+                indexer.stop_search_pool()
+            results.append(entry)
+            del indexer
+
+    return {
+        "benchmark": "sharded_index",
+        "vectors": vectors,
+        "dim": dim,
+        "k": k,
+        "queries": queries,
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=5_000_000)
+    parser.add_argument("--dim", type=int, default=settings.EMBEDDING_DIM)
+    parser.add_argument("--shards", default="1,2,4,8", help="Comma-separated shard counts")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="Search worker processes (capped at the shard count)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=settings.TOP_K * 2)
+    parser.add_argument("--seed", type=int, default=settings.RANDOM_SEED)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+    shard_counts = [int(s) for s in args.shards.split(",")]
+    write_report(run(args.vectors, args.dim, shard_counts, args.processes, args.queries, args.k, args.seed),
+                 args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+
+"""
+Replica cold start from index snapshots (app.core.snapshots).
+
+Builds a semantic index of synthetic vectors and a Whoosh index of
+synthetic chunks, publishes them as a snapshot to a LocalS3Client, and
+measures time-to-ready for a fresh replica (ready = first semantic and
+lexical query answered):
+
+- whole_objects_deserialize: the saved index files fetched with one
+  sequential GET each, then loaded with faiss.read_index (what copying
+  INDEX_DIR from object storage would take);
+- snapshot_threads_N: ranged GETs over N threads, checksum verification,
+  memory-mapped open;
+- warm_restart: the generation is already on local disk.
+
+It also times a generation switch on a serving replica (fetch + open +
+swap), during which queries keep running on the old generation.
+
+The local store has no network, so by default every GET is throttled to
+--latency-ms per request and --mbps per connection, roughly what a single
+S3 stream sees; pass --mbps 0 for raw local-disk speed. Files just written
+are in the page cache, so mapped reads are warm.
+
+Usage (from backend/):
+    python -m benchmarks.bench_snapshot_warm_start
+    python -m benchmarks.bench_snapshot_warm_start --vectors 1000000 --threads 1,4,8,16 --output snapshot.json
+"""
+from pathlib import Path
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.core.indexer import FAISSIndexer, WhooshIndexer
+from app.core.snapshots import IndexSnapshots, SnapshotWatcher
+from app.storage.local_store import LocalS3Client
+from benchmarks.bench_sharded_index import vector_blocks
+from benchmarks.common import Timer, synthetic_chunks, write_report
+
+
+class ThrottledStore:
+    """LocalS3Client whose GETs cost a fixed latency plus size / per-connection bandwidth."""
+
+    def __init__(self, inner: LocalS3Client, latency_ms: float, mbps: float):
+        self.inner = inner
+        self.latency = latency_ms / 1000
+        self.bytes_per_second = mbps * 1e6 if mbps > 0 else 0
+
+    def _wait(self, size: int):
+        time.sleep(self.latency + (size / self.bytes_per_second if self.bytes_per_second else 0))
+
+    def download_file(self, key):
+        data = self.inner.download_file(key)
+        self._wait(len(data or b""))
+        return data
+
+    def download_range(self, key, start, end):
+        data = self.inner.download_range(key, start, end)
+        self._wait(len(data or b""))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+def build_indexes(root: Path, vectors: int, dim: int, documents: int, seed: int):
+    faiss_indexer = FAISSIndexer(vector_dim=dim, index_path=str(root / "faiss"))
+    for start, block in vector_blocks(vectors, dim, seed):
+        faiss_indexer.add_batch(list(range(start + 1, start + 1 + len(block))), block)
+    faiss_indexer.save()
+    whoosh = WhooshIndexer(index_path=str(root / "whoosh"))
+    texts = synthetic_chunks(documents, seed=seed, min_words=100, max_words=200)
+    for start in range(0, documents, 2000):
+        whoosh.add_batch([
+            {"chunk_id": i + 1, "text": texts[i], "work_slug": "bench", "version": "v1", "chunk_index": i}
+            for i in range(start, min(start + 2000, documents))
+        ])
+    return faiss_indexer, whoosh
+
+
+def ready(semantic, lexical, query: np.ndarray):
+    semantic.search(query, settings.TOP_K)
+    lexical.search("quantum gravity", settings.TOP_K)
+
+
+def whole_objects(store, source: LocalS3Client, root: Path, replica: Path, dim: int, query: np.ndarray) -> float:
+    """Upload the raw index files once, then time sequential GETs + deserializing loads."""
+    files = [p for p in sorted(root.rglob("*")) if p.is_file() and not p.name.endswith(".lock")]
+    for path in files:
+        with open(path, "rb") as f:
+            source.upload_file(f, "raw/" + path.relative_to(root).as_posix())
+    with Timer() as t:
+        for path in files:
+            target = replica / path.relative_to(root)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(store.download_file("raw/" + path.relative_to(root).as_posix()))
+        semantic = FAISSIndexer(vector_dim=dim, index_path=str(replica / "faiss"))
+        semantic.load()
+        ready(semantic, WhooshIndexer(index_path=str(replica / "whoosh")), query)
+    return t.elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=500_000)
+    parser.add_argument("--dim", type=int, default=settings.EMBEDDING_DIM)
+    parser.add_argument("--documents", type=int, default=20_000, help="Chunks in the Whoosh index")
+    parser.add_argument("--threads", default="1,4,8,16", help="Comma-separated download thread counts")
+    parser.add_argument("--part-mb", type=float, default=settings.INDEX_SNAPSHOT_PART_BYTES / 2 ** 20)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Per-GET latency of the stand-in")
+    parser.add_argument("--mbps", type=float, default=80.0,
+                        help="Per-connection MB/s of the stand-in (0 = unthrottled)")
+    parser.add_argument("--seed", type=int, default=settings.RANDOM_SEED)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+    part_bytes = int(args.part_mb * 2 ** 20)
+    query = np.random.default_rng(args.seed + 1).standard_normal(args.dim).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        with Timer() as build:
+            faiss_indexer, whoosh = build_indexes(tmp / "source", args.vectors, args.dim, args.documents, args.seed)
+        source = LocalS3Client(str(tmp / "s3"))
+        store = ThrottledStore(source, args.latency_ms, args.mbps)
+        with Timer() as publish:
+            manifest = IndexSnapshots(source, local_dir=str(tmp / "publisher")).publish(faiss_indexer, whoosh)
+
+        results = {"whole_objects_deserialize": whole_objects(
+            store, source, tmp / "source", tmp / "replica-raw", args.dim, query)}
+        for threads in (int(n) for n in args.threads.split(",")):
+            local = tmp / f"replica-{threads}"
+            with Timer() as t:
+                generation, (semantic, lexical) = IndexSnapshots(
+                    store, local_dir=str(local), part_bytes=part_bytes, download_threads=threads
+                ).load_latest()
+                ready(semantic, lexical, query)
+            results[f"snapshot_threads_{threads}"] = t.elapsed
+
+        snapshots = IndexSnapshots(store, local_dir=str(local), part_bytes=part_bytes, download_threads=threads)
+        with Timer() as t:
+            _, (semantic, lexical) = snapshots.load_latest()
+            ready(semantic, lexical, query)
+        results["warm_restart"] = t.elapsed
+
+        # Generation switch while serving: publish again, let the watcher fetch and swap
+        IndexSnapshots(source, local_dir=str(tmp / "publisher")).publish(faiss_indexer, whoosh)
+        serving = {"indexes": (semantic, lexical)}
+        watcher = SnapshotWatcher(snapshots, lambda g, indexes: serving.update(indexes=indexes), current=generation)
+        with Timer() as switch:
+            watcher.check()
+        ready(*serving["indexes"], query)
+        shutil.rmtree(tmp / "replica-raw", ignore_errors=True)
+
+    write_report({
+        "benchmark": "snapshot_warm_start",
+        "vectors": args.vectors,
+        "dim": args.dim,
+        "documents": args.documents,
+        "bundle_bytes": manifest["bundle_bytes"],
+        "part_bytes": part_bytes,
+        "stand_in": {"latency_ms": args.latency_ms, "mbps_per_connection": args.mbps},
+        "build_seconds": build.elapsed,
+        "publish_seconds": publish.elapsed,
+        "time_to_ready_seconds": results,
+        "generation_switch_seconds": switch.elapsed,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+
+"""
+Time to first event versus time to complete for POST /api/v1/query/stream.
+
+A synthetic corpus is ingested into the offline environment (as in the
+suite), then every query is sent to the streaming endpoint and, for
+comparison, to POST /api/v1/query/. For each streamed query the report
+records when the first retrieval event (the first search leg to finish),
+the fused top-K and the final answer arrived, both sequentially and with
+--concurrency clients sharing the query embedder.
+
+In-process, requests go straight to the ASGI app so each body chunk is
+timed as it is sent (httpx's in-process transport buffers whole bodies).
+With --url the same is measured over HTTP against a running server.
+
+Usage (from backend/):
+    python -m benchmarks.bench_streaming_query
+    python -m benchmarks.bench_streaming_query --concurrency 16 --output streaming.json
+"""
+from pathlib import Path
+from typing import Dict, List
+import argparse
+import asyncio
+import tempfile
+import time
+
+import httpx
+import orjson
+
+from app.config import settings
+from app.main import app
+from benchmarks.common import latency_summary, write_report
+from benchmarks.corpus import build_corpus, synthetic_queries
+from benchmarks.standins import OfflineEnvironment
+from benchmarks.suite import make_embedder, measure_ingestion
+
+STREAM_PATH = "/api/v1/query/stream"
+
+
+def _event_names(chunk: bytes) -> List[str]:
+    return [line[7:].decode() for line in chunk.split(b"\n") if line.startswith(b"event: ")]
+
+
+async def asgi_stream(path: str, payload: Dict) -> List:
+    """POST to the in-process app; returns [(ms since start, event name)] per SSE event."""
+    body = orjson.dumps(payload)
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("bench", 1), "server": ("bench", 80),
+    }
+    received, timeline, status = False, [], []
+    start = time.perf_counter()
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.Event().wait()  # No disconnect until the response is done
+        received = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+        elif message["type"] == "http.response.body" and message.get("body"):
+            now = (time.perf_counter() - start) * 1000
+            timeline.extend((now, name) for name in _event_names(message["body"]) or ["body"])
+
+    await app(scope, receive, send)
+    if status[0] != 200:
+        raise RuntimeError(f"POST {path} returned {status[0]}")
+    return timeline
+
+
+async def http_stream(client: httpx.AsyncClient, path: str, payload: Dict) -> List:
+    """Same as asgi_stream, over HTTP."""
+    timeline = []
+    start = time.perf_counter()
+    async with client.stream("POST", path, json=payload) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes():
+            now = (time.perf_counter() - start) * 1000
+            timeline.extend((now, name) for name in _event_names(chunk) or ["body"])
+    return timeline
+
+
+def _milestones(timeline: List) -> Dict:
+    retrieval = [ms for ms, name in timeline if name == "retrieval"]
+    return {"first_event": timeline[0][0], "fused": retrieval[-1], "complete": timeline[-1][0]}
+
+
+async def measure(stream, client: httpx.AsyncClient, queries: List[str], concurrency: int) -> Dict:
+    samples: Dict[str, List[float]] = {"first_event": [], "fused": [], "complete": [], "unary": []}
+
+    async def one(i: int, text: str):
+        payload = {"session_id": f"stream-{i}", "user_query": text}
+        for name, ms in _milestones(await stream(STREAM_PATH, payload)).items():
+            samples[name].append(ms)
+        start = time.perf_counter()
+        response = await client.post("/api/v1/query/", json=payload)
+        response.raise_for_status()
+        samples["unary"].append((time.perf_counter() - start) * 1000)
+
+    pending = list(enumerate(queries))
+
+    async def worker():
+        while pending:
+            await one(*pending.pop())
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    report = {name: latency_summary(values) for name, values in samples.items()}
+    report["first_event_fraction_of_complete"] = report["first_event"]["p50_ms"] / report["complete"]["p50_ms"]
+    return report
+
+
+async def run(args) -> Dict:
+    queries = synthetic_queries(args.queries, args.seed)
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+            async def stream(path: str, payload: Dict) -> List:
+                return await http_stream(client, path, payload)
+
+            return {f"concurrency_{c}": await measure(stream, client, queries, c) for c in (1, args.concurrency)}
+
+    embedder = make_embedder(args.embedder, args.dim)
+    with tempfile.TemporaryDirectory() as tmp:
+        repos = build_corpus(Path(tmp) / "corpus", args.works, args.files_per_work, seed=args.seed)
+        env = OfflineEnvironment(tmp, embedder, getattr(embedder, "vector_dim", args.dim))
+        env.install(app)
+        try:
+            async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=args.timeout) as client:
+                ingestion = await measure_ingestion(client, env, repos)
+                await measure(asgi_stream, client, queries[:5], 1)  # Warm up
+                results = {f"concurrency_{c}": await measure(asgi_stream, client, queries, c)
+                           for c in (1, args.concurrency)}
+                return {"chunks": ingestion["chunks"], **results}
+        finally:
+            env.uninstall(app)
+            await env.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running server (default: in-process app on offline stand-ins)")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--works", type=int, default=4)
+    parser.add_argument("--files-per-work", type=int, default=10)
+    parser.add_argument("--embedder", choices=["synthetic", "model"], default="synthetic")
+    parser.add_argument("--dim", type=int, default=settings.EMBEDDING_DIM)
+    parser.add_argument("--seed", type=int, default=settings.RANDOM_SEED)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = {"benchmark": "streaming_query", "queries": args.queries, **asyncio.run(run(args))}
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
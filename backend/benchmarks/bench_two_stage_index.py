@@ -0,0 +1,152 @@
+
+"""
+Two-stage semantic search (TwoStageFAISSIndexer) against exact search.
+
+Streams clustered synthetic vectors into an exact FAISSIndexer and into
+two-stage indexes with PQ and binary codes, then runs the same queries
+(perturbed corpus vectors) through each and reports:
+
+- RAM held for search (float32 vectors for exact search; codes,
+  codebooks and chunk IDs for two-stage) and the size of the disk vectors;
+- build time (including PQ training);
+- per-query latency and recall@k against exact search, for each
+  first-stage candidate depth.
+
+By default vectors lie near a --latent-dim subspace, as sentence
+embeddings largely do. --latent-dim 0 uses isotropic clusters in the full
+dimension instead (the sharded-index benchmark's data), a worst case in
+which near neighbors are almost equidistant and compressed codes rank
+them poorly.
+
+The disk vectors are read through the page cache, so latencies are for a
+warm cache; a cold cache adds one random read per candidate page.
+
+Reference run (200k vectors, 20 results):
+
+    mode                      RAM      p50      recall@20
+    exact                     307 MB   39 ms    -
+    binary, 256 candidates    11 MB    1.5 ms   0.95
+    pq, 256 candidates        12 MB    9 ms     0.88
+    either, 1000 candidates   as above          1.0
+
+Usage (from backend/):
+    python -m benchmarks.bench_two_stage_index --vectors 1000000
+    python -m benchmarks.bench_two_stage_index --vectors 200000 --depths 20,100,256,1000 --output two_stage.json
+    python -m benchmarks.bench_two_stage_index --vectors 200000 --latent-dim 0
+"""
+from pathlib import Path
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.core.indexer import FAISSIndexer, TwoStageFAISSIndexer
+from benchmarks.bench_sharded_index import vector_blocks
+from benchmarks.common import Timer, latency_summary, write_report
+
+
+def latent_blocks(count: int, dim: int, latent_dim: int, seed: int):
+    """Clustered vectors in a random latent_dim subspace plus small full-dimension noise, in blocks."""
+    if latent_dim <= 0:
+        yield from vector_blocks(count, dim, seed)
+        return
+    rng = np.random.default_rng(seed)
+    basis = rng.standard_normal((latent_dim, dim)).astype(np.float32) / np.sqrt(latent_dim)
+    for start, block in vector_blocks(count, latent_dim, seed):
+        yield start, block @ basis + 0.05 * rng.standard_normal((len(block), dim)).astype(np.float32)
+
+
+def build(indexer, vectors: int, dim: int, latent_dim: int, seed: int) -> float:
+    with Timer() as t:
+        for start, block in latent_blocks(vectors, dim, latent_dim, seed):
+            indexer.add_batch(list(range(start + 1, start + 1 + len(block))), block)
+    return t.elapsed
+
+
+def make_queries(count: int, dim: int, latent_dim: int, seed: int) -> np.ndarray:
+    """Corpus vectors (from the first block) plus noise of a tenth of their norm."""
+    rng = np.random.default_rng(seed + 1)
+    _, block = next(latent_blocks(count, dim, latent_dim, seed))
+    scale = 0.1 * np.linalg.norm(block, axis=1, keepdims=True) / np.sqrt(dim)
+    return block + scale * rng.standard_normal(block.shape).astype(np.float32)
+
+
+def measure(search, queries: np.ndarray, expected, k: int) -> dict:
+    search(queries[0])  # Warm up
+    samples, found = [], 0
+    for query, truth in zip(queries, expected):
+        start = time.perf_counter()
+        hits = search(query)
+        samples.append((time.perf_counter() - start) * 1000)
+        found += len({h["chunk_id"] for h in hits} & truth)
+    return {"latency": latency_summary(samples), f"recall_at_{k}": found / (k * len(queries))}
+
+
+def run(vectors: int, dim: int, latent_dim: int, depths, subquantizers: int, train_size: int, queries: int,
+        k: int, seed: int) -> dict:
+    query_vectors = make_queries(queries, dim, latent_dim, seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        exact = FAISSIndexer(vector_dim=dim, index_path=str(Path(tmp) / "exact"))
+        exact_build = build(exact, vectors, dim, latent_dim, seed)
+        expected = [{h["chunk_id"] for h in exact.search(q, k)} for q in query_vectors]
+        report = {
+            "exact": {
+                "ram_bytes": exact.index.ntotal * dim * 4,
+                "build_seconds": exact_build,
+                **measure(lambda q, exact=exact: exact.search(q, k), query_vectors, expected, k),
+            }
+        }
+        del exact
+
+        for codes in ("pq", "binary"):
+            index = TwoStageFAISSIndexer(vector_dim=dim, index_path=str(Path(tmp) / codes), codes=codes,
+                                         subquantizers=subquantizers, train_size=train_size, seed=seed)
+            seconds = build(index, vectors, dim, latent_dim, seed)
+            report[codes] = {
+                "ram_bytes": index.nbytes,
+                "disk_vector_bytes": sum(p.stat().st_size for p in (Path(tmp) / codes).glob("index_vectors*.f32")),
+                "build_seconds": seconds,
+                "by_candidates": {
+                    str(depth): measure(
+                        lambda q, index=index, depth=depth: index.search(q, k, candidates=depth),
+                        query_vectors, expected, k
+                    )
+                    for depth in depths
+                },
+            }
+            del index
+
+    return {
+        "benchmark": "two_stage_index",
+        "vectors": vectors,
+        "dim": dim,
+        "latent_dim": latent_dim,
+        "k": k,
+        "queries": queries,
+        "pq_subquantizers": subquantizers,
+        "results": report,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=settings.EMBEDDING_DIM)
+    parser.add_argument("--latent-dim", type=int, default=64, help="0 = isotropic clusters in the full dimension")
+    parser.add_argument("--depths", default="20,100,256,1000", help="Comma-separated first-stage candidate depths")
+    parser.add_argument("--subquantizers", type=int, default=settings.SEMANTIC_PQ_SUBQUANTIZERS)
+    parser.add_argument("--train-size", type=int, default=settings.SEMANTIC_PQ_TRAIN_SIZE)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=settings.TOP_K)
+    parser.add_argument("--seed", type=int, default=settings.RANDOM_SEED)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+    depths = [int(d) for d in args.depths.split(",")]
+    write_report(run(args.vectors, args.dim, args.latent_dim, depths, args.subquantizers, args.train_size,
+                     args.queries, args.k, args.seed), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+
+"""
+Shared helpers for benchmarks: seeded synthetic corpora and offline
+stand-ins for the embedding model.
+"""
+from typing import Dict, List
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+import numpy as np
+
+from app.config import settings
+
+VOCAB = (
+    "quantum resonance gravity vacuum energy cosmological constant field theory "
+    "spacetime curvature metric tensor inflation horizon entropy black hole "
+    "dark matter baryon photon neutrino lattice symmetry gauge boson fermion "
+    "perturbation spectrum redshift galaxy cluster halo lensing manifold"
+).split()
+
+
+def synthetic_chunks(
+    count: int, seed: int = settings.RANDOM_SEED, min_words: int = 20, max_words: int = 400
+) -> List[str]:
+    """Deterministic chunk texts with a spread of lengths."""
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choice(VOCAB) for _ in range(rng.randint(min_words, max_words)))
+        for _ in range(count)
+    ]
+
+
+class SyntheticEmbedder:
+    """
+    CPU-bound stand-in for a sentence-transformer.
+
+    Each batch is padded to its longest text and pushed through a few dense
+    and attention-like layers, so cost grows with padded length the way a
+    real encoder's does. Vectors are deterministic.
+    """
+
+    model_name = "synthetic-encoder"
+
+    def __init__(
+        self,
+        vector_dim: int = settings.EMBEDDING_DIM,
+        layers: int = 2,
+        seed: int = settings.RANDOM_SEED,
+        pass_overhead_ms: float = 0.0
+    ):
+        """
+        Args:
+            vector_dim: Output dimension
+            layers: Dense + attention layers per forward pass
+            seed: Weight seed
+            pass_overhead_ms: Fixed cost added to every embed_batch call, for
+                modelling per-pass dispatch/synchronization on real hardware
+        """
+        self.vector_dim = vector_dim
+        self.layers = layers
+        self.pass_overhead = pass_overhead_ms / 1000.0
+        rng = np.random.default_rng(seed)
+        self.weights = rng.standard_normal((layers, vector_dim, vector_dim)).astype(np.float32) / np.sqrt(vector_dim)
+
+    def _token_vectors(self, text: str) -> np.ndarray:
+        rows = []
+        for word in re.findall(r"\w+", text.lower()) or [""]:
+            seed = int.from_bytes(hashlib.md5(word.encode("utf-8")).digest()[:4], "little")
+            rows.append(np.random.default_rng(seed).standard_normal(self.vector_dim))
+        return np.asarray(rows, dtype=np.float32)
+
+    def embed_batch(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        if self.pass_overhead:
+            time.sleep(self.pass_overhead)
+        out = np.zeros((len(texts), self.vector_dim), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            tokens = [self._token_vectors(t) for t in texts[start:start + batch_size]]
+            width = max(len(t) for t in tokens)
+            x = np.zeros((len(tokens), width, self.vector_dim), dtype=np.float32)
+            mask = np.zeros((len(tokens), width, 1), dtype=np.float32)
+            for i, t in enumerate(tokens):
+                x[i, :len(t)] = t
+                mask[i, :len(t)] = 1.0
+            for w in self.weights:
+                attention = np.tanh(x @ x.transpose(0, 2, 1) / np.sqrt(self.vector_dim))
+                x = np.tanh((attention @ x) @ w) * mask
+            pooled = x.sum(axis=1) / mask.sum(axis=1)
+            pooled /= np.linalg.norm(pooled, axis=1, keepdims=True) + 1e-12
+            out[start:start + len(tokens)] = pooled
+        return out
+
+    def embed_text(self, text: str) -> np.ndarray:
+        return self.embed_batch([text])[0]
+
+    def hash_embedding(self, embedding: np.ndarray) -> str:
+        return hashlib.sha256(np.round(embedding, 6).astype(np.float32).tobytes()).hexdigest()
+
+
+def padding_efficiency(texts: List[str], batch_size: int, sort_by_length: bool) -> float:
+    """Fraction of computed token positions that are real tokens (1.0 = no padding)."""
+    lengths = [len(t.split()) for t in texts]
+    if sort_by_length:
+        lengths.sort()
+    real = padded = 0
+    for start in range(0, len(lengths), batch_size):
+        batch = lengths[start:start + batch_size]
+        real += sum(batch)
+        padded += max(batch) * len(batch)
+    return real / padded if padded else 1.0
+
+
+def latency_summary(samples_ms: List[float]) -> Dict:
+    """Mean and p50/p95/p99 of latency samples in milliseconds."""
+    if not samples_ms:
+        return {"count": 0}
+    values = np.asarray(samples_ms)
+    return {
+        "count": len(values),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+    }
+
+
+class Timer:
+    """Wall-clock timer context manager (seconds in .elapsed)."""
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self._start
+
+
+def write_report(report: Dict, path: str = None):
+    """Print a report as JSON and optionally save it."""
+    text = json.dumps(report, indent=2, sort_keys=True)
+    print(text)
+    if path:
+        with open(path, "w") as f:
+            f.write(text + "\n")
+
+
+def minimal_pdf(pages: List[str]) -> bytes:
+    """A small valid PDF with one line of Helvetica text per page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        stream = f"BT /F1 10 Tf 40 760 Td ({escaped}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return bytes(out)
+
+
+class RegexEncoder:
+    """
+    Offline tokenizer stand-in (one token per word or whitespace run) for
+    when tiktoken's encoding files cannot be downloaded.
+    """
+
+    _TOKEN = re.compile(r"\s+|\S+")
+
+    def __init__(self):
+        self.vocab: Dict[str, int] = {}
+        self.words: List[str] = []
+        self._lock = threading.Lock()
+
+    def encode(self, text: str) -> List[int]:
+        ids = []
+        for token in self._TOKEN.findall(text):
+            if token not in self.vocab:
+                with self._lock:
+                    if token not in self.vocab:
+                        self.words.append(token)
+                        self.vocab[token] = len(self.words) - 1
+            ids.append(self.vocab[token])
+        return ids
+
+    def decode(self, ids: List[int]) -> str:
+        return "".join(self.words[i] for i in ids)
+
+
+def make_chunker(**kwargs):
+    """DeterministicChunker with tiktoken if available, else RegexEncoder."""
+    from app.core.chunker import DeterministicChunker
+    chunker = DeterministicChunker(**kwargs)
+    try:
+        chunker.encoder
+    except Exception:
+        chunker = DeterministicChunker(encoder=RegexEncoder(), **kwargs)
+    return chunker
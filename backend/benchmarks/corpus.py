@@ -0,0 +1,67 @@
+
+"""
+Deterministic synthetic corpus for end-to-end benchmarks.
+
+Works are git repositories of Markdown and text files made of sentences
+drawn from a physics vocabulary. The same seed (settings.RANDOM_SEED by
+default) always produces byte-identical repositories and query sets.
+"""
+from pathlib import Path
+from typing import Dict, List
+import random
+
+import git
+
+from app.config import settings
+from benchmarks.common import VOCAB
+
+
+def synthetic_sentence(rng: random.Random, min_words: int = 8, max_words: int = 20) -> str:
+    words = [rng.choice(VOCAB) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + "."
+
+
+def synthetic_document(rng: random.Random, paragraphs: int, sentences_per_paragraph: int = 6) -> str:
+    return "\n\n".join(
+        " ".join(synthetic_sentence(rng) for _ in range(sentences_per_paragraph))
+        for _ in range(paragraphs)
+    )
+
+
+def write_work_repo(path: Path, slug: str, files: int, paragraphs: int, rng: random.Random) -> Path:
+    """Create a committed repository with metadata.yaml and `files` documents."""
+    repo = git.Repo.init(path)
+    names = ["metadata.yaml"]
+    (path / "metadata.yaml").write_text(f"title: {slug.title()}\nauthors: [Benchmark]\ntags: [synthetic]\n")
+    for i in range(files):
+        name = f"docs/{slug}-{i:04d}." + ("md" if i % 2 else "txt")
+        target = path / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        body = synthetic_document(rng, paragraphs)
+        target.write_text(f"# {slug} part {i}\n\n{body}\n" if name.endswith(".md") else body)
+        names.append(name)
+    repo.index.add(names)
+    actor = git.Actor("Bench", "bench@example.com")
+    repo.index.commit("corpus", author=actor, committer=actor)
+    return path
+
+
+def build_corpus(root: Path, works: int, files_per_work: int, paragraphs: int = 4,
+                 seed: int = settings.RANDOM_SEED) -> Dict[str, Path]:
+    """
+    Write `works` repositories under root.
+
+    Returns:
+        {slug: repository path}
+    """
+    rng = random.Random(seed)
+    return {
+        f"work-{w:03d}": write_work_repo(root / f"work-{w:03d}", f"work-{w:03d}", files_per_work, paragraphs, rng)
+        for w in range(works)
+    }
+
+
+def synthetic_queries(count: int, seed: int = settings.RANDOM_SEED) -> List[str]:
+    """Short keyword queries over the corpus vocabulary."""
+    rng = random.Random(seed + 1)
+    return [" ".join(rng.sample(VOCAB, rng.randint(2, 5))) for _ in range(count)]
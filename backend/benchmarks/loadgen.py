@@ -0,0 +1,458 @@
+
+"""
+Load generator for the API: per-endpoint latency histograms, throughput and
+error rates under a mix of query/verify/checkpoint/audit traffic.
+
+Two ways to drive load:
+    closed loop  --concurrency N   N clients, each sends its next request
+                                   as soon as the previous one returns
+    open loop    --rate R          Poisson arrivals at R requests/s; latency
+                                   is measured from the scheduled send time,
+                                   so a stalled server cannot hide queueing
+                                   (no coordinated omission)
+
+--sweep runs the chosen mode at several levels (concurrencies or rates) and
+reports the knee of the throughput curve: the level after which adding load
+stops buying throughput. The sweep stops early once the error rate or p99
+passes --max-error-rate / --p99-slo-ms.
+
+By default the app runs in-process against the offline stand-ins of
+benchmarks.suite (a synthetic corpus is ingested first). Client and server
+then share one event loop, so numbers are a lower bound on a real
+deployment. With --url the load goes to a running server instead, which
+must already have ingested works:
+
+    uvicorn app.main:app --port 8000
+    python -m benchmarks.loadgen --url http://127.0.0.1:8000 --sweep 1,2,4,8,16,32
+
+Usage (from backend/):
+    python -m benchmarks.loadgen --concurrency 8 --duration 30
+    python -m benchmarks.loadgen --rate 40 --mix query=80,verify=10,audit=10
+    python -m benchmarks.loadgen --sweep 1,2,4,8,16,32 --output load.json
+"""
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import argparse
+import asyncio
+import math
+import os
+import platform
+import random
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+from app.config import settings
+from app.main import app
+from benchmarks.common import write_report
+from benchmarks.corpus import build_corpus, synthetic_queries
+from benchmarks.standins import OfflineEnvironment
+from benchmarks.suite import make_embedder, measure_ingestion
+
+ENDPOINTS = ("query", "verify", "checkpoint", "rehydrate", "audit")
+DEFAULT_MIX = "query=70,verify=10,checkpoint=10,audit=10"
+
+
+class LatencyHistogram:
+    """
+    HDR-style latency histogram over integer microseconds.
+
+    Buckets are log-linear: values below 2 * 10**significant_figures are
+    exact, and every power-of-two range above is split into the same number
+    of linear sub-buckets, so any recorded value is off by at most
+    10**-significant_figures relative. Memory is fixed (a few thousand
+    counters) no matter how many values are recorded.
+    """
+
+    def __init__(self, highest_us: int = 3_600_000_000, significant_figures: int = 2):
+        self.sub_bucket_count = 1 << math.ceil(math.log2(2 * 10 ** significant_figures))
+        self.sub_bucket_half = self.sub_bucket_count // 2
+        self._half_magnitude = int(math.log2(self.sub_bucket_half))
+        self.highest_us = highest_us
+        self.counts = np.zeros(self._index(highest_us) + 1, dtype=np.int64)
+        self.total = 0
+        self.min_us = None
+        self.max_us = 0
+        self._sum_us = 0
+
+    def _index(self, value: int) -> int:
+        if value < self.sub_bucket_count:
+            return value
+        bucket = value.bit_length() - 1 - self._half_magnitude
+        return (bucket + 1) * self.sub_bucket_half + (value >> bucket) - self.sub_bucket_half
+
+    def _highest_equivalent(self, index: int) -> int:
+        if index < self.sub_bucket_count:
+            return index
+        bucket = index // self.sub_bucket_half - 1
+        sub = index % self.sub_bucket_half + self.sub_bucket_half
+        return ((sub + 1) << bucket) - 1
+
+    def record(self, value_us: int, count: int = 1):
+        value_us = min(max(int(value_us), 0), self.highest_us)
+        self.counts[self._index(value_us)] += count
+        self.total += count
+        self._sum_us += value_us * count
+        self.min_us = value_us if self.min_us is None else min(self.min_us, value_us)
+        self.max_us = max(self.max_us, value_us)
+
+    def merge(self, other: "LatencyHistogram"):
+        """Add another histogram with the same layout into this one."""
+        self.counts += other.counts
+        self.total += other.total
+        self._sum_us += other._sum_us
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+        self.max_us = max(self.max_us, other.max_us)
+
+    def percentile(self, p: float) -> int:
+        """Smallest recorded value (bucket upper bound, us) covering p percent of samples."""
+        if not self.total:
+            return 0
+        rank = max(1, math.ceil(p / 100.0 * self.total))
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return min(self._highest_equivalent(index), self.max_us)
+
+    def distribution(self, ticks_per_half: int = 2) -> List[Dict]:
+        """
+        HdrHistogram-style percentile distribution: percentiles that step
+        ever closer to 100 (50, 75, 87.5, ...) with the value at each.
+        """
+        rows, percentile = [], 0.0
+        while self.total:
+            rows.append({"percentile": round(percentile, 4), "value_ms": self.percentile(percentile) / 1000.0})
+            remaining = 100.0 - percentile
+            if remaining * self.total / 100.0 < 1:
+                break
+            percentile += remaining / (2 * ticks_per_half) if percentile >= 50 else 50.0 / ticks_per_half
+        if self.total:
+            rows.append({"percentile": 100.0, "value_ms": self.max_us / 1000.0})
+        return rows
+
+    def to_dict(self) -> Dict:
+        if not self.total:
+            return {"count": 0}
+        return {
+            "count": self.total,
+            "min_ms": self.min_us / 1000.0,
+            "mean_ms": self._sum_us / self.total / 1000.0,
+            "p50_ms": self.percentile(50) / 1000.0,
+            "p90_ms": self.percentile(90) / 1000.0,
+            "p99_ms": self.percentile(99) / 1000.0,
+            "p99_9_ms": self.percentile(99.9) / 1000.0,
+            "max_ms": self.max_us / 1000.0,
+            "distribution": self.distribution(),
+        }
+
+
+class EndpointStats:
+    """Outcome counters and a latency histogram for one endpoint."""
+
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.status_codes: Counter = Counter()
+        self.errors = 0
+
+    def record(self, status: str, latency_us: int, ok: bool):
+        self.status_codes[status] += 1
+        if ok:
+            self.histogram.record(latency_us)
+        else:
+            self.errors += 1
+
+    @property
+    def requests(self) -> int:
+        return sum(self.status_codes.values())
+
+    def to_dict(self, seconds: float) -> Dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": self.errors / self.requests if self.requests else 0.0,
+            "throughput_rps": (self.requests - self.errors) / seconds,
+            "status_codes": dict(self.status_codes),
+            "latency": self.histogram.to_dict(),
+        }
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """'query=70,verify=10' -> normalized weights."""
+    weights = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name!r} in mix (expected one of {', '.join(ENDPOINTS)})")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("Mix weights must sum to a positive number")
+    return {name: weight / total for name, weight in weights.items()}
+
+
+class TrafficMix:
+    """
+    Draws requests according to the mix weights.
+
+    Verify and checkpoint bodies are built from real query responses
+    collected by prepare(), so they reference chunks that exist.
+    """
+
+    def __init__(self, weights: Dict[str, float], queries: List[str], seed: int = settings.RANDOM_SEED):
+        self.names = list(weights)
+        self.cumulative = np.cumsum([weights[name] for name in self.names])
+        self.queries = queries
+        self.rng = random.Random(seed)
+        self.responses: List[Dict] = []
+        self.checkpoint_ids: List[str] = []
+
+    async def prepare(self, client: httpx.AsyncClient, samples: int = 20):
+        """Collect query responses (and a few checkpoints) to build other requests from."""
+        for i, text in enumerate(self.queries[:samples]):
+            response = await client.post("/api/v1/query/", json={"session_id": f"load-{i}", "user_query": text})
+            response.raise_for_status()
+            self.responses.append(response.json())
+        if "rehydrate" in self.names:
+            for i in range(min(samples, 10)):
+                _, method, url, kwargs = self._checkpoint(i)
+                response = await client.request(method, url, **kwargs)
+                response.raise_for_status()
+                self.checkpoint_ids.append(response.json()["checkpoint_id"])
+
+    def _checkpoint(self, i: int) -> Tuple:
+        response = self.responses[i % len(self.responses)]
+        return "checkpoint", "POST", "/api/v1/session/checkpoint", {"json": {
+            "session_id": f"load-session-{i % 16}",
+            "condensed_summary": response["answer"],
+            "accepted_claims": [{"text": c["text"], "citation_ids": c["citation_ids"]} for c in response["claims"]],
+            "top_citation_ids": response["retrieval_ids"][:settings.TOP_K],
+        }}
+
+    def next_request(self) -> Tuple[str, str, str, Dict]:
+        """(endpoint name, method, url, httpx request kwargs)"""
+        pick = int(np.searchsorted(self.cumulative, self.rng.random() * self.cumulative[-1], side="right"))
+        name = self.names[min(pick, len(self.names) - 1)]
+        i = self.rng.randrange(1 << 30)
+        if name == "query":
+            return name, "POST", "/api/v1/query/", {"json": {
+                "session_id": f"load-{i % 64}", "user_query": self.queries[i % len(self.queries)]
+            }}
+        if name == "verify":
+            response = self.responses[i % len(self.responses)]
+            output = " ".join(
+                f"{c['text']} [{c['citation_ids'][0]}]" if c["citation_ids"] else c["text"] for c in response["claims"]
+            ) or response["answer"]
+            return name, "POST", "/api/v1/verify/run", {"json": {
+                "run_id": f"load-{i}", "model_output": output, "retrieval_ids": response["retrieval_ids"]
+            }}
+        if name == "checkpoint":
+            return self._checkpoint(i)
+        if name == "rehydrate":
+            return name, "GET", "/api/v1/session/rehydrate", {
+                "params": {"checkpoint_id": self.checkpoint_ids[i % len(self.checkpoint_ids)]}
+            }
+        return name, "GET", "/api/v1/audit/logs", {
+            "params": {"event_type": ("retrieval", "verification", "checkpoint")[i % 3], "limit": 50}
+        }
+
+
+class LoadRun:
+    """Stats for one load level, counting only requests that start after warmup."""
+
+    def __init__(self, names: List[str]):
+        self.stats = {name: EndpointStats() for name in names}
+        self.measure_from = 0.0
+        self.in_flight_peak = 0
+        self.dropped = 0
+
+    async def send(self, client: httpx.AsyncClient, request: Tuple, scheduled: Optional[float] = None):
+        name, method, url, kwargs = request
+        start = time.perf_counter() if scheduled is None else scheduled
+        try:
+            response = await client.request(method, url, **kwargs)
+            status, ok = str(response.status_code), response.status_code < 400
+        except httpx.HTTPError as e:
+            status, ok = type(e).__name__, False
+        if start >= self.measure_from:
+            self.stats[name].record(status, int((time.perf_counter() - start) * 1e6), ok)
+
+    def summary(self, seconds: float) -> Dict:
+        overall = LatencyHistogram()
+        requests = errors = 0
+        for stats in self.stats.values():
+            overall.merge(stats.histogram)
+            requests += stats.requests
+            errors += stats.errors
+        return {
+            "seconds": seconds,
+            "requests": requests,
+            "errors": errors,
+            "error_rate": errors / requests if requests else 0.0,
+            "throughput_rps": (requests - errors) / seconds,
+            "dropped": self.dropped,
+            "in_flight_peak": self.in_flight_peak,
+            "latency": overall.to_dict(),
+            "endpoints": {name: stats.to_dict(seconds) for name, stats in self.stats.items() if stats.requests},
+        }
+
+
+async def run_closed_loop(client: httpx.AsyncClient, mix: TrafficMix, concurrency: int,
+                          duration: float, warmup: float) -> Dict:
+    """N clients back to back for warmup + duration seconds."""
+    run = LoadRun(mix.names)
+    run.measure_from = time.perf_counter() + warmup
+    deadline = run.measure_from + duration
+    run.in_flight_peak = concurrency
+
+    async def client_loop():
+        while time.perf_counter() < deadline:
+            await run.send(client, mix.next_request())
+
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return {"mode": "closed", "concurrency": concurrency, **run.summary(duration)}
+
+
+def arrival_schedule(rng: random.Random, rate: float, start: float, deadline: float) -> Iterator[float]:
+    """Poisson send times from start (exclusive) to deadline (exclusive) at `rate` per second."""
+    scheduled = start
+    while True:
+        scheduled += rng.expovariate(rate)
+        if scheduled >= deadline:
+            return
+        yield scheduled
+
+
+async def run_open_loop(client: httpx.AsyncClient, mix: TrafficMix, rate: float, duration: float,
+                        warmup: float, max_in_flight: int = 1024) -> Dict:
+    """
+    Poisson arrivals at `rate` requests/s. Arrivals beyond max_in_flight
+    outstanding requests are dropped and counted rather than queued.
+    """
+    run = LoadRun(mix.names)
+    start = time.perf_counter()
+    run.measure_from = start + warmup
+    deadline = run.measure_from + duration
+    tasks = set()
+    for scheduled in arrival_schedule(random.Random(mix.rng.random()), rate, start, deadline):
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(tasks) >= max_in_flight:
+            run.dropped += scheduled >= run.measure_from
+            continue
+        task = asyncio.create_task(run.send(client, mix.next_request(), scheduled=scheduled))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        run.in_flight_peak = max(run.in_flight_peak, len(tasks))
+    if tasks:
+        await asyncio.gather(*tasks)
+    return {"mode": "open", "rate": rate, **run.summary(duration)}
+
+
+def find_knee(levels: List[float], throughputs: List[float]) -> Optional[Dict]:
+    """
+    Knee of a throughput curve (Kneedle): after normalizing both axes to
+    [0, 1], the level where the curve rises furthest above the straight
+    line from the first to the last point.
+    """
+    if len(levels) < 3:
+        return None
+    x = np.asarray(levels, dtype=np.float64)
+    y = np.maximum.accumulate(np.asarray(throughputs, dtype=np.float64))
+    if x[-1] == x[0] or y[-1] == y[0]:
+        return {"level": float(x[0]), "throughput_rps": float(throughputs[0])}
+    x_norm = (x - x[0]) / (x[-1] - x[0])
+    y_norm = (y - y[0]) / (y[-1] - y[0])
+    best = int(np.argmax(y_norm - x_norm))
+    return {"level": float(x[best]), "throughput_rps": float(throughputs[best])}
+
+
+async def run_sweep(client: httpx.AsyncClient, mix: TrafficMix, args) -> Dict:
+    levels, results = [float(v) for v in args.sweep.split(",")], []
+    for level in levels:
+        if args.rate is not None:
+            result = await run_open_loop(client, mix, level, args.duration, args.warmup, args.max_in_flight)
+        else:
+            result = await run_closed_loop(client, mix, int(level), args.duration, args.warmup)
+        results.append(result)
+        p99 = result["latency"].get("p99_ms", 0.0)
+        if result["error_rate"] > args.max_error_rate or (args.p99_slo_ms and p99 > args.p99_slo_ms):
+            break
+    measured = [levels[i] for i in range(len(results))]
+    throughputs = [r["throughput_rps"] for r in results]
+    return {
+        "levels": results,
+        "knee": find_knee(measured, throughputs),
+        "peak_throughput_rps": max(throughputs),
+        "stopped_early": len(results) < len(levels),
+    }
+
+
+async def drive(client: httpx.AsyncClient, args) -> Dict:
+    mix = TrafficMix(parse_mix(args.mix), synthetic_queries(args.queries, args.seed), args.seed)
+    await mix.prepare(client)
+    if args.sweep:
+        return await run_sweep(client, mix, args)
+    if args.rate is not None:
+        return await run_open_loop(client, mix, args.rate, args.duration, args.warmup, args.max_in_flight)
+    return await run_closed_loop(client, mix, args.concurrency, args.duration, args.warmup)
+
+
+async def run_load(args) -> Dict:
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+            return await drive(client, args)
+
+    embedder = make_embedder(args.embedder, args.dim)
+    vector_dim = getattr(embedder, "vector_dim", args.dim)
+    with tempfile.TemporaryDirectory() as tmp:
+        repos = build_corpus(Path(tmp) / "corpus", args.works, args.files_per_work, seed=args.seed)
+        env = OfflineEnvironment(tmp, embedder, vector_dim)
+        env.install(app)
+        try:
+            async with httpx.AsyncClient(app=app, base_url="http://load", timeout=args.timeout) as client:
+                await measure_ingestion(client, env, repos)
+                return await drive(client, args)
+        finally:
+            env.uninstall(app)
+            await env.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running server (default: in-process app on offline stand-ins)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Endpoint weights, from {', '.join(ENDPOINTS)}")
+    parser.add_argument("--concurrency", type=int, default=8, help="Closed-loop clients")
+    parser.add_argument("--rate", type=float, help="Open-loop arrival rate (requests/s); overrides --concurrency")
+    parser.add_argument("--sweep", help="Comma-separated concurrencies (or rates with --rate) to step through")
+    parser.add_argument("--duration", type=float, default=20.0, help="Measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured seconds before each level")
+    parser.add_argument("--max-in-flight", type=int, default=1024, help="Open loop: drop arrivals beyond this")
+    parser.add_argument("--max-error-rate", type=float, default=0.05, help="Sweep: stop above this error rate")
+    parser.add_argument("--p99-slo-ms", type=float, default=0.0, help="Sweep: stop once p99 exceeds this (0 = off)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--queries", type=int, default=200, help="Distinct synthetic queries to replay")
+    parser.add_argument("--works", type=int, default=4)
+    parser.add_argument("--files-per-work", type=int, default=10)
+    parser.add_argument("--embedder", choices=["synthetic", "model"], default="synthetic")
+    parser.add_argument("--dim", type=int, default=settings.EMBEDDING_DIM)
+    parser.add_argument("--seed", type=int, default=settings.RANDOM_SEED)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = {
+        "benchmark": "load",
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpu_count": os.cpu_count(), "target": args.url or "in-process"},
+        "results": asyncio.run(run_load(args)),
+    }
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+
+"""
+Offline environment for end-to-end benchmarks.
+
+Wires the FastAPI app and the ingestion worker to local stand-ins:
+SQLite for Postgres, fakeredis for the RQ queue, LocalS3Client for S3,
+and FAISS/Whoosh indexes in a scratch directory. Everything lives under
+one root directory.
+"""
+from pathlib import Path
+
+import fakeredis
+from fastapi import FastAPI
+from rq import Queue, SimpleWorker
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.core.embedding_service import QueryEmbeddingService, get_query_embedder
+from app.core.extractor import RepositoryExtractor
+from app.core.indexer import FAISSIndexer, WhooshIndexer
+from app.core.ingestion import IngestionPipeline
+from app.core.retrieval import get_search_indexes
+from app.db.models import Base
+from app.db.session import get_db
+from app.storage.local_store import LocalS3Client
+from app.storage.s3_client import get_s3_client
+from app.workers import ingest_worker
+from app.workers.queue import get_ingestion_queue
+from benchmarks.common import make_chunker
+
+
+class OfflineEnvironment:
+    """
+    SQLite + fakeredis + local S3 + scratch indexes, installable into the app.
+
+    Usage:
+        env = OfflineEnvironment(tmp_dir, embedder, vector_dim)
+        env.install(app)
+        ...
+        env.uninstall(app)
+        await env.aclose()
+    """
+
+    def __init__(
+        self,
+        root: str,
+        embedder,
+        vector_dim: int,
+        query_max_batch: int = settings.QUERY_EMBED_MAX_BATCH,
+        query_max_wait_ms: float = settings.QUERY_EMBED_MAX_WAIT_MS
+    ):
+        self.root = Path(root)
+        self.embedder = embedder
+        self.vector_dim = vector_dim
+        self.engine = create_engine(
+            f"sqlite:///{self.root / 'bench.db'}",
+            connect_args={"check_same_thread": False, "timeout": 60}
+        )
+        Base.metadata.create_all(self.engine)
+        self.session_factory = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.redis = fakeredis.FakeStrictRedis()
+        self.queue = Queue(settings.INGEST_QUEUE_NAME, connection=self.redis)
+        self.store = LocalS3Client(str(self.root / "s3"))
+        self.faiss_path = str(self.root / "index" / "faiss")
+        self.whoosh_path = str(self.root / "index" / "whoosh")
+        self.query_embedder = QueryEmbeddingService(embedder, max_batch=query_max_batch,
+                                                    max_wait_ms=query_max_wait_ms)
+        self._indexes = None
+        self._saved = None
+
+    def get_db(self):
+        """get_db override: a session on the benchmark database."""
+        db = self.session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def pipeline(self, session_factory=None) -> IngestionPipeline:
+        """Ingestion pipeline writing to this environment's DB and indexes."""
+        return IngestionPipeline(
+            session_factory or self.session_factory,
+            chunker=make_chunker(chunk_size=settings.CHUNK_SIZE, overlap=settings.CHUNK_OVERLAP),
+            embedder=self.embedder,
+            faiss_indexer=FAISSIndexer(vector_dim=self.vector_dim, index_path=self.faiss_path),
+            whoosh_indexer=WhooshIndexer(index_path=self.whoosh_path),
+            extractor=RepositoryExtractor(temp_dir=str(self.root / "clones"), use_process_pool=False)
+        )
+
+    def search_indexes(self):
+        """FAISS and Whoosh indexes as saved by ingestion (loaded once)."""
+        if self._indexes is None:
+            faiss_indexer = FAISSIndexer(vector_dim=self.vector_dim, index_path=self.faiss_path)
+            faiss_indexer.load()
+            self._indexes = (faiss_indexer, WhooshIndexer(index_path=self.whoosh_path))
+        return self._indexes
+
+    def install(self, app: FastAPI):
+        """Point the app's dependencies and the ingestion worker at the stand-ins."""
+        app.dependency_overrides[get_db] = self.get_db
+        app.dependency_overrides[get_ingestion_queue] = lambda: self.queue
+        app.dependency_overrides[get_s3_client] = lambda: self.store
+        app.dependency_overrides[get_query_embedder] = lambda: self.query_embedder
+        app.dependency_overrides[get_search_indexes] = self.search_indexes
+        self._saved = (ingest_worker.SessionLocal, ingest_worker.build_pipeline)
+        ingest_worker.SessionLocal = self.session_factory
+        ingest_worker.build_pipeline = self.pipeline
+
+    def uninstall(self, app: FastAPI):
+        """Remove the overrides installed by install()."""
+        app.dependency_overrides.clear()
+        if self._saved is not None:
+            ingest_worker.SessionLocal, ingest_worker.build_pipeline = self._saved
+            self._saved = None
+
+    def run_worker(self):
+        """Process every queued ingestion job, then return."""
+        SimpleWorker([self.queue], connection=self.redis).work(burst=True)
+
+    def reload_indexes(self):
+        """Drop cached indexes so the next request loads the latest saved files."""
+        self._indexes = None
+
+    async def aclose(self):
+        """Stop the query embedder and release the database."""
+        await self.query_embedder.aclose()
+        self.engine.dispose()
@@ -0,0 +1,310 @@
+
+"""
+End-to-end benchmark suite for the PROJECT_PLAN performance targets.
+
+Runs entirely offline (see benchmarks.standins): a synthetic corpus is
+ingested through the API and an RQ worker, then queries, verification runs,
+checkpoints, rehydrations and audit writes are timed against the app.
+
+Targets:
+    ingestion      >= 50 chunks/min
+    query latency  p50 <= 300 ms, p95 <= 800 ms, p99 <= 1.5 s
+    query rate     >= 50 QPS
+    verification   <= 500 ms per claim
+    checkpoint     <= 100 ms
+    rehydrate      <= 2 s (20 citations)
+    audit write    < 10 ms
+
+The report lists every target with its measured value and pass/fail, and,
+when --baseline is given, any metric that regressed by more than
+--tolerance against the baseline report. The exit status is non-zero if a
+target fails or a metric regressed.
+
+Usage (from backend/):
+    python -m benchmarks.suite --output report.json --baseline benchmarks/baseline.json
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import httpx
+
+from app.config import settings
+from app.main import app
+from app.utils.audit_log import AuditLogger
+from benchmarks.common import SyntheticEmbedder, latency_summary, write_report
+from benchmarks.corpus import build_corpus, synthetic_queries
+from benchmarks.standins import OfflineEnvironment
+
+
+@dataclass
+class Target:
+    """A PROJECT_PLAN target: metric <op> threshold."""
+    name: str
+    metric: str
+    op: str  # ">=", "<=" or "<"
+    threshold: float
+    unit: str
+
+    def passed(self, value: float) -> bool:
+        if self.op == ">=":
+            return value >= self.threshold
+        if self.op == "<=":
+            return value <= self.threshold
+        return value < self.threshold
+
+    @property
+    def higher_is_better(self) -> bool:
+        return self.op == ">="
+
+
+TARGETS = [
+    Target("ingestion_throughput", "ingestion.chunks_per_minute", ">=", 50, "chunks/min"),
+    Target("query_latency_p50", "query.latency.p50_ms", "<=", 300, "ms"),
+    Target("query_latency_p95", "query.latency.p95_ms", "<=", 800, "ms"),
+    Target("query_latency_p99", "query.latency.p99_ms", "<=", 1500, "ms"),
+    Target("query_throughput", "query.throughput.qps", ">=", 50, "qps"),
+    Target("verification_per_claim", "verification.per_claim.p95_ms", "<=", 500, "ms"),
+    Target("checkpoint_latency", "checkpoint.latency.p95_ms", "<=", 100, "ms"),
+    Target("rehydrate_latency", "rehydrate.latency.p95_ms", "<=", 2000, "ms"),
+    Target("audit_overhead", "audit.write.p95_ms", "<", 10, "ms"),
+]
+
+
+def metric_value(metrics: Dict, path: str) -> Optional[float]:
+    value = metrics
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def evaluate(metrics: Dict) -> List[Dict]:
+    """Pass/fail for every target."""
+    results = []
+    for target in TARGETS:
+        value = metric_value(metrics, target.metric)
+        results.append({
+            "name": target.name,
+            "metric": target.metric,
+            "op": target.op,
+            "threshold": target.threshold,
+            "unit": target.unit,
+            "value": value,
+            "passed": value is not None and target.passed(value),
+        })
+    return results
+
+
+def compare(metrics: Dict, baseline: Dict, tolerance: float) -> List[Dict]:
+    """
+    Target metrics that are worse than the baseline report's by more than
+    tolerance (relative).
+    """
+    regressions = []
+    for target in TARGETS:
+        value = metric_value(metrics, target.metric)
+        before = metric_value(baseline.get("metrics", {}), target.metric)
+        if value is None or not before:
+            continue
+        change = (value - before) / before
+        if (-change if target.higher_is_better else change) > tolerance:
+            regressions.append({"metric": target.metric, "baseline": before, "value": value, "change": change})
+    return regressions
+
+
+async def _timed(client: httpx.AsyncClient, method: str, url: str, **kwargs):
+    start = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if response.status_code >= 300:
+        raise RuntimeError(f"{method} {url} returned {response.status_code}: {response.text[:200]}")
+    return response.json(), elapsed_ms
+
+
+async def measure_ingestion(client: httpx.AsyncClient, env: OfflineEnvironment, repos: Dict) -> Dict:
+    start = time.perf_counter()
+    job_ids = []
+    for slug, path in repos.items():
+        body, _ = await _timed(client, "POST", "/api/v1/ingest/add-work", json={"repo_url": str(path), "slug": slug})
+        job_ids.append(body["job_id"])
+    env.run_worker()  # Blocks the loop; nothing else is running
+    seconds = time.perf_counter() - start
+
+    chunks = 0
+    for job_id in job_ids:
+        status, _ = await _timed(client, "GET", f"/api/v1/ingest/job/{job_id}")
+        if status["status"] != "completed":
+            raise RuntimeError(f"Ingestion job {job_id} ended as {status['status']}: {status['error']}")
+        chunks += status["total_chunks"]
+    env.reload_indexes()
+    return {"works": len(job_ids), "chunks": chunks, "seconds": seconds, "chunks_per_minute": chunks / seconds * 60}
+
+
+async def measure_queries(client: httpx.AsyncClient, queries: List[str], concurrency: int,
+                          duration: float) -> Tuple[Dict, List[Dict]]:
+    """Sequential latency over every query, then closed-loop QPS; also returns the sequential responses."""
+    latencies, responses = [], []
+    for i, text in enumerate(queries):
+        body, ms = await _timed(client, "POST", "/api/v1/query/", json={"session_id": f"bench-{i}", "user_query": text})
+        latencies.append(ms)
+        responses.append(body)
+
+    completed = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(offset: int):
+        nonlocal completed
+        i = offset
+        while time.perf_counter() < deadline:
+            await _timed(client, "POST", "/api/v1/query/",
+                         json={"session_id": "load", "user_query": queries[i % len(queries)]})
+            completed += 1
+            i += concurrency
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(c) for c in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "latency": latency_summary(latencies),
+        "throughput": {"concurrency": concurrency, "seconds": elapsed, "requests": completed,
+                       "qps": completed / elapsed},
+    }, responses
+
+
+async def measure_verification(client: httpx.AsyncClient, responses: List[Dict], runs: int) -> Dict:
+    per_claim, run_ms, claims_total = [], [], 0
+    samples = [r for r in responses if r["claims"]][:runs]
+    for i, response in enumerate(samples):
+        output = " ".join(f"{c['text']} [{c['citation_ids'][0]}]" for c in response["claims"])
+        body, ms = await _timed(client, "POST", "/api/v1/verify/run", json={
+            "run_id": f"bench-{i}", "model_output": output, "retrieval_ids": response["retrieval_ids"]
+        })
+        claims = max(1, len(body["annotated_claims"]))
+        claims_total += claims
+        run_ms.append(ms)
+        per_claim.append(ms / claims)
+    return {"runs": len(samples), "claims": claims_total, "run": latency_summary(run_ms),
+            "per_claim": latency_summary(per_claim)}
+
+
+async def measure_sessions(client: httpx.AsyncClient, responses: List[Dict], count: int) -> Dict:
+    checkpoint_ms, rehydrate_ms, checkpoint_ids = [], [], []
+    for i in range(count):
+        response = responses[i % len(responses)]
+        body, ms = await _timed(client, "POST", "/api/v1/session/checkpoint", json={
+            "session_id": f"bench-session-{i % 10}",
+            "condensed_summary": response["answer"],
+            "accepted_claims": [{"text": c["text"], "citation_ids": c["citation_ids"]} for c in response["claims"]],
+            "top_citation_ids": response["retrieval_ids"][:settings.TOP_K],
+        })
+        checkpoint_ms.append(ms)
+        checkpoint_ids.append(body["checkpoint_id"])
+    citations = 0
+    for checkpoint_id in checkpoint_ids:
+        body, ms = await _timed(client, "GET", "/api/v1/session/rehydrate", params={"checkpoint_id": checkpoint_id})
+        rehydrate_ms.append(ms)
+        citations += len(body["supporting_chunk_ids"])
+    return {
+        "checkpoint": {"latency": latency_summary(checkpoint_ms)},
+        "rehydrate": {"latency": latency_summary(rehydrate_ms), "mean_citations": citations / max(1, count)},
+    }
+
+
+def measure_audit(env: OfflineEnvironment, count: int) -> Dict:
+    db = env.session_factory()
+    audit = AuditLogger(db)
+    samples = []
+    for i in range(count):
+        start = time.perf_counter()
+        audit.log_event("retrieval", "query", resource_type="session", resource_id=f"bench-{i}",
+                        metadata={"results": settings.TOP_K}, duration_ms=1)
+        samples.append((time.perf_counter() - start) * 1000)
+    db.close()
+    return {"write": latency_summary(samples)}
+
+
+def make_embedder(kind: str, vector_dim: int):
+    if kind == "model":
+        from app.core.embeddings import EmbeddingGenerator
+        return EmbeddingGenerator()
+    return SyntheticEmbedder(vector_dim=vector_dim)
+
+
+async def run_suite(args) -> Dict:
+    embedder = make_embedder(args.embedder, args.dim)
+    vector_dim = getattr(embedder, "vector_dim", args.dim)
+    with tempfile.TemporaryDirectory() as tmp:
+        repos = build_corpus(Path(tmp) / "corpus", args.works, args.files_per_work, seed=args.seed)
+        env = OfflineEnvironment(tmp, embedder, vector_dim)
+        env.install(app)
+        try:
+            async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=120) as client:
+                metrics = {"ingestion": await measure_ingestion(client, env, repos)}
+                metrics["query"], responses = await measure_queries(
+                    client, synthetic_queries(args.queries, args.seed), args.concurrency, args.duration
+                )
+                metrics["verification"] = await measure_verification(client, responses, args.verify_runs)
+                metrics.update(await measure_sessions(client, responses, args.checkpoints))
+                metrics["audit"] = measure_audit(env, args.audit_events)
+        finally:
+            env.uninstall(app)
+            await env.aclose()
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--works", type=int, default=4)
+    parser.add_argument("--files-per-work", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100, help="Sequential queries for the latency percentiles")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients for the QPS measurement")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of concurrent load")
+    parser.add_argument("--verify-runs", type=int, default=50)
+    parser.add_argument("--checkpoints", type=int, default=50)
+    parser.add_argument("--audit-events", type=int, default=500)
+    parser.add_argument("--embedder", choices=["synthetic", "model"], default="synthetic",
+                        help="synthetic: offline SyntheticEmbedder; model: the configured sentence-transformer")
+    parser.add_argument("--dim", type=int, default=settings.EMBEDDING_DIM)
+    parser.add_argument("--seed", type=int, default=settings.RANDOM_SEED)
+    parser.add_argument("--baseline", help="Baseline report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression")
+    parser.add_argument("--save-baseline", help="Also write this run's report as the new baseline")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    metrics = asyncio.run(run_suite(args))
+    targets = evaluate(metrics)
+    report = {
+        "suite": "project_plan_targets",
+        "config": {k: v for k, v in vars(args).items() if k not in ("baseline", "save_baseline", "output")},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpu_count": os.cpu_count()},
+        "metrics": metrics,
+        "targets": targets,
+        "passed": all(t["passed"] for t in targets),
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(metrics, json.load(f), args.tolerance)
+        report["baseline"] = {"path": args.baseline, "tolerance": args.tolerance, "regressions": regressions}
+    write_report(report, args.output)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            f.write(json.dumps(report, indent=2, sort_keys=True) + "\n")
+    if not report["passed"] or report.get("baseline", {}).get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,24 @@
 """
 Pytest configuration and fixtures.
 """
+import hashlib
+import os
+import re
+import threading
+
+import fakeredis
+import numpy as np
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from fastapi.testclient import TestClient
 
-from app.main import app
-from app.db.models import Base
-from app.db.session import get_db
+# Settings are read when app modules are imported
+os.environ.setdefault("ABACUSAI_API_KEY", "test-key")
+
+from app.main import app  # noqa: E402
+from app.db.models import Base  # noqa: E402
+from app.db.session import get_db  # noqa: E402
 
 
 # Test database URL (SQLite in-memory)
@@ -51,3 +61,80 @@ def client(db_session):
         yield test_client
     
     app.dependency_overrides.clear()
+
+
+class WordEncoder:
+    """
+    Offline stand-in for the tiktoken encoder: one token per word or
+    whitespace run, so decode(encode(text)) == text.
+    """
+
+    _TOKEN = re.compile(r"\s+|\S+")
+
+    def __init__(self):
+        self.vocab = {}
+        self.words = []
+        self.lock = threading.Lock()  # Pipeline chunk workers share one encoder
+
+    def encode(self, text):
+        ids = []
+        for token in self._TOKEN.findall(text):
+            if token not in self.vocab:
+                with self.lock:
+                    if token not in self.vocab:
+                        self.words.append(token)
+                        self.vocab[token] = len(self.words) - 1
+            ids.append(self.vocab[token])
+        return ids
+
+    def decode(self, ids):
+        return "".join(self.words[i] for i in ids)
+
+
+class HashingEmbedder:
+    """
+    Offline stand-in for EmbeddingGenerator: bag-of-words hashed into a
+    fixed-size unit vector, so texts sharing words have similar vectors.
+    """
+
+    model_name = "test-hashing"
+
+    def __init__(self, vector_dim=64):
+        self.vector_dim = vector_dim
+
+    def embed_text(self, text):
+        vector = np.zeros(self.vector_dim, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.vector_dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_batch(self, texts, batch_size=32):
+        if not texts:
+            return np.zeros((0, self.vector_dim), np.float32)
+        return np.stack([self.embed_text(text) for text in texts])
+
+    def hash_embedding(self, embedding):
+        return hashlib.sha256(np.round(embedding, 6).astype(np.float32).tobytes()).hexdigest()
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """
+    File-backed SQLite session factory for code that opens sessions from
+    worker threads (in-memory SQLite is per-connection).
+    """
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'test.db'}",
+        connect_args={"check_same_thread": False, "timeout": 30}
+    )
+    Base.metadata.create_all(engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def fake_redis():
+    """In-process Redis for RQ queues."""
+    return fakeredis.FakeStrictRedis()
@@ -0,0 +1,137 @@
+
+"""
+Tests for request coalescing and admission control.
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from app.core.admission import AdmissionController, Overloaded, SingleFlight, get_query_admission, get_query_flights
+from app.core.retrieval import get_retriever
+from app.db.session import get_db
+from app.main import app
+
+
+class SlowRetriever:
+    """Retriever stand-in that takes a while and counts its retrievals."""
+
+    def __init__(self):
+        self.queries = []
+
+    async def retrieve(self, query, top_k=20, filters=None):
+        self.queries.append(query)
+        await asyncio.sleep(0.05)
+        return [{"retrieval_id": f"notes:v1:{len(self.queries)}", "text": f"Result for {query}."}]
+
+    def load_text(self, results, max_chars=None):
+        return results
+
+
+def test_admission_serves_in_order_and_sheds_excess():
+    async def run():
+        controller = AdmissionController("test", max_concurrency=2, max_queue=2, queue_timeout_ms=1000)
+        order = []
+
+        async def request(i, hold):
+            async with controller.slot():
+                order.append(i)
+                await asyncio.sleep(hold)
+
+        tasks = [asyncio.ensure_future(request(i, 0.05)) for i in range(4)]
+        await asyncio.sleep(0)
+        assert controller.active == 2 and controller.waiting == 2
+        with pytest.raises(Overloaded) as full:
+            await controller.acquire()
+        await asyncio.gather(*tasks)
+        assert order == [0, 1, 2, 3] and controller.active == 0
+
+        impatient = AdmissionController("test", max_concurrency=1, max_queue=4, queue_timeout_ms=20)
+        await impatient.acquire()
+        with pytest.raises(Overloaded) as late:
+            await impatient.acquire()
+        assert impatient.waiting == 0
+        impatient.release()
+        await impatient.acquire()  # The slot is free again
+        return full.value, late.value, controller.stats
+
+    full, late, stats = asyncio.run(run())
+    assert (full.reason, late.reason) == ("queue_full", "queue_timeout")
+    assert full.retry_after >= 1
+    assert stats == {"admitted": 4, "queued": 2, "rejected": 1}
+
+
+def test_single_flight_shares_in_flight_calls_only():
+    async def run():
+        flights = SingleFlight("test")
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return {"value": len(calls)}
+
+        first = await asyncio.gather(*(flights.do("k", compute) for _ in range(5)))
+        second = await flights.do("k", compute)
+
+        # A cancelled caller leaves the shared computation running for the rest
+        waiters = [asyncio.ensure_future(flights.do("c", compute)) for _ in range(2)]
+        await asyncio.sleep(0)
+        waiters[0].cancel()
+        survivor = await waiters[1]
+
+        async def fail():
+            raise RuntimeError("boom")
+
+        errors = await asyncio.gather(*(flights.do("e", fail) for _ in range(3)), return_exceptions=True)
+        return first, second, survivor, errors, len(calls), flights.stats
+
+    first, second, survivor, errors, calls, stats = asyncio.run(run())
+    assert all(result is first[0] for result in first) and first[0] == {"value": 1}
+    assert second == {"value": 2} and survivor == {"value": 3} and calls == 3
+    assert all(isinstance(e, RuntimeError) for e in errors)
+    assert stats["shared"] == 4 + 1 + 2
+
+
+@pytest.fixture
+def slow_app(db_session):
+    retriever = SlowRetriever()
+    app.dependency_overrides[get_db] = lambda: db_session
+    app.dependency_overrides[get_retriever] = lambda: retriever
+    yield retriever
+    app.dependency_overrides.clear()
+
+
+def post_queries(bodies):
+    async def run():
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            return await asyncio.gather(*(client.post("/api/v1/query/", json=body) for body in bodies))
+    return asyncio.run(run())
+
+
+def test_identical_queries_share_one_retrieval(slow_app):
+    flights = SingleFlight("query")
+    app.dependency_overrides[get_query_flights] = lambda: flights
+    bodies = [{"session_id": f"s{i}", "user_query": "vacuum  energy " if i % 2 else "vacuum energy"} for i in range(6)]
+    bodies.append({"session_id": "s6", "user_query": "vacuum energy", "constraints": {"work_slug": "notes"}})
+
+    responses = post_queries(bodies)
+
+    assert [r.status_code for r in responses] == [200] * 7
+    assert len(slow_app.queries) == 2 and flights.stats["shared"] == 5
+    assert len({tuple(r.json()["retrieval_ids"]) for r in responses[:6]}) == 1
+
+
+def test_overloaded_query_gets_429_with_retry_after(slow_app):
+    flights = SingleFlight("query", enabled=False)
+    app.dependency_overrides[get_query_flights] = lambda: flights
+    controller = AdmissionController("query", max_concurrency=1, max_queue=1, queue_timeout_ms=5000)
+    app.dependency_overrides[get_query_admission] = lambda: controller
+
+    responses = post_queries([{"session_id": "s", "user_query": f"query number {i}"} for i in range(4)])
+
+    statuses = sorted(r.status_code for r in responses)
+    assert statuses == [200, 200, 429, 429]
+    shed = next(r for r in responses if r.status_code == 429)
+    assert int(shed.headers["Retry-After"]) >= 1
+    assert controller.active == 0 and controller.stats["rejected"] == 2
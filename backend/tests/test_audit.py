@@ -0,0 +1,120 @@
+
+"""
+Tests for the audit trail.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+from app.db.models import AuditLog
+from app.db.session import get_db
+from app.main import app
+from app.utils.audit_chain import (
+    AuditChain, audit_path, build_tree, get_audit_chain, leaf_hash, root_from_path, subset_root
+)
+from app.utils.audit_log import AuditLogger
+
+
+@pytest.fixture
+def audit_client(session_factory):
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as test_client:
+        yield test_client
+    app.dependency_overrides.clear()
+
+
+def test_audit_logs_filter_and_paginate(audit_client, session_factory):
+    db = session_factory()
+    logger = AuditLogger(db)
+    for i in range(5):
+        logger.log_event("retrieval", "query", correlation_id=f"c{i}", metadata={"i": i})
+    logger.log_event("checkpoint", "create_checkpoint", duration_ms=3)
+    old = db.query(AuditLog).filter(AuditLog.correlation_id == "c0").one()
+    old.timestamp = datetime.utcnow() - timedelta(days=3)
+    db.commit()
+    db.close()
+
+    body = audit_client.get("/api/v1/audit/logs", params={"event_type": "retrieval", "limit": 2, "page": 2}).json()
+    assert body["total"] == 5 and body["page"] == 2
+    assert [log["correlation_id"] for log in body["logs"]] == ["c2", "c3"]
+
+    since = (datetime.utcnow() - timedelta(days=1)).isoformat() + "Z"
+    body = audit_client.get("/api/v1/audit/logs", params={"start_date": since}).json()
+    assert body["total"] == 5
+    assert body["logs"][-1]["event_type"] == "checkpoint"
+
+    assert audit_client.get("/api/v1/audit/logs", params={"start_date": "yesterday"}).status_code == 400
+
+
+def test_merkle_proofs_match_full_tree():
+    for leaves in (1, 2, 5, 8, 13):
+        hashes = [leaf_hash(str(i).encode()) for i in range(leaves)]
+        levels = build_tree(hashes)
+        root = levels[-1][0]
+        stored = lambda positions: {(level, pos): levels[level][pos] for level, pos in positions}  # noqa: E731
+        for index in range(leaves):
+            proof = [(side, levels[level][pos]) for level, pos, side in audit_path(leaves, index)]
+            assert root_from_path(hashes[index], proof) == root
+        for subset in ({0}, {leaves - 1}, set(range(leaves // 2, leaves)), set(range(leaves))):
+            assert subset_root({i: hashes[i] for i in subset}, leaves, stored)[0] == root
+        assert root_from_path(leaf_hash(b"forged"), proof) != root or leaves == 1
+
+
+def test_audit_segments_prove_events_and_ranges(audit_client, session_factory):
+    chain = AuditChain(segment_events=4, segment_seconds=3600, grace_seconds=0)
+    app.dependency_overrides[get_audit_chain] = lambda: chain
+    db = session_factory()
+    logger = AuditLogger(db)
+    start = datetime.utcnow() - timedelta(hours=20)
+    ids = []
+    for i in range(10):
+        event = logger.log_event("retrieval", "query", correlation_id=f"c{i}", metadata={"i": i})
+        event.timestamp = start + timedelta(hours=i)
+        db.commit()
+        ids.append(event.id)
+    assert chain.seal(db) == 3  # Two full segments, then the rest once it is old enough
+    logger.log_event("checkpoint", "create_checkpoint")  # Not sealed yet
+
+    body = audit_client.get("/api/v1/audit/verify", params={"event_id": ids[5]}).json()
+    assert body["verified"] and body["segments"][0]["seq"] == 1 and body["event"]["leaf_index"] == 1
+    # A client holding only the segment root can check the proof itself
+    proof = [(side, bytes.fromhex(node)) for side, node in body["event"]["proof"]]
+    root = root_from_path(leaf_hash(body["event"]["record"].encode()), proof)
+    assert root.hex() == body["segments"][0]["merkle_root"] and len(proof) == 2
+    assert body["chain_head"] == {"seq": 2, "last_event_id": ids[-1], "chain_root": chain.chain_head(db)["chain_root"]}
+
+    window = {"start_date": (start + timedelta(hours=2)).isoformat(),
+              "end_date": (start + timedelta(hours=6)).isoformat()}
+    body = audit_client.get("/api/v1/audit/verify", params=window).json()
+    assert body["verified"] and body["events_checked"] == 5 and body["unsealed_events"] == 0
+    assert [s["events_in_range"] for s in body["segments"]] == [2, 3]
+    assert all(s["stored_nodes_used"] > 0 for s in body["segments"])
+    assert audit_client.get("/api/v1/audit/verify", params={"start_date": start.isoformat()}).json()[
+        "unsealed_events"] == 1
+
+    # Rewriting a sealed event is caught by its proof and pinpointed by range verification
+    db.execute(update(AuditLog).where(AuditLog.id == ids[5]).values(metadata_={"i": 99}))
+    db.commit()
+    assert not chain.verify_event(db, ids[5])["verified"] and chain.verify_event(db, ids[1])["verified"]
+    body = audit_client.get("/api/v1/audit/verify", params=window).json()
+    assert not body["verified"] and body["mismatched_event_ids"] == [ids[5]]
+    assert [s["verified"] for s in body["segments"]] == [True, False]
+
+    # So is deleting one
+    db.query(AuditLog).filter(AuditLog.id == ids[2]).delete()
+    db.commit()
+    segment = chain.verify_range(db, start, start + timedelta(hours=1))["segments"][0]
+    assert not segment["complete"] and not segment["verified"]
+    db.close()
+
+    assert audit_client.get("/api/v1/audit/verify").status_code == 400
+    assert audit_client.get("/api/v1/audit/verify", params={"event_id": 10 ** 6}).status_code == 404
@@ -0,0 +1,50 @@
+
+"""
+Tests for embedding generation.
+"""
+import os
+
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.core.embeddings import EmbeddingGenerator, ParallelEmbeddingPool, create_embedder
+from tests.conftest import HashingEmbedder
+
+
+@pytest.fixture(scope="module")
+def pool():
+    with ParallelEmbeddingPool(
+        processes=2, batch_size=3, vector_dim=64, embedder_factory=HashingEmbedder
+    ) as embedding_pool:
+        yield embedding_pool
+
+
+def shm_segments():
+    return set(os.listdir("/dev/shm")) if os.path.isdir("/dev/shm") else set()
+
+
+def test_pool_matches_local_embedder_in_input_order(pool):
+    texts = [("word " * n).strip() + f" {n}" for n in (40, 1, 17, 3, 29, 8, 2, 55, 11, 6)]
+    before = shm_segments()
+
+    vectors = pool.embed_batch(texts)
+
+    assert vectors.shape == (len(texts), 64)
+    assert vectors.dtype == np.float32
+    np.testing.assert_allclose(vectors, HashingEmbedder().embed_batch(texts), rtol=1e-6)
+    assert shm_segments() <= before  # Output buffer is unlinked
+
+
+def test_pool_handles_empty_and_single_inputs(pool):
+    assert pool.embed_batch([]).shape == (0, 64)
+    np.testing.assert_allclose(pool.embed_text("vacuum"), HashingEmbedder().embed_text("vacuum"), rtol=1e-6)
+    assert pool.get_metadata()["processes"] == 2
+
+
+def test_create_embedder_follows_execution_mode(monkeypatch):
+    assert isinstance(create_embedder(), EmbeddingGenerator)
+
+    monkeypatch.setattr(settings, "EMBEDDING_EXECUTION_MODE", "gpu_cluster")
+    with pytest.raises(ValueError):
+        create_embedder()
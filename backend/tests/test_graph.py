@@ -0,0 +1,162 @@
+
+"""
+Tests for the citation graph.
+"""
+from collections import Counter, defaultdict
+import itertools
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.citation_graph import CitationGraph, get_citation_graph, read_snapshot
+from app.core.embedding_service import QueryEmbeddingService, get_query_embedder
+from app.core.indexer import FAISSIndexer
+from app.core.retrieval import get_search_indexes
+from app.db.models import Chunk, Citation, Work
+from app.db.session import get_db
+from app.main import app
+from tests.conftest import HashingEmbedder
+
+
+def add_works(db, slugs):
+    chunks = {}
+    for slug in slugs:
+        work = Work(source_slug=slug, version="v1", canonical_url=f"https://example.org/{slug}", is_current=True)
+        db.add(work)
+        db.flush()
+        chunk = Chunk(work_id=work.id, chunk_index=0, text=f"Text of {slug}.")
+        db.add(chunk)
+        db.flush()
+        chunks[slug] = chunk.id
+    db.commit()
+    return chunks
+
+
+def expected_edges(citations):
+    """Co-citation weights recomputed from scratch: citation pairs per query, per pair of works."""
+    by_query = defaultdict(Counter)
+    for slug, query in citations:
+        by_query[query][slug] += 1
+    weights = Counter()
+    for counts in by_query.values():
+        for a, b in itertools.permutations(counts, 2):
+            weights[a, b] += counts[a] * counts[b]
+    return weights
+
+
+def test_graph_weights_stay_exact_as_citations_arrive(session_factory):
+    db = session_factory()
+    slugs = [f"work-{i}" for i in range(12)]
+    chunks = add_works(db, slugs)
+    rng = random.Random(0)
+    citations = [(rng.choice(slugs[:rng.randint(2, 12)]), f"query {rng.randint(0, 30)}") for _ in range(400)]
+
+    def insert(batch):
+        db.add_all([Citation(chunk_id=chunks[slug], retrieval_id=f"{slug}:v1:{chunks[slug]}", query_text=query)
+                    for slug, query in batch])
+        db.commit()
+
+    insert(citations[:150])
+    graph = CitationGraph(merge_edges=40, refresh_seconds=3600).build(db)
+    insert(citations[150:])
+    assert graph.refresh(db) == 250 and graph._pending  # Some updates are still waiting to be merged
+
+    weights = expected_edges(citations)
+    for slug in slugs:
+        total, page = graph.neighborhood(slug, limit=100)
+        assert {(slug, n["work_slug"]): n["weight"] for n in page} == {k: w for k, w in weights.items() if k[0] == slug}
+        assert [n["weight"] for n in page] == sorted((n["weight"] for n in page), reverse=True)
+        assert graph.node(slug)["citations"] == sum(1 for s, _ in citations if s == slug)
+
+    # Pages tile the full neighborhood
+    total, everything = graph.neighborhood("work-0", limit=100)
+    pages = [graph.neighborhood("work-0", offset, 3)[1] for offset in range(0, total, 3)]
+    assert list(itertools.chain(*pages)) == everything
+    heavy = graph.neighborhood("work-0", min_weight=everything[1]["weight"])[1]
+    assert all(n["weight"] >= everything[1]["weight"] for n in heavy) and len(heavy) >= 2
+
+    snapshot = read_snapshot(b"".join(graph.snapshot_chunks()))
+    assert not graph._pending and len(snapshot["indices"]) == 2 * graph.edges
+    for node, slug in enumerate(snapshot["slugs"]):
+        start, end = snapshot["indptr"][node], snapshot["indptr"][node + 1]
+        row = {snapshot["slugs"][n]: int(w)
+               for n, w in zip(snapshot["indices"][start:end], snapshot["weights"][start:end])}
+        assert row == {b: w for (a, b), w in weights.items() if a == slug}
+    assert graph.nodes(0, 1)[1][0]["citations"] == max(Counter(s for s, _ in citations).values())
+    db.close()
+
+
+def test_graph_keeps_query_counts_for_recent_queries_only(session_factory):
+    db = session_factory()
+    chunks = add_works(db, ["a", "b", "c"])
+    citations = [("a", "q1"), ("b", "q1"), ("c", "q2"), ("a", "q3"), ("b", "q1")]
+    db.add_all([Citation(chunk_id=chunks[slug], retrieval_id=f"{slug}:v1:{chunks[slug]}", query_text=query)
+                for slug, query in citations])
+    db.commit()
+
+    unbounded = CitationGraph(refresh_seconds=3600).build(db)
+    assert unbounded.neighborhood("a")[1][0]["weight"] == 2
+    graph = CitationGraph(refresh_seconds=3600, max_queries=2).build(db)
+    # q1 was dropped when q3 arrived, so the last citation of b pairs with nothing
+    assert len(graph._queries) == 2
+    assert [(n["work_slug"], n["weight"]) for n in graph.neighborhood("a")[1]] == [("b", 1)]
+    assert graph.node("b")["citations"] == 2
+    db.close()
+
+
+@pytest.fixture
+def graph_client(session_factory, tmp_path):
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    graph = CitationGraph(refresh_seconds=3600)
+    service = QueryEmbeddingService(HashingEmbedder(), max_batch=16, max_wait_ms=1)
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_query_embedder] = lambda: service
+    semantic_index = FAISSIndexer(vector_dim=64, index_path=str(tmp_path / "faiss"))
+    app.dependency_overrides[get_search_indexes] = lambda: (semantic_index, None)
+    app.dependency_overrides[get_citation_graph] = lambda: graph
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+    app.dependency_overrides.clear()
+
+
+def test_verification_updates_graph_endpoints(graph_client, session_factory):
+    db = session_factory()
+    chunks = add_works(db, ["lattice", "supernova", "inflation"])
+    db.close()
+    assert graph_client.get("/api/v1/graph/nodes").json() == {"nodes": [], "total": 0, "next_offset": None}
+
+    ids = {slug: f"{slug}:v1:{chunk_id}" for slug, chunk_id in chunks.items()}
+    for cited in (["lattice", "supernova"], ["lattice", "supernova", "inflation"]):
+        response = graph_client.post("/api/v1/verify/run", json={
+            "run_id": "run", "query_text": "what drives expansion",
+            "model_output": " ".join(f"Text of {slug}. [{ids[slug]}]" for slug in cited),
+            "retrieval_ids": list(ids.values()),
+        })
+        assert response.status_code == 200
+
+    # Built by the first request; each verification's citations were added as it committed
+    nodes = graph_client.get("/api/v1/graph/nodes", params={"limit": 2}).json()
+    assert nodes["nodes"] == [{"work_slug": "lattice", "citations": 2}, {"work_slug": "supernova", "citations": 2}]
+    assert nodes["total"] == 3 and nodes["next_offset"] == 2
+
+    body = graph_client.get("/api/v1/graph/neighborhood/lattice", params={"limit": 1}).json()
+    assert body["node"] == {"work_slug": "lattice", "citations": 2}
+    assert body["neighbors"] == [{"work_slug": "supernova", "weight": 4, "citations": 2}]
+    assert body["total"] == 2 and body["next_offset"] == 1
+    assert graph_client.get("/api/v1/graph/neighborhood/unknown").status_code == 404
+
+    response = graph_client.get("/api/v1/graph/snapshot", params={"min_weight": 3})
+    assert response.headers["content-type"] == "application/octet-stream"
+    snapshot = read_snapshot(response.content)
+    assert snapshot["slugs"] == ["lattice", "supernova", "inflation"]
+    assert snapshot["citations"].tolist() == [2, 2, 1]
+    assert snapshot["indptr"].tolist() == [0, 1, 2, 2] and snapshot["indices"].tolist() == [1, 0]
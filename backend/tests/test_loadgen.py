@@ -0,0 +1,101 @@
+"""
+Tests for the load generator's histogram, knee detection and open-loop schedule.
+"""
+import asyncio
+import random
+
+import httpx
+import numpy as np
+import pytest
+
+from benchmarks.loadgen import LatencyHistogram, TrafficMix, arrival_schedule, find_knee, parse_mix, run_open_loop
+
+
+def test_histogram_percentiles_match_known_distribution():
+    rng = np.random.default_rng(7)
+    values = rng.lognormal(mean=9.0, sigma=1.0, size=50_000).astype(np.int64) + 1
+    histogram = LatencyHistogram(significant_figures=2)
+    for value in values:
+        histogram.record(int(value))
+
+    assert histogram.total == len(values)
+    assert histogram.min_us == values.min()
+    assert histogram.max_us == values.max()
+    for p in (50, 90, 99, 99.9):
+        exact = np.percentile(values, p, method="inverted_cdf")
+        assert exact <= histogram.percentile(p) <= exact * 1.01
+    assert histogram.percentile(100) == values.max()
+
+
+def test_histogram_small_values_are_exact_and_merge_adds_up():
+    low, high = LatencyHistogram(), LatencyHistogram()
+    for value in range(1, 101):
+        low.record(value)
+    high.record(10_000, count=100)
+
+    assert low.percentile(50) == 50
+    assert low.percentile(99) == 99
+
+    low.merge(high)
+    assert low.total == 200
+    assert low.percentile(50) == 100
+    assert 10_000 <= low.percentile(75) <= 10_100
+    assert low.to_dict()["mean_ms"] == pytest.approx((5050 + 1_000_000) / 200 / 1000.0)
+
+
+def test_find_knee_on_saturating_curve():
+    levels = [1, 2, 4, 8, 16, 32, 64]
+    # Throughput doubles with load up to 8, then flattens and sags.
+    throughputs = [10, 20, 40, 78, 80, 79, 75]
+    assert find_knee(levels, throughputs) == {"level": 8.0, "throughput_rps": 78.0}
+
+
+def test_find_knee_edge_cases():
+    assert find_knee([1, 2], [10, 20]) is None
+    assert find_knee([1, 2, 4], [30, 30, 30]) == {"level": 1.0, "throughput_rps": 30.0}
+
+
+def test_arrival_schedule_is_poisson_at_rate():
+    rate, start, deadline = 200.0, 5.0, 105.0
+    times = list(arrival_schedule(random.Random(3), rate, start, deadline))
+    gaps = np.diff([start] + times)
+
+    assert all(start < t < deadline for t in times)
+    assert (gaps > 0).all()
+    # 20000 expected arrivals: count and mean gap within a few percent,
+    # and exponential gaps have a coefficient of variation of 1.
+    assert len(times) == pytest.approx(rate * (deadline - start), rel=0.03)
+    assert gaps.mean() == pytest.approx(1 / rate, rel=0.03)
+    assert gaps.std() / gaps.mean() == pytest.approx(1.0, rel=0.05)
+    assert times == list(arrival_schedule(random.Random(3), rate, start, deadline))
+
+
+def test_open_loop_sends_on_schedule_without_waiting_for_responses():
+    in_flight, peak = [0], [0]
+
+    async def handler(request):
+        in_flight[0] += 1
+        peak[0] = max(peak[0], in_flight[0])
+        await asyncio.sleep(0.05)
+        in_flight[0] -= 1
+        return httpx.Response(200, json={})
+
+    async def run():
+        mix = TrafficMix(parse_mix("query=1"), ["q"], seed=1)
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await run_open_loop(client, mix, rate=400, duration=0.5, warmup=0)
+
+    result = asyncio.run(run())
+    assert result["mode"] == "open"
+    assert result["errors"] == 0
+    assert 100 <= result["requests"] <= 300
+    # 50 ms responses at 400/s: a closed loop would never overlap requests.
+    assert peak[0] > 5
+    assert result["latency"]["min_ms"] >= 50
+
+
+def test_parse_mix_normalizes_and_rejects_unknown_endpoints():
+    assert parse_mix("query=3,verify=1") == {"query": 0.75, "verify": 0.25}
+    with pytest.raises(ValueError):
+        parse_mix("query=1,upload=1")
@@ -0,0 +1,74 @@
+
+"""
+Tests for the logging pipeline.
+"""
+import io
+import threading
+
+import orjson
+import pytest
+import structlog
+
+from app.utils.log_pipeline import LOG_EVENTS, configure_logging, parse_sample_rates, shutdown_logging
+
+
+@pytest.fixture(autouse=True)
+def restore_logging():
+    yield
+    shutdown_logging()
+    configure_logging()
+
+
+class BlockingStream(io.BytesIO):
+    """Binary stream whose writes wait until released."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def write(self, data):
+        self.release.wait(5)
+        return super().write(data)
+
+
+def test_async_mode_writes_json_lines_with_sampling():
+    stream = io.BytesIO()
+    configure_logging(async_mode=True, level="INFO",
+                      sample_rates={"Query received": 0.0, "Retrieval complete": 1.0}, stream=stream)
+    logger = structlog.get_logger()
+    sampled_before = LOG_EVENTS.labels("sampled_out").value
+
+    logger.info("Query received", query="dark energy")
+    logger.warning("Query received", query="kept: warnings are never sampled")
+    logger.info("Retrieval complete", results_count=3, payload={1: object()})
+    logger.debug("Below the level")
+    shutdown_logging()
+
+    lines = [orjson.loads(line) for line in stream.getvalue().splitlines()]
+    assert [(line["event"], line["level"]) for line in lines] == [
+        ("Query received", "warning"), ("Retrieval complete", "info")
+    ]
+    assert lines[1]["sample_rate"] == 1.0 and lines[1]["timestamp"].endswith("Z")
+    assert LOG_EVENTS.labels("sampled_out").value == sampled_before + 1
+
+
+def test_full_queue_drops_instead_of_blocking():
+    stream = BlockingStream()
+    configure_logging(async_mode=True, level="INFO", sample_rates={}, stream=stream, queue_size=2)
+    logger = structlog.get_logger()
+    dropped_before = LOG_EVENTS.labels("dropped").value
+
+    for i in range(50):
+        logger.info("Burst", i=i)  # Returns immediately even though the writer is stuck
+    stream.release.set()
+    shutdown_logging()
+
+    written = len(stream.getvalue().splitlines())
+    dropped = LOG_EVENTS.labels("dropped").value - dropped_before
+    assert dropped > 0 and written + dropped == 50
+
+
+def test_parse_sample_rates():
+    assert parse_sample_rates("Query received=0.01, a=b=2,") == {"Query received": 0.01, "a=b": 1.0}
+    with pytest.raises(ValueError):
+        parse_sample_rates("no-rate")
@@ -0,0 +1,87 @@
+
+"""
+Tests for request instrumentation.
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db.models import AuditLog
+from app.db.session import get_db
+from app.main import app
+from app.storage.local_store import LocalS3Client
+from app.storage.s3_client import get_s3_client
+from app.utils.metrics import STAGE_DURATION, MetricsRegistry, stage_timer
+
+
+@pytest.fixture
+def metrics_client(session_factory, tmp_path):
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_s3_client] = lambda: LocalS3Client(str(tmp_path / "s3"))
+    with TestClient(app) as test_client:
+        yield test_client
+    app.dependency_overrides.clear()
+
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    latency = registry.histogram("demo_seconds", "Demo latency", ["stage"], buckets=(0.1, 1.0))
+    errors = registry.counter("demo_errors_total", "Demo errors", ["stage"])
+    for value in (0.05, 0.5, 5.0):
+        latency.labels("fu\"sion").observe(value)
+    errors.labels("fusion").inc(2)
+
+    text = registry.render()
+    assert "# TYPE demo_seconds histogram" in text
+    assert 'demo_seconds_bucket{stage="fu\\"sion",le="0.1"} 1.0' in text
+    assert 'demo_seconds_bucket{stage="fu\\"sion",le="1.0"} 2.0' in text
+    assert 'demo_seconds_bucket{stage="fu\\"sion",le="+Inf"} 3.0' in text
+    assert 'demo_seconds_count{stage="fu\\"sion"} 3.0' in text
+    assert 'demo_errors_total{stage="fusion"} 2.0' in text
+    with pytest.raises(ValueError):
+        registry.counter("demo_errors_total", "again")
+
+
+def test_stage_timer_counts_calls_and_errors():
+    child = STAGE_DURATION.labels("test_stage")
+    before = child.count
+
+    @stage_timer("test_stage")
+    def fail():
+        raise RuntimeError("boom")
+
+    with stage_timer("test_stage"):
+        pass
+    with pytest.raises(RuntimeError):
+        fail()
+    assert child.count == before + 2
+
+
+def test_requests_are_timed_and_audited(metrics_client, session_factory):
+    response = metrics_client.post(
+        "/api/v1/session/checkpoint",
+        json={"session_id": "s1", "condensed_summary": "x", "accepted_claims": [], "top_citation_ids": []},
+        headers={"X-Correlation-ID": "trace-123"}
+    )
+    assert response.status_code == 200
+    assert response.headers["x-correlation-id"] == "trace-123"
+    generated = metrics_client.get("/health").headers["x-correlation-id"]
+    assert generated and generated != "trace-123"
+
+    db = session_factory()
+    event = db.query(AuditLog).filter(AuditLog.event_type == "checkpoint").one()
+    assert event.correlation_id == "trace-123"
+    assert event.duration_ms is not None and event.duration_ms >= 0
+    db.close()
+
+    body = metrics_client.get("/metrics")
+    assert body.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'greds_stage_duration_seconds_count{stage="s3_io"}' in body.text
+    assert ('greds_http_request_duration_seconds_count'
+            '{method="POST",route="/api/v1/session/checkpoint",status="200"}') in body.text
@@ -0,0 +1,80 @@
+
+"""
+Tests for per-request profiling.
+"""
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.db.models import AuditLog
+from app.db.session import get_db
+from app.main import app
+from app.storage.local_store import LocalS3Client
+from app.storage.s3_client import get_s3_client
+
+CHECKPOINT = {"session_id": "s1", "condensed_summary": "x", "accepted_claims": [], "top_citation_ids": []}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalS3Client(str(tmp_path / "s3"))
+
+
+@pytest.fixture
+def profiling_client(session_factory, store, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILING_TOKEN", "let-me-profile")
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_s3_client] = lambda: store
+    with TestClient(app) as test_client:
+        yield test_client
+    app.dependency_overrides.clear()
+
+
+def wait_for_object(store, prefix, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        keys = store.list_objects(prefix)
+        if keys:
+            return keys
+        time.sleep(0.02)
+    return []
+
+
+def test_header_triggers_profile_upload(profiling_client, store, session_factory):
+    response = profiling_client.post("/api/v1/session/checkpoint", json=CHECKPOINT, headers={
+        "X-Profile": "let-me-profile", "X-Correlation-ID": "slow-one"
+    })
+    assert response.status_code == 200
+    key = response.headers["x-profile-key"]
+    assert key.startswith("profiles/") and key.endswith("/slow-one.json")
+
+    assert wait_for_object(store, "profiles/") == [key]
+    profile = json.loads(store.download_file(key))
+    assert profile["correlation_id"] == "slow-one"
+    assert profile["trigger"] == "header" and profile["status"] == 200
+    assert profile["path"] == "/api/v1/session/checkpoint"
+    assert set(profile["samples"]) == {"running", "waiting"}
+    assert "peak_traced_bytes" in profile["allocations"]
+
+    db = session_factory()
+    event = db.query(AuditLog).filter(AuditLog.correlation_id == "slow-one").one()
+    assert event.metadata_["profile_key"] == key
+    db.close()
+
+
+def test_unprofiled_requests(profiling_client, store):
+    wrong = profiling_client.post("/api/v1/session/checkpoint", json=CHECKPOINT, headers={"X-Profile": "guess"})
+    plain = profiling_client.post("/api/v1/session/checkpoint", json=CHECKPOINT)
+    assert "x-profile-key" not in wrong.headers and "x-profile-key" not in plain.headers
+    assert store.list_objects("profiles/") == []
@@ -2,19 +2,538 @@
 """
 Tests for retrieval pipeline.
 """
+import asyncio
+import json
+
+import numpy as np
 import pytest
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.core.diversity import mmr
+from app.core.embedding_service import QueryEmbeddingService, get_query_embedder
+from app.core.hierarchy import SectionIndex
+from app.core.hydration import ChunkHydrator
+from app.core.indexer import FAISSIndexer, ShardedFAISSIndexer, TwoStageFAISSIndexer, WhooshIndexer, normalize_rows
+from app.core.neighbors import NeighborIndex
+from app.core import retrieval
+from app.core.retrieval import HybridRetriever, get_search_indexes, normalize_scores
+from app.db.models import Chunk, Work
+from app.db.session import get_db
+from app.main import app
+from tests.conftest import HashingEmbedder
+
+CORPUS = {
+    ("vacuum", ("cosmology",)): [
+        "The vacuum energy density is tiny. Field theory predicts far more.",
+        "Renormalization shifts the vacuum energy by large amounts.",
+        "Observations of supernovae imply accelerated expansion.",
+    ],
+    ("lattice", ("qcd",)): [
+        "Lattice gauge theory discretizes spacetime. Quarks live on sites.",
+        "Monte Carlo sampling estimates the hadron spectrum on the lattice.",
+    ],
+}
+
+
+class CountingEmbedder(HashingEmbedder):
+    """HashingEmbedder that records the size of every forward pass."""
+
+    def __init__(self, fail=False):
+        super().__init__()
+        self.batches = []
+        self.fail = fail
+
+    def embed_batch(self, texts, batch_size=32):
+        self.batches.append(len(texts))
+        if self.fail:
+            raise RuntimeError("model crashed")
+        return super().embed_batch(texts)
+
+
+@pytest.fixture
+def search_indexes(session_factory, tmp_path):
+    """Works and chunks in the DB, indexed in FAISS and Whoosh."""
+    embedder = HashingEmbedder()
+    faiss_indexer = FAISSIndexer(vector_dim=64, index_path=str(tmp_path / "faiss"))
+    whoosh_indexer = WhooshIndexer(index_path=str(tmp_path / "whoosh"))
+
+    db = session_factory()
+    for (slug, tags), texts in CORPUS.items():
+        work = Work(source_slug=slug, version="v1", canonical_url=f"https://example.org/{slug}", tags=list(tags),
+                    is_current=True)
+        db.add(work)
+        db.flush()
+        chunks = [Chunk(work_id=work.id, chunk_index=i, text=text) for i, text in enumerate(texts)]
+        db.add_all(chunks)
+        db.flush()
+        faiss_indexer.add_batch([c.id for c in chunks], embedder.embed_batch(texts))
+        whoosh_indexer.add_batch([
+            {"chunk_id": c.id, "text": c.text, "work_slug": slug, "version": "v1", "chunk_index": c.chunk_index}
+            for c in chunks
+        ])
+    db.commit()
+    db.close()
+    return faiss_indexer, whoosh_indexer
+
+
+@pytest.fixture
+def query_client(session_factory, search_indexes):
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    service = QueryEmbeddingService(CountingEmbedder(), max_batch=8, max_wait_ms=2)
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_query_embedder] = lambda: service
+    app.dependency_overrides[get_search_indexes] = lambda: search_indexes
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+    app.dependency_overrides.clear()
+
+
+def test_normalize_scores():
+    assert normalize_scores([]) == []
+    assert normalize_scores([2.0, 2.0]) == [1.0, 1.0]
+    assert normalize_scores([1.0, 3.0, 2.0]) == [0.0, 1.0, 0.5]
+
+
+def test_hybrid_scoring_is_weighted_and_deterministic():
+    retriever = HybridRetriever(None, None, None, None, semantic_weight=0.7, lexical_weight=0.3)
+    semantic = [{"chunk_id": 1, "score": 0.9}, {"chunk_id": 2, "score": 0.5}, {"chunk_id": 3, "score": 0.1}]
+    lexical = [{"chunk_id": 3, "score": 12.0}, {"chunk_id": 4, "score": 2.0}]
+
+    fused = retriever.fuse(semantic, lexical)
+
+    assert [e["chunk_id"] for e in fused] == [1, 2, 3, 4]
+    assert fused[0]["hybrid_score"] == pytest.approx(0.7)
+    assert fused[2]["hybrid_score"] == pytest.approx(0.3)
+    assert fused[1]["hybrid_score"] == pytest.approx(0.35)
+    assert retriever.fuse(semantic, lexical) == fused
+
+
+def test_query_returns_top_k_with_citations(query_client):
+    response = query_client.post("/api/v1/query/", json={
+        "session_id": "s1", "user_query": "vacuum energy density"
+    })
+    assert response.status_code == 200
+    body = response.json()
+
+    assert body["retrieval_ids"][0].startswith("vacuum:v1:")
+    assert body["claims"][0]["text"] == "The vacuum energy density is tiny."
+    assert body["claims"][0]["citation_ids"] == body["retrieval_ids"][:1]
+    assert body["answer"].startswith("The vacuum energy density is tiny.")
+
+
+def test_query_constraints_filter_results(query_client):
+    body = query_client.post("/api/v1/query/", json={
+        "session_id": "s1", "user_query": "vacuum energy lattice", "constraints": {"tags": ["qcd"]}
+    }).json()
+    assert body["retrieval_ids"]
+    assert all(rid.startswith("lattice:v1:") for rid in body["retrieval_ids"])
+
+    short = query_client.post("/api/v1/query/", json={"session_id": "s1", "user_query": "ab"})
+    assert short.status_code == 400
+
+
+def test_mmr_skips_near_copies_and_caps_works():
+    base = np.eye(16)[:4]
+    vectors = np.stack([base[0], base[0] + 0.01 * base[1], base[1], base[2], base[3]])
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    relevance = np.array([1.0, 0.99, 0.8, 0.7, 0.6])
+
+    assert mmr(relevance, vectors, 3, 1.0).tolist() == [0, 1, 2]  # lambda = 1 keeps the fused order
+    assert mmr(relevance, vectors, 3, 0.6).tolist() == [0, 2, 3]  # The near-copy of the first pick drops out
+    works = np.array([0, 1, 1, 1, 2])
+    assert mmr(relevance, vectors, 5, 1.0, works, max_per_group=2).tolist() == [0, 1, 2, 4]
+    assert mmr(relevance, np.zeros((5, 16)), 2, 0.5, works, max_per_group=1).tolist() == [0, 1]
+
+
+def test_query_diversity_constraints(query_client, search_indexes):
+    faiss_indexer, _ = search_indexes
+    chunk_ids = faiss_indexer.position_chunk_ids()
+    assert faiss_indexer.positions([chunk_ids[3], -5, chunk_ids[0]]).tolist() == [3, -1, 0]
+
+    request = {"session_id": "s1", "user_query": "vacuum energy lattice"}
+    plain = query_client.post("/api/v1/query/", json=request).json()["retrieval_ids"]
+    capped = query_client.post("/api/v1/query/", json={**request, "constraints": {"max_per_work": 1}}).json()
+    assert len(plain) == 5
+    assert sorted(rid.split(":")[0] for rid in capped["retrieval_ids"]) == ["lattice", "vacuum"]
+    assert capped["retrieval_ids"][0] == plain[0]
+    kept = query_client.post("/api/v1/query/", json={**request, "constraints": {"mmr_lambda": 1}}).json()
+    assert kept["retrieval_ids"] == plain
+
+    for constraints in ({"mmr_lambda": 1.5}, {"max_per_work": 0}):
+        response = query_client.post("/api/v1/query/", json={**request, "constraints": constraints})
+        assert response.status_code == 400
+
+
+def parse_sse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_streaming_query_emits_early_then_fused_results(query_client):
+    request = {"session_id": "s1", "user_query": "vacuum energy density"}
+    response = query_client.post("/api/v1/query/stream", json=request)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(response.text)
+
+    assert [name for name, _ in events] == ["retrieval", "retrieval", "claim", "claim", "claim", "answer"]
+    early, fused = events[0][1], events[1][1]
+    assert early["leg"] in ("semantic", "lexical") and early["retrieval_ids"]
+    assert fused["leg"] == "fused" and fused["hits"][0]["retrieval_id"] == fused["retrieval_ids"][0]
+    top = fused["hits"][0]
+    assert int(top["retrieval_id"].rsplit(":", 1)[1]) in top["context_window"]
+    answer = events[-1][1]
+    assert answer == query_client.post("/api/v1/query/", json=request).json()
+    assert [data for name, data in events if name == "claim"] == answer["claims"]
+
+    assert query_client.post("/api/v1/query/stream", json={"session_id": "s1", "user_query": "ab"}).status_code == 400
+
+
+def test_neighbor_index_windows_stay_within_files(session_factory):
+    db = session_factory()
+    work = Work(source_slug="paper", version="v1", canonical_url="https://example.org/paper", is_current=True)
+    db.add(work)
+    db.flush()
+    # Two files; rows inserted out of order so chunk IDs do not follow chunk_index
+    layout = [("b.md", 3), ("a.md", 0), ("a.md", 2), ("a.md", 1), ("b.md", 4), ("b.md", 5)]
+    rows = {index: Chunk(work_id=work.id, chunk_index=index, source_path=path, text=f"chunk {index}")
+            for path, index in layout}
+    db.add_all(rows.values())
+    db.commit()
+    ids = {index: row.id for index, row in rows.items()}
+
+    index = NeighborIndex(refresh_seconds=3600).build(db)
+    assert len(index) == 6
+    assert index.window(ids[1]) == [ids[0], ids[1], ids[2]]
+    assert index.window(ids[2], k=2) == [ids[0], ids[1], ids[2]]  # a.md ends here; b.md is not context
+    assert index.window(ids[3], k=2) == [ids[3], ids[4], ids[5]]
+
+    # Chunks added later (e.g. by the ingestion worker) are linked on the first lookup that misses
+    late = Chunk(work_id=work.id, chunk_index=6, source_path="b.md", text="chunk 6")
+    db.add(late)
+    db.commit()
+    windows = index.windows(db, [late.id, ids[5]])
+    assert windows == {late.id: [ids[5], late.id], ids[5]: [ids[4], ids[5], late.id]}
+
+    loaded = index.load_windows(db, windows)
+    assert [row["text"] for row in loaded[ids[5]]] == ["chunk 4", "chunk 5", "chunk 6"]
+    assert "text" not in index.load_windows(db, windows, with_text=False)[late.id][0]
+    db.close()
+
+
+def test_hydrator_caches_hot_chunks_and_sees_new_aliases(session_factory):
+    db = session_factory()
+    old = Work(source_slug="paper", version="v1", canonical_url="https://example.org/paper", is_current=True)
+    db.add(old)
+    db.flush()
+    chunks = [Chunk(work_id=old.id, chunk_index=i, text=f"chunk {i} " * 50) for i in range(3)]
+    db.add_all(chunks)
+    db.commit()
+    ids = [c.id for c in chunks]
+
+    hydrator = ChunkHydrator(max_chunks=2, refresh_seconds=3600)
+    found, works = hydrator.copies(db, ids[:2])
+    assert [group[0].retrieval_id for group in found.values()] == [f"paper:v1:{ids[0]}", f"paper:v1:{ids[1]}"]
+    assert works[old.id].is_current and hydrator.stats["misses"] == 2
+    queries = hydrator.stats["queries"]
+    hydrator.copies(db, ids[:2])
+    assert hydrator.stats["queries"] == queries and hydrator.stats["hits"] == 2  # Served from the cache
+    hydrator.copies(db, ids[2:])
+    assert len(hydrator) == 2 and ids[0] not in hydrator._copies  # Least recently used evicted
+
+    # A new version adds an alias of a cached chunk and takes over is_current
+    new = Work(source_slug="paper", version="v2", canonical_url="https://example.org/paper", is_current=True)
+    old.is_current = False
+    db.add(new)
+    db.flush()
+    db.add(Chunk(work_id=new.id, chunk_index=0, text=chunks[1].text, canonical_chunk_id=ids[1]))
+    db.commit()
+    hydrator.refresh(db)
+    found, works = hydrator.copies(db, ids[1:2])
+    assert [ref.retrieval_id.split(":")[1] for ref in found[ids[1]]] == ["v1", "v2"]
+    assert not works[old.id].is_current and works[new.id].is_current
+
+    results = hydrator.load_text(db, [{"chunk_id": ids[0]}, {"chunk_id": ids[2]}], max_chars=8)
+    assert [r["text"] for r in results] == ["chunk 0 ", "chunk 2 "]
+    db.close()
+
+
+def test_hierarchical_retrieval_searches_routed_sections(session_factory, search_indexes):
+    faiss_indexer, whoosh_indexer = search_indexes
+    db = session_factory()
+    hierarchy = SectionIndex(works=1, sections=1, section_chunks=2, refresh_seconds=0)
+    embedder = HashingEmbedder()
+
+    candidates = hierarchy.route(db, faiss_indexer, embedder.embed_text("vacuum energy renormalization"))
+    assert candidates.work_slugs == ["vacuum"] and len(hierarchy) == 3  # vacuum: 2 + 1 chunks, lattice: 2
+    vacuum = db.query(Chunk).join(Work).filter(Work.source_slug == "vacuum").order_by(Chunk.chunk_index).all()
+    chunk_ids = faiss_indexer.position_chunk_ids()
+    assert sorted(chunk_ids[candidates.positions]) == [vacuum[0].id, vacuum[1].id]
+    tagged = hierarchy.route(db, faiss_indexer, embedder.embed_text("vacuum energy"), {"tags": ["qcd"]})
+    assert tagged.work_slugs == ["lattice"]
+
+    async def run(query):
+        service = QueryEmbeddingService(embedder, max_batch=8, max_wait_ms=2)
+        retriever = HybridRetriever(db, service, faiss_indexer, whoosh_indexer, hierarchy=hierarchy)
+        try:
+            return await retriever.semantic_search(query, 5), await retriever.retrieve(query, top_k=5)
+        finally:
+            await service.aclose()
+
+    semantic, results = asyncio.run(run("vacuum energy"))
+    assert {hit["chunk_id"] for hit in semantic} == {vacuum[0].id, vacuum[1].id}
+    assert results[0]["work_slug"] == "vacuum"
+
+    # A newly ingested work is routed to once the refresh interval has passed
+    work = Work(source_slug="galaxies", version="v1", canonical_url="https://example.org/galaxies",
+                is_current=True)
+    db.add(work)
+    db.flush()
+    chunk = Chunk(work_id=work.id, chunk_index=0, text="Spiral galaxies rotate faster than their visible mass allows.")
+    db.add(chunk)
+    db.commit()
+    faiss_indexer.add_batch([chunk.id], embedder.embed_batch([chunk.text]))
+    whoosh_indexer.add_batch([{"chunk_id": chunk.id, "text": chunk.text, "work_slug": "galaxies", "version": "v1",
+                               "chunk_index": 0}])
+    semantic, results = asyncio.run(run("spiral galaxies rotate"))
+    assert [hit["chunk_id"] for hit in semantic] == [chunk.id]
+    assert results[0]["work_slug"] == "galaxies"
+    db.close()
+
+
+def test_embedding_service_batches_concurrent_requests():
+    embedder = CountingEmbedder()
+    texts = [f"query number {i}" for i in range(10)]
+
+    async def run():
+        service = QueryEmbeddingService(embedder, max_batch=32, max_wait_ms=50)
+        vectors = await asyncio.gather(*(service.embed(t) for t in texts))
+        await service.aclose()
+        return vectors
+
+    vectors = asyncio.run(run())
+
+    assert embedder.batches == [10]
+    for text, vector in zip(texts, vectors):
+        np.testing.assert_allclose(vector, HashingEmbedder().embed_text(text))
+
+
+def test_embedding_service_respects_max_batch():
+    embedder = CountingEmbedder()
+
+    async def run():
+        service = QueryEmbeddingService(embedder, max_batch=4, max_wait_ms=50)
+        await asyncio.gather(*(service.embed(f"q{i}") for i in range(10)))
+        await service.aclose()
+
+    asyncio.run(run())
+    assert sum(embedder.batches) == 10
+    assert max(embedder.batches) == 4
+
+
+def test_embedding_service_propagates_errors_to_every_caller():
+    async def run():
+        service = QueryEmbeddingService(CountingEmbedder(fail=True), max_batch=8, max_wait_ms=20)
+        results = await asyncio.gather(*(service.embed(f"q{i}") for i in range(3)), return_exceptions=True)
+        await service.aclose()
+        return results
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_embedding_service_fails_callers_when_rows_are_missing():
+    class ShortEmbedder(HashingEmbedder):
+        calls = 0
+
+        def embed_batch(self, texts, batch_size=None):
+            self.calls += 1
+            vectors = super().embed_batch(texts)
+            return vectors[:-1] if self.calls == 1 else vectors
+
+    async def run():
+        service = QueryEmbeddingService(ShortEmbedder(), max_batch=8, max_wait_ms=20)
+        results = await asyncio.gather(*(service.embed(f"q{i}") for i in range(3)), return_exceptions=True)
+        followup = await asyncio.wait_for(service.embed("next"), 1)  # The batching task survived
+        await service.aclose()
+        return results, followup
+
+    results, followup = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    np.testing.assert_allclose(followup, HashingEmbedder().embed_text("next"))
+
+
+def test_search_indexes_reload_newer_saved_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "SEARCH_INDEX_REFRESH_SECONDS", 0.0)
+    monkeypatch.setattr(retrieval, "_indexes", None)
+    vectors = np.eye(settings.EMBEDDING_DIM, dtype=np.float32)
+    worker_index = FAISSIndexer()
+    worker_index.add_batch([1], vectors[:1])
+    worker_index.save()
+
+    faiss_indexer, whoosh_indexer = get_search_indexes()
+    assert faiss_indexer.next_id == 1
+    assert get_search_indexes()[0] is faiss_indexer  # Unchanged on disk
+
+    worker_index.add_batch([2], vectors[1:2])
+    worker_index.save()
+    reloaded, same_whoosh = get_search_indexes()
+    assert reloaded.chunk_ids() == {1, 2}
+    assert same_whoosh is whoosh_indexer
+    assert faiss_indexer.next_id == 1  # Requests holding the old index are unaffected
+
+
+def test_sharded_index_matches_single_index(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((200, 16)).astype(np.float32)
+    chunk_ids = list(range(1000, 1200))
+    queries = rng.standard_normal((5, 16)).astype(np.float32)
+
+    single = FAISSIndexer(vector_dim=16, index_path=str(tmp_path / "single"))
+    single.add_batch(chunk_ids, vectors)
+    sharded = ShardedFAISSIndexer(vector_dim=16, index_path=str(tmp_path / "sharded"), num_shards=4,
+                                  search_processes=2)
+    faiss_ids = sharded.add_batch(chunk_ids, vectors)
+
+    assert len(set(faiss_ids)) == len(chunk_ids)
+    assert sharded.next_id == 200 and sharded.chunk_ids() == set(chunk_ids)
+    assert [len(shard.id_mapping) for shard in sharded.shards] == [50, 50, 50, 50]
+    expected = [single.search(q, 10) for q in queries]
+    for query, hits in zip(queries, expected):
+        assert [h["chunk_id"] for h in sharded.search(query, 10)] == [h["chunk_id"] for h in hits]
+
+    sharded.save()
+    sharded.start_search_pool()
+    try:
+        for query, hits in zip(queries, expected):
+            assert [h["chunk_id"] for h in sharded.search(query, 10)] == [h["chunk_id"] for h in hits]
+        with pytest.raises(RuntimeError):
+            sharded.add_batch([1], vectors[:1])
+    finally:
+        sharded.stop_search_pool()
+    assert sharded.next_id == 200
+
+
+@pytest.mark.parametrize("codes", ["pq", "binary"])
+def test_two_stage_index_reranks_candidates_exactly(tmp_path, codes):
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((40, 32)).astype(np.float32)
+    vectors = centers[rng.integers(0, 40, 2000)] + 0.3 * rng.standard_normal((2000, 32)).astype(np.float32)
+    chunk_ids = list(range(5000, 7000))
+    queries = vectors[rng.choice(2000, 20, replace=False)] + 0.1 * rng.standard_normal((20, 32)).astype(np.float32)
+
+    exact = FAISSIndexer(vector_dim=32, index_path=str(tmp_path / "exact"))
+    exact.add_batch(chunk_ids, vectors)
+    index = TwoStageFAISSIndexer(vector_dim=32, index_path=str(tmp_path / codes), codes=codes,
+                                 candidates=200, subquantizers=8, train_size=500)
+    index.add_batch(chunk_ids[:300], vectors[:300])
+    assert index.trained == (codes == "binary")  # PQ waits for train_size vectors
+    index.add_batch(chunk_ids[300:], vectors[300:])
+    assert index.trained and index.chunk_ids() == set(chunk_ids)
+    assert index.nbytes < vectors.nbytes / 2  # Codes, codebooks and chunk IDs vs float32 vectors
+
+    overlap = 0
+    for query in queries:
+        expected = exact.search(query, 10)
+        full_depth = index.search(query, 10, candidates=2000)
+        assert [h["chunk_id"] for h in full_depth] == [h["chunk_id"] for h in expected]
+        hits = index.search(query, 10)
+        overlap += len({h["chunk_id"] for h in hits} & {h["chunk_id"] for h in expected})
+        # Second-stage scores are exact cosine similarities
+        by_id = {h["chunk_id"]: h["score"] for h in expected}
+        for hit in hits:
+            if hit["chunk_id"] in by_id:
+                assert hit["score"] == pytest.approx(by_id[hit["chunk_id"]], abs=1e-5)
+    assert overlap / (10 * len(queries)) >= 0.9
+
+    # Vectors added after the last save are dropped on load
+    index.save()
+    saved_hits = index.search(queries[0], 10)
+    index.add_batch([9999], vectors[:1])
+    reloaded = TwoStageFAISSIndexer(vector_dim=32, index_path=str(tmp_path / codes), codes=codes,
+                                    candidates=200, subquantizers=8, train_size=500)
+    assert reloaded.load()
+    assert reloaded.next_id == 2000 and 9999 not in reloaded.chunk_ids()
+    assert reloaded.search(queries[0], 10) == saved_hits
+    assert reloaded.positions([5007, 9999]).tolist() == [7, -1]
+    reloaded.add_batch([9999], vectors[:1])
+    assert reloaded.positions([9999]).tolist() == [2000]
+    assert reloaded.search(vectors[0], 2)[1]["chunk_id"] in (9999, 5000)
+
+
+def test_two_stage_index_shared_by_writer_and_reader(tmp_path):
+    rng = np.random.default_rng(4)
+    vectors = normalize_rows(rng.standard_normal((40, 16)))
+
+    def indexer():
+        return TwoStageFAISSIndexer(vector_dim=16, index_path=str(tmp_path), codes="binary")
+
+    def rows_match(index, chunk_ids):
+        ids, rows = index.vectors()
+        return ids == chunk_ids and np.allclose(rows, vectors[[i - 100 for i in chunk_ids]], atol=1e-6)
+
+    writer, reader = indexer(), indexer()
+    writer.add_batch(list(range(100, 110)), vectors[:10])
+    writer.save()
+    writer.add_batch(list(range(110, 120)), vectors[10:20])  # Not saved yet
+    assert reader.load() and reader.next_id == 10
+    writer.add_batch(list(range(120, 130)), vectors[20:30])
+    writer.save()
+    # Reloading the reader left the writer's unsaved rows alone
+    assert reader.load() and rows_match(reader, list(range(100, 130)))
+    assert (np.linalg.norm(reader.vectors()[1], axis=1) > 0.99).all()
+
+    # Removal writes a new file; the reader's mapped rows keep their chunk IDs until it reloads
+    writer.remove(range(100, 105))
+    writer.save()
+    assert rows_match(reader, list(range(100, 130)))
+    assert reader.search(vectors[2], 1)[0]["chunk_id"] == 102
+    assert reader.load() and rows_match(reader, list(range(105, 130)))
+
+    # A reader that appends after another writer's rows starts a file of its own
+    writer.add_batch([130], vectors[30:31])
+    reader.add_batch([131], vectors[31:32])
+    assert rows_match(reader, list(range(105, 130)) + [131]) and rows_match(writer, list(range(105, 131)))
+
+    # Each switch deletes the file replaced by the switch before it
+    writer.remove([105])
+    writer.save()
+    files = sorted(p.name for p in tmp_path.glob("index_vectors*.f32"))
+    assert len(files) == 3  # Current, just replaced, and the reader's unsaved file
+    fresh = indexer()
+    assert fresh.load() and rows_match(fresh, list(range(106, 131)))
 
 
-def test_placeholder():
-    """
-    Placeholder test for retrieval.
-    TODO: Implement actual tests in Phase 4.
-    """
-    assert True
+def test_sharded_index_rebuilds_one_shard(tmp_path):
+    vectors = np.eye(8, dtype=np.float32)
+    sharded = ShardedFAISSIndexer(vector_dim=8, index_path=str(tmp_path), num_shards=2, shard_key="work")
+    sharded.add_batch([1, 2, 3], vectors[:3], work_slug="alpha")
+    sharded.add_batch([4, 5], vectors[3:5], work_slug="beta")
+    alpha, beta = sharded.shard_for(0, "alpha"), sharded.shard_for(0, "beta")
+    assert alpha != beta
+    sharded.save()
+    untouched = (sharded.shards[beta].index_path / "index.faiss").stat().st_mtime_ns
 
+    assert sharded.compact_shard(alpha, keep_chunk_ids={1, 3}) == 1
+    assert sharded.chunk_ids() == {1, 3, 4, 5}
+    assert sharded.search(vectors[2], 1)[0]["chunk_id"] == 3
+    assert (sharded.shards[beta].index_path / "index.faiss").stat().st_mtime_ns == untouched
 
-# TODO: Phase 4 - Implement retrieval tests
-# - test_semantic_search
-# - test_lexical_search
-# - test_hybrid_scoring
-# - test_top_k_results
+    reloaded = ShardedFAISSIndexer(vector_dim=8, index_path=str(tmp_path), num_shards=2, shard_key="work")
+    assert reloaded.load()
+    assert reloaded.chunk_ids() == {1, 3, 4, 5}
+    with pytest.raises(ValueError):
+        reloaded.add_batch([6], vectors[5:6])
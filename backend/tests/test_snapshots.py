@@ -0,0 +1,138 @@
+
+"""
+Tests for index snapshot publishing and replica warm start.
+"""
+import numpy as np
+import pytest
+
+from app.core.indexer import FAISSIndexer, ShardedFAISSIndexer, WhooshIndexer
+from app.core.snapshots import IndexSnapshots, SnapshotWatcher
+from app.storage.local_store import LocalS3Client
+
+WORDS = "vacuum energy inflation horizon entropy lattice gauge boson photon neutrino".split()
+
+
+def add_documents(faiss_indexer, whoosh_indexer, chunk_ids, rng):
+    faiss_indexer.add_batch(chunk_ids, rng.standard_normal((len(chunk_ids), 16)).astype(np.float32),
+                            work_slug="notes")
+    whoosh_indexer.add_batch([
+        {"chunk_id": cid, "text": " ".join(rng.choice(WORDS, 12)), "work_slug": "notes", "version": "v1",
+         "chunk_index": i}
+        for i, cid in enumerate(chunk_ids)
+    ])
+    faiss_indexer.save()
+
+
+@pytest.mark.parametrize("sharded", [False, True])
+def test_replica_serves_published_snapshot(tmp_path, sharded):
+    rng = np.random.default_rng(0)
+    source = (ShardedFAISSIndexer(vector_dim=16, index_path=str(tmp_path / "faiss"), num_shards=3) if sharded
+              else FAISSIndexer(vector_dim=16, index_path=str(tmp_path / "faiss")))
+    whoosh = WhooshIndexer(index_path=str(tmp_path / "whoosh"))
+    add_documents(source, whoosh, list(range(1, 301)), rng)
+    s3 = LocalS3Client(str(tmp_path / "s3"))
+
+    manifest = IndexSnapshots(s3, local_dir=str(tmp_path / "publisher")).publish(source, whoosh)
+    assert manifest["generation"] == 1 and manifest["semantic"]["vectors"] == 300
+
+    replica = IndexSnapshots(s3, local_dir=str(tmp_path / "replica"), part_bytes=1000, download_threads=4)
+    generation, (semantic, lexical) = replica.load_latest()
+    assert generation == 1 and semantic.codes == "exact"
+    for query in rng.standard_normal((5, 16)).astype(np.float32):
+        expected = source.search(query, 10)
+        hits = semantic.search(query, 10)
+        assert [h["chunk_id"] for h in hits] == [h["chunk_id"] for h in expected]
+        assert [h["score"] for h in hits] == pytest.approx([h["score"] for h in expected], abs=1e-5)
+    assert lexical.search("vacuum entropy", 20) == whoosh.search("vacuum entropy", 20)
+
+
+def test_corrupt_bundle_is_rejected_and_watcher_switches_generations(tmp_path):
+    rng = np.random.default_rng(1)
+    source = FAISSIndexer(vector_dim=16, index_path=str(tmp_path / "faiss"))
+    whoosh = WhooshIndexer(index_path=str(tmp_path / "whoosh"))
+    add_documents(source, whoosh, list(range(1, 101)), rng)
+    s3 = LocalS3Client(str(tmp_path / "s3"))
+    publisher = IndexSnapshots(s3, local_dir=str(tmp_path / "publisher"))
+    first = publisher.publish(source, whoosh)
+
+    replica = IndexSnapshots(s3, local_dir=str(tmp_path / "replica"), part_bytes=512)
+    switched = []
+    watcher = SnapshotWatcher(replica, lambda generation, indexes: switched.append((generation, indexes)))
+    assert watcher.check() and switched[-1][0] == 1
+    assert not watcher.check()  # Nothing newer
+
+    add_documents(source, whoosh, list(range(101, 151)), rng)
+    second = publisher.publish(source, whoosh)
+    bundle = tmp_path / "s3" / "local" / second["bundle_key"]
+    data = bytearray(bundle.read_bytes())
+    data[10] ^= 0xFF
+    bundle.write_bytes(bytes(data))
+    with pytest.raises(IOError):
+        watcher.check()
+    assert watcher.current == 1 and not replica.local_path(2).exists()
+
+    third = publisher.publish(source, whoosh)
+    assert third["generation"] == 3 and first["generation"] == 1
+    assert watcher.check()
+    generation, (semantic, _) = switched[-1]
+    assert generation == 3 and semantic.chunk_ids() == set(range(1, 151))
+    assert sorted(p.name for p in (tmp_path / "replica").iterdir()) == ["00000001", "00000003"]
+
+    publisher.publish(source, whoosh)
+    assert watcher.check()
+    assert sorted(p.name for p in (tmp_path / "replica").iterdir()) == ["00000003", "00000004"]
+
+
+class InterleavingS3Client(LocalS3Client):
+    """LocalS3Client that runs another publisher while the first bundle upload is in flight."""
+
+    def __init__(self, root, interleave):
+        super().__init__(root)
+        self.interleave = interleave
+
+    def upload_file(self, file_obj, key, metadata=None):
+        interleave, self.interleave = self.interleave, None
+        if interleave:
+            interleave()
+        return super().upload_file(file_obj, key, metadata)
+
+
+def test_concurrent_publishers_get_distinct_generations(tmp_path):
+    rng = np.random.default_rng(2)
+    source = FAISSIndexer(vector_dim=16, index_path=str(tmp_path / "faiss"))
+    whoosh = WhooshIndexer(index_path=str(tmp_path / "whoosh"))
+    add_documents(source, whoosh, list(range(1, 51)), rng)
+    other = FAISSIndexer(vector_dim=16, index_path=str(tmp_path / "other"))
+    other.add_batch(list(range(1000, 1020)), rng.standard_normal((20, 16)).astype(np.float32))
+    other.save()
+
+    overtaking = []
+    s3 = InterleavingS3Client(str(tmp_path / "s3"), lambda: overtaking.append(
+        IndexSnapshots(s3, local_dir=str(tmp_path / "second")).publish(other, whoosh)
+    ))
+    first = IndexSnapshots(s3, local_dir=str(tmp_path / "first")).publish(source, whoosh)
+    second, = overtaking
+
+    # The second publisher started after the first claimed 1, and finished first
+    assert (first["generation"], second["generation"]) == (1, 2)
+    assert first["writer"] != second["writer"] and first["bundle_key"] != second["bundle_key"]
+    assert s3.list_objects("index-snapshots/00000001/claims/") == [f"index-snapshots/00000001/claims/{first['writer']}"]
+    # The first publisher re-read LATEST and did not move it back
+    replica = IndexSnapshots(s3, local_dir=str(tmp_path / "replica"))
+    generation, (semantic, _) = replica.load_latest()
+    assert generation == 2 and semantic.chunk_ids() == set(range(1000, 1020))
+    assert replica.open(replica.fetch(1))[0].chunk_ids() == set(range(1, 51))
+
+
+def test_publisher_steps_over_contested_generation(tmp_path):
+    rng = np.random.default_rng(3)
+    source = FAISSIndexer(vector_dim=16, index_path=str(tmp_path / "faiss"))
+    whoosh = WhooshIndexer(index_path=str(tmp_path / "whoosh"))
+    add_documents(source, whoosh, list(range(1, 21)), rng)
+    s3 = LocalS3Client(str(tmp_path / "s3"))
+    # Another publisher's claim on 1, with nothing published yet
+    s3.upload_json({"writer": "other"}, "index-snapshots/00000001/claims/other")
+
+    manifest = IndexSnapshots(s3, local_dir=str(tmp_path / "publisher")).publish(source, whoosh)
+    assert manifest["generation"] == 2
+    assert IndexSnapshots(s3, local_dir=str(tmp_path / "replica")).latest_generation() == 2
@@ -1,9 +1,118 @@
+'use client'
+
+import { useRef, useState } from 'react'
+
+const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000/api/v1'
+
+interface Hit {
+  retrieval_id: string
+  work_slug: string
+  work_title: string | null
+  work_url: string | null
+  chunk_index: number
+  hybrid_score: number
+  text: string
+}
+
+interface Claim {
+  text: string
+  citation_ids: string[]
+}
+
+interface Timings {
+  firstResultMs?: number
+  fusedMs?: number
+  completeMs?: number
+}
+
+// Splits a server-sent event stream into (event, data) pairs as bytes arrive
+async function* readEvents(body: ReadableStream<Uint8Array>) {
+  const reader = body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) return
+    buffer += decoder.decode(value, { stream: true })
+    let end
+    while ((end = buffer.indexOf('\n\n')) >= 0) {
+      const block = buffer.slice(0, end)
+      buffer = buffer.slice(end + 2)
+      let event = 'message'
+      let data = ''
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7)
+        else if (line.startsWith('data: ')) data += line.slice(6)
+      }
+      yield { event, data: JSON.parse(data) }
+    }
+  }
+}
 
 export default function Query() {
+  const [query, setQuery] = useState('')
+  const [hits, setHits] = useState<Hit[]>([])
+  const [leg, setLeg] = useState<string | null>(null)
+  const [claims, setClaims] = useState<Claim[]>([])
+  const [answer, setAnswer] = useState<string | null>(null)
+  const [error, setError] = useState<string | null>(null)
+  const [timings, setTimings] = useState<Timings>({})
+  const [running, setRunning] = useState(false)
+  const abort = useRef<AbortController | null>(null)
+
+  async function search() {
+    abort.current?.abort()
+    const controller = new AbortController()
+    abort.current = controller
+    setHits([])
+    setLeg(null)
+    setClaims([])
+    setAnswer(null)
+    setError(null)
+    setTimings({})
+    setRunning(true)
+
+    const start = performance.now()
+    const elapsed = () => Math.round(performance.now() - start)
+    try {
+      const response = await fetch(`${API_URL}/query/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+        body: JSON.stringify({ session_id: 'web', user_query: query }),
+        signal: controller.signal,
+      })
+      if (!response.ok || !response.body) {
+        const body = await response.json().catch(() => null)
+        throw new Error(body?.detail || `Query failed (${response.status})`)
+      }
+      for await (const { event, data } of readEvents(response.body)) {
+        if (event === 'retrieval') {
+          setHits(data.hits)
+          setLeg(data.leg)
+          const ms = elapsed()
+          setTimings((t) =>
+            data.leg === 'fused' ? { ...t, fusedMs: ms } : { ...t, firstResultMs: t.firstResultMs ?? ms }
+          )
+        } else if (event === 'claim') {
+          setClaims((c) => [...c, data])
+        } else if (event === 'answer') {
+          setAnswer(data.answer)
+          setTimings((t) => ({ ...t, completeMs: elapsed() }))
+        } else if (event === 'error') {
+          throw new Error(data.detail)
+        }
+      }
+    } catch (e) {
+      if (!controller.signal.aborted) setError((e as Error).message)
+    } finally {
+      if (abort.current === controller) setRunning(false)
+    }
+  }
+
   return (
     <div className="container mx-auto px-4 py-8">
       <h1 className="text-3xl font-bold mb-6">Query Interface</h1>
-      
+
       <div className="space-y-6">
         <div>
           <label className="block text-sm font-medium mb-2">
@@ -13,25 +122,73 @@ export default function Query() {
             className="w-full p-3 border rounded-lg"
             rows={4}
             placeholder="What is quantum resonance gravity?"
-            disabled
+            value={query}
+            onChange={(e) => setQuery(e.target.value)}
           />
         </div>
-        
-        <button 
-          className="px-6 py-2 bg-primary text-primary-foreground rounded-lg"
-          disabled
+
+        <button
+          className="px-6 py-2 bg-primary text-primary-foreground rounded-lg disabled:opacity-50"
+          disabled={running || query.trim().length < 3}
+          onClick={search}
         >
-          Search
+          {running ? 'Searching…' : 'Search'}
         </button>
 
-        <div className="p-6 border rounded-lg">
-          <p className="text-muted-foreground">
-            Query interface will be implemented in Phase 8.
-          </p>
-          <p className="text-sm text-muted-foreground mt-2">
-            Coming soon: Hybrid retrieval, citation display, result filtering.
+        {error && (
+          <div className="p-4 border border-red-300 rounded-lg text-red-600">{error}</div>
+        )}
+
+        {(timings.firstResultMs !== undefined || running) && (
+          <p className="text-sm text-muted-foreground">
+            First results: {timings.firstResultMs ?? '…'} ms · Fused: {timings.fusedMs ?? '…'} ms ·
+            Complete: {timings.completeMs ?? '…'} ms
           </p>
-        </div>
+        )}
+
+        {(answer !== null || claims.length > 0) && (
+          <div className="p-6 border rounded-lg space-y-3">
+            <h2 className="text-xl font-semibold">Answer</h2>
+            <ul className="space-y-2">
+              {claims.map((claim, i) => (
+                <li key={i}>
+                  {claim.text}{' '}
+                  {claim.citation_ids.map((id) => (
+                    <span key={id} className="text-xs font-mono text-muted-foreground">[{id}]</span>
+                  ))}
+                </li>
+              ))}
+            </ul>
+          </div>
+        )}
+
+        {hits.length > 0 && (
+          <div className="space-y-3">
+            <h2 className="text-xl font-semibold">
+              Results{' '}
+              {leg !== 'fused' && (
+                <span className="text-sm font-normal text-muted-foreground">
+                  (early, {leg} search only)
+                </span>
+              )}
+            </h2>
+            {hits.map((hit) => (
+              <div key={hit.retrieval_id} className="p-4 border rounded-lg">
+                <div className="flex justify-between text-sm mb-1">
+                  <span className="font-medium">
+                    {hit.work_url ? (
+                      <a href={hit.work_url} className="underline">{hit.work_title || hit.work_slug}</a>
+                    ) : (
+                      hit.work_title || hit.work_slug
+                    )}
+                  </span>
+                  <span className="font-mono text-muted-foreground">{hit.retrieval_id}</span>
+                </div>
+                <p className="text-sm text-muted-foreground">{hit.text}</p>
+              </div>
+            ))}
+          </div>
+        )}
       </div>
     </div>
   )